@@ -0,0 +1,79 @@
+"""
+Benchmark della scansione multi-processo (`OpzioniAnalisi.processi`).
+
+Crea un albero sintetico di file .mp3 vuoti con nomi realistici (le info vengono
+quindi ricavate dal nome file, come per i file senza tag) e misura il tempo di
+`scansiona_cartella` al variare del numero di processi.
+
+Uso:
+    python benchmarks/bench_analisi_processi.py --file 200000
+    python benchmarks/bench_analisi_processi.py --cartella /tmp/albero --mantieni
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from gestore_duplicati_musicali import scansiona_cartella, OpzioniAnalisi
+
+SUFFISSI = ["", "", "", " (Live)", " (Radio Edit)", " [Remastered 2011]", " (Acoustic)", " (feat. Ospite)"]
+
+
+def crea_albero_sintetico(cartella: Path, numero_file: int, seme: int = 42):
+    """Crea `numero_file` file vuoti organizzati in Artista/Album/Traccia."""
+    rnd = random.Random(seme)
+    for i in range(numero_file):
+        artista = f"Artista {i % 5000:04d}"
+        album = cartella / artista / f"Album {(i // 12) % 40:02d}"
+        if i % 12 == 0 or not album.exists():
+            album.mkdir(parents=True, exist_ok=True)
+        titolo = f"Titolo {rnd.randrange(numero_file // 3 + 1)}{rnd.choice(SUFFISSI)}"
+        (album / f"{i % 12 + 1:02d} - {artista} - {titolo}.mp3").touch()
+
+
+def misura(cartella: Path, processi: int) -> float:
+    inizio = time.perf_counter()
+    validi, _ = scansiona_cartella(
+        cartella, cartella / "NON CONFORMI",
+        logger=lambda msg, flush=True: None,
+        opzioni=OpzioniAnalisi(processi=processi)
+    )
+    durata = time.perf_counter() - inizio
+    assert validi, "Nessun file valido: albero sintetico non corretto?"
+    return durata
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", type=int, default=200_000, help="Numero di file sintetici (default: 200000).")
+    parser.add_argument("--cartella", type=str, default=None, help="Cartella dell'albero (default: cartella temporanea).")
+    parser.add_argument("--mantieni", action="store_true", help="Non cancellare l'albero al termine.")
+    parser.add_argument("--max-processi", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    cartella = Path(args.cartella) if args.cartella else Path(tempfile.mkdtemp(prefix="tuneup_bench_"))
+    try:
+        if not any(cartella.iterdir()):
+            print(f"Creo {args.file} file sintetici in {cartella}...", flush=True)
+            crea_albero_sintetico(cartella, args.file)
+
+        livelli = [0] + [p for p in (2, 4, 8, 16, 32, 64) if p <= args.max_processi]
+        base = None
+        print(f"{'processi':>8} {'secondi':>9} {'file/s':>10} {'speedup':>8}")
+        for processi in livelli:
+            durata = misura(cartella, processi)
+            base = base or durata
+            print(f"{processi or 1:>8} {durata:>9.2f} {args.file / durata:>10.0f} {base / durata:>7.2f}x", flush=True)
+    finally:
+        if not args.mantieni and not args.cartella:
+            shutil.rmtree(cartella, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark della lettura di titolo e artista: lettore rapido (`leggi_titolo_artista_id3`)
+rispetto a mutagen (`EasyID3`), a page cache calda e fredda.
+
+Crea file MP3 sintetici con tag ID3v2 scritti da mutagen (testo in UTF-16, più una
+copertina di `--copertina` KiB), poi misura le due letture su tutti i file.
+La misura "fredda" scarta le pagine dei file dalla cache con
+`posix_fadvise(POSIX_FADV_DONTNEED)` prima di ogni passata: disponibile solo su
+Linux/Unix, e valida solo se i file non sono stati appena scritti (si esegue `os.sync`).
+
+Uso:
+    python benchmarks/bench_lettura_id3.py --file 5000
+    python benchmarks/bench_lettura_id3.py --cartella /percorso/libreria/reale
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+RADICE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RADICE))
+sys.path.insert(0, str(RADICE / "tests"))
+
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3, TIT2, TPE1, TALB, APIC, Encoding
+from gestore_duplicati_musicali import leggi_titolo_artista_id3
+from mp3_sintetici import frame_audio, crea_mp3
+
+
+def crea_file_sintetici(cartella: Path, numero_file: int, copertina_kib: int):
+    audio = frame_audio(300) # ~8 secondi a 128 kbps
+    for i in range(numero_file):
+        percorso = crea_mp3(cartella / f"{i // 500:03d}" / f"{i:06d}.mp3", audio)
+        tag = ID3()
+        tag.add(TIT2(encoding=Encoding.UTF16, text=[f"Titolo {i}"]))
+        tag.add(TPE1(encoding=Encoding.UTF16, text=[f"Artista {i % 997}"]))
+        tag.add(TALB(encoding=Encoding.UTF16, text=[f"Album {i % 101}"]))
+        if copertina_kib:
+            tag.add(APIC(encoding=Encoding.LATIN1, mime="image/jpeg", type=3, desc="", data=os.urandom(copertina_kib * 1024)))
+        tag.save(percorso, v2_version=3)
+
+
+def lettura_mutagen(percorso):
+    try:
+        audio = EasyID3(percorso)
+    except Exception:
+        return None, None
+    return audio.get('title', [None])[0], audio.get('artist', [None])[0]
+
+
+def svuota_cache(percorsi):
+    for percorso in percorsi:
+        fd = os.open(percorso, os.O_RDONLY)
+        try:
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+
+def misura(funzione, percorsi, fredda: bool) -> float:
+    if fredda:
+        svuota_cache(percorsi)
+    inizio = time.perf_counter()
+    for percorso in percorsi:
+        funzione(percorso)
+    return time.perf_counter() - inizio
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", type=int, default=5000, help="Numero di file sintetici (default: 5000).")
+    parser.add_argument("--copertina", type=int, default=64, help="KiB di copertina in ogni tag (default: 64).")
+    parser.add_argument("--cartella", type=str, default=None, help="Usa i file .mp3 di questa cartella invece di crearne di sintetici.")
+    parser.add_argument("--ripetizioni", type=int, default=3)
+    args = parser.parse_args()
+
+    temporanea = None
+    if args.cartella:
+        cartella = Path(args.cartella)
+    else:
+        cartella = temporanea = Path(tempfile.mkdtemp(prefix="tuneup_bench_id3_"))
+        print(f"Creo {args.file} file sintetici in {cartella}...", flush=True)
+        crea_file_sintetici(cartella, args.file, args.copertina)
+    try:
+        percorsi = sorted(str(p) for p in cartella.rglob("*.mp3"))
+        differenze = sum(1 for p in percorsi if leggi_titolo_artista_id3(p) not in (None, lettura_mutagen(p)))
+        print(f"{len(percorsi)} file, {differenze} risultati diversi tra i due lettori")
+
+        cache_fredda_disponibile = hasattr(os, "posix_fadvise")
+        if cache_fredda_disponibile:
+            os.sync()
+        print(f"{'lettore':<10} {'cache':<7} {'secondi':>9} {'µs/file':>9}")
+        for fredda in ([False, True] if cache_fredda_disponibile else [False]):
+            tempi = {}
+            for nome, funzione in (("mutagen", lettura_mutagen), ("rapido", leggi_titolo_artista_id3)):
+                misura(funzione, percorsi, False) # Riscaldamento (interprete e, per la misura calda, page cache)
+                tempi[nome] = min(misura(funzione, percorsi, fredda) for _ in range(args.ripetizioni))
+                print(f"{nome:<10} {'fredda' if fredda else 'calda':<7} {tempi[nome]:>9.3f} {tempi[nome] / len(percorsi) * 1e6:>9.1f}", flush=True)
+            print(f"{'speedup':<10} {'':<7} {tempi['mutagen'] / tempi['rapido']:>8.1f}x")
+        if not cache_fredda_disponibile:
+            print("posix_fadvise non disponibile: misura a cache fredda saltata.")
+    finally:
+        if temporanea is not None:
+            shutil.rmtree(temporanea, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
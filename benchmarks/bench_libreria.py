@@ -0,0 +1,245 @@
+"""
+Benchmark end-to-end su una libreria sintetica di MP3 reali (tag ID3v2 validi), creata con
+`crea_libreria_sintetica` di tests/mp3_sintetici.py: per ogni dimensione misura le fasi
+scansione (`scansiona_libreria`), duplicati e versioni (i due pianificatori), destinazioni
+(`risolvi_destinazioni`) ed esecuzione (`esegui_piano_azioni`).
+
+Per ogni fase vengono registrati tempo reale e di CPU, picco di memoria (RSS massimo del
+processo fino a fine fase), le chiamate al filesystem contate dal profilatore (stat, scandir,
+rename: vedi `_conta`) e, su Linux, le chiamate read/write e i byte letti/scritti da
+/proc/self/io (che non vedono stat, scandir e rename). Ogni dimensione viene misurata in un
+processo separato, così il picco di memoria non dipende dalle misure precedenti; la libreria
+viene creata prima (quindi i file sono in page cache) e cancellata dopo.
+
+I risultati vengono confrontati con una baseline JSON (default: baseline_libreria.json accanto
+a questo file, non inclusa nel repository): le fasi più lente o più pesanti oltre la tolleranza
+sono segnalate come regressioni e il processo esce con codice 1. La baseline dipende dalla
+macchina (CPU, disco, filesystem): va registrata (--salva-baseline) sulla stessa macchina su
+cui si confronta.
+
+Uso:
+    python benchmarks/bench_libreria.py                      # 1000 e 10000 file, confronto con la baseline
+    python benchmarks/bench_libreria.py --file 1000 10000 100000 --salva-baseline
+    python benchmarks/bench_libreria.py --file 10000 --quota-duplicati 0.5 --profondita 1
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+
+RADICE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RADICE))
+sys.path.insert(0, str(RADICE / "tests"))
+
+from gestore_duplicati_musicali import (scansiona_libreria, pianifica_spostamento_duplicati_libreria, pianifica_spostamento_da_verificare_libreria,
+                                        risolvi_destinazioni, esegui_piano_azioni, OpzioniAnalisi, Profilatore, profilazione)
+from mp3_sintetici import crea_libreria_sintetica
+
+BASELINE_PREDEFINITA = Path(__file__).resolve().parent / "baseline_libreria.json"
+VERSIONE_BASELINE = 2
+FASI = ("scansione", "duplicati", "versioni", "destinazioni", "esecuzione")
+CONTATORI_IO = ("syscr", "syscw", "rchar", "wchar") # Da /proc/self/io: solo le chiamate read/write
+CONTATORI_FILESYSTEM = ("stat", "scandir", "rename") # Dal profilatore (`_conta`), su ogni sistema
+SOGLIA_RUMORE_SECONDI = 0.05 # Differenze di tempo sotto questa soglia non sono regressioni
+
+
+def _leggi_io() -> dict:
+    try:
+        with open("/proc/self/io") as f:
+            valori = dict(riga.split(":") for riga in f)
+    except OSError:
+        return {}
+    return {chiave: int(valori[chiave]) for chiave in CONTATORI_IO if chiave in valori}
+
+
+def _picco_rss_kib() -> int:
+    picco = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return picco // 1024 if sys.platform == "darwin" else picco # Byte su macOS, KiB altrove
+
+
+def _tempo_cpu() -> float:
+    uso = resource.getrusage(resource.RUSAGE_SELF)
+    return uso.ru_utime + uso.ru_stime
+
+
+def chiamate(valori: dict) -> int:
+    """Chiamate al filesystem e chiamate read/write di una fase: il valore confrontato con la baseline."""
+    return sum(valori.get(chiave, 0) for chiave in CONTATORI_FILESYSTEM + ("syscr", "syscw"))
+
+
+class Misuratore:
+    """Misura le fasi eseguite dentro `with misuratore.fase(nome):`, con `profilatore` attivo."""
+    def __init__(self, profilatore: Profilatore):
+        self.profilatore = profilatore
+        self.fasi = {}
+
+    def _contatori(self) -> dict:
+        return {chiave: self.profilatore.contatori.get(chiave, 0) for chiave in CONTATORI_FILESYSTEM}
+
+    def fase(self, nome: str):
+        misuratore = self
+
+        class _Fase:
+            def __enter__(self):
+                self.contatori, self.io = misuratore._contatori(), _leggi_io()
+                self.cpu, self.inizio = _tempo_cpu(), time.perf_counter()
+
+            def __exit__(self, *_):
+                secondi = time.perf_counter() - self.inizio
+                io, contatori = _leggi_io(), misuratore._contatori()
+                misuratore.fasi[nome] = {
+                    "secondi": round(secondi, 4),
+                    "cpu": round(_tempo_cpu() - self.cpu, 4),
+                    "picco_rss_kib": _picco_rss_kib(),
+                    **{chiave: contatori[chiave] - self.contatori[chiave] for chiave in contatori},
+                    **{chiave: io[chiave] - self.io[chiave] for chiave in io},
+                }
+        return _Fase()
+
+
+def misura_libreria(musica: Path, workers: int) -> dict:
+    """Esegue le fasi sulla libreria (spostandone i duplicati) e restituisce le misure."""
+    logger = lambda msg, flush=True: None
+    base = musica.parent
+    duplicati, non_conformi = base / "DOPPIONI", base / "NON CONFORMI"
+    opzioni = OpzioniAnalisi(workers=workers)
+    profilatore = Profilatore()
+    misuratore = Misuratore(profilatore)
+    with profilazione(profilatore): # Per i contatori di stat, scandir e rename
+        with misuratore.fase("scansione"):
+            libreria, _ = scansiona_libreria(musica, non_conformi, logger, opzioni=opzioni)
+        with misuratore.fase("duplicati"):
+            azioni_duplicati, mantenuti = pianifica_spostamento_duplicati_libreria(libreria, libreria.ids(), duplicati, logger)
+        with misuratore.fase("versioni"):
+            azioni_versioni = pianifica_spostamento_da_verificare_libreria(libreria, mantenuti, duplicati / "DA_VERIFICARE", logger)
+        with misuratore.fase("destinazioni"):
+            piano = risolvi_destinazioni(azioni_duplicati + azioni_versioni)
+        with misuratore.fase("esecuzione"):
+            spostati = esegui_piano_azioni(piano, logger, workers=workers)
+    return {"validi": len(libreria), "azioni": dict(Counter(azione.motivazione for azione in piano)),
+            "spostati": spostati, "fasi": misuratore.fasi}
+
+
+def misura_dimensione(numero_file: int, args) -> dict:
+    cartella = Path(tempfile.mkdtemp(prefix="tuneup_bench_libreria_", dir=args.cartella))
+    try:
+        print(f"Creo {numero_file} file sintetici in {cartella}...", flush=True)
+        libreria = crea_libreria_sintetica(cartella / "musica", numero_file, seme=args.seme, quota_duplicati=args.quota_duplicati,
+                                           quota_versioni=args.quota_versioni, profondita=args.profondita)
+        processo = subprocess.run([sys.executable, __file__, "--misura", str(cartella / "musica"), "--workers", str(args.workers)],
+                                  stdout=subprocess.PIPE, check=True, text=True)
+        misure = json.loads(processo.stdout)
+    finally:
+        shutil.rmtree(cartella, ignore_errors=True)
+    attese = {"Duplicato": libreria.duplicati, "Versione da Verificare": libreria.in_versioni}
+    attese = {motivazione: numero for motivazione, numero in attese.items() if numero}
+    if misure["azioni"] != attese:
+        raise SystemExit(f"Piano inatteso per {numero_file} file: {misure['azioni']} invece di {attese}")
+    return {"file": libreria.file, "byte": libreria.byte, "cartelle": libreria.cartelle, **misure}
+
+
+def _macchina() -> dict:
+    return {"piattaforma": platform.platform(), "python": platform.python_version(), "cpu": os.cpu_count()}
+
+
+def _variazione(attuale: float, riferimento: float) -> str:
+    return f"{(attuale - riferimento) / riferimento:+.0%}" if riferimento else "n/d"
+
+
+def confronta(risultati: dict, baseline: dict, tolleranza_tempo: float, tolleranza_conteggi: float) -> list:
+    """Stampa il confronto con la baseline e restituisce le regressioni trovate."""
+    if baseline.get("versione") != VERSIONE_BASELINE:
+        print(f"ATTENZIONE: baseline in un formato precedente (versione {baseline.get('versione')}): registrala di nuovo con --salva-baseline.")
+        return []
+    if baseline.get("macchina") != _macchina():
+        print(f"ATTENZIONE: baseline registrata su un'altra macchina o versione di Python: {baseline.get('macchina')}")
+    regressioni = []
+    print(f"\n{'file':>7} {'fase':<13} {'secondi':>17} {'picco RSS MiB':>19} {'chiamate':>21}")
+    for dimensione, misure in risultati.items():
+        riferimento = baseline.get("misure", {}).get(dimensione)
+        if riferimento is None:
+            print(f"{dimensione:>7} nessuna misura nella baseline")
+            continue
+        for fase in FASI:
+            attuale, base = misure["fasi"][fase], riferimento["fasi"][fase]
+            syscall, syscall_base = chiamate(attuale), chiamate(base)
+            segnalazioni = []
+            if attuale["secondi"] > base["secondi"] * (1 + tolleranza_tempo) and attuale["secondi"] - base["secondi"] > SOGLIA_RUMORE_SECONDI:
+                segnalazioni.append("tempo")
+            if attuale["picco_rss_kib"] > base["picco_rss_kib"] * (1 + tolleranza_conteggi):
+                segnalazioni.append("memoria")
+            if syscall_base and syscall > syscall_base * (1 + tolleranza_conteggi):
+                segnalazioni.append("chiamate")
+            print(f"{dimensione:>7} {fase:<13} {attuale['secondi']:>9.3f} {_variazione(attuale['secondi'], base['secondi']):>7}"
+                  f" {attuale['picco_rss_kib'] / 1024:>11.1f} {_variazione(attuale['picco_rss_kib'], base['picco_rss_kib']):>7}"
+                  f" {syscall:>13} {_variazione(syscall, syscall_base):>7}"
+                  + (f"  REGRESSIONE ({', '.join(segnalazioni)})" if segnalazioni else ""))
+            regressioni += [(dimensione, fase, segnalazione) for segnalazione in segnalazioni]
+    return regressioni
+
+
+def stampa(risultati: dict):
+    print(f"\n{'file':>7} {'fase':<13} {'secondi':>9} {'cpu':>9} {'file/s':>10} {'picco RSS MiB':>14}"
+          f" {'stat/scandir/rename':>20} {'read/write':>15}")
+    for dimensione, misure in risultati.items():
+        for fase in FASI:
+            valori = misure["fasi"][fase]
+            velocita = misure["file"] / valori["secondi"] if valori["secondi"] else 0
+            filesystem = "/".join(str(valori[chiave]) for chiave in CONTATORI_FILESYSTEM)
+            syscall = f"{valori['syscr']}/{valori['syscw']}" if "syscr" in valori else "n/d"
+            print(f"{dimensione:>7} {fase:<13} {valori['secondi']:>9.3f} {valori['cpu']:>9.3f} {velocita:>10.0f}"
+                  f" {valori['picco_rss_kib'] / 1024:>14.1f} {filesystem:>20} {syscall:>15}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--file", type=int, nargs="+", default=[1000, 10_000], help="Dimensioni della libreria (default: 1000 10000).")
+    parser.add_argument("--seme", type=int, default=42)
+    parser.add_argument("--quota-duplicati", type=float, default=0.15, help="Quota di brani con una copia (default: 0.15).")
+    parser.add_argument("--quota-versioni", type=float, default=0.1, help="Quota di brani con versioni alternative (default: 0.1).")
+    parser.add_argument("--profondita", type=int, default=3, help="Livelli massimi di cartelle sotto la radice (default: 3).")
+    parser.add_argument("--workers", type=int, default=1, help="Thread per la lettura dei tag e gli spostamenti (default: 1).")
+    parser.add_argument("--cartella", type=str, default=None, help="Dove creare le librerie (default: cartella temporanea di sistema).")
+    parser.add_argument("--baseline", type=str, default=str(BASELINE_PREDEFINITA), help="File JSON della baseline.")
+    parser.add_argument("--salva-baseline", action="store_true", help="Registra queste misure come baseline invece di confrontarle.")
+    parser.add_argument("--tolleranza", type=float, default=0.25, help="Peggioramento di tempo tollerato (default: 0.25, cioè +25%%).")
+    parser.add_argument("--tolleranza-conteggi", type=float, default=0.10, help="Peggioramento tollerato di memoria e chiamate (default: 0.10).")
+    parser.add_argument("--misura", type=str, default=None, help=argparse.SUPPRESS) # Processo figlio: misura una libreria già creata
+    args = parser.parse_args()
+
+    if args.misura:
+        json.dump(misura_libreria(Path(args.misura), args.workers), sys.stdout)
+        return
+
+    risultati = {str(numero_file): misura_dimensione(numero_file, args) for numero_file in args.file}
+    stampa(risultati)
+    percorso_baseline = Path(args.baseline)
+    if args.salva_baseline:
+        baseline = {"versione": VERSIONE_BASELINE, "macchina": _macchina(), "misure": {}}
+        if percorso_baseline.exists():
+            precedente = json.loads(percorso_baseline.read_text(encoding="utf-8"))
+            if precedente.get("macchina") == baseline["macchina"] and precedente.get("versione") == VERSIONE_BASELINE:
+                baseline["misure"] = precedente.get("misure", {}) # Aggiorna solo le dimensioni misurate ora
+        baseline["misure"].update(risultati)
+        percorso_baseline.write_text(json.dumps(baseline, indent=1, sort_keys=True) + "\n", encoding="utf-8")
+        print(f"\nBaseline salvata in {percorso_baseline}")
+    elif percorso_baseline.exists():
+        regressioni = confronta(risultati, json.loads(percorso_baseline.read_text(encoding="utf-8")), args.tolleranza, args.tolleranza_conteggi)
+        if regressioni:
+            print(f"\n{len(regressioni)} regressioni rispetto a {percorso_baseline}")
+            sys.exit(1)
+        print(f"\nNessuna regressione rispetto a {percorso_baseline}")
+    else:
+        print(f"\nNessuna baseline in {percorso_baseline}: registrala con --salva-baseline.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Micro-benchmark di `normalizza_testo` (NFKC, casefold e tabelle di `translate`) rispetto alla
+catena di `re.sub` e `str.replace` usata in precedenza, sul corpus di titoli reali dei test.
+Al termine elenca i gruppi (stessi artista e titolo base) del corpus che cambiano con la nuova
+normalizzazione e con `--ignora-accenti`.
+
+Uso:
+    python benchmarks/bench_normalizzazione.py [--ripetizioni 20]
+"""
+import argparse
+import sys
+import timeit
+from pathlib import Path
+
+RADICE = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(RADICE))
+sys.path.insert(0, str(RADICE / "tests"))
+
+from gestore_duplicati_musicali import normalizza_testo
+from test_pattern import varianti_corpus
+from test_normalizzazione import riferimento_normalizza_testo, raggruppamenti
+
+senza_accenti = lambda testo: normalizza_testo(testo, senza_accenti=True)
+CASI = [
+    ("normalizza_testo", normalizza_testo),
+    ("normalizza_testo senza accenti", senza_accenti),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--ripetizioni", type=int, default=20, help="Passate sull'intero corpus per misura (default: 20).")
+    args = parser.parse_args()
+
+    corpus = varianti_corpus()
+    insiemi = [
+        ("corpus completo", corpus),
+        ("solo ASCII", [t for t in corpus if t.isascii()]),
+        ("non ASCII", [t for t in corpus if not t.isascii()]),
+    ]
+    for descrizione, stringhe in insiemi:
+        print(f"\n{descrizione}: {len(stringhe)} stringhe, {args.ripetizioni} passate")
+        print(f"{'funzione':<32} {'re.sub (µs)':>12} {'tabelle (µs)':>13} {'speedup':>8}")
+        riferimento = min(timeit.repeat(lambda: [riferimento_normalizza_testo(t) for t in stringhe], number=args.ripetizioni, repeat=3))
+        riferimento /= args.ripetizioni * len(stringhe) / 1e6
+        for nome, funzione in CASI:
+            durata = min(timeit.repeat(lambda: [funzione(t) for t in stringhe], number=args.ripetizioni, repeat=3))
+            durata /= args.ripetizioni * len(stringhe) / 1e6
+            print(f"{nome:<32} {riferimento:>12.2f} {durata:>13.2f} {riferimento / durata:>7.1f}x")
+
+    prima = raggruppamenti(riferimento_normalizza_testo)
+    for descrizione, funzione in (("nuova normalizzazione", normalizza_testo), ("senza accenti", senza_accenti)):
+        dopo = raggruppamenti(funzione)
+        print(f"\nGruppi del corpus che cambiano con {descrizione}: {len(dopo - prima)} nuovi, {len(prima - dopo)} non più presenti")
+        for gruppo in sorted(dopo - prima):
+            print("  + " + " | ".join(gruppo))
+        for gruppo in sorted(prima - dopo):
+            print("  - " + " | ".join(gruppo))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,38 @@
 import os
 import shutil
 import argparse
+import bisect
+import cProfile
+import difflib
+import errno
+import functools
+import hashlib
+import json
+import mmap
+import multiprocessing
+import queue
 import re
+import sqlite3
+import stat
+import sys
+import threading
+import time
+import unicodedata
+import uuid
 from pathlib import Path
+try:
+    import resource # Solo Unix: tempo di CPU e picco di memoria nel profilo
+except ImportError:
+    resource = None
+import mutagen
 from mutagen.easyid3 import EasyID3
 from mutagen import MutagenError
-from collections import defaultdict
-from dataclasses import dataclass
-from typing import Optional, List, Dict, Tuple, Set
+from array import array
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass, fields, replace
+from typing import Callable, Optional, List, Dict, Tuple, Set, Iterable, Iterator, NamedTuple
 
 VIDEO_PATTERNS = [
     r'\(official video\)', r'\[official video\]',
@@ -41,6 +66,100 @@ VERSION_PATTERNS = [
     r'\s*\(explicit\)', r'\s*\[explicit\]',
 ]
 
+# Pattern rimossi dal nome del file prima di separare "Artista - Titolo" (applicati in sequenza)
+PATTERN_NOME_FILE_DA_RIMUOVERE = [
+    r'^\s*\d+[\s.-]*',              # Numeri traccia all'inizio (es. "01.", "02 - ")
+    r'\s*\(hd\)', r'\s*\[hd\]',
+    r'\s*\(hq\)', r'\s*\[hq\]',
+    r'\s*\(explicit\)', r'\s*\[explicit\]',
+    r'\s*\(clean\)', r'\s*\[clean\]',
+    r'\s*\(www\..*?\..*?\)',      # Indirizzi web semplici
+    # Aggiungere altri pattern specifici osservati nei propri file
+]
+
+
+class MatcherPattern:
+    """
+    Famiglia di pattern compilata una sola volta, sia singolarmente sia in un'unica
+    alternanza. L'alternanza fa da filtro rapido (una sola ricerca per i testi che non
+    contengono alcun pattern); quando trova qualcosa, si ricontrollano solo i pattern che
+    la precedono nella lista, così vince sempre il primo pattern in ordine di lista, come
+    nel classico ciclo di `re.search`.
+    I pattern non devono usare riferimenti numerici a gruppi (es. `\\1`).
+
+    `caratteri_richiesti` (facoltativo) dichiara che ogni pattern contiene obbligatoriamente
+    uno di questi caratteri letterali (es. "([" per i tag tra parentesi): i testi che non ne
+    contengono nessuno vengono scartati con un semplice controllo su stringa, senza regex.
+    """
+    def __init__(self, patterns: List[str], flags: int = 0, caratteri_richiesti: str = ""):
+        self.patterns = tuple(patterns)
+        self.compilati = [re.compile(p, flags) for p in self.patterns]
+        self._combinato = re.compile("|".join(f"(?P<p{i}>{p})" for i, p in enumerate(self.patterns)), flags)
+        for pattern in self.patterns:
+            if caratteri_richiesti and not any(re.escape(c) in pattern for c in caratteri_richiesti):
+                raise ValueError(f"Il pattern {pattern!r} non contiene nessuno dei caratteri richiesti {caratteri_richiesti!r}")
+        self.caratteri_richiesti = caratteri_richiesti
+
+    def _scartabile(self, testo: str) -> bool:
+        return bool(self.caratteri_richiesti) and not any(c in testo for c in self.caratteri_richiesti)
+
+    def trova(self, testo: str) -> bool:
+        """True se almeno un pattern compare nel testo."""
+        if self._scartabile(testo):
+            _conta("regex evitate")
+            return False
+        _conta("regex eseguite")
+        return self._combinato.search(testo) is not None
+
+    def cerca(self, testo: str) -> Optional[Tuple[int, int, int]]:
+        """
+        Restituisce (indice_pattern, inizio, fine) della prima occorrenza del primo pattern
+        della lista che compare nel testo, oppure None.
+        """
+        if self._scartabile(testo):
+            _conta("regex evitate")
+            return None
+        _conta("regex eseguite")
+        match = self._combinato.search(testo)
+        if match is None:
+            return None
+        indice = int(match.lastgroup[1:])
+        # Un pattern precedente potrebbe comparire più avanti nel testo: ha comunque la precedenza
+        for indice_precedente in range(indice):
+            match_precedente = self.compilati[indice_precedente].search(testo)
+            if match_precedente:
+                return indice_precedente, match_precedente.start(), match_precedente.end()
+        return indice, match.start(), match.end()
+
+
+# Tutti i tag di versione e video sono tra parentesi tonde o quadre
+_MATCHER_VERSIONI = MatcherPattern(VERSION_PATTERNS, re.IGNORECASE, caratteri_richiesti="([")
+_MATCHER_VIDEO = MatcherPattern(VIDEO_PATTERNS, caratteri_richiesti="([")
+_MATCHER_NOME_FILE = MatcherPattern(PATTERN_NOME_FILE_DA_RIMUOVERE, re.IGNORECASE)
+_RE_ARTISTA_TITOLO = re.compile(r'(.+?) - (.+)')
+_RE_TRATTINO_FINALE = re.compile(r'\s*-\s*$')
+_VERSIONE_PATTERN = 0 # Incrementata da ricompila_pattern: fa parte della chiave di MEMO_NORMALIZZAZIONE
+
+
+def _impronta_pattern() -> str:
+    """Impronta del contenuto dei pattern: la cache su disco la confronta con quella con cui è stata scritta."""
+    testo = json.dumps([VERSION_PATTERNS, VIDEO_PATTERNS, PATTERN_NOME_FILE_DA_RIMUOVERE])
+    return hashlib.sha1(testo.encode("utf-8")).hexdigest()
+
+
+_IMPRONTA_PATTERN = _impronta_pattern()
+
+
+def ricompila_pattern():
+    """Ricompila i matcher dopo una modifica a VERSION_PATTERNS, VIDEO_PATTERNS o PATTERN_NOME_FILE_DA_RIMUOVERE."""
+    global _MATCHER_VERSIONI, _MATCHER_VIDEO, _MATCHER_NOME_FILE, _VERSIONE_PATTERN, _IMPRONTA_PATTERN
+    _MATCHER_VERSIONI = MatcherPattern(VERSION_PATTERNS, re.IGNORECASE, caratteri_richiesti="([")
+    _MATCHER_VIDEO = MatcherPattern(VIDEO_PATTERNS, caratteri_richiesti="([")
+    _MATCHER_NOME_FILE = MatcherPattern(PATTERN_NOME_FILE_DA_RIMUOVERE, re.IGNORECASE)
+    _VERSIONE_PATTERN += 1
+    _IMPRONTA_PATTERN = _impronta_pattern()
+
+
 @dataclass(frozen=True)
 class MusicFile:
     """Rappresenta un singolo file musicale e i suoi metadati."""
@@ -51,6 +170,13 @@ class MusicFile:
     tag_versione: Optional[str]
     dimensione: int
     sorgente_info: str
+    impronta_audio: Optional[str] = None # Hash dei soli frame audio (vedi `calcola_impronta_audio_mp3`)
+    # Caratteristiche del flusso audio (vedi `leggi_info_audio_mp3`); None se non disponibili
+    bitrate_kbps: Optional[int] = None # Medio, per i file VBR
+    frequenza: Optional[int] = None # Hz
+    vbr: Optional[bool] = None
+    durata: Optional[float] = None # Secondi
+    codec: Optional[str] = None # "mp3", "flac", "aac", ... (vedi `LETTORI_FORMATO`)
 
 
 @dataclass(frozen=True)
@@ -58,392 +184,3700 @@ class SpostaFileAzione:
     """Rappresenta una singola operazione di spostamento file."""
     sorgente: Path
     destinazione: Path
-    motivazione: str # Es. "Duplicato", "Versione da Verificare"
+    motivazione: str # Es. "Duplicato", "Versione da Verificare", "Duplicato Esatto", "Duplicato Audio", "Simile da Verificare", "Non Conforme"
+
+
+# Qualità dei codec per confrontare copie in formati diversi: prima i lossless, poi i codec
+# lossy più efficienti di MP3 a parità di bitrate. I codec sconosciuti valgono 0.
+QUALITA_CODEC = {
+    "flac": 3, "alac": 3, "wmalossless": 3,
+    "opus": 2, "vorbis": 2, "aac": 2,
+    "mp3": 1, "wma": 1,
+}
+
+# Criteri per scegliere il file da mantenere in un gruppo di duplicati: valori più alti sono
+# preferiti; un "-" davanti al nome inverte il criterio (es. "-durata" preferisce il file più corto).
+CRITERI_CONSERVAZIONE = {
+    "dimensione": lambda mf: mf.dimensione,
+    "bitrate": lambda mf: mf.bitrate_kbps or 0,
+    "frequenza": lambda mf: mf.frequenza or 0,
+    "vbr": lambda mf: bool(mf.vbr),
+    "durata": lambda mf: mf.durata or 0.0,
+    "id3": lambda mf: mf.sorgente_info == "ID3",
+    "codec": lambda mf: QUALITA_CODEC.get(mf.codec, 0),
+}
+# Politiche predefinite, utilizzabili per nome al posto dell'elenco dei criteri
+POLITICHE_CONSERVAZIONE = {
+    "dimensione": ("dimensione",), # Comportamento storico: il file più grande (copertine comprese)
+    "qualita": ("codec", "bitrate", "frequenza", "dimensione"), # Il flusso audio migliore, poi il più grande
+}
+
+
+def criteri_da_testo(testo: str) -> Tuple[str, ...]:
+    """
+    Converte il nome di una politica ("qualita") o un elenco di criteri separati da virgole
+    ("bitrate,-durata,dimensione") nella tupla di criteri. Solleva ValueError se un criterio non esiste.
+    """
+    testo = testo.strip().lower()
+    if testo in POLITICHE_CONSERVAZIONE:
+        return POLITICHE_CONSERVAZIONE[testo]
+    criteri = tuple(c.strip() for c in testo.split(",") if c.strip())
+    sconosciuti = [c for c in criteri if c.lstrip("-") not in CRITERI_CONSERVAZIONE]
+    if not criteri or sconosciuti:
+        raise ValueError(f"Criteri non validi: {', '.join(sconosciuti) or testo!r}. "
+                         f"Disponibili: {', '.join(CRITERI_CONSERVAZIONE)} o le politiche {', '.join(POLITICHE_CONSERVAZIONE)}.")
+    return criteri
+
+
+def chiave_conservazione(criteri: Iterable[str]):
+    """Funzione chiave per `max()`: il file con la chiave più alta è quello da mantenere."""
+    funzioni = []
+    for criterio in criteri:
+        funzione = CRITERI_CONSERVAZIONE[criterio.lstrip("-")]
+        if criterio.startswith("-"):
+            funzione = (lambda f: lambda mf: -f(mf))(funzione)
+        funzioni.append(funzione)
+    return lambda mf: tuple(funzione(mf) for funzione in funzioni)
+
+
+SOGLIA_SOMIGLIANZA_PREDEFINITA = 0.9 # Per il raggruppamento dei brani simili
+
+
+@dataclass(frozen=True)
+class OpzioniAnalisi:
+    """Opzioni facoltative che regolano la fase di scansione e analisi."""
+    usa_cache: bool = False
+    percorso_cache: Optional[Path] = None # Se None, la cache viene creata nella cartella musicale
+    workers: int = 1 # Thread per l'estrazione dei tag (1 = seriale)
+    processi: int = 0 # Processi per l'analisi (0/1 = disattivato); ha la precedenza su `workers`
+    duplicati_esatti: bool = False # Cerca anche copie identiche byte per byte (a prescindere dai tag)
+    impronta_audio: bool = False # Calcola l'impronta dei frame audio e cerca copie dello stesso audio con tag diversi
+    ignora_accenti: bool = False # Raggruppa duplicati e versioni senza distinguere gli accenti ("Beyoncé" / "Beyonce")
+    raggruppa_simili: bool = False # Raccoglie in DA_VERIFICARE anche i brani con artista/titolo simili (refusi, "the", "feat.")
+    soglia_somiglianza: float = SOGLIA_SOMIGLIANZA_PREDEFINITA # Tra 0 e 1: più è alta, più i testi devono coincidere
+    criteri_conservazione: Tuple[str, ...] = POLITICHE_CONSERVAZIONE["dimensione"] # Vedi CRITERI_CONSERVAZIONE
+    verifica_copie: bool = False # Negli spostamenti tra dischi diversi confronta l'hash di copia e originale prima di eliminarlo
+
+
+NOME_FILE_CACHE = ".tuneup_cache.sqlite"
+VERSIONE_SCHEMA_CACHE = 5
+
+
+def _default_logger(messaggio, flush=True):
+    print(messaggio, flush=flush)
+
+
+class CodaLog:
+    """
+    Raccoglie i messaggi di log prodotti da qualsiasi thread, per un'interfaccia che li
+    visualizza dal proprio thread (es. il main loop di Tk) a blocchi e a intervalli regolari.
+    - `scrivi` è compatibile con i logger delle funzioni di questo modulo ed è thread-safe;
+    - `preleva` svuota la coda: salva tutti i messaggi nel file di log (se indicato) e
+      restituisce solo gli ultimi `massimo_righe` da mostrare;
+    - le ultime `massimo_righe` restano disponibili in `righe` (buffer circolare), così la
+      memoria occupata non cresce con il numero di file analizzati.
+    """
+    def __init__(self, massimo_righe: int = 5000, percorso_file: Optional[Path] = None):
+        self.massimo_righe = massimo_righe
+        self.percorso_file = percorso_file
+        self.righe: deque = deque(maxlen=massimo_righe)
+        self.totale_righe = 0
+        self._coda: queue.SimpleQueue = queue.SimpleQueue()
+        self._file = None
+
+    def scrivi(self, messaggio, flush=True): # flush è per compatibilità con _default_logger
+        self._coda.put(str(messaggio))
+
+    def preleva(self) -> List[str]:
+        """Restituisce le righe arrivate dall'ultima chiamata (al più le ultime `massimo_righe`)."""
+        messaggi = []
+        while True:
+            try:
+                messaggi.append(self._coda.get_nowait())
+            except queue.Empty:
+                break
+        if not messaggi:
+            return []
+        # Un messaggio può contenere più righe
+        righe = "\n".join(messaggi).split("\n")
+        self.totale_righe += len(righe)
+        self._salva_su_file(righe)
+        self.righe.extend(righe[-self.massimo_righe:])
+        return righe[-self.massimo_righe:]
+
+    def _salva_su_file(self, righe: List[str]):
+        if self.percorso_file is None:
+            return
+        try:
+            if self._file is None:
+                self._file = open(self.percorso_file, "a", encoding="utf-8")
+            self._file.write("\n".join(righe) + "\n")
+            self._file.flush()
+        except OSError:
+            self.percorso_file = None # Disco pieno o percorso non scrivibile: si continua solo a video
+
+    def pulisci(self):
+        """Svuota le righe visualizzate (il file di log resta completo)."""
+        self.righe.clear()
+
+    def chiudi(self):
+        self.preleva()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+# --- Avanzamento: aggiornamenti a frequenza limitata, velocità e tempo stimato ---
+
+FASI_AVANZAMENTO = ("visita", "analisi", "hash", "pianificazione", "spostamento")
+_UNITA_FASI = {"visita": "file", "analisi": "file", "hash": "file", "pianificazione": "file", "spostamento": "file"}
+
+
+def _formatta_durata(secondi: float) -> str:
+    secondi = int(round(secondi))
+    ore, resto = divmod(secondi, 3600)
+    return f"{ore}:{resto // 60:02d}:{resto % 60:02d}" if ore else f"{resto // 60}:{resto % 60:02d}"
+
+
+@dataclass(frozen=True)
+class StatoAvanzamento:
+    """Istantanea dell'avanzamento di una fase, inviata al callback di `MonitorAvanzamento`."""
+    fase: str
+    corrente: int
+    totale: Optional[int] # None se non noto (es. durante la visita delle cartelle)
+    totale_approssimato: bool # True finché il totale può ancora crescere
+    byte: int
+    trascorsi: float # Secondi dall'inizio della fase
+    elementi_al_secondo: float # Media mobile esponenziale
+    byte_al_secondo: float
+    secondi_rimanenti: Optional[float]
+    completata: bool = False
+
+    @property
+    def percentuale(self) -> Optional[float]:
+        if not self.totale:
+            return None
+        return min(100.0, self.corrente * 100.0 / self.totale)
+
+    def descrizione(self) -> str:
+        """Riga di testo per CLI e GUI, es. "analisi: 1200/~5000 (24%) - 850 file/s - 3.1 MB/s - ETA 0:04"."""
+        testo = f"{self.fase}: {self.corrente}"
+        if self.totale:
+            testo += f"/{'~' if self.totale_approssimato else ''}{self.totale} ({self.percentuale:.0f}%)"
+        testo += f" - {self.elementi_al_secondo:.0f} {_UNITA_FASI.get(self.fase, 'elementi')}/s"
+        if self.byte:
+            testo += f" - {self.byte_al_secondo / 1e6:.1f} MB/s"
+        if self.completata:
+            testo += f" - completata in {_formatta_durata(self.trascorsi)}"
+        elif self.secondi_rimanenti is not None:
+            testo += f" - ETA {_formatta_durata(self.secondi_rimanenti)}"
+        return testo
+
+
+class _StatisticheFase:
+    __slots__ = ('corrente', 'totale', 'approssimato', 'byte', 'inizio', 'fine',
+                 'ultimo_invio', 'corrente_inviato', 'byte_inviati', 'velocita', 'velocita_byte')
+
+    def __init__(self, inizio: float, totale: Optional[int], approssimato: bool):
+        self.corrente = 0
+        self.totale = totale
+        self.approssimato = approssimato
+        self.byte = 0
+        self.inizio = inizio
+        self.fine: Optional[float] = None
+        self.ultimo_invio = inizio
+        self.corrente_inviato = 0
+        self.byte_inviati = 0
+        self.velocita: Optional[float] = None
+        self.velocita_byte: Optional[float] = None
+
+
+class MonitorAvanzamento:
+    """
+    Raccoglie l'avanzamento delle fasi del lavoro (visita, analisi, hash, pianificazione,
+    spostamento) e lo inoltra a `callback` come `StatoAvanzamento`, al più una volta ogni
+    `intervallo` secondi per fase (più un ultimo invio a fase conclusa): chi chiama `avanza`
+    per ogni file paga solo un contatore, e l'interfaccia viene aggiornata a frequenza fissa.
+    La velocità è una media mobile esponenziale (peso `smorzamento` all'ultimo intervallo),
+    da cui si stima il tempo rimanente. I metodi sono thread-safe (la visita avanza in un
+    thread separato); il callback viene chiamato fuori dal lock, dal thread che ha avanzato.
+    """
+    def __init__(self, callback=None, intervallo: float = 0.25, smorzamento: float = 0.3, orologio=time.monotonic):
+        self.callback = callback
+        self.intervallo = intervallo
+        self.smorzamento = smorzamento
+        self._orologio = orologio
+        self._fasi: Dict[str, _StatisticheFase] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def da_callback(cls, progress_callback) -> "MonitorAvanzamento":
+        """
+        Adatta il `progress_callback` delle funzioni pubbliche: un MonitorAvanzamento viene usato
+        così com'è, una funzione (corrente, totale) riceve l'avanzamento della fase di analisi.
+        """
+        if isinstance(progress_callback, cls):
+            return progress_callback
+        if progress_callback is None:
+            return cls()
+
+        def _compatibile(stato: StatoAvanzamento):
+            if stato.fase == "analisi":
+                progress_callback(stato.corrente, stato.totale or 0)
+        return cls(_compatibile)
+
+    def inizia_fase(self, fase: str, totale: Optional[int] = None, approssimato: bool = False):
+        with self._lock:
+            self._fasi[fase] = _StatisticheFase(self._orologio(), totale, approssimato)
+        if _profilatore is not None:
+            _profilatore.inizio_fase(fase)
+
+    def avanza(self, fase: str, quanti: int = 1, byte: int = 0, totale: Optional[int] = None, approssimato: Optional[bool] = None):
+        """Aggiunge `quanti` elementi (e `byte`) alla fase, aggiornandone eventualmente il totale."""
+        with self._lock:
+            statistiche = self._fasi.get(fase)
+            if statistiche is None:
+                statistiche = self._fasi[fase] = _StatisticheFase(self._orologio(), totale, bool(approssimato))
+            statistiche.corrente += quanti
+            statistiche.byte += byte
+            if totale is not None:
+                statistiche.totale = totale
+            if approssimato is not None:
+                statistiche.approssimato = approssimato
+            if self.callback is None:
+                return
+            adesso = self._orologio()
+            if adesso - statistiche.ultimo_invio < self.intervallo:
+                return
+            stato = self._istantanea(fase, statistiche, adesso)
+        self.callback(stato)
+
+    def termina_fase(self, fase: str, totale: Optional[int] = None):
+        """Chiude la fase e invia lo stato finale (il totale diventa esatto)."""
+        with self._lock:
+            statistiche = self._fasi.get(fase)
+            if statistiche is None or statistiche.fine is not None:
+                return
+            statistiche.fine = self._orologio()
+            statistiche.totale = totale if totale is not None else (statistiche.totale or statistiche.corrente)
+            statistiche.approssimato = False
+            stato = self._istantanea(fase, statistiche, statistiche.fine)
+        if _profilatore is not None:
+            _profilatore.fine_fase(fase)
+        if self.callback is not None:
+            self.callback(stato)
+
+    def _istantanea(self, fase: str, statistiche: _StatisticheFase, adesso: float) -> StatoAvanzamento:
+        completata = statistiche.fine is not None
+        trascorsi = adesso - statistiche.inizio
+        if completata:
+            # A fase conclusa conta la media sull'intera fase, non l'ultimo intervallo
+            velocita = statistiche.corrente / trascorsi if trascorsi > 0 else 0.0
+            velocita_byte = statistiche.byte / trascorsi if trascorsi > 0 else 0.0
+        else:
+            durata_intervallo = adesso - statistiche.ultimo_invio
+            istantanea = (statistiche.corrente - statistiche.corrente_inviato) / durata_intervallo if durata_intervallo > 0 else 0.0
+            istantanea_byte = (statistiche.byte - statistiche.byte_inviati) / durata_intervallo if durata_intervallo > 0 else 0.0
+            if statistiche.velocita is None:
+                statistiche.velocita, statistiche.velocita_byte = istantanea, istantanea_byte
+            else:
+                a = self.smorzamento
+                statistiche.velocita = a * istantanea + (1 - a) * statistiche.velocita
+                statistiche.velocita_byte = a * istantanea_byte + (1 - a) * statistiche.velocita_byte
+            velocita, velocita_byte = statistiche.velocita, statistiche.velocita_byte
+        statistiche.ultimo_invio = adesso
+        statistiche.corrente_inviato = statistiche.corrente
+        statistiche.byte_inviati = statistiche.byte
+
+        secondi_rimanenti = None
+        if completata:
+            secondi_rimanenti = 0.0
+        elif statistiche.totale and velocita > 0:
+            secondi_rimanenti = max(0, statistiche.totale - statistiche.corrente) / velocita
+        return StatoAvanzamento(fase, statistiche.corrente, statistiche.totale, statistiche.approssimato, statistiche.byte,
+                                trascorsi, velocita, velocita_byte, secondi_rimanenti, completata)
+
+    def riepilogo(self) -> List[Tuple[str, int, int, float]]:
+        """(fase, elementi, byte, secondi) per ogni fase iniziata, nell'ordine di FASI_AVANZAMENTO."""
+        adesso = self._orologio()
+        with self._lock:
+            ordine = sorted(self._fasi, key=lambda f: FASI_AVANZAMENTO.index(f) if f in FASI_AVANZAMENTO else len(FASI_AVANZAMENTO))
+            return [(fase, self._fasi[fase].corrente, self._fasi[fase].byte, (self._fasi[fase].fine or adesso) - self._fasi[fase].inizio)
+                    for fase in ordine]
+
+    def righe_riepilogo(self) -> List[str]:
+        righe = []
+        for fase, elementi, byte, secondi in self.riepilogo():
+            velocita = f"{elementi / secondi:.0f} {_UNITA_FASI.get(fase, 'elementi')}/s" if secondi > 0 else "-"
+            testo = f"  {fase:<15} {elementi:>9} {_UNITA_FASI.get(fase, 'elementi')} in {_formatta_durata(secondi)} ({velocita}"
+            if byte:
+                testo += f", {byte / 1e6:.1f} MB, {byte / 1e6 / secondi if secondi > 0 else 0:.1f} MB/s"
+            righe.append(testo + ")")
+        return righe
+
+
+# --- Profilazione: tempi delle funzioni più chiamate e contatori ---
+
+VERSIONE_PROFILO = 1
+_profilatore: Optional["Profilatore"] = None # Attivo solo durante una esecuzione profilata
+
+
+def _statistiche_processo() -> Dict[str, float]:
+    """CPU, picco di memoria e I/O del processo, dove il sistema li espone."""
+    statistiche: Dict[str, float] = {}
+    if resource is not None:
+        uso = resource.getrusage(resource.RUSAGE_SELF)
+        statistiche["cpu"] = uso.ru_utime + uso.ru_stime
+        statistiche["picco_rss_kib"] = uso.ru_maxrss // 1024 if sys.platform == "darwin" else uso.ru_maxrss
+    try:
+        with open("/proc/self/io") as f:
+            for riga in f:
+                chiave, valore = riga.split(":")
+                if chiave in ("rchar", "wchar", "syscr", "syscw", "read_bytes", "write_bytes"):
+                    statistiche[chiave] = int(valore)
+    except OSError:
+        pass
+    return statistiche
+
+
+class Profilatore:
+    """
+    Raccoglie, durante un'esecuzione, chiamate e tempo delle funzioni più usate (decorate con
+    `_profilata`) e contatori di eventi (`_conta`: stat, letture dei tag, cache, ...). Finché
+    nessun profilatore è attivo (vedi `profilazione`) il costo è un controllo su una variabile
+    globale per chiamata. Con `fase_cprofile` la fase indicata (vedi FASI_AVANZAMENTO) viene
+    anche profilata con cProfile e salvata in `file_cprofile` (formato pstats); cProfile vede
+    solo il thread che esegue la fase, non i thread o i processi di lavoro.
+    Thread-safe. I processi di lavoro (`OpzioniAnalisi.processi`) non vengono conteggiati.
+    """
+    def __init__(self, fase_cprofile: Optional[str] = None, file_cprofile: Optional[Path] = None):
+        self.fase_cprofile = fase_cprofile
+        self.file_cprofile = Path(file_cprofile) if file_cprofile else (Path(f"tuneup_{fase_cprofile}.pstats") if fase_cprofile else None)
+        self.funzioni: Dict[str, List[float]] = {} # nome -> [chiamate, secondi]
+        self.contatori: Dict[str, int] = defaultdict(int)
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._inizio = time.perf_counter()
+        self._processo_iniziale = _statistiche_processo()
+        self._lock = threading.Lock()
+
+    def registra(self, nome: str, secondi: float):
+        with self._lock:
+            voce = self.funzioni.get(nome)
+            if voce is None:
+                voce = self.funzioni[nome] = [0, 0.0]
+            voce[0] += 1
+            voce[1] += secondi
+
+    def conta(self, nome: str, quanti: int = 1):
+        with self._lock:
+            self.contatori[nome] += quanti
+
+    def inizio_fase(self, fase: str):
+        if fase == self.fase_cprofile and self._cprofile is None:
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+
+    def fine_fase(self, fase: str):
+        if fase == self.fase_cprofile and self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(str(self.file_cprofile))
+
+    def report(self, monitor: Optional["MonitorAvanzamento"] = None) -> dict:
+        """Report leggibile da programma (JSON): fasi del monitor, funzioni, contatori e processo."""
+        processo = {"secondi": round(time.perf_counter() - self._inizio, 4)}
+        finale = _statistiche_processo()
+        for chiave, valore in finale.items():
+            # Il picco di memoria è assoluto, gli altri valori sono differenze dall'inizio
+            processo[chiave] = valore if chiave == "picco_rss_kib" else round(valore - self._processo_iniziale.get(chiave, 0), 4)
+        with self._lock:
+            funzioni = {nome: {"chiamate": chiamate, "secondi": round(secondi, 4)}
+                        for nome, (chiamate, secondi) in sorted(self.funzioni.items(), key=lambda voce: -voce[1][1])}
+            contatori = dict(sorted(self.contatori.items()))
+        fasi = []
+        for fase, elementi, byte, secondi in (monitor.riepilogo() if monitor is not None else []):
+            fasi.append({"fase": fase, "elementi": elementi, "byte": byte, "secondi": round(secondi, 4),
+                         "elementi_al_secondo": round(elementi / secondi, 1) if secondi > 0 else None})
+        report = {"versione": VERSIONE_PROFILO, "fasi": fasi, "funzioni": funzioni, "contatori": contatori, "processo": processo}
+        if self.fase_cprofile:
+            report["cprofile"] = {"fase": self.fase_cprofile, "file": str(self.file_cprofile) if self._cprofile is not None else None}
+        return report
+
+    @staticmethod
+    def righe_report(report: dict) -> List[str]:
+        """Il report in forma di testo, per il log."""
+        righe = ["Funzioni (chiamate, tempo totale, tempo per chiamata):"]
+        for nome, voce in report["funzioni"].items():
+            per_chiamata = voce["secondi"] / voce["chiamate"] * 1e6 if voce["chiamate"] else 0
+            righe.append(f"  {nome:<32} {voce['chiamate']:>9} {voce['secondi']:>9.3f} s {per_chiamata:>9.1f} µs")
+        righe.append("Contatori:")
+        righe += [f"  {nome:<32} {valore:>9}" for nome, valore in report["contatori"].items()]
+        processo = report["processo"]
+        testo = f"Processo: {processo['secondi']:.2f} s"
+        if "cpu" in processo:
+            testo += f", CPU {processo['cpu']:.2f} s, picco di memoria {processo['picco_rss_kib'] / 1024:.0f} MiB"
+        if "rchar" in processo:
+            testo += f", letti {processo['rchar'] / 1e6:.1f} MB in {processo['syscr']} read, scritti {processo['wchar'] / 1e6:.1f} MB in {processo['syscw']} write"
+        righe.append(testo)
+        if report.get("cprofile", {}).get("file"):
+            righe.append(f"Profilo cProfile della fase '{report['cprofile']['fase']}': {report['cprofile']['file']}")
+        return righe
+
+
+@contextmanager
+def profilazione(profilatore: Optional[Profilatore]):
+    """Attiva `profilatore` per la durata del blocco `with` (con None non cambia nulla)."""
+    global _profilatore
+    precedente = _profilatore
+    _profilatore = profilatore or precedente
+    try:
+        yield profilatore
+    finally:
+        _profilatore = precedente
+
+
+def _profilata(nome: str):
+    """Decoratore: con un profilatore attivo registra chiamate e tempo della funzione sotto `nome`."""
+    def decoratore(funzione):
+        @functools.wraps(funzione)
+        def avvolta(*args, **kwargs):
+            profilatore = _profilatore
+            if profilatore is None:
+                return funzione(*args, **kwargs)
+            inizio = time.perf_counter()
+            try:
+                return funzione(*args, **kwargs)
+            finally:
+                profilatore.registra(nome, time.perf_counter() - inizio)
+        return avvolta
+    return decoratore
+
+
+def _conta(nome: str, quanti: int = 1):
+    profilatore = _profilatore
+    if profilatore is not None:
+        profilatore.conta(nome, quanti)
+
+
+# Per thread (e per processo): segnala se la lettura del file corrente ha incontrato errori di I/O
+_STATO_LETTURA = threading.local()
+
+
+def _segnala_errore_io(errore: Optional[BaseException] = None):
+    """
+    Segna la lettura in corso come non memorizzabile. Con `errore` la segna solo se l'eccezione
+    deriva da un OSError (mutagen incapsula gli errori di I/O in MutagenError).
+    """
+    if errore is not None:
+        while errore is not None and not isinstance(errore, OSError):
+            errore = errore.__cause__ or errore.__context__
+        if errore is None:
+            return # Tag assenti o file danneggiato: esito deterministico
+    _STATO_LETTURA.errore_io = True
+
+
+def _lettura_senza_errori_io() -> bool:
+    return not getattr(_STATO_LETTURA, "errore_io", False)
+
+
+class CacheScansione:
+    """
+    Cache persistente (SQLite) dei risultati di `_estrai_info_file`.
+    Ogni voce è indicizzata dal percorso del file e resta valida finché
+    dimensione e mtime (in nanosecondi) non cambiano: per i file invariati
+    la riscansione costa una sola `stat()`, senza rileggere i tag.
+    """
+    DIMENSIONE_BLOCCO_SCRITTURA = 1000
+
+    def __init__(self, percorso_db: Path, logger=_default_logger, richiede_impronta: bool = False):
+        self.percorso_db = percorso_db
+        self.logger = logger
+        # Se True, le voci memorizzate senza impronta audio vanno ricalcolate
+        self.richiede_impronta = richiede_impronta
+        self.hit = 0
+        self.miss = 0
+        self._scritture_in_sospeso = []
+        self._visti_in_sospeso = []
+        self._conn = sqlite3.connect(str(percorso_db))
+        self._prepara_schema()
+
+    def _prepara_schema(self):
+        versione = self._conn.execute("PRAGMA user_version").fetchone()[0]
+        if versione != VERSIONE_SCHEMA_CACHE:
+            # Schema obsoleto o database nuovo: si riparte da zero
+            self._conn.execute("DROP TABLE IF EXISTS file_musicali")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS file_musicali (
+                percorso TEXT PRIMARY KEY,
+                dimensione INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                valido INTEGER NOT NULL,
+                artista_norm TEXT,
+                titolo_norm TEXT,
+                titolo_base_norm TEXT,
+                tag_versione TEXT,
+                sorgente_info TEXT,
+                impronta_audio TEXT, -- NULL = non calcolata, '' = calcolata ma non disponibile
+                bitrate_kbps INTEGER,
+                frequenza INTEGER,
+                vbr INTEGER,
+                durata REAL,
+                codec TEXT
+            )
+        """)
+        self._conn.execute(f"PRAGMA user_version = {VERSIONE_SCHEMA_CACHE}")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS metadati (chiave TEXT PRIMARY KEY, valore TEXT)")
+        riga = self._conn.execute("SELECT valore FROM metadati WHERE chiave = 'pattern'").fetchone()
+        if riga is None or riga[0] != _IMPRONTA_PATTERN:
+            # Pattern di normalizzazione diversi da quelli con cui la cache è stata scritta
+            self._conn.execute("DELETE FROM file_musicali")
+            self._conn.execute("INSERT OR REPLACE INTO metadati VALUES ('pattern', ?)", (_IMPRONTA_PATTERN,))
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS visti (percorso TEXT PRIMARY KEY)")
+        self._conn.commit()
+
+    def cerca(self, file_path: Path, stat_file: os.stat_result) -> Tuple[bool, Optional[MusicFile]]:
+        """
+        Cerca il file nella cache. Restituisce (trovato, music_file): se `trovato` è False
+        il file è nuovo o modificato e va analizzato; altrimenti `music_file` è il risultato
+        memorizzato (None se il file era stato scartato per info insufficienti).
+        """
+        percorso = str(file_path)
+        self._segna_visto(percorso)
+        riga = self._conn.execute(
+            "SELECT dimensione, mtime_ns, valido, artista_norm, titolo_norm, titolo_base_norm, tag_versione, sorgente_info, impronta_audio, "
+            "bitrate_kbps, frequenza, vbr, durata, codec "
+            "FROM file_musicali WHERE percorso = ?", (percorso,)
+        ).fetchone()
+        if (riga is None or riga[0] != stat_file.st_size or riga[1] != stat_file.st_mtime_ns
+                or (self.richiede_impronta and riga[2] and riga[8] is None)):
+            self.miss += 1
+            _conta("cache mancanti")
+            return False, None
+
+        self.hit += 1
+        _conta("cache trovati")
+        if not riga[2]:
+            return True, None
+        return True, MusicFile(
+            path=file_path,
+            artista_norm=riga[3],
+            titolo_norm=riga[4],
+            titolo_base_norm=riga[5],
+            tag_versione=riga[6],
+            dimensione=riga[0],
+            sorgente_info=riga[7],
+            impronta_audio=riga[8] or None,
+            bitrate_kbps=riga[9],
+            frequenza=riga[10],
+            vbr=None if riga[11] is None else bool(riga[11]),
+            durata=riga[12],
+            codec=riga[13]
+        )
+
+    def registra(self, file_path: Path, stat_file: os.stat_result, info_file: Optional[MusicFile]):
+        """
+        Memorizza il risultato dell'analisi di un file (anche se scartato). Il chiamante non deve
+        registrare i risultati ottenuti dopo un errore di I/O (vedi `_lettura_senza_errori_io`).
+        """
+        if info_file is None:
+            valori = (str(file_path), stat_file.st_size, stat_file.st_mtime_ns, 0) + (None,) * 11
+        else:
+            impronta = info_file.impronta_audio
+            if impronta is None and self.richiede_impronta:
+                impronta = '' # Calcolata, ma il file non contiene frame MPEG riconoscibili
+            valori = (str(file_path), stat_file.st_size, stat_file.st_mtime_ns, 1,
+                      info_file.artista_norm, info_file.titolo_norm, info_file.titolo_base_norm,
+                      info_file.tag_versione, info_file.sorgente_info, impronta,
+                      info_file.bitrate_kbps, info_file.frequenza, info_file.vbr, info_file.durata, info_file.codec)
+        self._scritture_in_sospeso.append(valori)
+        if len(self._scritture_in_sospeso) >= self.DIMENSIONE_BLOCCO_SCRITTURA:
+            self._scarica_scritture()
+
+    def _segna_visto(self, percorso: str):
+        self._visti_in_sospeso.append((percorso,))
+        if len(self._visti_in_sospeso) >= self.DIMENSIONE_BLOCCO_SCRITTURA:
+            self._scarica_visti()
+
+    def _scarica_scritture(self):
+        if self._scritture_in_sospeso:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO file_musicali VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    self._scritture_in_sospeso
+                )
+            self._scritture_in_sospeso = []
+
+    def _scarica_visti(self):
+        if self._visti_in_sospeso:
+            self._conn.executemany("INSERT OR IGNORE INTO temp.visti VALUES (?)", self._visti_in_sospeso)
+            self._visti_in_sospeso = []
+
+    def chiudi(self, rimuovi_obsoleti: bool = True):
+        """
+        Salva le scritture pendenti e chiude il database. Se `rimuovi_obsoleti` è True
+        elimina le voci dei file non incontrati durante la scansione (cancellati o spostati).
+        """
+        self._scarica_scritture()
+        self._scarica_visti()
+        if rimuovi_obsoleti:
+            with self._conn:
+                self._conn.execute("DELETE FROM file_musicali WHERE percorso NOT IN (SELECT percorso FROM temp.visti)")
+        self._conn.close()
+
+
+def _apri_cache(cartella_path: Path, opzioni: OpzioniAnalisi, logger=_default_logger) -> Optional[CacheScansione]:
+    """Apre la cache di scansione richiesta dalle opzioni, o restituisce None."""
+    if not opzioni.usa_cache:
+        return None
+    percorso_db = opzioni.percorso_cache or (cartella_path / NOME_FILE_CACHE)
+    try:
+        cache = CacheScansione(percorso_db, logger, richiede_impronta=opzioni.impronta_audio)
+    except sqlite3.Error as e:
+        logger(f"ATTENZIONE: Impossibile aprire la cache '{percorso_db}': {e}. Procedo senza cache.")
+        return None
+    logger(f"Cache di scansione attiva: {percorso_db}")
+    return cache
+
+
+class PercorsoCartella:
+    """
+    Visita ricorsiva di una cartella basata su `os.scandir`.
+    Genera in modo lazy gli `os.DirEntry` dei file, riusando il tipo fornito dal sistema
+    operativo (niente `stat()` extra per distinguere file e cartelle), e tiene aggiornato
+    il conteggio dei file trovati finora, utilizzabile come totale approssimativo.
+    I link simbolici a cartelle non vengono seguiti, come in `Path.rglob`.
+    """
+    def __init__(self, radice: Path, cartelle_escluse: Iterable[Path] = (), prefissi_esclusi: Tuple[str, ...] = (), estensioni_contate: Iterable[str] = ()):
+        self.radice = radice
+        self.cartelle_escluse = {os.path.normcase(os.path.abspath(c)) for c in cartelle_escluse}
+        self.prefissi_esclusi = tuple(prefissi_esclusi)
+        self.estensioni_contate = {e.lower() for e in estensioni_contate}
+        self.file_trovati = 0
+        self.file_contati = 0 # File con una delle `estensioni_contate`
+        self.cartelle_visitate = 0
+        self.completato = False
+        self.errori: List[Tuple[str, OSError]] = []
+
+    def __iter__(self) -> Iterator[os.DirEntry]:
+        pila = [os.fspath(self.radice)]
+        while pila:
+            cartella = pila.pop()
+            sottocartelle = []
+            _conta("scandir")
+            try:
+                with os.scandir(cartella) as voci:
+                    for voce in voci:
+                        try:
+                            if voce.is_dir(follow_symlinks=False):
+                                if os.path.normcase(voce.path) not in self.cartelle_escluse:
+                                    sottocartelle.append(voce.path)
+                                continue
+                            if not voce.is_file() or voce.name.startswith(self.prefissi_esclusi):
+                                continue
+                        except OSError as e:
+                            self.errori.append((voce.path, e))
+                            continue
+                        self.file_trovati += 1
+                        if os.path.splitext(voce.name)[1].lower() in self.estensioni_contate:
+                            self.file_contati += 1
+                        yield voce
+            except OSError as e:
+                self.errori.append((cartella, e))
+                continue
+            self.cartelle_visitate += 1
+            # In ordine inverso, così le sottocartelle vengono visitate nell'ordine di scandir
+            pila.extend(reversed(sottocartelle))
+        self.completato = True
+
+
+def _in_anticipo(iterabile: Iterable, massimo_in_attesa: int = 50_000) -> Iterator:
+    """
+    Consuma `iterabile` in un thread separato tenendo pronti fino a `massimo_in_attesa`
+    elementi: la visita delle cartelle procede in anticipo rispetto all'analisi (così il
+    conteggio dei file trovati è significativo) senza materializzare l'intero albero.
+    """
+    coda: queue.Queue = queue.Queue(maxsize=massimo_in_attesa)
+    fine = object()
+    interrompi = threading.Event()
+    errori = []
+
+    def _produttore():
+        try:
+            for elemento in iterabile:
+                while not interrompi.is_set():
+                    try:
+                        coda.put(elemento, timeout=0.1)
+                        break
+                    except queue.Full:
+                        pass
+                if interrompi.is_set():
+                    return
+        except BaseException as e:
+            errori.append(e)
+        finally:
+            while not interrompi.is_set():
+                try:
+                    coda.put(fine, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+
+    produttore = threading.Thread(target=_produttore, name="visita-cartelle", daemon=True)
+    produttore.start()
+    try:
+        while True:
+            elemento = coda.get()
+            if elemento is fine:
+                break
+            yield elemento
+    finally:
+        interrompi.set()
+        produttore.join()
+    if errori:
+        raise errori[0]
+
+
+@_profilata("analisi file")
+def _estrai_info_file(file_path: Path, logger=_default_logger, stat_file: Optional[os.stat_result] = None, calcola_impronta: bool = False) -> Optional[MusicFile]:
+    """
+    Estrae, normalizza e struttura le informazioni di un singolo file musicale.
+    Restituisce un oggetto MusicFile o None se le informazioni sono insufficienti.
+    Se `stat_file` è fornito, viene riusato al posto di una nuova chiamata a `stat()`.
+    Con `calcola_impronta` viene calcolata anche l'impronta dei frame audio (solo per gli MP3).
+    """
+    _STATO_LETTURA.errore_io = False
+    # 1. Estrazione Raw
+    info_formato = leggi_info_formato(file_path, logger)
+    titolo_id3_raw, artista_id3_raw = info_formato.titolo, info_formato.artista
+    artista_nomefile_raw, titolo_nomefile_raw = estrai_info_da_nome_file(file_path.stem)
+
+    artista_finale, titolo_finale, sorgente_info = None, None, "Nessuna"
+
+    if artista_id3_raw and titolo_id3_raw:
+        artista_finale = artista_id3_raw
+        titolo_finale = titolo_id3_raw
+        sorgente_info = "ID3" # Tag del file, qualunque sia il formato (ID3, commenti Vorbis, atomi MP4, ASF)
+    elif artista_nomefile_raw and titolo_nomefile_raw:
+        artista_finale = artista_nomefile_raw
+        titolo_finale = titolo_nomefile_raw
+        sorgente_info = "Nome File"
+    else:
+        logger(f"    Info insufficienti (ID3/Nome File) per: {file_path.name}")
+        return None
+
+    # 2. Normalizzazione ed estrazione di titolo base e versione (memorizzate per testo grezzo)
+    artista_normalizzato, titolo_normalizzato, titolo_base, tag_versione = normalizza_artista_titolo(artista_finale, titolo_finale)
+
+    if not (artista_normalizzato and titolo_normalizzato):
+        logger(f"    Info insufficienti post-normalizzazione per: {file_path.name}")
+        return None
+
+    # 3. Recupero Metadati Aggiuntivi
+    try:
+        if stat_file is None:
+            _conta("stat")
+            stat_file = file_path.stat()
+        dimensione = stat_file.st_size
+    except FileNotFoundError:
+        _segnala_errore_io()
+        logger(f"    ATTENZIONE: File {file_path.name} non trovato durante lettura dimensione.")
+        return None
+
+    impronta_audio = None
+    if calcola_impronta and info_formato.codec == "mp3":
+        try:
+            impronta_audio = calcola_impronta_audio_mp3(file_path)
+        except OSError as e:
+            _segnala_errore_io()
+            logger(f"    ATTENZIONE: Impossibile calcolare l'impronta audio di {file_path.name}: {e}")
+
+    return MusicFile(
+        path=file_path,
+        artista_norm=artista_normalizzato,
+        titolo_norm=titolo_normalizzato,
+        titolo_base_norm=titolo_base,
+        tag_versione=tag_versione,
+        dimensione=dimensione,
+        sorgente_info=sorgente_info,
+        impronta_audio=impronta_audio,
+        bitrate_kbps=info_formato.bitrate_kbps,
+        frequenza=info_formato.frequenza,
+        vbr=info_formato.vbr,
+        durata=info_formato.durata,
+        codec=info_formato.codec
+    )
+
+
+def _estrai_info_file_bufferizzato(file_path: Path, stat_file: Optional[os.stat_result] = None, calcola_impronta: bool = False) -> Tuple[Optional[MusicFile], List[str], bool]:
+    """
+    Esegue `_estrai_info_file` raccogliendo i messaggi di log invece di emetterli.
+    Pensata per i thread di lavoro: i messaggi vengono poi inoltrati al logger
+    dal thread coordinatore, nell'ordine dei file. Il terzo valore indica se il
+    risultato può essere memorizzato nella cache (nessun errore di I/O durante la lettura).
+    """
+    messaggi: List[str] = []
+    info_file = _estrai_info_file(file_path, lambda messaggio, flush=True: messaggi.append(messaggio), stat_file, calcola_impronta)
+    return info_file, messaggi, _lettura_senza_errori_io()
+
+
+def _estrai_info_file_da_voce(voce: os.DirEntry, file_path: Path, calcola_impronta: bool = False) -> Tuple[Optional[MusicFile], List[str], bool]:
+    """Come `_estrai_info_file_bufferizzato`, riusando la `stat()` memorizzata nel DirEntry."""
+    _conta("stat")
+    try:
+        stat_file = voce.stat()
+    except FileNotFoundError:
+        stat_file = None # Sarà _estrai_info_file a segnalare il file mancante
+    return _estrai_info_file_bufferizzato(file_path, stat_file, calcola_impronta)
+
+
+def _futuro_completato(valore) -> Future:
+    futuro = Future()
+    futuro.set_result(valore)
+    return futuro
+
+
+# Campi di MusicFile trasferiti dai processi di lavoro: tutto tranne il Path,
+# che il processo principale conosce già e ricostruisce senza serializzarlo.
+_CAMPI_RECORD = tuple(campo.name for campo in fields(MusicFile) if campo.name != 'path')
+DIMENSIONE_BLOCCO_PROCESSI = 256
+
+
+def _record_da_music_file(info_file: Optional[MusicFile]) -> Optional[tuple]:
+    if info_file is None:
+        return None
+    return tuple(getattr(info_file, campo) for campo in _CAMPI_RECORD)
+
+
+def _music_file_da_record(file_path: Path, record: Optional[tuple]) -> Optional[MusicFile]:
+    if record is None:
+        return None
+    return MusicFile(file_path, *record)
+
+
+def _analizza_blocco(percorsi: List[str], calcola_impronta: bool = False) -> Tuple[List[Tuple[Optional[tuple], Tuple[str, ...], bool]], "StatisticheMemo"]:
+    """
+    Eseguita nei processi di lavoro: analizza un blocco di file e restituisce, per ciascuno,
+    un record compatto (tupla di soli str/int), i messaggi di log prodotti e se il risultato
+    è memorizzabile nella cache, più le statistiche del memo della normalizzazione relative al blocco.
+    """
+    statistiche_iniziali = MEMO_NORMALIZZAZIONE.statistiche()
+    risultati = []
+    for percorso in percorsi:
+        info_file, messaggi, memorizzabile = _estrai_info_file_bufferizzato(Path(percorso), calcola_impronta=calcola_impronta)
+        risultati.append((_record_da_music_file(info_file), tuple(messaggi), memorizzabile))
+    return risultati, MEMO_NORMALIZZAZIONE.statistiche() - statistiche_iniziali
+
+
+class _BloccoProcessi:
+    """Gruppo di file da inviare insieme a un processo di lavoro."""
+    __slots__ = ('percorsi', 'futuro')
+
+    def __init__(self):
+        self.percorsi: List[str] = []
+        self.futuro: Optional[Future] = None
+
+
+def _estrai_info_file_in_ordine(file_audio: Iterable[os.DirEntry], cache: Optional[CacheScansione], workers: int = 1, processi: int = 0, calcola_impronta: bool = False):
+    """
+    Genera (file_path, info_file, messaggi) per ogni file audio, nello stesso ordine di `file_audio`
+    (un iterabile, anche lazy, di `os.DirEntry`).
+    Con `workers` > 1 l'estrazione dei tag avviene in un pool di thread (utile quando ogni
+    apertura di file attende la rete, es. su NAS); con `processi` > 1 i file vengono divisi in
+    blocchi analizzati da processi separati, così la normalizzazione (regex) non è limitata dal GIL.
+    La cache viene consultata e aggiornata solo dal thread chiamante, e solo i file nuovi o
+    modificati vengono inviati al pool. Il numero di file in lavorazione resta limitato.
+    """
+    if processi > 1:
+        pool = ProcessPoolExecutor(max_workers=processi)
+        finestra = processi * DIMENSIONE_BLOCCO_PROCESSI * 2
+    else:
+        pool = ThreadPoolExecutor(max_workers=workers) if workers > 1 else None
+        finestra = max(1, workers * 8)
+    in_volo = deque() # Elementi (file_path, stat_da_registrare, futuro oppure (blocco, indice))
+    blocco_corrente = _BloccoProcessi()
+
+    def _invia_blocco():
+        nonlocal blocco_corrente
+        if blocco_corrente.percorsi:
+            blocco_corrente.futuro = pool.submit(_analizza_blocco, blocco_corrente.percorsi, calcola_impronta)
+            blocco_corrente = _BloccoProcessi()
+
+    def _estrai(voce, file_path, stat_file):
+        if processi > 1:
+            blocco_corrente.percorsi.append(voce.path)
+            sorgente = (blocco_corrente, len(blocco_corrente.percorsi) - 1)
+            if len(blocco_corrente.percorsi) >= DIMENSIONE_BLOCCO_PROCESSI:
+                _invia_blocco()
+            return sorgente
+        if stat_file is not None:
+            funzione, argomenti = _estrai_info_file_bufferizzato, (file_path, stat_file, calcola_impronta)
+        else:
+            funzione, argomenti = _estrai_info_file_da_voce, (voce, file_path, calcola_impronta)
+        if pool is None:
+            return _futuro_completato(funzione(*argomenti))
+        return pool.submit(funzione, *argomenti)
+
+    def _pronto(sorgente) -> bool:
+        if isinstance(sorgente, Future):
+            return sorgente.done()
+        return sorgente[0].futuro is not None and sorgente[0].futuro.done()
+
+    def _consegna(elemento):
+        file_path, stat_da_registrare, sorgente = elemento
+        if isinstance(sorgente, Future):
+            info_file, messaggi, memorizzabile = sorgente.result()
+        else:
+            blocco, indice = sorgente
+            if blocco.futuro is None:
+                _invia_blocco()
+            risultati, statistiche_memo = blocco.futuro.result()
+            if indice == 0: # Una volta per blocco
+                MEMO_NORMALIZZAZIONE.somma_statistiche(statistiche_memo)
+            record, messaggi, memorizzabile = risultati[indice]
+            info_file = _music_file_da_record(file_path, record)
+        if stat_da_registrare is not None and memorizzabile: # Un errore di I/O (es. timeout del NAS) può essere passeggero
+            cache.registra(file_path, stat_da_registrare, info_file)
+        return file_path, info_file, messaggi
+
+    try:
+        for voce in file_audio:
+            file_path = Path(voce.path)
+            if cache is None:
+                in_volo.append((file_path, None, _estrai(voce, file_path, None)))
+            else:
+                _conta("stat")
+                try:
+                    stat_file = voce.stat()
+                except FileNotFoundError:
+                    messaggio = f"    ATTENZIONE: File {file_path.name} non trovato durante lettura dimensione."
+                    in_volo.append((file_path, None, _futuro_completato((None, [messaggio], False))))
+                    stat_file = None
+                if stat_file is not None:
+                    trovato, info_file = cache.cerca(file_path, stat_file)
+                    if trovato:
+                        in_volo.append((file_path, None, _futuro_completato((info_file, [], True))))
+                    else:
+                        in_volo.append((file_path, stat_file, _estrai(voce, file_path, stat_file)))
+
+            while len(in_volo) >= finestra or (in_volo and _pronto(in_volo[0][2])):
+                yield _consegna(in_volo.popleft())
+
+        while in_volo:
+            yield _consegna(in_volo.popleft())
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+# Punteggiatura rimossa. Le parentesi tonde e quadre NON vengono rimosse, per preservare tag come (Live), (Remastered).
+_PUNTEGGIATURA_RIMOSSA = '.,!?"\'{}#*:'
+_PUNTEGGIATURA_RIMOSSA_ASCII = _PUNTEGGIATURA_RIMOSSA.encode('ascii') # Per `bytes.translate`, più rapido sui testi ASCII
+# Tabella per `str.translate` dei testi non ASCII, applicata dopo NFKC e casefold: toglie anche apici e
+# virgolette tipografici e uniforma i trattini tipografici
+_TABELLA_NORMALIZZAZIONE = str.maketrans({
+    **dict.fromkeys(_PUNTEGGIATURA_RIMOSSA + '\u2018\u2019\u201a\u201b\u2032\u201c\u201d\u201e\u201f\u2033\u00ab\u00bb'),
+    **dict.fromkeys('\u2010\u2012\u2013\u2014\u2015\u2212\ufe58', '-'),
+    '\u2044': '/', # Barra delle frazioni ("AC⁄DC")
+})
+# Per `str.translate` dopo NFD: toglie i segni diacritici combinanti (U+0300-U+036F) e sostituisce
+# le lettere che NFD non scompone in lettera base più accento
+_TABELLA_SENZA_ACCENTI = {
+    **dict.fromkeys(range(0x0300, 0x0370)),
+    **str.maketrans({'ø': 'o', 'đ': 'd', 'ł': 'l', 'ħ': 'h', 'ŧ': 't', 'ı': 'i', 'ð': 'd', 'þ': 'th', 'æ': 'ae', 'œ': 'oe'}),
+}
+
+
+@_profilata("normalizza_testo")
+def normalizza_testo(testo, senza_accenti: bool = False):
+    """
+    Normalizza il testo per il confronto: forme compatibili Unicode (NFKC: caratteri a larghezza
+    piena, legature), minuscolo (casefold: "Straße" -> "strasse"), rimozione della punteggiatura
+    base e degli spazi superflui. Con `senza_accenti` toglie anche i segni diacritici (vedi `rimuovi_accenti`).
+    """
+    if testo is None:
+        return None
+    if testo.isascii():
+        # Per l'ASCII casefold equivale a lower() e NFKC non cambia nulla
+        testo = testo.lower().encode('ascii').translate(None, _PUNTEGGIATURA_RIMOSSA_ASCII).decode('ascii')
+    else:
+        testo = unicodedata.normalize('NFKC', testo).casefold().translate(_TABELLA_NORMALIZZAZIONE)
+        if senza_accenti:
+            testo = rimuovi_accenti(testo)
+    if '&' in testo:
+        testo = testo.replace('&', 'and') # Esempio, si può espandere
+    testo = ' '.join(testo.split()) # Spazi multipli e trim
+    if '(' in testo or '[' in testo:
+        # Rimuove spazi extra che potrebbero essere rimasti attorno a parentesi conservate
+        testo = testo.replace('( ', '(').replace(' )', ')').replace('[ ', '[').replace(' ]', ']')
+    return testo
+
+
+def rimuovi_accenti(testo: str) -> str:
+    """
+    Toglie i segni diacritici latini, greci e cirillici da un testo già normalizzato
+    ("beyoncé" -> "beyonce", "mötley crüe" -> "motley crue", "ørsted" -> "orsted").
+    Gli altri segni combinanti (es. i dakuten giapponesi) cambiano la lettera e vengono conservati.
+    """
+    if testo.isascii():
+        return testo
+    return unicodedata.normalize('NFC', unicodedata.normalize('NFD', testo).translate(_TABELLA_SENZA_ACCENTI))
+
+@_profilata("estrai_titolo_base_e_versione")
+def estrai_titolo_base_e_versione(titolo_normalizzato, logger=_default_logger):
+    """
+    Tenta di estrarre un 'titolo base' e l'eventuale 'tag di versione' da un titolo normalizzato.
+    Restituisce (titolo_base, tag_versione_trovato) o (titolo_originale, None) se nessun pattern matcha.
+    """
+    risultato = _MATCHER_VERSIONI.cerca(titolo_normalizzato)
+    if risultato is None:
+        return titolo_normalizzato, None
+
+    _, inizio, fine = risultato
+    corrispondenza = titolo_normalizzato[inizio:fine]
+    versione_trovata = corrispondenza.strip() # Il tag di versione include le parentesi
+    if not versione_trovata:
+        return titolo_normalizzato, None
+    # Il titolo base si ottiene ritagliando il tag (senza gli spazi che lo precedono)
+    inizio_tag = inizio + (len(corrispondenza) - len(corrispondenza.lstrip()))
+    resto = titolo_normalizzato[:inizio_tag] + titolo_normalizzato[fine:]
+    if versione_trovata.casefold() in resto.casefold():
+        # Caso raro: il tag compare più volte, vanno rimosse tutte le occorrenze
+        resto = re.sub(re.escape(versione_trovata), '', resto, flags=re.IGNORECASE)
+    # Rimuove eventuali doppi spazi o spazi all'inizio/fine creati dalla rimozione
+    titolo_da_lavorare = ' '.join(resto.split())
+    # A volte la rimozione può lasciare " - " o simili alla fine, puliamo
+    titolo_da_lavorare = _RE_TRATTINO_FINALE.sub('', titolo_da_lavorare).strip()
+    return titolo_da_lavorare, versione_trovata
+
+@_profilata("identifica_come_video")
+def identifica_come_video(nome_file_stem):
+    """Verifica se il nome del file suggerisce un contenuto video."""
+    return _MATCHER_VIDEO.trova(nome_file_stem.lower())
+
+@_profilata("estrai_info_da_nome_file")
+def estrai_info_da_nome_file(nome_file_stem):
+    """Tenta di estrarre Artista e Titolo dal nome del file (senza estensione)."""
+    # I pattern da rimuovere (es. numeri traccia, tag vari) sono in PATTERN_NOME_FILE_DA_RIMUOVERE.
+    # Vanno applicati in sequenza (una rimozione può far emergere il pattern successivo),
+    # ma la ricerca combinata permette di saltarli tutti quando nessuno compare.
+    nome_pulito = nome_file_stem
+    if _MATCHER_NOME_FILE.trova(nome_pulito):
+        for pattern in _MATCHER_NOME_FILE.compilati:
+            nome_pulito = pattern.sub('', nome_pulito)
+    
+    nome_pulito = nome_pulito.strip()
+
+    # Tentativo di separare Artista - Titolo
+    match = _RE_ARTISTA_TITOLO.match(nome_pulito)
+    if match:
+        artista = match.group(1).strip()
+        titolo = match.group(2).strip()
+        if artista and titolo: # Assicurati che entrambi siano non vuoti dopo lo strip
+             return artista, titolo
+    
+    # Fallback: se non c'è " - ", ma ci sono spazi, potremmo provare a dividere
+    # Questo è più euristico e potrebbe necessitare di affinamenti
+    # parts = nome_pulito.split()
+    # if len(parts) >= 2: # Richiede almeno due parole
+    #    # Qui si potrebbe tentare di indovinare, es. la prima parte è l'artista
+    #    pass
+
+    return None, None # Se non si riesce a separare chiaramente
+
+# --- Memo della normalizzazione: cache LRU limitata per artisti e titoli ---
+
+DIMENSIONE_MEMO_NORMALIZZAZIONE = 65_536 # Testi distinti ricordati (artisti e titoli insieme)
+
+
+class StatisticheMemo(NamedTuple):
+    trovati: int = 0 # Testi già normalizzati, restituiti senza ricalcolo
+    calcolati: int = 0
+    scartati: int = 0 # Voci meno recenti rimosse per restare entro la dimensione massima
+
+    def __sub__(self, altre: "StatisticheMemo") -> "StatisticheMemo":
+        return StatisticheMemo(*(a - b for a, b in zip(self, altre)))
+
+    def __add__(self, altre: "StatisticheMemo") -> "StatisticheMemo":
+        return StatisticheMemo(*(a + b for a, b in zip(self, altre)))
+
+
+class MemoNormalizzazione:
+    """
+    Cache LRU limitata dei risultati della normalizzazione, per testo grezzo: in una libreria
+    reale lo stesso artista compare migliaia di volte e i titoli si ripetono nelle compilation.
+    La chiave comprende la versione dei pattern (`ricompila_pattern` la incrementa), quindi dopo
+    una modifica dei pattern i risultati precedenti non vengono più usati e escono per anzianità.
+    Thread-safe (il calcolo avviene fuori dal lock: due thread possono calcolare lo stesso testo,
+    con lo stesso risultato). Nei processi di lavoro ogni processo ha la propria copia; le
+    statistiche vengono sommate nel processo principale (vedi `_analizza_blocco`).
+    """
+    def __init__(self, dimensione_massima: int = DIMENSIONE_MEMO_NORMALIZZAZIONE):
+        self.dimensione_massima = dimensione_massima
+        self._voci: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._statistiche = StatisticheMemo()
+
+    def ottieni(self, chiave: tuple, calcola) -> tuple:
+        """Restituisce il valore memorizzato per `chiave` o lo calcola con `calcola()` e lo memorizza."""
+        with self._lock:
+            valore = self._voci.get(chiave)
+            if valore is not None:
+                self._voci.move_to_end(chiave)
+                self._statistiche = self._statistiche._replace(trovati=self._statistiche.trovati + 1)
+                _conta("memo trovati")
+                return valore
+        _conta("memo mancanti")
+        valore = calcola()
+        with self._lock:
+            self._voci[chiave] = valore
+            scartati = 0
+            while len(self._voci) > self.dimensione_massima:
+                self._voci.popitem(last=False)
+                scartati += 1
+            self._statistiche += StatisticheMemo(0, 1, scartati)
+        return valore
+
+    def statistiche(self) -> StatisticheMemo:
+        with self._lock:
+            return self._statistiche
+
+    def somma_statistiche(self, statistiche: StatisticheMemo):
+        """Aggiunge le statistiche raccolte in un processo di lavoro."""
+        with self._lock:
+            self._statistiche += statistiche
+
+    def __len__(self) -> int:
+        return len(self._voci)
+
+    def svuota(self):
+        with self._lock:
+            self._voci.clear()
+            self._statistiche = StatisticheMemo()
+
+    def _dopo_fork(self):
+        # Il processo figlio eredita le voci (ancora valide) ma non il lock, che potrebbe essere preso
+        self._lock = threading.Lock()
+        self._statistiche = StatisticheMemo()
+
+
+MEMO_NORMALIZZAZIONE = MemoNormalizzazione()
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=MEMO_NORMALIZZAZIONE._dopo_fork)
+
+
+def _calcola_titolo_normalizzato(titolo: str) -> Tuple[Optional[str], str, Optional[str]]:
+    titolo_normalizzato = normalizza_testo(titolo)
+    if not titolo_normalizzato:
+        return titolo_normalizzato, titolo_normalizzato, None
+    return (titolo_normalizzato, *estrai_titolo_base_e_versione(titolo_normalizzato))
+
+
+def normalizza_artista_titolo(artista: str, titolo: str) -> Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]:
+    """
+    Normalizza artista e titolo grezzi e separa il titolo base dal tag di versione, usando
+    `MEMO_NORMALIZZAZIONE`. Restituisce (artista_norm, titolo_norm, titolo_base, tag_versione).
+    """
+    versione = _VERSIONE_PATTERN
+    artista_normalizzato, = MEMO_NORMALIZZAZIONE.ottieni((versione, "artista", artista), lambda: (normalizza_testo(artista),))
+    titolo_normalizzato, titolo_base, tag_versione = MEMO_NORMALIZZAZIONE.ottieni((versione, "titolo", titolo), lambda: _calcola_titolo_normalizzato(titolo))
+    return artista_normalizzato, titolo_normalizzato, titolo_base, tag_versione
+
+
+# --- Lettura rapida dei tag ID3 ---
+
+DIMENSIONE_LETTURA_TAG = 16 * 1024 # Prima lettura: di solito contiene header e frame di testo del tag ID3v2
+_FRAME_TITOLO_ARTISTA = {2: (b"TT2", b"TP1"), 3: (b"TIT2", b"TPE1"), 4: (b"TIT2", b"TPE1")}
+_CODIFICHE_ID3 = {0: "latin-1", 1: "utf-16", 2: "utf-16-be", 3: "utf-8"}
+_RE_ID_FRAME_ID3 = re.compile(rb'[A-Z0-9]{3,4}')
+
+
+class TagNonGestito(Exception):
+    """Il tag ID3 usa caratteristiche non gestite dal lettore rapido (si ricorre a mutagen)."""
+
+
+def _decodifica_testo_id3(contenuto: bytes) -> Optional[str]:
+    """Decodifica un frame di testo ID3v2 e restituisce il primo valore (come `EasyID3`)."""
+    if len(contenuto) < 2:
+        return None
+    codifica = _CODIFICHE_ID3.get(contenuto[0])
+    if codifica is None:
+        raise TagNonGestito(f"codifica del testo sconosciuta ({contenuto[0]})")
+    testo = contenuto[1:]
+    if codifica.startswith("utf-16") and len(testo) % 2:
+        testo = testo[:-1]
+    try:
+        return testo.decode(codifica).split("\x00")[0]
+    except UnicodeDecodeError as e:
+        raise TagNonGestito(str(e)) from e
+
+
+def _leggi_intervallo(f, testa: bytes, inizio: int, lunghezza: int) -> bytes:
+    """Legge `lunghezza` byte da `inizio`, dal blocco iniziale già letto se lo contiene."""
+    if inizio + lunghezza <= len(testa):
+        return testa[inizio:inizio + lunghezza]
+    f.seek(inizio)
+    return f.read(lunghezza)
+
+
+def _leggi_frame_id3v2(f, testa: bytes) -> Tuple[Optional[str], Optional[str]]:
+    """
+    Scorre i frame del tag ID3v2 che inizia all'offset 0 e decodifica solo titolo e artista.
+    I frame già contenuti in `testa` non richiedono altre letture; oltre, si legge solo
+    l'intestazione di ogni frame e il contenuto dei frame cercati (le copertine vengono saltate).
+    """
+    versione, flag = testa[3], testa[5]
+    if versione not in _FRAME_TITOLO_ARTISTA:
+        raise TagNonGestito(f"versione ID3v2.{versione}")
+    if flag & 0x80 or (versione == 2 and flag & 0x40):
+        raise TagNonGestito("tag con unsynchronisation o compressione")
+    fine_tag = 10 + _dimensione_syncsafe(testa[6:10])
+
+    posizione = 10
+    if flag & 0x40: # Header esteso
+        dimensione_estesa = _leggi_intervallo(f, testa, 10, 4)
+        if versione == 3:
+            posizione += 4 + int.from_bytes(dimensione_estesa, "big")
+        else:
+            posizione += _dimensione_syncsafe(dimensione_estesa)
+
+    id_titolo, id_artista = _FRAME_TITOLO_ARTISTA[versione]
+    lunghezza_id = 3 if versione == 2 else 4
+    lunghezza_header = 6 if versione == 2 else 10
+    valori: Dict[bytes, Optional[str]] = {}
+    while posizione + lunghezza_header <= fine_tag and len(valori) < 2:
+        header = _leggi_intervallo(f, testa, posizione, lunghezza_header)
+        if len(header) < lunghezza_header:
+            break # File troncato
+        identificativo = header[:lunghezza_id]
+        if not _RE_ID_FRAME_ID3.fullmatch(identificativo):
+            break # Padding o dati non validi: fine dei frame
+        if versione == 2:
+            dimensione = int.from_bytes(header[3:6], "big")
+        elif versione == 3:
+            dimensione = int.from_bytes(header[4:8], "big")
+        else:
+            if any(b & 0x80 for b in header[4:8]):
+                raise TagNonGestito("dimensione del frame non sincronizzata (ID3v2.4 non conforme)")
+            dimensione = _dimensione_syncsafe(header[4:8])
+
+        inizio_contenuto = posizione + lunghezza_header
+        posizione = inizio_contenuto + dimensione
+        if identificativo not in (id_titolo, id_artista) or identificativo in valori:
+            continue
+        if (versione == 3 and header[9] & 0xE0) or (versione == 4 and header[9] & 0x4F):
+            raise TagNonGestito("frame compresso, cifrato o raggruppato")
+        valori[identificativo] = _decodifica_testo_id3(_leggi_intervallo(f, testa, inizio_contenuto, dimensione))
+    return valori.get(id_titolo), valori.get(id_artista)
+
+
+def _leggi_id3v1(f, testa: bytes) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """Legge titolo e artista dal tag ID3v1 in coda al file, se presente."""
+    f.seek(0, os.SEEK_END)
+    dimensione = f.tell()
+    if dimensione < 128:
+        return None
+    if dimensione <= len(testa):
+        coda = testa[dimensione - 128:dimensione]
+    else:
+        f.seek(dimensione - 128)
+        coda = f.read(128)
+    if coda[:3] != b"TAG":
+        return None
+
+    def _campo(dati: bytes) -> Optional[str]:
+        return dati.split(b"\x00")[0].strip().decode("latin-1") or None
+
+    return _campo(coda[3:33]), _campo(coda[33:63])
+
+
+@_profilata("leggi_titolo_artista_id3")
+def leggi_titolo_artista_id3(file_path) -> Optional[Tuple[Optional[str], Optional[str]]]:
+    """
+    Lettore rapido di titolo e artista: legge solo l'inizio del file (header e frame del tag
+    ID3v2, decodificando solo TIT2/TPE1) e, se manca uno dei due valori, il tag ID3v1 in coda.
+    Come mutagen, i valori ID3v2 hanno la precedenza su quelli ID3v1.
+    Restituisce None se il file non ha tag ID3; solleva `TagNonGestito` per i casi insoliti
+    (unsynchronisation, frame compressi o cifrati, codifiche non valide) e OSError se il file
+    non è leggibile.
+    """
+    with open(file_path, 'rb', buffering=0) as f:
+        testa = f.read(DIMENSIONE_LETTURA_TAG)
+        titolo = artista = None
+        trovato = False
+        if len(testa) >= 10 and testa[:3] == b"ID3":
+            trovato = True
+            titolo, artista = _leggi_frame_id3v2(f, testa)
+        if titolo is None or artista is None:
+            id3v1 = _leggi_id3v1(f, testa)
+            if id3v1 is not None:
+                trovato = True
+                titolo = titolo if titolo is not None else id3v1[0]
+                artista = artista if artista is not None else id3v1[1]
+    return (titolo, artista) if trovato else None
+
+
+@_profilata("estrai_info_id3")
+def estrai_info_id3(file_path, logger=_default_logger):
+    """
+    Estrae titolo e artista dai tag ID3 di un file MP3.
+    Usa il lettore rapido `leggi_titolo_artista_id3`; mutagen (EasyID3) resta il riferimento per
+    i file in cui il lettore rapido non trova tag o incontra un caso che non gestisce.
+    """
+    try:
+        risultato = leggi_titolo_artista_id3(file_path)
+        if risultato is not None:
+            _conta("tag dal lettore rapido")
+            return risultato # La normalizzazione avverrà dopo
+    except TagNonGestito:
+        pass
+    except OSError:
+        _segnala_errore_io()
+
+    _conta("tag con mutagen")
+    try:
+        audio = EasyID3(file_path)
+        titolo = audio.get('title', [None])[0]
+        artista = audio.get('artist', [None])[0]
+        return titolo, artista
+    except MutagenError as e:
+        _segnala_errore_io(e)
+        return None, None # Nessun tag, o file non leggibile
+    except Exception as e:
+        _segnala_errore_io(e)
+        logger(f"    ATTENZIONE: Errore inatteso nella lettura dei tag di {Path(file_path).name}: {e!r}")
+        return None, None
+
+# --- Impronta audio MP3 (indipendente dai tag) ---
+
+# Bitrate in kbps per indice (1-14), per (MPEG-1?, layer)
+_BITRATE_MPEG = {
+    (True, 1): (32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+# Frequenze di campionamento per versione MPEG (bit del header: 0 = 2.5, 2 = 2, 3 = 1)
+_FREQUENZE_MPEG = {3: (44100, 48000, 32000), 2: (22050, 24000, 16000), 0: (11025, 12000, 8000)}
+_VERSIONI_MPEG = {3: "1", 2: "2", 0: "2.5"}
+MASSIMO_BYTE_RICERCA_FRAME = 64 * 1024 # Byte esaminati dopo i tag iniziali per trovare il primo frame
+
+
+class HeaderMpeg(NamedTuple):
+    """Campi del header (4 byte) di un frame audio MPEG."""
+    versione: str # "1", "2" o "2.5"
+    layer: int
+    bitrate_kbps: int
+    frequenza: int
+    padding: int
+    mono: bool
+    lunghezza_frame: int
+    campioni_per_frame: int
+
+
+def analizza_header_mpeg(dati, posizione: int = 0) -> Optional[HeaderMpeg]:
+    """Interpreta i 4 byte a `posizione` come header di un frame MPEG; None se non sono un header valido."""
+    if posizione + 4 > len(dati) or dati[posizione] != 0xFF or dati[posizione + 1] & 0xE0 != 0xE0:
+        return None
+    b1, b2, b3 = dati[posizione + 1], dati[posizione + 2], dati[posizione + 3]
+    bit_versione = (b1 >> 3) & 0x03
+    layer = 4 - ((b1 >> 1) & 0x03)
+    indice_bitrate = b2 >> 4
+    indice_frequenza = (b2 >> 2) & 0x03
+    if bit_versione == 1 or layer == 4 or indice_bitrate in (0, 15) or indice_frequenza == 3:
+        return None # Valori riservati, o bitrate "free" (non supportato)
+
+    mpeg1 = bit_versione == 3
+    bitrate_kbps = _BITRATE_MPEG[(mpeg1, layer)][indice_bitrate - 1]
+    frequenza = _FREQUENZE_MPEG[bit_versione][indice_frequenza]
+    padding = (b2 >> 1) & 0x01
+    if layer == 1:
+        campioni_per_frame = 384
+        lunghezza_frame = (12 * bitrate_kbps * 1000 // frequenza + padding) * 4
+    else:
+        campioni_per_frame = 1152 if (layer == 2 or mpeg1) else 576
+        lunghezza_frame = campioni_per_frame // 8 * bitrate_kbps * 1000 // frequenza + padding
+    return HeaderMpeg(_VERSIONI_MPEG[bit_versione], layer, bitrate_kbps, frequenza, padding,
+                      (b3 >> 6) == 3, lunghezza_frame, campioni_per_frame)
+
+
+def _dimensione_syncsafe(dati) -> int:
+    return (dati[0] & 0x7F) << 21 | (dati[1] & 0x7F) << 14 | (dati[2] & 0x7F) << 7 | (dati[3] & 0x7F)
+
+
+def _limiti_dati_audio(dati) -> Tuple[int, int]:
+    """
+    Restituisce (inizio, fine) della parte di `dati` che segue i tag ID3v2 iniziali
+    e precede i tag finali (ID3v1, ID3v1 esteso, APEv1/v2, Lyrics3v2, ID3v2 in coda).
+    """
+    inizio, fine = 0, len(dati)
+    # Possono esserci più tag ID3v2 consecutivi (es. scritti da programmi diversi)
+    while fine - inizio >= 10 and dati[inizio:inizio + 3] == b"ID3":
+        footer = 10 if dati[inizio + 5] & 0x10 else 0
+        inizio += 10 + footer + _dimensione_syncsafe(dati[inizio + 6:inizio + 10])
+
+    # I tag finali possono essere impilati in qualsiasi ordine: si rimuovono finché se ne trovano
+    while fine > inizio:
+        if fine - inizio >= 128 and dati[fine - 128:fine - 125] == b"TAG":
+            fine -= 128
+            if fine - inizio >= 227 and dati[fine - 227:fine - 223] == b"TAG+":
+                fine -= 227
+        elif fine - inizio >= 32 and dati[fine - 32:fine - 24] == b"APETAGEX":
+            # La dimensione dichiarata comprende il footer ma non l'header (se presente)
+            dimensione_ape = int.from_bytes(dati[fine - 20:fine - 16], "little")
+            con_header = dati[fine - 9] & 0x80
+            fine -= dimensione_ape + (32 if con_header else 0)
+        elif fine - inizio >= 15 and dati[fine - 9:fine] == b"LYRICS200" and dati[fine - 15:fine - 9].isdigit():
+            fine -= int(dati[fine - 15:fine - 9]) + 15
+        elif fine - inizio >= 10 and dati[fine - 10:fine - 7] == b"3DI":
+            fine -= 20 + _dimensione_syncsafe(dati[fine - 4:fine])
+        else:
+            break
+    return inizio, max(inizio, fine)
+
+
+def trova_primo_frame(dati, inizio: int, fine: int) -> Optional[Tuple[int, HeaderMpeg]]:
+    """
+    Cerca il primo frame MPEG tra `inizio` e `fine` (saltando eventuale padding o spazzatura
+    dopo i tag). Un header è accettato solo se ne segue un altro compatibile, oppure se il
+    frame termina esattamente a `fine`: così i byte 0xFF casuali non vengono scambiati per audio.
+    """
+    limite = min(fine, inizio + MASSIMO_BYTE_RICERCA_FRAME)
+    posizione = dati.find(b"\xff", inizio, limite)
+    while posizione != -1:
+        header = analizza_header_mpeg(dati, posizione)
+        if header is not None and posizione + header.lunghezza_frame <= fine:
+            successivo = posizione + header.lunghezza_frame
+            if successivo == fine:
+                return posizione, header
+            header_successivo = analizza_header_mpeg(dati, successivo) if successivo + 4 <= fine else None
+            if header_successivo is not None and header_successivo[:2] == header[:2] and header_successivo.frequenza == header.frequenza:
+                return posizione, header
+        posizione = dati.find(b"\xff", posizione + 1, limite)
+    return None
+
+
+def _offset_info_vbr(header: HeaderMpeg) -> int:
+    """Posizione (dall'inizio del frame) dell'intestazione Xing/Info, dopo le side information."""
+    if header.versione == "1":
+        return 4 + (17 if header.mono else 32)
+    return 4 + (9 if header.mono else 17)
+
+
+def _e_frame_info_vbr(dati, posizione: int, header: HeaderMpeg) -> bool:
+    """True se il frame a `posizione` è un frame Xing/Info/VBRI (metadati dell'encoder, non audio)."""
+    offset_xing = posizione + _offset_info_vbr(header)
+    return dati[offset_xing:offset_xing + 4] in (b"Xing", b"Info") or dati[posizione + 36:posizione + 40] == b"VBRI"
+
+
+def _hash_dati_audio_mp3(dati) -> Optional[str]:
+    inizio, fine = _limiti_dati_audio(dati)
+    primo_frame = trova_primo_frame(dati, inizio, fine)
+    if primo_frame is None:
+        return None
+    posizione, header = primo_frame
+    if _e_frame_info_vbr(dati, posizione, header):
+        posizione += header.lunghezza_frame
+    if posizione >= fine:
+        return None
+
+    hasher = hashlib.blake2b(digest_size=20)
+    vista = memoryview(dati)
+    try:
+        for blocco in range(posizione, fine, DIMENSIONE_BUFFER_HASH):
+            hasher.update(vista[blocco:min(blocco + DIMENSIONE_BUFFER_HASH, fine)])
+    finally:
+        vista.release()
+    return hasher.hexdigest()
+
+
+class InfoAudioMp3(NamedTuple):
+    """Caratteristiche del flusso audio di un MP3, ricavate senza decodificarlo."""
+    bitrate_kbps: int # Medio, per i file VBR
+    frequenza: int
+    vbr: bool
+    durata: float # Secondi
+
+
+@_profilata("leggi_info_audio_mp3")
+def leggi_info_audio_mp3(file_path) -> Optional[InfoAudioMp3]:
+    """
+    Ricava bitrate, frequenza di campionamento, VBR e durata di un MP3 leggendo solo il primo
+    frame (dopo i tag ID3v2) e l'eventuale intestazione Xing/Info/VBRI: non decodifica
+    l'audio e non scorre il file. Per i file CBR senza intestazione la durata è stimata
+    dalla dimensione dei dati audio. Restituisce None se non trova frame MPEG.
+    """
+    with open(file_path, 'rb', buffering=0) as f:
+        testa = f.read(DIMENSIONE_LETTURA_TAG)
+        dimensione_file = os.fstat(f.fileno()).st_size
+        inizio = 0
+        while True:
+            header_tag = _leggi_intervallo(f, testa, inizio, 10)
+            if len(header_tag) < 10 or header_tag[:3] != b"ID3":
+                break
+            inizio += 10 + (10 if header_tag[5] & 0x10 else 0) + _dimensione_syncsafe(header_tag[6:10])
+        # Il primo frame è cercato entro MASSIMO_BYTE_RICERCA_FRAME; il margine copre il frame successivo
+        dati = _leggi_intervallo(f, testa, inizio, MASSIMO_BYTE_RICERCA_FRAME + 4096)
+        fine_audio = dimensione_file
+        if dimensione_file - inizio >= 128 and _leggi_intervallo(f, testa, dimensione_file - 128, 3) == b"TAG":
+            fine_audio -= 128
+
+    primo_frame = trova_primo_frame(dati, 0, len(dati))
+    if primo_frame is None:
+        return None
+    posizione, header = primo_frame
+    numero_frame = byte_audio = None
+    vbr = False
+    offset_xing = posizione + _offset_info_vbr(header)
+    marcatore = dati[offset_xing:offset_xing + 4]
+    if marcatore in (b"Xing", b"Info"):
+        vbr = marcatore == b"Xing" # "Info" è l'intestazione scritta da LAME per i file CBR
+        flag = int.from_bytes(dati[offset_xing + 4:offset_xing + 8], "big")
+        campo = offset_xing + 8
+        if flag & 0x01:
+            numero_frame = int.from_bytes(dati[campo:campo + 4], "big")
+            campo += 4
+        if flag & 0x02:
+            byte_audio = int.from_bytes(dati[campo:campo + 4], "big")
+    elif dati[posizione + 36:posizione + 40] == b"VBRI":
+        vbr = True
+        byte_audio = int.from_bytes(dati[posizione + 46:posizione + 50], "big")
+        numero_frame = int.from_bytes(dati[posizione + 50:posizione + 54], "big")
+
+    byte_audio = byte_audio or max(0, fine_audio - inizio - posizione)
+    if numero_frame:
+        durata = numero_frame * header.campioni_per_frame / header.frequenza
+    else:
+        durata = byte_audio * 8 / (header.bitrate_kbps * 1000)
+    bitrate_kbps = header.bitrate_kbps
+    if vbr and durata > 0:
+        bitrate_kbps = round(byte_audio * 8 / durata / 1000)
+    return InfoAudioMp3(bitrate_kbps, header.frequenza, vbr, round(durata, 3))
+
+
+@_profilata("calcola_impronta_audio_mp3")
+def calcola_impronta_audio_mp3(file_path: Path) -> Optional[str]:
+    """
+    Calcola un'impronta (hash esadecimale) dei soli frame audio di un file MP3, ignorando
+    tag ID3v2, ID3v1, APE e Lyrics3 e il frame Xing/Info/LAME iniziale: due copie dello stesso
+    brano con tag diversi hanno quindi la stessa impronta, anche se dimensione e byte differiscono.
+    Il file viene letto tramite mmap (o con un'unica lettura, se mmap non è disponibile).
+    Restituisce None se il file è vuoto o non contiene frame MPEG riconoscibili.
+    """
+    with open(file_path, 'rb') as f:
+        try:
+            mappa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, OSError):
+            # File vuoto, o file system che non supporta mmap
+            dati = f.read()
+            return _hash_dati_audio_mp3(dati) if dati else None
+        with mappa:
+            return _hash_dati_audio_mp3(mappa)
+
+
+# --- Lettori dei tag per formato: registro per estensione e firma ---
+
+MASSIMO_BYTE_INTESTAZIONI = 16 * 1024 * 1024 # Intestazioni più grandi (es. copertine enormi) sono lasciate a mutagen
+
+
+class InfoFormato(NamedTuple):
+    """Titolo, artista e caratteristiche del flusso audio letti da un `LettoreFormato` (None se assenti)."""
+    titolo: Optional[str]
+    artista: Optional[str]
+    codec: Optional[str] # Chiave di QUALITA_CODEC
+    bitrate_kbps: Optional[int] = None # Medio
+    frequenza: Optional[int] = None
+    vbr: Optional[bool] = None
+    durata: Optional[float] = None
+
+
+class FormatoDiverso(TagNonGestito):
+    """Il contenuto del file appartiene a un formato diverso da quello indicato dall'estensione."""
+    def __init__(self, testa: bytes):
+        super().__init__("il contenuto non corrisponde all'estensione")
+        self.testa = testa[:64]
+
+
+@dataclass(frozen=True)
+class LettoreFormato:
+    """
+    Lettore dei tag di un formato audio. `leggi(file_path, logger)` legge solo le intestazioni e
+    restituisce un `InfoFormato`; per i casi che non gestisce solleva `TagNonGestito` (o OSError)
+    e si ricorre a mutagen. `firme` sono coppie (offset, byte) che riconoscono il formato dai
+    primi byte del file, quando l'estensione non corrisponde al contenuto.
+    """
+    nome: str
+    estensioni: Tuple[str, ...]
+    leggi: Callable[..., InfoFormato]
+    firme: Tuple[Tuple[int, bytes], ...] = ()
+
+    def riconosce(self, testa: bytes) -> bool:
+        return any(testa[offset:offset + len(firma)] == firma for offset, firma in self.firme)
+
+
+LETTORI_FORMATO: Dict[str, LettoreFormato] = {} # Estensione (minuscola, con il punto) -> lettore
+
+
+def registra_lettore(lettore: LettoreFormato) -> LettoreFormato:
+    """Registra `lettore` per le sue estensioni, sostituendo i lettori già registrati per le stesse."""
+    for estensione in lettore.estensioni:
+        LETTORI_FORMATO[estensione.lower()] = lettore
+    return lettore
+
+
+def lettore_per_firma(testa: bytes) -> Optional[LettoreFormato]:
+    """Il lettore registrato che riconosce il formato dai primi byte del file, se esiste."""
+    for lettore in LETTORI_FORMATO.values():
+        if lettore.riconosce(testa):
+            return lettore
+    return None
+
+
+@_profilata("leggi_info_formato")
+def leggi_info_formato(file_path: Path, logger=_default_logger) -> InfoFormato:
+    """
+    Legge tag e caratteristiche audio con il lettore registrato per l'estensione del file.
+    Se il contenuto è di un altro formato registrato (es. un MP4 salvato come .ogg) usa il
+    lettore di quel formato; se nessun lettore gestisce il file ricorre a `mutagen.File`.
+    """
+    lettore = LETTORI_FORMATO.get(file_path.suffix.lower())
+    try:
+        try:
+            if lettore is not None:
+                return lettore.leggi(file_path, logger)
+        except FormatoDiverso as e:
+            lettore = lettore_per_firma(e.testa)
+            if lettore is not None:
+                return lettore.leggi(file_path, logger)
+    except (TagNonGestito, IndexError, ValueError):
+        pass # IndexError e ValueError: intestazioni malformate sfuggite ai controlli del lettore
+    except OSError:
+        _segnala_errore_io()
+    return leggi_info_formato_mutagen(file_path, logger)
+
+
+def _primo_valore_mutagen(tag, *chiavi: str) -> Optional[str]:
+    for chiave in chiavi:
+        valori = tag.get(chiave)
+        if valori:
+            return str(valori[0])
+    return None
+
+
+# Codec per classe di file di mutagen (per MP4 e ASF il codec dipende dal flusso)
+_CODEC_MUTAGEN = {"MP3": "mp3", "EasyMP3": "mp3", "FLAC": "flac", "OggFLAC": "flac", "OggVorbis": "vorbis", "OggOpus": "opus"}
+
+
+def leggi_info_formato_mutagen(file_path: Path, logger=_default_logger) -> InfoFormato:
+    """Riferimento per i file che nessun lettore rapido gestisce: `mutagen.File` riconosce il formato dal contenuto."""
+    _conta("tag con mutagen")
+    try:
+        audio = mutagen.File(file_path, easy=True)
+    except MutagenError as e:
+        _segnala_errore_io(e)
+        audio = None # File non leggibile o danneggiato
+    except Exception as e:
+        _segnala_errore_io(e)
+        logger(f"    ATTENZIONE: Errore inatteso nella lettura dei tag di {file_path.name}: {e!r}")
+        audio = None
+    if audio is None:
+        return InfoFormato(None, None, None)
+
+    info = audio.info
+    classe = type(audio).__name__
+    codec = _CODEC_MUTAGEN.get(classe)
+    if classe in ("MP4", "EasyMP4"):
+        codec = "alac" if info.codec == "alac" else "aac" if info.codec.startswith("mp4a") else None
+    elif classe == "ASF":
+        codec = "wmalossless" if "lossless" in info.codec_name.lower() else "wma"
+    tag = audio.tags if audio.tags is not None else {}
+    return InfoFormato(
+        _primo_valore_mutagen(tag, "title", "Title"),
+        _primo_valore_mutagen(tag, "artist", "Author"),
+        codec,
+        round(info.bitrate / 1000) if getattr(info, "bitrate", 0) else None,
+        getattr(info, "sample_rate", None) or (48000 if codec == "opus" else None),
+        None,
+        round(info.length, 3) if info.length else None
+    )
+
+
+def _leggi_formato_mp3(file_path: Path, logger=_default_logger) -> InfoFormato:
+    """MP3: tag con `estrai_info_id3` (che ricorre già a EasyID3) e flusso con `leggi_info_audio_mp3`."""
+    titolo, artista = estrai_info_id3(file_path, logger)
+    try:
+        info_audio = leggi_info_audio_mp3(file_path)
+    except OSError:
+        _segnala_errore_io()
+        info_audio = None # Caratteristiche audio facoltative: il file resta valido
+    return InfoFormato(titolo, artista, "mp3", *(info_audio or ()))
+
+
+def _leggi_commenti_vorbis(dati: bytes, inizio: int = 0) -> Tuple[Optional[str], Optional[str]]:
+    """Primo valore di TITLE e ARTIST da un blocco di commenti Vorbis (usato da FLAC, Vorbis e Opus)."""
+    posizione = inizio + 4 + int.from_bytes(dati[inizio:inizio + 4], "little") # Salta il vendor
+    if posizione + 4 > len(dati):
+        raise TagNonGestito("commenti Vorbis troncati")
+    quanti = int.from_bytes(dati[posizione:posizione + 4], "little")
+    posizione += 4
+    valori: Dict[bytes, str] = {}
+    for _ in range(quanti):
+        lunghezza = int.from_bytes(dati[posizione:posizione + 4], "little")
+        commento = dati[posizione + 4:posizione + 4 + lunghezza]
+        if len(commento) < lunghezza or posizione + 4 > len(dati):
+            raise TagNonGestito("commenti Vorbis troncati")
+        posizione += 4 + lunghezza
+        chiave, uguale, valore = commento.partition(b"=")
+        chiave = chiave.upper()
+        if uguale and chiave in (b"TITLE", b"ARTIST") and chiave not in valori:
+            try:
+                valori[chiave] = valore.decode("utf-8")
+            except UnicodeDecodeError as e:
+                raise TagNonGestito(str(e)) from e
+            if len(valori) == 2:
+                break
+    return valori.get(b"TITLE"), valori.get(b"ARTIST")
+
+
+def _bitrate_medio(byte_audio: int, durata: Optional[float]) -> Optional[int]:
+    return round(byte_audio * 8 / durata / 1000) if durata else None
+
+
+def _leggi_formato_flac(file_path: Path, logger=_default_logger) -> InfoFormato:
+    """
+    FLAC: scorre le intestazioni dei blocchi di metadati e legge solo STREAMINFO (frequenza e
+    numero di campioni) e VORBIS_COMMENT; copertine, padding e tabelle di seek vengono saltati.
+    """
+    with open(file_path, 'rb', buffering=0) as f:
+        testa = f.read(DIMENSIONE_LETTURA_TAG)
+        if testa[:4] != b"fLaC":
+            raise FormatoDiverso(testa)
+        dimensione_file = os.fstat(f.fileno()).st_size
+        titolo = artista = None
+        frequenza = campioni = 0
+        posizione = 4
+        ultimo = False
+        while not ultimo:
+            header = _leggi_intervallo(f, testa, posizione, 4)
+            if len(header) < 4 or header[0] & 0x7F == 0x7F:
+                raise TagNonGestito("blocco di metadati FLAC non valido")
+            ultimo = bool(header[0] & 0x80)
+            tipo = header[0] & 0x7F
+            lunghezza = int.from_bytes(header[1:4], "big")
+            posizione += 4
+            if tipo == 0: # STREAMINFO: 20 bit di frequenza, 3 di canali, 5 di bit per campione, 36 di campioni
+                campi = int.from_bytes(_leggi_intervallo(f, testa, posizione + 10, 8), "big")
+                frequenza, campioni = campi >> 44, campi & 0xFFFFFFFFF
+            elif tipo == 4:
+                titolo, artista = _leggi_commenti_vorbis(_leggi_intervallo(f, testa, posizione, lunghezza))
+            posizione += lunghezza
+
+    durata = campioni / frequenza if frequenza and campioni else None
+    _conta("tag dal lettore rapido")
+    return InfoFormato(titolo, artista, "flac", _bitrate_medio(dimensione_file - posizione, durata),
+                       frequenza or None, None, round(durata, 3) if durata else None)
+
+
+def _pacchetti_ogg(f, testa: bytes, quanti: int) -> Tuple[List[bytes], int, bytes]:
+    """
+    Ricompone i primi `quanti` pacchetti del primo flusso logico di un file Ogg.
+    Restituisce i pacchetti, la fine dell'ultima pagina letta e il numero di serie del flusso.
+    """
+    pacchetti: List[bytes] = []
+    corrente: List[bytes] = []
+    seriale = None
+    posizione = 0
+    while len(pacchetti) < quanti:
+        header = _leggi_intervallo(f, testa, posizione, 27)
+        if len(header) < 27 or header[:4] != b"OggS":
+            raise TagNonGestito("pagina Ogg non valida")
+        lacing = _leggi_intervallo(f, testa, posizione + 27, header[26])
+        inizio_dati = posizione + 27 + header[26]
+        dati = _leggi_intervallo(f, testa, inizio_dati, sum(lacing))
+        if len(lacing) < header[26] or len(dati) < sum(lacing):
+            raise TagNonGestito("pagina Ogg troncata")
+        posizione = inizio_dati + len(dati)
+        if posizione > MASSIMO_BYTE_INTESTAZIONI:
+            raise TagNonGestito("intestazioni Ogg troppo grandi")
+        seriale = seriale or header[14:18]
+        if header[14:18] != seriale:
+            continue # Pagina di un altro flusso multiplexato
+        offset = 0
+        for valore in lacing: # Un segmento più corto di 255 byte chiude il pacchetto
+            corrente.append(dati[offset:offset + valore])
+            offset += valore
+            if valore < 255:
+                pacchetti.append(b"".join(corrente))
+                corrente = []
+                if len(pacchetti) == quanti:
+                    break
+    return pacchetti, posizione, seriale
+
+
+def _ultima_posizione_ogg(f, dimensione_file: int, seriale: bytes) -> Optional[int]:
+    """Posizione (granule) dell'ultima pagina del flusso: una pagina Ogg non supera i 65307 byte."""
+    f.seek(max(0, dimensione_file - 65536))
+    coda = f.read()
+    indice = coda.rfind(b"OggS")
+    while indice >= 0:
+        if coda[indice + 14:indice + 18] == seriale:
+            posizione = int.from_bytes(coda[indice + 6:indice + 14], "little", signed=True)
+            if posizione >= 0:
+                return posizione
+        indice = coda.rfind(b"OggS", 0, indice)
+    return None
+
+
+def _leggi_formato_ogg(file_path: Path, logger=_default_logger) -> InfoFormato:
+    """
+    Ogg Vorbis e Opus: ricompone solo i pacchetti di identificazione e dei commenti dalle prime
+    pagine e ricava la durata dalla posizione dell'ultima pagina, letta in coda al file.
+    """
+    with open(file_path, 'rb', buffering=0) as f:
+        testa = f.read(DIMENSIONE_LETTURA_TAG)
+        if testa[:4] != b"OggS":
+            raise FormatoDiverso(testa)
+        dimensione_file = os.fstat(f.fileno()).st_size
+        (identificazione, commenti), fine_intestazioni, seriale = _pacchetti_ogg(f, testa, 2)
+        campioni = _ultima_posizione_ogg(f, dimensione_file, seriale)
+
+    if identificazione[:7] == b"\x01vorbis" and commenti[:7] == b"\x03vorbis":
+        codec, frequenza, inizio_commenti = "vorbis", int.from_bytes(identificazione[12:16], "little"), 7
+    elif identificazione[:8] == b"OpusHead" and commenti[:8] == b"OpusTags":
+        codec, frequenza, inizio_commenti = "opus", 48000, 8 # Opus è sempre decodificato a 48 kHz
+        if campioni is not None:
+            campioni -= int.from_bytes(identificazione[10:12], "little") # Campioni di pre-skip
+    else:
+        raise TagNonGestito("flusso Ogg diverso da Vorbis e Opus")
+    titolo, artista = _leggi_commenti_vorbis(commenti, inizio_commenti)
+
+    durata = campioni / frequenza if campioni and campioni > 0 and frequenza else None
+    _conta("tag dal lettore rapido")
+    return InfoFormato(titolo, artista, codec, _bitrate_medio(dimensione_file - fine_intestazioni, durata),
+                       frequenza or None, None, round(durata, 3) if durata else None)
+
+
+_CODEC_MP4 = {b"mp4a": "aac", b"alac": "alac", b"fLaC": "flac", b"Opus": "opus"}
+
+
+def _atomi_mp4(dati: bytes, inizio: int, fine: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Genera (tipo, inizio del contenuto, fine) degli atomi MP4 contenuti in dati[inizio:fine]."""
+    while inizio + 8 <= fine:
+        dimensione = int.from_bytes(dati[inizio:inizio + 4], "big")
+        contenuto = inizio + 8
+        if dimensione == 1: # Dimensione a 64 bit
+            dimensione = int.from_bytes(dati[inizio + 8:inizio + 16], "big")
+            contenuto += 8
+        elif dimensione == 0: # Fino alla fine del contenitore
+            dimensione = fine - inizio
+        if dimensione < contenuto - inizio or inizio + dimensione > fine:
+            raise TagNonGestito("atomo MP4 non valido")
+        yield dati[inizio + 4:inizio + 8], contenuto, inizio + dimensione
+        inizio += dimensione
+
+
+def _atomo_mp4(dati: bytes, inizio: int, fine: int, *percorso: bytes) -> Optional[Tuple[int, int]]:
+    """(inizio del contenuto, fine) del primo atomo raggiungibile seguendo `percorso`, es. (b"udta", b"meta")."""
+    for tipo, contenuto, termine in _atomi_mp4(dati, inizio, fine):
+        if tipo != percorso[0]:
+            continue
+        if tipo == b"meta" and dati[contenuto + 4:contenuto + 8] != b"hdlr":
+            contenuto += 4 # Versione e flag (assenti nei file scritti da QuickTime)
+        if len(percorso) == 1:
+            return contenuto, termine
+        trovato = _atomo_mp4(dati, contenuto, termine, *percorso[1:])
+        if trovato is not None:
+            return trovato
+    return None
+
+
+def _durata_mp4(dati: bytes, inizio: int, fine: int) -> Optional[float]:
+    """Durata dal contenuto dati[inizio:fine] di un atomo mvhd o mdhd (versione 0 con campi a 32 bit, versione 1 a 64 bit)."""
+    if fine - inizio < (32 if dati[inizio:inizio + 1] == b"\x01" else 20):
+        raise TagNonGestito("atomo mvhd/mdhd troppo corto")
+    if dati[inizio] == 1:
+        scala, durata = int.from_bytes(dati[inizio + 20:inizio + 24], "big"), int.from_bytes(dati[inizio + 24:inizio + 32], "big")
+    else:
+        scala, durata = int.from_bytes(dati[inizio + 12:inizio + 16], "big"), int.from_bytes(dati[inizio + 16:inizio + 20], "big")
+    return durata / scala if scala and durata else None
+
+
+def _leggi_formato_mp4(file_path: Path, logger=_default_logger) -> InfoFormato:
+    """
+    MP4/M4A: scorre gli atomi principali saltando i dati audio (mdat) e legge solo moov, dove si
+    trovano durata e codec della traccia audio (mdhd, stsd) e titolo e artista (udta/meta/ilst).
+    """
+    with open(file_path, 'rb', buffering=0) as f:
+        testa = f.read(DIMENSIONE_LETTURA_TAG)
+        if testa[4:8] != b"ftyp":
+            raise FormatoDiverso(testa)
+        dimensione_file = os.fstat(f.fileno()).st_size
+        moov = None
+        posizione = 0
+        while moov is None and posizione + 8 <= dimensione_file:
+            header = _leggi_intervallo(f, testa, posizione, 16)
+            dimensione, lunghezza_header = int.from_bytes(header[:4], "big"), 8
+            if dimensione == 1:
+                dimensione, lunghezza_header = int.from_bytes(header[8:16], "big"), 16
+            elif dimensione == 0:
+                dimensione = dimensione_file - posizione
+            if dimensione < lunghezza_header:
+                raise TagNonGestito("atomo MP4 non valido")
+            if header[4:8] == b"moov":
+                if dimensione > MASSIMO_BYTE_INTESTAZIONI:
+                    raise TagNonGestito("atomo moov troppo grande")
+                moov = _leggi_intervallo(f, testa, posizione + lunghezza_header, dimensione - lunghezza_header)
+            posizione += dimensione
+    if moov is None:
+        raise TagNonGestito("atomo moov mancante")
+
+    codec = frequenza = durata = None
+    for tipo, inizio, fine in _atomi_mp4(moov, 0, len(moov)):
+        gestore = _atomo_mp4(moov, inizio, fine, b"mdia", b"hdlr") if tipo == b"trak" else None
+        if gestore is None or moov[gestore[0] + 8:gestore[0] + 12] != b"soun":
+            continue # Non è la traccia audio
+        mdhd = _atomo_mp4(moov, inizio, fine, b"mdia", b"mdhd")
+        durata = _durata_mp4(moov, *mdhd) if mdhd else None
+        stsd = _atomo_mp4(moov, inizio, fine, b"mdia", b"minf", b"stbl", b"stsd")
+        if stsd is not None:
+            voce = stsd[0] + 8 # Dopo versione, flag e numero di voci
+            codec = _CODEC_MP4.get(moov[voce + 4:voce + 8])
+            frequenza = int.from_bytes(moov[voce + 32:voce + 36], "big") >> 16 # Virgola fissa 16.16
+        break
+    if durata is None:
+        mvhd = _atomo_mp4(moov, 0, len(moov), b"mvhd")
+        durata = _durata_mp4(moov, *mvhd) if mvhd else None
+
+    valori: Dict[bytes, str] = {}
+    ilst = _atomo_mp4(moov, 0, len(moov), b"udta", b"meta", b"ilst") or _atomo_mp4(moov, 0, len(moov), b"meta", b"ilst")
+    for tipo, inizio, fine in _atomi_mp4(moov, *ilst) if ilst else ():
+        if tipo not in (b"\xa9nam", b"\xa9ART") or tipo in valori:
+            continue
+        data = _atomo_mp4(moov, inizio, fine, b"data")
+        if data is None:
+            continue
+        if moov[data[0]:data[0] + 4] != b"\x00\x00\x00\x01":
+            raise TagNonGestito("valore MP4 non in UTF-8")
+        try:
+            valori[tipo] = moov[data[0] + 8:data[1]].decode("utf-8") # Dopo tipo e lingua
+        except UnicodeDecodeError as e:
+            raise TagNonGestito(str(e)) from e
+
+    _conta("tag dal lettore rapido")
+    return InfoFormato(valori.get(b"\xa9nam"), valori.get(b"\xa9ART"), codec, _bitrate_medio(dimensione_file - len(moov), durata),
+                       frequenza or None, None, round(durata, 3) if durata else None)
+
+
+def _guid_asf(testo: str) -> bytes:
+    return uuid.UUID(testo).bytes_le # I GUID ASF sono memorizzati con i primi tre campi little-endian
+
+
+_ASF_INTESTAZIONE = _guid_asf("75B22630-668E-11CF-A6D9-00AA0062CE6C")
+_ASF_DESCRIZIONE = _guid_asf("75B22633-668E-11CF-A6D9-00AA0062CE6C")
+_ASF_PROPRIETA_FILE = _guid_asf("8CABDCA1-A947-11CF-8EE4-00C00C205365")
+_ASF_PROPRIETA_FLUSSO = _guid_asf("B7DC0791-A9B7-11CF-8EE6-00C00C205365")
+_ASF_FLUSSO_AUDIO = _guid_asf("F8699E40-5B4D-11CF-A8FD-00805F5C442B")
+_ASF_WMA_LOSSLESS = 0x0163 # wFormatTag di WAVEFORMATEX
+
+
+def _testo_asf(dati: bytes) -> Optional[str]:
+    try:
+        return dati.decode("utf-16-le").split("\x00")[0] or None
+    except UnicodeDecodeError as e:
+        raise TagNonGestito(str(e)) from e
+
+
+def _leggi_formato_asf(file_path: Path, logger=_default_logger) -> InfoFormato:
+    """
+    WMA (ASF): legge solo l'oggetto di intestazione, da cui servono la descrizione del contenuto
+    (titolo e autore), le proprietà del file (durata) e quelle del flusso audio (codec e frequenza).
+    """
+    with open(file_path, 'rb', buffering=0) as f:
+        testa = f.read(DIMENSIONE_LETTURA_TAG)
+        if testa[:16] != _ASF_INTESTAZIONE:
+            raise FormatoDiverso(testa)
+        dimensione_intestazione = int.from_bytes(testa[16:24], "little")
+        if dimensione_intestazione > MASSIMO_BYTE_INTESTAZIONI:
+            raise TagNonGestito("intestazione ASF troppo grande")
+        intestazione = _leggi_intervallo(f, testa, 0, dimensione_intestazione)
+
+    titolo = artista = codec = frequenza = bitrate = durata = None
+    posizione = 30 # GUID, dimensione, numero di oggetti e due byte riservati
+    while posizione + 24 <= len(intestazione):
+        guid = intestazione[posizione:posizione + 16]
+        dimensione = int.from_bytes(intestazione[posizione + 16:posizione + 24], "little")
+        if dimensione < 24:
+            raise TagNonGestito("oggetto ASF non valido")
+        oggetto = intestazione[posizione:posizione + dimensione]
+        posizione += dimensione
+        if guid == _ASF_DESCRIZIONE: # Cinque lunghezze a 16 bit, poi i testi UTF-16
+            lunghezza_titolo = int.from_bytes(oggetto[24:26], "little")
+            lunghezza_autore = int.from_bytes(oggetto[26:28], "little")
+            titolo = _testo_asf(oggetto[34:34 + lunghezza_titolo])
+            artista = _testo_asf(oggetto[34 + lunghezza_titolo:34 + lunghezza_titolo + lunghezza_autore])
+        elif guid == _ASF_PROPRIETA_FILE: # Durata in unità da 100 ns, preroll in millisecondi
+            durata = max(int.from_bytes(oggetto[64:72], "little") / 10**7 - int.from_bytes(oggetto[80:88], "little") / 1000, 0.0)
+        elif guid == _ASF_PROPRIETA_FLUSSO and oggetto[24:40] == _ASF_FLUSSO_AUDIO and codec is None:
+            formato = oggetto[78:94] # WAVEFORMATEX: formato, canali, frequenza, byte al secondo
+            codec = "wmalossless" if int.from_bytes(formato[0:2], "little") == _ASF_WMA_LOSSLESS else "wma"
+            frequenza = int.from_bytes(formato[4:8], "little")
+            bitrate = round(int.from_bytes(formato[8:12], "little") * 8 / 1000)
+
+    _conta("tag dal lettore rapido")
+    return InfoFormato(titolo, artista, codec, bitrate or None, frequenza or None, None, round(durata, 3) if durata else None)
+
+
+registra_lettore(LettoreFormato("MP3", (".mp3",), _leggi_formato_mp3))
+registra_lettore(LettoreFormato("FLAC", (".flac",), _leggi_formato_flac, ((0, b"fLaC"),)))
+registra_lettore(LettoreFormato("MP4", (".m4a", ".m4b"), _leggi_formato_mp4, ((4, b"ftyp"),)))
+registra_lettore(LettoreFormato("Ogg", (".ogg", ".oga", ".opus"), _leggi_formato_ogg, ((0, b"OggS"),)))
+registra_lettore(LettoreFormato("WMA", (".wma",), _leggi_formato_asf, ((0, _ASF_INTESTAZIONE),)))
+
+
+# --- Libreria colonnare: testi condivisi, colonne in array e viste con __slots__ ---
+
+class TabellaTesti:
+    """
+    Ogni testo distinto è memorizzato una sola volta e indicato da un intero; l'indice 0 è None.
+    Gli artisti, i titoli e le cartelle si ripetono su migliaia di file: la tabella ne conserva
+    una copia e le colonne della libreria contengono solo gli indici.
+    """
+    __slots__ = ('_testi', '_indici')
+
+    def __init__(self):
+        self._testi: List[Optional[str]] = [None]
+        self._indici: Dict[Optional[str], int] = {None: 0}
+
+    def indice(self, testo: Optional[str]) -> int:
+        indice = self._indici.get(testo)
+        if indice is None:
+            indice = len(self._testi)
+            self._testi.append(testo)
+            self._indici[testo] = indice
+        return indice
+
+    def __getitem__(self, indice: int) -> Optional[str]:
+        return self._testi[indice]
+
+    def __len__(self) -> int:
+        return len(self._testi) - 1
+
+
+class LibreriaColonnare:
+    """
+    I file analizzati in forma compatta: ogni file è un intero (il suo id, nell'ordine di
+    aggiunta) e ogni campo di `MusicFile` è una colonna. I testi sono indici in una `TabellaTesti`
+    condivisa, il percorso è l'indice della cartella nella tabella dei percorsi più il nome del
+    file, i numeri sono `array` (0 per bitrate e frequenza assenti, -1 per vbr, NaN per la durata).
+    Un milione di brani occupa così una frazione della memoria di un milione di `MusicFile`, e i
+    pianificatori raggruppano per coppie di interi invece di confrontare stringhe.
+    `vista(id)` restituisce un oggetto con gli stessi attributi di `MusicFile`, `music_file(id)`
+    ricostruisce il `MusicFile` originale.
+    """
+    def __init__(self):
+        self.testi = TabellaTesti()
+        self.cartelle = TabellaTesti()
+        self._cartella = array('I')
+        self._nome: List[str] = []
+        self._artista = array('I')
+        self._titolo = array('I')
+        self._titolo_base = array('I')
+        self._versione = array('I')
+        self._sorgente = array('I')
+        self._impronta = array('I')
+        self._dimensione = array('q')
+        self._bitrate = array('I')
+        self._frequenza = array('I')
+        self._vbr = array('b')
+        self._durata = array('d')
+        self._codec = array('I')
+        self._senza_accenti: Dict[int, int] = {} # Indice di un testo -> indice del testo senza accenti
+
+    @classmethod
+    def da_music_file(cls, file_musicali: Iterable[MusicFile]) -> "LibreriaColonnare":
+        libreria = cls()
+        for mf in file_musicali:
+            libreria.aggiungi(mf)
+        return libreria
+
+    def aggiungi(self, mf: MusicFile) -> int:
+        """Aggiunge un file e ne restituisce l'id."""
+        testi = self.testi
+        self._cartella.append(self.cartelle.indice(str(mf.path.parent)))
+        self._nome.append(mf.path.name)
+        self._artista.append(testi.indice(mf.artista_norm))
+        self._titolo.append(testi.indice(mf.titolo_norm))
+        self._titolo_base.append(testi.indice(mf.titolo_base_norm))
+        self._versione.append(testi.indice(mf.tag_versione))
+        self._sorgente.append(testi.indice(mf.sorgente_info))
+        self._impronta.append(testi.indice(mf.impronta_audio))
+        self._dimensione.append(mf.dimensione)
+        self._bitrate.append(mf.bitrate_kbps or 0)
+        self._frequenza.append(mf.frequenza or 0)
+        self._vbr.append(-1 if mf.vbr is None else int(mf.vbr))
+        self._durata.append(float('nan') if mf.durata is None else mf.durata)
+        self._codec.append(testi.indice(mf.codec))
+        return len(self._nome) - 1
+
+    def __len__(self) -> int:
+        return len(self._nome)
+
+    def ids(self) -> List[int]:
+        return list(range(len(self._nome)))
+
+    def percorso(self, id_file: int) -> Path:
+        return Path(self.cartelle[self._cartella[id_file]], self._nome[id_file])
+
+    def nome(self, id_file: int) -> str:
+        return self._nome[id_file]
+
+    def _indice_senza_accenti(self, indice: int) -> int:
+        # Calcolato una volta per testo distinto, non per file
+        senza_accenti = self._senza_accenti.get(indice)
+        if senza_accenti is None:
+            testo = self.testi[indice]
+            senza_accenti = self.testi.indice(rimuovi_accenti(testo) if testo else testo)
+            self._senza_accenti[indice] = senza_accenti
+        return senza_accenti
+
+    def chiave_brano(self, id_file: int, senza_accenti: bool = False) -> Tuple[int, int]:
+        """(artista, titolo) come indici: file con la stessa chiave sono duplicati."""
+        if senza_accenti:
+            return self._indice_senza_accenti(self._artista[id_file]), self._indice_senza_accenti(self._titolo[id_file])
+        return self._artista[id_file], self._titolo[id_file]
+
+    def chiave_titolo_base(self, id_file: int, senza_accenti: bool = False) -> Tuple[int, int]:
+        """(artista, titolo base) come indici: file con la stessa chiave sono versioni dello stesso brano."""
+        if senza_accenti:
+            return self._indice_senza_accenti(self._artista[id_file]), self._indice_senza_accenti(self._titolo_base[id_file])
+        return self._artista[id_file], self._titolo_base[id_file]
+
+    def vista(self, id_file: int) -> "VoceLibreria":
+        return VoceLibreria(self, id_file)
+
+    def music_file(self, id_file: int) -> MusicFile:
+        vista = self.vista(id_file)
+        return MusicFile(*(getattr(vista, campo.name) for campo in fields(MusicFile)))
+
+    def __iter__(self) -> Iterator["VoceLibreria"]:
+        return (VoceLibreria(self, id_file) for id_file in range(len(self._nome)))
+
+
+class VoceLibreria:
+    """Un file di una `LibreriaColonnare`, con gli attributi di `MusicFile` letti dalle colonne."""
+    __slots__ = ('libreria', 'id')
+
+    def __init__(self, libreria: LibreriaColonnare, id_file: int):
+        self.libreria = libreria
+        self.id = id_file
+
+    path = property(lambda self: self.libreria.percorso(self.id))
+    artista_norm = property(lambda self: self.libreria.testi[self.libreria._artista[self.id]])
+    titolo_norm = property(lambda self: self.libreria.testi[self.libreria._titolo[self.id]])
+    titolo_base_norm = property(lambda self: self.libreria.testi[self.libreria._titolo_base[self.id]])
+    tag_versione = property(lambda self: self.libreria.testi[self.libreria._versione[self.id]])
+    sorgente_info = property(lambda self: self.libreria.testi[self.libreria._sorgente[self.id]])
+    impronta_audio = property(lambda self: self.libreria.testi[self.libreria._impronta[self.id]])
+    dimensione = property(lambda self: self.libreria._dimensione[self.id])
+    bitrate_kbps = property(lambda self: self.libreria._bitrate[self.id] or None)
+    frequenza = property(lambda self: self.libreria._frequenza[self.id] or None)
+    vbr = property(lambda self: None if self.libreria._vbr[self.id] < 0 else bool(self.libreria._vbr[self.id]))
+    codec = property(lambda self: self.libreria.testi[self.libreria._codec[self.id]])
+
+    @property
+    def durata(self) -> Optional[float]:
+        durata = self.libreria._durata[self.id]
+        return None if durata != durata else durata # NaN: durata assente
+
+    def __eq__(self, altro):
+        return isinstance(altro, VoceLibreria) and altro.libreria is self.libreria and altro.id == self.id
+
+    def __hash__(self):
+        return hash((id(self.libreria), self.id))
+
+    def __repr__(self):
+        return f"VoceLibreria({self.id}, {self.path!s})"
+
+
+# --- Nomi liberi nelle cartelle di destinazione ---
+
+class RisolutoreNomi:
+    """
+    Sceglie un nome libero per ogni file da spostare, con la stessa regola dell'esecuzione
+    storica (se "nome.mp3" esiste già, il primo libero tra "nome_1.mp3", "nome_2.mp3", ...),
+    ma senza uno stat per ogni tentativo: ogni cartella di destinazione viene letta una sola
+    volta con `os.scandir` e i nomi assegnati vengono aggiunti all'elenco in memoria. Per ogni
+    nome ricorda anche l'ultimo suffisso assegnato, così 300 copie di "01 - Intro.mp3" costano
+    O(n) invece di O(n²). I nomi sono confrontati con `os.path.normcase` (senza maiuscole su Windows).
+    Thread-safe.
+    """
+    def __init__(self):
+        self._nomi: Dict[Path, Set[str]] = {}
+        self._prossimo_suffisso: Dict[Tuple[Path, str], int] = {}
+        self._lock = threading.Lock()
+
+    def _nomi_in(self, cartella: Path) -> Set[str]:
+        nomi = self._nomi.get(cartella)
+        if nomi is None:
+            _conta("scandir")
+            try:
+                with os.scandir(cartella) as voci:
+                    nomi = {os.path.normcase(voce.name) for voce in voci}
+            except (FileNotFoundError, NotADirectoryError):
+                nomi = set()
+            self._nomi[cartella] = nomi
+        return nomi
+
+    @_profilata("RisolutoreNomi.risolvi")
+    def risolvi(self, destinazione: Path) -> Path:
+        """Restituisce `destinazione` o, se il nome è già occupato, la prima variante _N libera, e la riserva."""
+        cartella, nome = destinazione.parent, destinazione.name
+        with self._lock:
+            nomi = self._nomi_in(cartella)
+            chiave = os.path.normcase(nome)
+            if chiave not in nomi:
+                nomi.add(chiave)
+                return destinazione
+            # I nomi vengono solo aggiunti: i suffissi già provati restano occupati
+            stem, estensione = os.path.splitext(nome)
+            suffisso = self._prossimo_suffisso.get((cartella, chiave), 1)
+            while os.path.normcase(f"{stem}_{suffisso}{estensione}") in nomi:
+                suffisso += 1
+            self._prossimo_suffisso[(cartella, chiave)] = suffisso + 1
+            nomi.add(os.path.normcase(f"{stem}_{suffisso}{estensione}"))
+            return cartella / f"{stem}_{suffisso}{estensione}"
+
+
+def risolvi_destinazioni(piano: List[SpostaFileAzione], risolutore: Optional[RisolutoreNomi] = None) -> List[SpostaFileAzione]:
+    """Rende esatte le destinazioni del piano (nell'ordine del piano), come le sceglierebbe l'esecuzione."""
+    risolutore = risolutore or RisolutoreNomi()
+    risolte = []
+    for azione in piano:
+        destinazione = risolutore.risolvi(azione.destinazione)
+        risolte.append(azione if destinazione == azione.destinazione else replace(azione, destinazione=destinazione))
+    return risolte
+
+
+def scansiona_cartella(cartella_path: Path, cartella_non_conformi_path: Path, logger=_default_logger, progress_callback=None, opzioni: Optional[OpzioniAnalisi] = None, cartelle_escluse: Iterable[Path] = ()) -> Tuple[List[MusicFile], List[SpostaFileAzione]]:
+    """
+    Come `scansiona_libreria`, ma restituisce una lista di oggetti MusicFile per i file audio validi.
+    """
+    libreria, azioni_non_conformi = scansiona_libreria(cartella_path, cartella_non_conformi_path, logger, progress_callback, opzioni, cartelle_escluse)
+    return [libreria.music_file(id_file) for id_file in range(len(libreria))], azioni_non_conformi
+
+
+def scansiona_libreria(cartella_path: Path, cartella_non_conformi_path: Path, logger=_default_logger, progress_callback=None, opzioni: Optional[OpzioniAnalisi] = None, cartelle_escluse: Iterable[Path] = ()) -> Tuple[LibreriaColonnare, List[SpostaFileAzione]]:
+    """
+    Scansiona la cartella e restituisce i file audio validi in una `LibreriaColonnare` (gli id
+    seguono l'ordine di scansione) e le azioni di spostamento dei file video/non conformi
+    (motivazione "Non Conforme", destinazione ancora da risolvere con `risolvi_destinazioni`).
+    La scansione è in sola lettura: nessun file viene spostato, se ne occupa l'esecuzione del piano.
+    La visita è in streaming (`PercorsoCartella`): il totale passato a `progress_callback`
+    è il numero di file audio trovati finora e diventa esatto a visita completata.
+    `progress_callback` può essere una funzione (corrente, totale) o un `MonitorAvanzamento`,
+    che riceve anche l'avanzamento della visita (fase "visita") oltre all'analisi ("analisi").
+    La cartella dei non conformi e le `cartelle_escluse` (es. DOPPIONI) non vengono visitate.
+    Con `opzioni.usa_cache` i file invariati dall'ultima scansione vengono letti dalla cache.
+    """
+    opzioni = opzioni or OpzioniAnalisi()
+    monitor = MonitorAvanzamento.da_callback(progress_callback)
+    libreria = LibreriaColonnare()
+    statistiche_memo_iniziali = MEMO_NORMALIZZAZIONE.statistiche()
+    file_supportati = set(LETTORI_FORMATO)
+    azioni_non_conformi: List[SpostaFileAzione] = []
+    contatore_file_audio_analizzati = 0
+
+    logger(f"Inizio scansione di: {cartella_path}")
+    logger(f"I file non audio o identificati come 'video' verranno spostati in: {cartella_non_conformi_path}")
+
+    # Il database della cache (e i suoi file di journal) non fa parte della libreria.
+    prefissi_esclusi = (NOME_FILE_CACHE,) + ((opzioni.percorso_cache.name,) if opzioni.percorso_cache else ())
+    visita = PercorsoCartella(
+        cartella_path,
+        cartelle_escluse=[cartella_non_conformi_path, *cartelle_escluse],
+        prefissi_esclusi=prefissi_esclusi,
+        estensioni_contate=file_supportati
+    )
+
+    def _visita_monitorata():
+        # Eseguita nel thread di _in_anticipo: la durata della fase è quella della sola visita
+        monitor.inizia_fase("visita")
+        for voce in visita:
+            monitor.avanza("visita")
+            yield voce
+        monitor.termina_fase("visita")
+
+    def _voci_audio():
+        """Pianifica lo spostamento dei file non conformi incontrati e genera solo le voci dei file audio."""
+        for voce in _in_anticipo(_visita_monitorata()):
+            # Fase 1: Identificazione dei file non conformi/video
+            stem, estensione = os.path.splitext(voce.name)
+            is_video = identifica_come_video(stem)
+            is_audio_supportato = estensione.lower() in file_supportati
+
+            if not (is_video or not is_audio_supportato):
+                yield voce
+                continue
+
+            if is_video:
+                logger(f"  -> Identificato come file di tipo video/non conforme: '{voce.name}'")
+            else: # File non supportato
+                logger(f"  -> File non supportato, trattato come non conforme: '{voce.name}'")
+
+            azioni_non_conformi.append(SpostaFileAzione(
+                sorgente=Path(voce.path),
+                destinazione=cartella_non_conformi_path / voce.name,
+                motivazione="Non Conforme"
+            ))
+
+    cache = _apri_cache(cartella_path, opzioni, logger)
+    try:
+        # Fase 2: Processamento file audio (in ordine, anche quando l'estrazione è parallela)
+        if opzioni.processi > 1:
+            logger(f"Analisi dei file con {opzioni.processi} processi paralleli.")
+        elif opzioni.workers > 1:
+            logger(f"Estrazione dei tag con {opzioni.workers} thread paralleli.")
+        monitor.inizia_fase("analisi", approssimato=True)
+        for file_path, info_file, messaggi in _estrai_info_file_in_ordine(_voci_audio(), cache, opzioni.workers, opzioni.processi, opzioni.impronta_audio):
+            contatore_file_audio_analizzati += 1
+            # Finché la visita non è conclusa il totale è approssimato per difetto
+            totale_file_audio = visita.file_contati
+            totale_testo = str(totale_file_audio) if visita.completato else f"~{totale_file_audio}"
+            logger(f"\n  Analizzo file audio {contatore_file_audio_analizzati}/{totale_testo} (Nome: {file_path.name})", flush=True)
+            monitor.avanza("analisi", totale=totale_file_audio, approssimato=not visita.completato)
+
+            for messaggio in messaggi:
+                logger(messaggio)
+            if info_file:
+                logger(f"    Normalizzati ({info_file.sorgente_info}): Artista='{info_file.artista_norm}', Titolo='{info_file.titolo_norm}'")
+                libreria.aggiungi(info_file)
+            else:
+                # I messaggi di _estrai_info_file hanno già dato dettagli
+                logger(f"    File {file_path.name} scartato per info insufficienti.")
+        monitor.termina_fase("analisi", totale=contatore_file_audio_analizzati)
+    finally:
+        if cache is not None:
+            cache.chiudi(rimuovi_obsoleti=visita.completato)
+            logger(f"Cache di scansione: {cache.hit} file invariati, {cache.miss} file nuovi o modificati.")
+    statistiche_memo = MEMO_NORMALIZZAZIONE.statistiche() - statistiche_memo_iniziali
+    if statistiche_memo.trovati or statistiche_memo.calcolati:
+        logger(f"Memo della normalizzazione: {statistiche_memo.trovati} testi già normalizzati riusati, {statistiche_memo.calcolati} calcolati, "
+               f"{statistiche_memo.scartati} scartati per il limite di {MEMO_NORMALIZZAZIONE.dimensione_massima} voci.")
+
+    for percorso, errore in visita.errori:
+        logger(f"ATTENZIONE: Impossibile leggere '{percorso}': {errore}")
+    if visita.file_trovati == 0:
+        logger("Nessun file trovato nella cartella. Termino la scansione.")
+        return libreria, azioni_non_conformi
+
+    logger(f"\nScansione file completata. Visitate {visita.cartelle_visitate} cartelle, trovati {visita.file_trovati} file, analizzati {contatore_file_audio_analizzati} file audio.")
+    if azioni_non_conformi:
+        logger(f"Pianificati {len(azioni_non_conformi)} spostamenti di file non conformi in '{cartella_non_conformi_path}'.")
+    else:
+        logger("Nessun file non conforme trovato.")
+
+    return libreria, azioni_non_conformi
+
+DIMENSIONE_BLOCCO_HASH = 64 * 1024 # Blocchi iniziale e finale letti per l'hash parziale
+DIMENSIONE_BUFFER_HASH = 1024 * 1024 # Buffer di lettura per l'hash completo
+
+
+@_profilata("hash parziale")
+def _hash_parziale(file_path: Path, dimensione: int) -> bytes:
+    """Hash del primo e dell'ultimo blocco del file (dell'intero file se è piccolo)."""
+    hasher = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        hasher.update(f.read(DIMENSIONE_BLOCCO_HASH))
+        if dimensione > 2 * DIMENSIONE_BLOCCO_HASH:
+            f.seek(dimensione - DIMENSIONE_BLOCCO_HASH)
+        hasher.update(f.read(DIMENSIONE_BLOCCO_HASH))
+    return hasher.digest()
+
+
+@_profilata("hash completo")
+def _hash_completo(file_path: Path) -> bytes:
+    """Hash dell'intero contenuto del file, letto in streaming."""
+    hasher = hashlib.blake2b(digest_size=32)
+    buffer = bytearray(DIMENSIONE_BUFFER_HASH)
+    vista = memoryview(buffer)
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            letti = f.readinto(buffer)
+            if not letti:
+                break
+            hasher.update(vista[:letti])
+    return hasher.digest()
+
+
+def _raggruppa_per_hash(candidati: List[MusicFile], funzione_hash, workers: int, logger=_default_logger, monitor: Optional[MonitorAvanzamento] = None, byte_letti=None, conta_file: bool = True) -> List[List[MusicFile]]:
+    """
+    Calcola `funzione_hash` sui candidati (in parallelo se workers > 1) e restituisce i gruppi con più di un file.
+    Con `monitor`, ogni file avanza la fase "hash" dei byte letti (`byte_letti(mf)`).
+    """
+    def _calcola(mf):
+        try:
+            impronta = funzione_hash(mf)
+            if monitor is not None:
+                monitor.avanza("hash", 1 if conta_file else 0, byte=byte_letti(mf) if byte_letti else 0)
+            return impronta
+        except OSError as e:
+            logger(f"    ATTENZIONE: Impossibile leggere {mf.path.name} per il confronto del contenuto: {e}")
+            return None
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            impronte = list(pool.map(_calcola, candidati))
+    else:
+        impronte = [_calcola(mf) for mf in candidati]
+
+    gruppi: Dict[bytes, List[MusicFile]] = defaultdict(list)
+    for mf, impronta in zip(candidati, impronte):
+        if impronta is not None:
+            gruppi[impronta].append(mf)
+    return [gruppo for gruppo in gruppi.values() if len(gruppo) > 1]
+
+
+def trova_gruppi_contenuto_identico(file_musicali: List[MusicFile], workers: int = 1, logger=_default_logger, monitor: Optional[MonitorAvanzamento] = None) -> List[List[MusicFile]]:
+    """
+    Trova i gruppi di file con contenuto identico byte per byte, come fdupes:
+    1. raggruppa per dimensione (nessuna lettura);
+    2. nei gruppi con la stessa dimensione confronta l'hash del primo e dell'ultimo blocco;
+    3. solo per i file che collidono ancora calcola l'hash dell'intero contenuto.
+    Così l'I/O è proporzionale ai veri candidati, non alla dimensione della libreria.
+    I file vuoti vengono ignorati. L'ordine dei file nei gruppi segue quello di `file_musicali`.
+    Con `monitor` la fase "hash" conta i file con l'hash parziale (il totale è noto dopo il
+    passo 1) e i byte letti da entrambi i passi.
+    """
+    per_dimensione: Dict[int, List[MusicFile]] = defaultdict(list)
+    for mf in file_musicali:
+        if mf.dimensione > 0:
+            per_dimensione[mf.dimensione].append(mf)
+
+    if monitor is not None:
+        monitor.inizia_fase("hash", totale=sum(len(c) for c in per_dimensione.values() if len(c) > 1))
+    byte_parziali = lambda mf: min(mf.dimensione, 2 * DIMENSIONE_BLOCCO_HASH)
+    gruppi_identici: List[List[MusicFile]] = []
+    for dimensione, candidati in per_dimensione.items():
+        if len(candidati) < 2:
+            continue
+        for gruppo in _raggruppa_per_hash(candidati, lambda mf: _hash_parziale(mf.path, mf.dimensione), workers, logger, monitor, byte_parziali):
+            if dimensione <= 2 * DIMENSIONE_BLOCCO_HASH:
+                # L'hash parziale ha già coperto l'intero file
+                gruppi_identici.append(gruppo)
+            else:
+                gruppi_identici.extend(_raggruppa_per_hash(gruppo, lambda mf: _hash_completo(mf.path), workers, logger,
+                                                           monitor, lambda mf: mf.dimensione, conta_file=False))
+    if monitor is not None:
+        monitor.termina_fase("hash")
+    return gruppi_identici
+
+
+def trova_gruppi_stesso_audio(file_musicali: List[MusicFile]) -> List[List[MusicFile]]:
+    """
+    Raggruppa i file con la stessa `impronta_audio`: stesso flusso audio anche se tag e
+    dimensione differiscono. I file senza impronta vengono ignorati.
+    """
+    per_impronta: Dict[str, List[MusicFile]] = defaultdict(list)
+    for mf in file_musicali:
+        if mf.impronta_audio:
+            per_impronta[mf.impronta_audio].append(mf)
+    return [gruppo for gruppo in per_impronta.values() if len(gruppo) > 1]
+
+
+def pianifica_spostamento_duplicati_esatti(file_musicali: List[MusicFile], cartella_duplicati_path: Path, logger=_default_logger, workers: int = 1, confronta_contenuto: bool = True, monitor: Optional[MonitorAvanzamento] = None) -> Tuple[List[SpostaFileAzione], List[MusicFile]]:
+    """Come `pianifica_spostamento_duplicati_esatti_libreria`, per una lista di MusicFile: restituisce le azioni e i file rimasti."""
+    file_musicali = list(file_musicali)
+    libreria = LibreriaColonnare.da_music_file(file_musicali)
+    azioni, rimasti = pianifica_spostamento_duplicati_esatti_libreria(libreria, libreria.ids(), cartella_duplicati_path, logger,
+                                                                      workers, confronta_contenuto, monitor)
+    return azioni, [file_musicali[id_file] for id_file in rimasti]
+
+
+def pianifica_spostamento_duplicati_esatti_libreria(libreria: LibreriaColonnare, ids: List[int], cartella_duplicati_path: Path, logger=_default_logger, workers: int = 1, confronta_contenuto: bool = True, monitor: Optional[MonitorAvanzamento] = None) -> Tuple[List[SpostaFileAzione], List[int]]:
+    """
+    Pianifica lo spostamento delle copie con lo stesso audio o contenuto identico, indipendentemente dai tag.
+    1. I file con la stessa `impronta_audio` (se calcolata) sono lo stesso brano con tag diversi:
+       viene mantenuto quello con i tag ID3 e, a parità, il più grande (tag più completi).
+    2. Se `confronta_contenuto` è True, tra i file senza impronta si cercano le copie identiche
+       byte per byte; per ogni gruppo viene mantenuto il primo file (in ordine di scansione).
+    Restituisce le azioni e gli id dei file rimasti, da passare agli altri pianificatori.
+    """
+    logger("\n--- Inizio Ricerca Duplicati con Contenuto Identico ---")
+    azioni: List[SpostaFileAzione] = []
+    da_spostare: Set[int] = set()
+
+    def _pianifica_gruppo(file_da_mantenere: VoceLibreria, gruppo: List[VoceLibreria], motivazione: str):
+        logger(f"    -> Da Mantenere: {libreria.nome(file_da_mantenere.id)}")
+        for mf_da_spostare in gruppo:
+            if mf_da_spostare.id == file_da_mantenere.id:
+                continue
+            destinazione_proposta = cartella_duplicati_path / libreria.nome(mf_da_spostare.id)
+            azioni.append(SpostaFileAzione(
+                sorgente=libreria.percorso(mf_da_spostare.id),
+                destinazione=destinazione_proposta,
+                motivazione=motivazione
+            ))
+            da_spostare.add(mf_da_spostare.id)
+            logger(f"    -> Da Spostare: {libreria.nome(mf_da_spostare.id)} -> {destinazione_proposta}")
+
+    viste = [libreria.vista(id_file) for id_file in ids]
+    for gruppo in trova_gruppi_stesso_audio(viste):
+        file_da_mantenere = max(gruppo, key=lambda mf: (mf.sorgente_info == "ID3", mf.dimensione))
+        logger(f"Stesso audio (tag diversi) per {len(gruppo)} file.")
+        _pianifica_gruppo(file_da_mantenere, gruppo, "Duplicato Audio")
+
+    if confronta_contenuto:
+        # Due file identici byte per byte hanno la stessa impronta: restano da confrontare solo quelli senza
+        senza_impronta = [mf for mf in viste if not mf.impronta_audio]
+        for gruppo in trova_gruppi_contenuto_identico(senza_impronta, workers, logger, monitor):
+            logger(f"Contenuto identico ({gruppo[0].dimensione} bytes) per {len(gruppo)} file.")
+            _pianifica_gruppo(gruppo[0], gruppo, "Duplicato Esatto")
+
+    logger(f"Pianificate {len(azioni)} azioni di spostamento per duplicati con contenuto identico.")
+    return azioni, [id_file for id_file in ids if id_file not in da_spostare]
+
+
+def pianifica_spostamento_duplicati(file_musicali: List[MusicFile], cartella_duplicati_path: Path, logger=_default_logger, criteri_conservazione: Iterable[str] = POLITICHE_CONSERVAZIONE["dimensione"], ignora_accenti: bool = False) -> Tuple[List[SpostaFileAzione], Set[MusicFile]]:
+    """Come `pianifica_spostamento_duplicati_libreria`, per una lista di MusicFile: restituisce le azioni e il set dei file mantenuti."""
+    file_musicali = list(file_musicali)
+    libreria = LibreriaColonnare.da_music_file(file_musicali)
+    azioni, mantenuti = pianifica_spostamento_duplicati_libreria(libreria, libreria.ids(), cartella_duplicati_path, logger, criteri_conservazione, ignora_accenti)
+    return azioni, {file_musicali[id_file] for id_file in mantenuti}
+
+
+def pianifica_spostamento_duplicati_libreria(libreria: LibreriaColonnare, ids: List[int], cartella_duplicati_path: Path, logger=_default_logger, criteri_conservazione: Iterable[str] = POLITICHE_CONSERVAZIONE["dimensione"], ignora_accenti: bool = False) -> Tuple[List[SpostaFileAzione], List[int]]:
+    """
+    Analizza i file `ids` della libreria e pianifica lo spostamento dei duplicati.
+    NON esegue lo spostamento, ma restituisce una lista di azioni da compiere e gli id dei
+    file mantenuti (in ordine di scansione).
+    In ogni gruppo viene mantenuto il file migliore secondo `criteri_conservazione`
+    (a parità, il primo in ordine di scansione). I gruppi sono formati sugli indici di artista
+    e titolo nella tabella dei testi, senza confrontare le stringhe; con `ignora_accenti` sugli
+    indici dei testi senza accenti.
+    """
+    logger("\n--- Inizio Pianificazione Spostamento Duplicati ---")
+    azioni: List[SpostaFileAzione] = []
+    file_mantenuti: List[int] = []
+
+    chiave = chiave_conservazione(criteri_conservazione)
+    brani_identificati: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for id_file in ids:
+        brani_identificati[libreria.chiave_brano(id_file, ignora_accenti)].append(id_file)
+
+    for ids_in_gruppo in brani_identificati.values():
+        if len(ids_in_gruppo) == 1:
+            file_mantenuti.append(ids_in_gruppo[0])
+            continue
+
+        files_in_gruppo = [libreria.vista(id_file) for id_file in ids_in_gruppo]
+        logger(f"Brano: Artista='{files_in_gruppo[0].artista_norm}', Titolo='{files_in_gruppo[0].titolo_norm}' - Trovati {len(files_in_gruppo)} file (potenziali duplicati).")
+
+        file_da_mantenere = max(files_in_gruppo, key=chiave)
+        file_mantenuti.append(file_da_mantenere.id)
+        # Solo le caratteristiche note: i lettori dei vari formati possono non ricavarne alcune
+        parti_audio = []
+        if file_da_mantenere.bitrate_kbps:
+            parti_audio.append(f"{file_da_mantenere.bitrate_kbps} kbps{' VBR' if file_da_mantenere.vbr else ''}")
+        if file_da_mantenere.frequenza:
+            parti_audio.append(f"{file_da_mantenere.frequenza} Hz")
+        if file_da_mantenere.durata is not None:
+            parti_audio.append(f"{file_da_mantenere.durata:.0f} s")
+        dettagli_audio = "".join(f", {parte}" for parte in parti_audio)
+        logger(f"    -> Da Mantenere: {libreria.nome(file_da_mantenere.id)} (Dimensione: {file_da_mantenere.dimensione} bytes{dettagli_audio})")
+
+        for id_file in ids_in_gruppo:
+            if id_file != file_da_mantenere.id:
+                # La gestione di nomi duplicati nella destinazione verrà fatta dall'esecutore del piano
+                destinazione_proposta = cartella_duplicati_path / libreria.nome(id_file)
+                azione = SpostaFileAzione(
+                    sorgente=libreria.percorso(id_file),
+                    destinazione=destinazione_proposta,
+                    motivazione="Duplicato"
+                )
+                azioni.append(azione)
+                logger(f"    -> Da Spostare: {libreria.nome(id_file)} -> {destinazione_proposta}")
+
+    file_mantenuti.sort()
+    logger(f"Pianificate {len(azioni)} azioni di spostamento per duplicati.")
+    return azioni, file_mantenuti
+
+def _cartella_gruppo_da_verificare(cartella_base_da_verificare_path: Path, artista_norm: str, titolo_base: str) -> Path:
+    """Sottocartella DA_VERIFICARE/<artista>/<titolo base> in cui raccogliere un gruppo di file."""
+    nome_cartella_artista = "".join(c for c in artista_norm if c.isalnum() or c in (' ', '_')).strip() or "ArtistaSconosciuto"
+    nome_cartella_titolo = "".join(c for c in titolo_base if c.isalnum() or c in (' ', '_')).strip() or "TitoloSconosciuto"
+    return cartella_base_da_verificare_path / nome_cartella_artista / nome_cartella_titolo
+
+def pianifica_spostamento_da_verificare(file_da_considerare: Set[MusicFile], cartella_base_da_verificare_path: Path, logger=_default_logger, ignora_accenti: bool = False) -> List[SpostaFileAzione]:
+    """Come `pianifica_spostamento_da_verificare_libreria`, per un set di MusicFile."""
+    libreria = LibreriaColonnare.da_music_file(file_da_considerare)
+    return pianifica_spostamento_da_verificare_libreria(libreria, libreria.ids(), cartella_base_da_verificare_path, logger, ignora_accenti)
+
+
+def pianifica_spostamento_da_verificare_libreria(libreria: LibreriaColonnare, ids: List[int], cartella_base_da_verificare_path: Path, logger=_default_logger, ignora_accenti: bool = False) -> List[SpostaFileAzione]:
+    """
+    Analizza i file `ids` della libreria e pianifica lo spostamento di gruppi di versioni
+    dello stesso brano per una revisione manuale. Con `ignora_accenti` artista e titolo base
+    sono confrontati senza accenti; la cartella del gruppo prende il nome dal primo file.
+    """
+    logger("\n--- Inizio Pianificazione File DA VERIFICARE ---")
+    azioni: List[SpostaFileAzione] = []
+    if not ids:
+        logger("Nessun file candidato per l'analisi DA VERIFICARE.")
+        return azioni
+
+    brani_per_base: Dict[Tuple[int, int], List[int]] = defaultdict(list)
+    for id_file in ids:
+        brani_per_base[libreria.chiave_titolo_base(id_file, ignora_accenti)].append(id_file)
+
+    for lista_brani in brani_per_base.values():
+        if len(lista_brani) > 1:
+            riferimento = libreria.vista(lista_brani[0])
+            artista_norm, titolo_base = riferimento.artista_norm, riferimento.titolo_base_norm
+            logger(f"  Gruppo DA VERIFICARE per Artista='{artista_norm}', Titolo Base='{titolo_base}' ({len(lista_brani)} file):")
+            
+            cartella_destinazione_gruppo = _cartella_gruppo_da_verificare(cartella_base_da_verificare_path, artista_norm, titolo_base)
+
+            for id_file in lista_brani:
+                destinazione_proposta = cartella_destinazione_gruppo / libreria.nome(id_file)
+                azione = SpostaFileAzione(
+                    sorgente=libreria.percorso(id_file),
+                    destinazione=destinazione_proposta,
+                    motivazione="Versione da Verificare"
+                )
+                azioni.append(azione)
+                logger(f"    - Pianificato spostamento per '{libreria.nome(id_file)}' in '{cartella_destinazione_gruppo}'")
+
+    logger(f"Pianificate {len(azioni)} azioni di spostamento per file DA VERIFICARE.")
+    return azioni
+
+
+# --- Raggruppamento per somiglianza (quasi-duplicati) ---
+
+FINESTRA_VICINATO_PREDEFINITA = 8
+_RE_FEAT_TRA_PARENTESI = re.compile(r'\s*[\(\[]\s*(?:feat|ft|featuring|with)\b[^\)\]]*[\)\]]')
+_RE_FEAT_IN_CODA = re.compile(r'\s+(?:feat|ft|featuring)\b.*$')
+_RE_ARTICOLO_INIZIALE = re.compile(r'^(?:the|i|il|lo|la|gli|le)\s+')
+_RE_NON_ALFANUMERICI = re.compile(r'[\W_]+')
+_RE_CIFRE = re.compile(r'\d+')
+
+
+def chiave_somiglianza(testo_normalizzato: str, togli_articolo: bool = False) -> str:
+    """
+    Riduce un testo già normalizzato alla forma usata per il confronto per somiglianza:
+    senza ospiti ("feat. ..."), con punteggiatura e trattini sostituiti da spazi e,
+    se `togli_articolo` (per gli artisti), senza articolo iniziale ("the beatles" -> "beatles").
+    """
+    testo = _RE_FEAT_TRA_PARENTESI.sub('', testo_normalizzato)
+    testo = _RE_FEAT_IN_CODA.sub('', testo)
+    testo = _RE_NON_ALFANUMERICI.sub(' ', testo).strip()
+    return _RE_ARTICOLO_INIZIALE.sub('', testo) if togli_articolo else testo
+
+
+class _VoceSomiglianza:
+    """Chiavi di confronto precalcolate per un file."""
+    __slots__ = ('artista', 'titolo', 'cifre')
+
+    def __init__(self, mf: MusicFile):
+        self.artista = chiave_somiglianza(mf.artista_norm, togli_articolo=True)
+        self.titolo = chiave_somiglianza(mf.titolo_base_norm) # Le versioni ("live", ...) sono gestite a parte
+        # Numeri diversi ("part 1" / "part 2", "no 5" / "no 9") indicano brani diversi
+        self.cifre = _RE_CIFRE.findall(self.artista + ' ' + self.titolo)
+
+
+def _rapporto_almeno(a: str, b: str, soglia: float) -> bool:
+    if a == b:
+        return True
+    minimo_comuni = soglia * (len(a) + len(b)) / 2
+    if min(len(a), len(b)) < minimo_comuni:
+        return False # Limite superiore del rapporto dato dalle sole lunghezze
+    # Limite superiore dato dai caratteri in comune (come `quick_ratio`, ma senza costruire
+    # dizionari e interrompendo il conteggio appena i caratteri mancanti sono troppi)
+    mancanti_ammessi = len(a) - minimo_comuni
+    for c in set(a):
+        eccesso = a.count(c) - b.count(c)
+        if eccesso > 0:
+            mancanti_ammessi -= eccesso
+            if mancanti_ammessi < 0:
+                return False
+    return difflib.SequenceMatcher(None, a, b, autojunk=False).ratio() >= soglia
+
+
+def _sono_simili(a: _VoceSomiglianza, b: _VoceSomiglianza, soglia: float) -> bool:
+    return a.cifre == b.cifre and _rapporto_almeno(a.titolo, b.titolo, soglia) and _rapporto_almeno(a.artista, b.artista, soglia)
+
+
+def trova_gruppi_simili(file_musicali: List[MusicFile], soglia: float = SOGLIA_SOMIGLIANZA_PREDEFINITA, finestra: int = FINESTRA_VICINATO_PREDEFINITA) -> List[List[MusicFile]]:
+    """
+    Raggruppa i file con artista e titolo simili ma non necessariamente identici
+    ("the beatles - let it be" / "beatles - let it be", refusi, varianti "feat.").
+    Le coppie candidate vengono generate con il metodo del vicinato ordinato
+    (sorted neighborhood): i file vengono ordinati per più chiavi (artista+titolo,
+    titolo+artista, testo rovesciato, contro i refusi iniziali) e ogni file è confrontato solo
+    con i `finestra`-1 successivi in ciascun ordinamento, quindi il costo è O(n log n) e non O(n²).
+    Ogni coppia candidata è verificata separatamente su artista e titolo con `difflib`
+    (rapporto >= `soglia`); i gruppi sono le componenti connesse delle coppie verificate.
+    L'ordine dei file nei gruppi segue quello di `file_musicali`.
+    """
+    voci = [_VoceSomiglianza(mf) for mf in file_musicali]
+    ordinamenti = [
+        lambda i: (voci[i].artista, voci[i].titolo),
+        lambda i: (voci[i].titolo, voci[i].artista),
+        lambda i: (voci[i].artista + ' ' + voci[i].titolo)[::-1],
+    ]
+    # Union-find sugli indici dei file
+    genitore = list(range(len(voci)))
+
+    def _radice(i: int) -> int:
+        while genitore[i] != i:
+            genitore[i] = genitore[genitore[i]]
+            i = genitore[i]
+        return i
+
+    confrontate: Set[Tuple[int, int]] = set()
+    for chiave in ordinamenti:
+        ordine = sorted(range(len(voci)), key=chiave)
+        for posizione, i in enumerate(ordine):
+            for j in ordine[posizione + 1:posizione + finestra]:
+                coppia = (i, j) if i < j else (j, i)
+                if coppia in confrontate:
+                    continue
+                confrontate.add(coppia)
+                radice_i, radice_j = _radice(i), _radice(j)
+                if radice_i != radice_j and _sono_simili(voci[i], voci[j], soglia):
+                    genitore[max(radice_i, radice_j)] = min(radice_i, radice_j)
+
+    gruppi: Dict[int, List[MusicFile]] = defaultdict(list)
+    for i, mf in enumerate(file_musicali):
+        gruppi[_radice(i)].append(mf)
+    return [gruppo for gruppo in gruppi.values() if len(gruppo) > 1]
+
+
+def pianifica_spostamento_simili(file_da_considerare: Iterable[MusicFile], cartella_base_da_verificare_path: Path, logger=_default_logger, soglia: float = SOGLIA_SOMIGLIANZA_PREDEFINITA) -> List[SpostaFileAzione]:
+    """Come `pianifica_spostamento_simili_libreria`, per un elenco di MusicFile."""
+    libreria = LibreriaColonnare.da_music_file(file_da_considerare)
+    return pianifica_spostamento_simili_libreria(libreria, libreria.ids(), cartella_base_da_verificare_path, logger, soglia)
+
+
+def pianifica_spostamento_simili_libreria(libreria: LibreriaColonnare, ids: List[int], cartella_base_da_verificare_path: Path, logger=_default_logger, soglia: float = SOGLIA_SOMIGLIANZA_PREDEFINITA) -> List[SpostaFileAzione]:
+    """
+    Pianifica lo spostamento in DA_VERIFICARE dei gruppi di file con artista e titolo simili
+    (vedi `trova_gruppi_simili`). Essendo corrispondenze approssimate, nessun file viene
+    considerato un duplicato: l'intero gruppo viene raccolto per una revisione manuale.
+    """
+    logger("\n--- Inizio Ricerca Brani Simili DA VERIFICARE ---")
+    azioni: List[SpostaFileAzione] = []
+    candidati = [libreria.vista(id_file) for id_file in sorted(ids, key=libreria.percorso)]
+
+    for gruppo in trova_gruppi_simili(candidati, soglia):
+        riferimento = gruppo[0]
+        logger(f"  Gruppo di brani simili a Artista='{riferimento.artista_norm}', Titolo='{riferimento.titolo_norm}' ({len(gruppo)} file):")
+        cartella_destinazione_gruppo = _cartella_gruppo_da_verificare(cartella_base_da_verificare_path, riferimento.artista_norm, riferimento.titolo_base_norm)
+        for mf_da_spostare in gruppo:
+            destinazione_proposta = cartella_destinazione_gruppo / mf_da_spostare.path.name
+            azioni.append(SpostaFileAzione(
+                sorgente=mf_da_spostare.path,
+                destinazione=destinazione_proposta,
+                motivazione="Simile da Verificare"
+            ))
+            logger(f"    - '{mf_da_spostare.artista_norm} - {mf_da_spostare.titolo_norm}': pianificato spostamento di '{mf_da_spostare.path.name}' in '{cartella_destinazione_gruppo}'")
 
+    logger(f"Pianificate {len(azioni)} azioni di spostamento per brani simili.")
+    return azioni
 
-def _default_logger(messaggio, flush=True):
-    print(messaggio, flush=flush)
 
+# --- Indice del piano per l'anteprima ---
+
+_RE_PAROLE_PERCORSO = re.compile(r"[^\W_]+") # Anche "_" separa le parole (es. DA_VERIFICARE)
 
-def _estrai_info_file(file_path: Path, logger=_default_logger) -> Optional[MusicFile]:
+
+class IndicePiano:
     """
-    Estrae, normalizza e struttura le informazioni di un singolo file musicale.
-    Restituisce un oggetto MusicFile o None se le informazioni sono insufficienti.
+    Vista indicizzata di un piano di azioni per l'anteprima, pensata per piani con centinaia
+    di migliaia di righe: le azioni sono raggruppate per motivazione (nell'ordine in cui
+    compaiono), i percorsi relativi vengono calcolati solo per le righe richieste e la ricerca
+    usa un indice invertito delle parole di cartelle e nomi dei file (artista, titolo, cartella),
+    costruito alla prima ricerca (o prima, con `prepara_ricerca`). Una parola cercata trova tutte quelle che la hanno come prefisso;
+    più parole devono comparire tutte.
     """
-    # 1. Estrazione Raw
-    titolo_id3_raw, artista_id3_raw = estrai_info_id3(file_path)
-    artista_nomefile_raw, titolo_nomefile_raw = estrai_info_da_nome_file(file_path.stem)
+    def __init__(self, piano: List[SpostaFileAzione], cartella_base=None):
+        self.piano = piano
+        self._prefisso_base = os.path.join(str(cartella_base), "") if cartella_base else None
+        self._gruppi: Dict[str, List[int]] = {}
+        self._gruppo_di: List[str] = []
+        for indice, azione in enumerate(piano):
+            motivazione = azione.motivazione
+            gruppo = self._gruppi.get(motivazione)
+            if gruppo is None:
+                gruppo = self._gruppi[motivazione] = []
+            gruppo.append(indice)
+            self._gruppo_di.append(motivazione)
+        self._parole: Optional[List[str]] = None # Parole distinte, ordinate (per la ricerca per prefisso)
+        self._occorrenze: Dict[str, List[int]] = {}
+        self._lock = threading.Lock()
 
-    artista_finale, titolo_finale, sorgente_info = None, None, "Nessuna"
+    @property
+    def motivazioni(self) -> List[str]:
+        return list(self._gruppi)
 
-    if artista_id3_raw and titolo_id3_raw:
-        artista_finale = artista_id3_raw
-        titolo_finale = titolo_id3_raw
-        sorgente_info = "ID3"
-    elif artista_nomefile_raw and titolo_nomefile_raw:
-        artista_finale = artista_nomefile_raw
-        titolo_finale = titolo_nomefile_raw
-        sorgente_info = "Nome File"
-    else:
-        logger(f"    Info insufficienti (ID3/Nome File) per: {file_path.name}")
-        return None
+    def _relativo(self, percorso: Path) -> str:
+        testo = str(percorso)
+        if self._prefisso_base and testo.startswith(self._prefisso_base):
+            return testo[len(self._prefisso_base):]
+        return testo
 
-    # 2. Normalizzazione
-    artista_normalizzato = normalizza_testo(artista_finale)
-    titolo_normalizzato = normalizza_testo(titolo_finale)
+    def riga(self, indice: int) -> Tuple[str, str, str]:
+        """(sorgente, destinazione, motivazione) dell'azione, con i percorsi relativi alla cartella base se possibile."""
+        azione = self.piano[indice]
+        return self._relativo(azione.sorgente), self._relativo(azione.destinazione), azione.motivazione
 
-    if not (artista_normalizzato and titolo_normalizzato):
-        logger(f"    Info insufficienti post-normalizzazione per: {file_path.name}")
-        return None
+    def prepara_ricerca(self):
+        """Costruisce l'indice delle parole, se non esiste ancora; si può chiamare da un thread separato."""
+        with self._lock:
+            if self._parole is not None:
+                return
+            occorrenze: Dict[str, List[int]] = defaultdict(list)
+            trova_parole = _RE_PAROLE_PERCORSO.findall
+            for indice, azione in enumerate(self.piano):
+                # Della destinazione contano solo le cartelle (es. DA_VERIFICARE/artista/titolo).
+                # Una parola ripetuta nella stessa riga ripete l'indice: la ricerca unisce in un set.
+                cartella_destinazione = os.path.dirname(self._relativo(azione.destinazione))
+                for parola in trova_parole(f"{self._relativo(azione.sorgente)} {cartella_destinazione}".lower()):
+                    occorrenze[parola].append(indice)
+            self._occorrenze = dict(occorrenze)
+            self._parole = sorted(occorrenze)
 
-    # 3. Estrazione Titolo Base e Versione
-    titolo_base, tag_versione = estrai_titolo_base_e_versione(titolo_normalizzato, logger)
+    def cerca(self, testo: str) -> Optional[Dict[str, List[int]]]:
+        """
+        Indici delle azioni che contengono tutte le parole di `testo`, raggruppati per motivazione
+        (solo i gruppi con almeno un risultato). Restituisce None se `testo` non contiene parole.
+        """
+        parole_cercate = _RE_PAROLE_PERCORSO.findall(testo.lower())
+        if not parole_cercate:
+            return None
+        self.prepara_ricerca()
+        risultato: Optional[Set[int]] = None
+        # Prima le parole più lunghe, che di solito hanno meno occorrenze
+        for cercata in sorted(set(parole_cercate), key=len, reverse=True):
+            inizio = bisect.bisect_left(self._parole, cercata)
+            fine = bisect.bisect_left(self._parole, cercata + "\U0010ffff", inizio)
+            trovati: Set[int] = set()
+            for parola in self._parole[inizio:fine]:
+                trovati.update(self._occorrenze[parola])
+            risultato = trovati if risultato is None else risultato & trovati
+            if not risultato:
+                return {}
+        gruppi: Dict[str, List[int]] = {motivazione: [] for motivazione in self._gruppi}
+        for indice in sorted(risultato):
+            gruppi[self._gruppo_di[indice]].append(indice)
+        return {motivazione: indici for motivazione, indici in gruppi.items() if indici}
 
-    # 4. Recupero Metadati Aggiuntivi
-    try:
-        dimensione = file_path.stat().st_size
-    except FileNotFoundError:
-        logger(f"    ATTENZIONE: File {file_path.name} non trovato durante lettura dimensione.")
-        return None
+    def gruppi(self, filtro: Optional[str] = None) -> Dict[str, List[int]]:
+        """Indici delle azioni per motivazione, eventualmente limitati a quelle trovate con `cerca(filtro)`."""
+        trovati = self.cerca(filtro) if filtro else None
+        return dict(self._gruppi) if trovati is None else trovati
 
-    return MusicFile(
-        path=file_path,
-        artista_norm=artista_normalizzato,
-        titolo_norm=titolo_normalizzato,
-        titolo_base_norm=titolo_base,
-        tag_versione=tag_versione,
-        dimensione=dimensione,
-        sorgente_info=sorgente_info
-    )
 
+# --- Spostamento dei file: rinomina sullo stesso disco, copia nel kernel tra dischi diversi ---
 
-def normalizza_testo(testo):
-    """Normalizza il testo per il confronto: minuscolo, trim, rimozione punteggiatura base."""
-    if testo is None:
-        return None
-    testo = testo.lower()
-    testo = testo.strip()
-    # Ora NON rimuoviamo le parentesi tonde () e quadre [] per preservare tag come (Live), (Remastered)
-    testo = re.sub(r'[\.,!?"\'\{\}#*:]', '', testo) # Rimossa \(\) e \[\] dalla classe
-    testo = testo.replace('&', 'and') # Esempio, si può espandere
-    testo = re.sub(r'\s+', ' ', testo) # Rimuove spazi multipli
-    # Rimuove spazi extra che potrebbero essere rimasti attorno a parentesi conservate
-    testo = testo.replace('( ', '(').replace(' )', ')')
-    testo = testo.replace('[ ', '[').replace(' ]', ']')
-    return testo.strip() # Trim finale
+DIMENSIONE_BLOCCO_COPIA = 64 * 1024 * 1024 # Byte per chiamata a copy_file_range/sendfile
+# Errori con cui copy_file_range/sendfile segnalano di non supportare la coppia di file: si passa al metodo successivo
+# ENOTSOCK: su macOS `sendfile` accetta solo un socket come destinazione
+_ERRORI_COPIA_NON_SUPPORTATA = {errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.ENOTSUP, errno.EBADF, errno.ENOTSOCK}
 
-def estrai_titolo_base_e_versione(titolo_normalizzato, logger=_default_logger):
+
+def _copia_contenuto(sorgente, destinazione, dimensione: int) -> str:
     """
-    Tenta di estrarre un 'titolo base' e l'eventuale 'tag di versione' da un titolo normalizzato.
-    Restituisce (titolo_base, tag_versione_trovato) o (titolo_originale, None) se nessun pattern matcha.
+    Copia `dimensione` byte tra due file aperti in binario senza buffer, nel kernel se possibile:
+    `os.copy_file_range` (Linux, anche tra filesystem diversi da 5.3; può usare il reflink o la
+    copia lato server su NFS/SMB), poi `os.sendfile`, infine lettura/scrittura in Python.
+    Restituisce il metodo usato.
     """
-    titolo_da_lavorare = titolo_normalizzato
-    versione_trovata = None
-
-    for pattern in VERSION_PATTERNS:
-        match = re.search(pattern, titolo_da_lavorare, flags=re.IGNORECASE)
-        if match:
-            versione_trovata = match.group(0).strip() # Il tag di versione include le parentesi
-            # Rimuove il tag di versione dal titolo per ottenere il titolo base
-            # Usiamo re.escape sul tag trovato per sicurezza se contiene caratteri speciali regex
-            titolo_da_lavorare = re.sub(re.escape(versione_trovata), '', titolo_da_lavorare, flags=re.IGNORECASE).strip()
-            # Rimuove eventuali doppi spazi o spazi all'inizio/fine creati dalla rimozione
-            titolo_da_lavorare = re.sub(r'\s+', ' ', titolo_da_lavorare).strip()
-            #logger(f"      Pattern versione '{pattern}' matchato: tag='{versione_trovata}', titolo base preliminare='{titolo_da_lavorare}'")
-            break # Trovato un pattern, usiamo questo
-
-    if versione_trovata:
-        # A volte la rimozione può lasciare " - " o simili alla fine, puliamo
-        titolo_da_lavorare = re.sub(r'\s*-\s*$', '', titolo_da_lavorare).strip()
-        return titolo_da_lavorare, versione_trovata
-    else:
-        return titolo_normalizzato, None
+    fd_sorgente, fd_destinazione = sorgente.fileno(), destinazione.fileno()
+    for metodo in ("copy_file_range", "sendfile"):
+        if not hasattr(os, metodo):
+            continue
+        copiati = 0
+        try:
+            while copiati < dimensione:
+                blocco = min(DIMENSIONE_BLOCCO_COPIA, dimensione - copiati)
+                if metodo == "copy_file_range":
+                    letti = os.copy_file_range(fd_sorgente, fd_destinazione, blocco)
+                else:
+                    letti = os.sendfile(fd_destinazione, fd_sorgente, copiati, blocco)
+                if letti == 0:
+                    break # Il file si è accorciato durante la copia
+                copiati += letti
+            return metodo
+        except OSError as e:
+            if copiati or e.errno not in _ERRORI_COPIA_NON_SUPPORTATA:
+                raise
+    shutil.copyfileobj(sorgente, destinazione, DIMENSIONE_BUFFER_HASH)
+    return "read/write"
 
-def identifica_come_video(nome_file_stem):
-    """Verifica se il nome del file suggerisce un contenuto video."""
-    nome_lower = nome_file_stem.lower()
-    for pattern in VIDEO_PATTERNS:
-        if re.search(pattern, nome_lower):
-            return True
-    return False
 
-def estrai_info_da_nome_file(nome_file_stem):
-    """Tenta di estrarre Artista e Titolo dal nome del file (senza estensione)."""
-    # Lista di pattern da rimuovere (es. numeri traccia, tag vari)
-    # Questa lista può essere espansa significativamente
-    pattern_da_rimuovere = [
-        r'^\s*\d+[\s.-]*',              # Numeri traccia all'inizio (es. "01.", "02 - ")
-        r'\s*\(hd\)', r'\s*\[hd\]',
-        r'\s*\(hq\)', r'\s*\[hq\]',
-        r'\s*\(explicit\)', r'\s*\[explicit\]',
-        r'\s*\(clean\)', r'\s*\[clean\]',
-        r'\s*\(www\..*?\..*?\)',      # Indirizzi web semplici
-        # Aggiungere altri pattern specifici osservati nei propri file
-    ]
+def _copia_file(sorgente: Path, destinazione: Path, dimensione: int, verifica: bool = False) -> str:
+    """
+    Copia il file (contenuto, permessi e date, come shutil.copy2) senza mai sovrascrivere la
+    destinazione. Con `verifica` confronta l'hash BLAKE2 di copia e originale. In caso di errore
+    la copia parziale viene eliminata e l'eccezione propagata. Restituisce il metodo usato.
+    """
+    file_destinazione = open(destinazione, 'xb', buffering=0)
+    try:
+        with file_destinazione, open(sorgente, 'rb', buffering=0) as file_sorgente:
+            metodo = _copia_contenuto(file_sorgente, file_destinazione, dimensione)
+        shutil.copystat(sorgente, destinazione)
+        if verifica and _hash_completo(sorgente) != _hash_completo(destinazione):
+            raise OSError(f"verifica della copia non riuscita: '{destinazione}' è diverso dall'originale")
+    except BaseException:
+        try:
+            os.unlink(destinazione)
+        except OSError:
+            pass
+        raise
+    return metodo
 
-    nome_pulito = nome_file_stem
-    for pattern in pattern_da_rimuovere:
-        nome_pulito = re.sub(pattern, '', nome_pulito, flags=re.IGNORECASE)
-    
-    nome_pulito = nome_pulito.strip()
 
-    # Tentativo di separare Artista - Titolo
-    match = re.match(r'(.+?) - (.+)', nome_pulito)
-    if match:
-        artista = match.group(1).strip()
-        titolo = match.group(2).strip()
-        if artista and titolo: # Assicurati che entrambi siano non vuoti dopo lo strip
-             return artista, titolo
-    
-    # Fallback: se non c'è " - ", ma ci sono spazi, potremmo provare a dividere
-    # Questo è più euristico e potrebbe necessitare di affinamenti
-    # parts = nome_pulito.split()
-    # if len(parts) >= 2: # Richiede almeno due parole
-    #    # Qui si potrebbe tentare di indovinare, es. la prima parte è l'artista
-    #    pass
+class MovimentoFile(NamedTuple):
+    byte: int
+    dispositivo_sorgente: int
+    dispositivo_destinazione: int
+    metodo: str # "rename", o il metodo di copia (vedi `_copia_contenuto`)
+    secondi: float
 
-    return None, None # Se non si riesce a separare chiaramente
 
-def estrai_info_id3(file_path):
-    """Estrae titolo e artista dai tag ID3 di un file MP3."""
+@_profilata("sposta_file")
+def sposta_file(sorgente: Path, destinazione: Path, dispositivo_destinazione: Optional[int] = None, verifica: bool = False) -> MovimentoFile:
+    """
+    Sposta un file. Se sorgente e cartella di destinazione sono sullo stesso dispositivo (`st_dev`)
+    basta `os.rename`; altrimenti il file viene copiato nel kernel (vedi `_copia_file`), eventualmente
+    verificato, e solo dopo l'originale viene eliminato. I collegamenti simbolici sono delegati a
+    shutil.move. `dispositivo_destinazione` evita di rileggere lo st_dev della cartella per ogni file.
+    """
+    inizio = time.perf_counter()
+    _conta("stat")
+    stat_sorgente = os.lstat(sorgente)
+    if dispositivo_destinazione is None:
+        _conta("stat")
+        dispositivo_destinazione = os.stat(destinazione.parent).st_dev
+    if stat.S_ISLNK(stat_sorgente.st_mode):
+        shutil.move(str(sorgente), str(destinazione))
+        return MovimentoFile(0, stat_sorgente.st_dev, dispositivo_destinazione, "symlink", time.perf_counter() - inizio)
+    if stat_sorgente.st_dev == dispositivo_destinazione:
+        try:
+            _conta("rename")
+            os.rename(sorgente, destinazione)
+            return MovimentoFile(stat_sorgente.st_size, stat_sorgente.st_dev, dispositivo_destinazione, "rename", time.perf_counter() - inizio)
+        except OSError as e:
+            if e.errno != errno.EXDEV: # Stesso dispositivo ma punti di mount diversi (es. bind mount): si copia
+                raise
+    metodo = _copia_file(sorgente, destinazione, stat_sorgente.st_size, verifica)
+    _conta("byte copiati", stat_sorgente.st_size)
+    os.unlink(sorgente)
+    return MovimentoFile(stat_sorgente.st_size, stat_sorgente.st_dev, dispositivo_destinazione, metodo, time.perf_counter() - inizio)
+
+
+def _nome_dispositivo(dispositivo: int) -> str:
     try:
-        audio = EasyID3(file_path)
-        titolo = audio.get('title', [None])[0]
-        artista = audio.get('artist', [None])[0]
-        return titolo, artista # La normalizzazione avverrà dopo
-    except MutagenError:
-        return None, None
-    except Exception:
-        return None, None
+        return f"{os.major(dispositivo)}:{os.minor(dispositivo)}"
+    except AttributeError: # Windows: st_dev è il numero di serie del volume
+        return str(dispositivo)
+
+
+class EsitoAzione(NamedTuple):
+    """Risultato dell'esecuzione di una `SpostaFileAzione`."""
+    azione: SpostaFileAzione
+    destinazione: Optional[Path] # Percorso finale (con eventuale suffisso _N), None se non spostato
+    byte: int
+    errore: Optional[str] = None
+    sorgente_mancante: bool = False
+    movimento: Optional[MovimentoFile] = None
+
+
+_RE_SUFFISSO_COLLISIONE = re.compile(r"(?:_\d+)+$")
 
-def scansiona_cartella(cartella_path: Path, cartella_non_conformi_path: Path, logger=_default_logger, progress_callback=None) -> Tuple[List[MusicFile], int]:
+
+def _chiave_collisione(destinazione: Path) -> Tuple[str, str, str]:
     """
-    Scansiona la cartella, sposta i file video/non-conformi e restituisce una lista
-    di oggetti MusicFile per i file audio validi.
+    Le azioni con la stessa chiave possono contendersi gli stessi nomi liberi ("a.mp3", "a_1.mp3",
+    "a_1_1.mp3"...) e vanno eseguite nell'ordine del piano; azioni con chiavi diverse non
+    possono mai scegliere lo stesso nome. Il confronto ignora le maiuscole, come i filesystem
+    di Windows e macOS.
     """
-    file_musicali_validi: List[MusicFile] = []
-    file_supportati = ['.mp3']
-    contatore_non_conformi = 0
-    contatore_file_audio_analizzati = 0
+    return (str(destinazione.parent), _RE_SUFFISSO_COLLISIONE.sub("", destinazione.stem).casefold(), destinazione.suffix.casefold())
 
-    logger(f"Inizio pre-scansione per conteggio file in: {cartella_path}")
-    # Usiamo un generatore per efficienza, ma lo convertiamo a lista per il conteggio
-    tutti_i_file_nella_cartella = list(cartella_path.rglob('*'))
-    file_audio_da_elaborare_lista = [f for f in tutti_i_file_nella_cartella if f.is_file() and f.suffix.lower() in file_supportati]
-    totale_file_audio_da_elaborare = len(file_audio_da_elaborare_lista)
-    
-    logger(f"Trovati {totale_file_audio_da_elaborare} file audio ({', '.join(file_supportati)}) da analizzare.")
-    logger(f"I file non audio o identificati come 'video' verranno spostati in: {cartella_non_conformi_path}")
 
-    if not tutti_i_file_nella_cartella:
-        logger("Nessun file trovato nella cartella. Termino la scansione.")
-        return [], 0
+def _crea_cartelle_destinazione(piano: List[SpostaFileAzione], logger=_default_logger) -> Tuple[Dict[Path, str], Dict[Path, int]]:
+    """
+    Crea una sola volta ogni cartella di destinazione del piano. Restituisce le cartelle non create
+    (con l'errore) e il dispositivo (`st_dev`) di quelle create.
+    """
+    non_create: Dict[Path, str] = {}
+    dispositivi: Dict[Path, int] = {}
+    for cartella in dict.fromkeys(azione.destinazione.parent for azione in piano):
+        try:
+            cartella.mkdir(parents=True, exist_ok=True)
+            _conta("stat")
+            dispositivi[cartella] = os.stat(cartella).st_dev
+        except OSError as e:
+            non_create[cartella] = str(e)
+            logger(f"    ERRORE durante la creazione della cartella '{cartella}': {e}")
+    return non_create, dispositivi
 
-    for file_path in tutti_i_file_nella_cartella:
-        if not file_path.is_file():
-            continue
 
-        # Fase 1: Identificazione e spostamento file non conformi/video
-        is_video = identifica_come_video(file_path.stem)
-        is_audio_supportato = file_path.suffix.lower() in file_supportati
+def _sposta_azione(azione: SpostaFileAzione, cartelle_non_create: Dict[Path, str], dispositivi: Dict[Path, int], risolutore: RisolutoreNomi, verifica: bool = False,
+                   giornale: Optional["GiornaleEsecuzione"] = None) -> EsitoAzione:
+    """
+    Sposta il file di `azione`. Le destinazioni pianificate sono già libere (vedi `risolvi_destinazioni`):
+    il risolutore, che legge le cartelle una sola volta, le conferma senza stat per file e aggiunge
+    _1, _2... al nome solo se nel frattempo qualcosa ha occupato la destinazione.
+    Con `giornale` lo spostamento viene annunciato, con il nome definitivo, prima di iniziare.
+    """
+    errore_cartella = cartelle_non_create.get(azione.destinazione.parent)
+    if errore_cartella is not None:
+        return EsitoAzione(azione, None, 0, f"cartella di destinazione non creata ({errore_cartella})")
+    try:
+        nome_file_dest = risolutore.risolvi(azione.destinazione)
+        if giornale is not None:
+            giornale.registra_avvio(azione.sorgente, nome_file_dest)
+        movimento = sposta_file(azione.sorgente, nome_file_dest, dispositivi.get(azione.destinazione.parent), verifica)
+        return EsitoAzione(azione, nome_file_dest, movimento.byte, movimento=movimento)
+    except FileNotFoundError as e:
+        return EsitoAzione(azione, None, 0, str(e), sorgente_mancante=True)
+    except Exception as e:
+        return EsitoAzione(azione, None, 0, str(e))
+
 
-        if is_video or not is_audio_supportato:
-            if is_video:
-                logger(f"  -> Identificato come file di tipo video/non conforme: '{file_path.name}'")
-            else: # File non supportato
-                logger(f"  -> File non supportato, trattato come non conforme: '{file_path.name}'")
+def _log_velocita_dispositivi(esiti: List[EsitoAzione], logger=_default_logger):
+    """Per ogni coppia di dispositivi (e metodo): file, byte e velocità (byte / somma dei tempi dei singoli spostamenti)."""
+    totali: Dict[Tuple[int, int, str], List[float]] = defaultdict(lambda: [0, 0, 0.0])
+    for esito in esiti:
+        if esito.movimento is not None:
+            m = esito.movimento
+            totale = totali[(m.dispositivo_sorgente, m.dispositivo_destinazione, m.metodo)]
+            totale[0] += 1
+            totale[1] += m.byte
+            totale[2] += m.secondi
+    for (sorgente, destinazione, metodo), (file, byte, secondi) in sorted(totali.items()):
+        velocita = f", {byte / 1e6 / secondi:.1f} MB/s" if metodo not in ("rename", "symlink") and secondi > 0 else ""
+        logger(f"  Dispositivo {_nome_dispositivo(sorgente)} -> {_nome_dispositivo(destinazione)} ({metodo}): "
+               f"{int(file)} file, {byte / 1e6:.1f} MB in {secondi:.1f} s{velocita}")
+
+
+def _log_riepilogo_esecuzione(esiti: List[EsitoAzione], logger=_default_logger):
+    spostati_per_motivazione: Dict[str, int] = defaultdict(int)
+    for esito in esiti:
+        if esito.errore is None:
+            spostati_per_motivazione[esito.azione.motivazione] += 1
+    for motivazione, conteggio in spostati_per_motivazione.items():
+        logger(f"  Spostati {conteggio} file ({motivazione}).")
+    mancanti = [esito for esito in esiti if esito.sorgente_mancante]
+    if mancanti:
+        logger(f"  ATTENZIONE: {len(mancanti)} file sorgente non trovati, impossibile spostarli:")
+        for esito in mancanti:
+            logger(f"    - {esito.azione.sorgente}")
+    falliti = [esito for esito in esiti if esito.errore is not None and not esito.sorgente_mancante]
+    if falliti:
+        logger(f"  ERRORE: {len(falliti)} spostamenti non riusciti:")
+        for esito in falliti:
+            logger(f"    - {esito.azione.sorgente.name}: {esito.errore}")
+
+
+def esegui_piano_azioni(piano: List[SpostaFileAzione], logger=_default_logger, progress_callback=None, workers: int = 1, verifica_copie: bool = False, giornale: Optional["GiornaleEsecuzione"] = None) -> int:
+    """
+    Esegue una lista di azioni di spostamento, gestendo la creazione di cartelle
+    e i conflitti di nomi. Con un `MonitorAvanzamento` come `progress_callback`
+    l'avanzamento (file e byte spostati) viene riportato nella fase "spostamento".
+    Le cartelle di destinazione vengono create (e lette, per i conflitti di nomi) una sola volta.
+    Con workers > 1 gli spostamenti (limitati dalla latenza su NAS e dischi di rete) avvengono
+    in parallelo: le azioni che possono contendersi un nome (vedi `_chiave_collisione`) restano
+    in ordine nello stesso thread, quindi il risultato è identico all'esecuzione seriale; al posto
+    di una riga per file viene registrato un riepilogo finale.
+    Tra dischi diversi i file vengono copiati nel kernel (vedi `sposta_file`); con `verifica_copie`
+    l'originale viene eliminato solo se l'hash della copia coincide. A fine esecuzione viene
+    registrata la velocità per ogni coppia di dispositivi.
+    Con `giornale` ogni spostamento viene registrato prima di iniziare e, se riuscito, alla fine
+    (vedi `GiornaleEsecuzione`).
+    """
+    logger("\n--- Inizio Esecuzione Piano di Spostamento ---")
+    if not piano:
+        logger("Piano di azioni vuoto. Nessun file da spostare.")
+        return 0
+
+    monitor = progress_callback if isinstance(progress_callback, MonitorAvanzamento) else None
+    if monitor is not None:
+        monitor.inizia_fase("spostamento", totale=len(piano))
+    cartelle_non_create, dispositivi = _crea_cartelle_destinazione(piano, logger)
+    risolutore = RisolutoreNomi()
 
+    def _esegui(azione: SpostaFileAzione) -> EsitoAzione:
+        esito = _sposta_azione(azione, cartelle_non_create, dispositivi, risolutore, verifica_copie, giornale)
+        # Un errore del giornale o del monitor resta legato all'azione: gli altri spostamenti
+        # proseguono e il riepilogo viene comunque prodotto
+        if giornale is not None and esito.errore is None:
             try:
-                nome_file_destinazione = cartella_non_conformi_path / file_path.name
-                counter = 1
-                while nome_file_destinazione.exists():
-                    nome_file_destinazione = cartella_non_conformi_path / f"{file_path.stem}_{counter}{file_path.suffix}"
-                    counter += 1
-                shutil.move(str(file_path), str(nome_file_destinazione))
-                logger(f"    -> Spostato in: {nome_file_destinazione}")
-                contatore_non_conformi += 1
+                giornale.registra_spostamento(azione.sorgente, esito.destinazione)
             except Exception as e:
-                logger(f"    ERRORE durante lo spostamento di {file_path.name}: {e}")
-            continue # Passa al file successivo
-
-        # Fase 2: Processamento file audio
-        contatore_file_audio_analizzati += 1
-        logger(f"\n  Analizzo file audio {contatore_file_audio_analizzati}/{totale_file_audio_da_elaborare} (Nome: {file_path.name})", flush=True)
-        if progress_callback:
-            progress_callback(contatore_file_audio_analizzati, totale_file_audio_da_elaborare)
-
-        info_file = _estrai_info_file(file_path, logger)
-        if info_file:
-            logger(f"    Normalizzati ({info_file.sorgente_info}): Artista='{info_file.artista_norm}', Titolo='{info_file.titolo_norm}'")
-            file_musicali_validi.append(info_file)
-        else:
-            # Il logger dentro _estrai_info_file ha già dato dettagli
-            logger(f"    File {file_path.name} scartato per info insufficienti.")
-    
-    logger(f"\nScansione file completata. Analizzati {contatore_file_audio_analizzati} file audio.")
-    if contatore_non_conformi > 0:
-        logger(f"Spostati {contatore_non_conformi} file non conformi in '{cartella_non_conformi_path}'.")
+                esito = esito._replace(errore=f"spostato in '{esito.destinazione}', ma non registrato nel giornale ({e})")
+        if monitor is not None:
+            # Solo i byte copiati danno una velocità significativa: una rinomina non li legge
+            copiati = esito.byte if esito.movimento is not None and esito.movimento.metodo not in ("rename", "symlink") else 0
+            try:
+                monitor.avanza("spostamento", byte=copiati)
+            except Exception as e:
+                if esito.errore is None:
+                    esito = esito._replace(errore=f"spostato in '{esito.destinazione}', ma errore nell'avanzamento ({e!r})")
+        return esito
+
+    if workers > 1:
+        gruppi: Dict[Tuple[str, str, str], List[int]] = defaultdict(list)
+        for indice, azione in enumerate(piano):
+            gruppi[_chiave_collisione(azione.destinazione)].append(indice)
+        esiti: List[Optional[EsitoAzione]] = [None] * len(piano)
+
+        def _esegui_gruppo(indici: List[int]):
+            for indice in indici:
+                esiti[indice] = _esegui(piano[indice])
+
+        logger(f"Spostamento di {len(piano)} file con {workers} thread paralleli...")
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for _ in pool.map(_esegui_gruppo, gruppi.values()):
+                pass
+        _log_riepilogo_esecuzione(esiti, logger)
     else:
-        logger("Nessun file non conforme è stato spostato.")
+        esiti = []
+        for azione in piano:
+            esito = _esegui(azione)
+            esiti.append(esito)
+            if esito.errore is None:
+                logger(f"  -> Spostato: '{azione.sorgente.name}' in '{esito.destinazione.parent}' ({azione.motivazione})")
+            elif esito.sorgente_mancante:
+                logger(f"    ATTENZIONE: File sorgente non trovato, impossibile spostare: {azione.sorgente}")
+            else:
+                logger(f"    ERRORE durante lo spostamento di {azione.sorgente.name}: {esito.errore}")
+
+    if monitor is not None:
+        monitor.termina_fase("spostamento")
+    _log_velocita_dispositivi(esiti, logger)
+    contatore_spostati = sum(1 for esito in esiti if esito.errore is None)
+    logger(f"Esecuzione completata. Spostati {contatore_spostati} file.")
+    return contatore_spostati
+
+
+# --- Giornale di esecuzione: ripresa dei piani interrotti e annullamento ---
 
-    return file_musicali_validi, contatore_non_conformi
+NOME_FILE_GIORNALE = ".tuneup_giornale.jsonl"
+VERSIONE_GIORNALE = 1
 
-def pianifica_spostamento_duplicati(file_musicali: List[MusicFile], cartella_duplicati_path: Path, logger=_default_logger) -> Tuple[List[SpostaFileAzione], Set[MusicFile]]:
+
+class StatoGiornale(NamedTuple):
+    piano: List[SpostaFileAzione]
+    spostati: Dict[Path, Path] # sorgente -> destinazione finale, nell'ordine di esecuzione
+    avviati: Dict[Path, Path] # sorgente -> destinazione finale degli spostamenti iniziati (riusciti o no)
+    ripristinati: Set[Path] # Sorgenti riportate al loro posto dall'annullamento
+    completato: bool # Il piano è stato eseguito fino in fondo
+    annullato: bool # L'annullamento è stato eseguito fino in fondo
+
+    @property
+    def annullamento_in_corso(self) -> bool:
+        """L'annullamento è iniziato ma non è arrivato in fondo (es. file non ripristinabili)."""
+        return bool(self.ripristinati) and not self.annullato
+
+    @property
+    def concluso(self) -> bool:
+        # Un piano completato con un annullamento a metà non è concluso: sovrascrivendo il
+        # giornale si perderebbe traccia dei file ancora nella cartella dei duplicati
+        return self.annullato or (self.completato and not self.annullamento_in_corso)
+
+    def spostamenti_non_confermati(self) -> Dict[Path, Path]:
+        """
+        Spostamenti iniziati ma non registrati come riusciti (processo interrotto a metà) che sono
+        comunque avvenuti: la sorgente non esiste più e la destinazione annunciata sì.
+        """
+        return {sorgente: destinazione for sorgente, destinazione in self.avviati.items()
+                if sorgente not in self.spostati and not os.path.lexists(sorgente) and os.path.lexists(destinazione)}
+
+
+class GiornaleEsecuzione:
     """
-    Analizza una lista di MusicFile e pianifica lo spostamento dei duplicati.
-    NON esegue lo spostamento, ma restituisce una lista di azioni da compiere.
+    Giornale append-only (JSON Lines) dell'esecuzione di un piano. Contiene:
+      {"tipo": "piano", "versione": 1}, poi una riga "azione" per ogni azione del piano;
+      una riga "avviato" (sorgente, destinazione finale) prima di ogni spostamento, e una riga
+      "spostato" con gli stessi percorsi quando lo spostamento è riuscito;
+      una riga "ripristinato" per ogni file riportato indietro dall'annullamento;
+      "completato" / "annullato" quando l'esecuzione / l'annullamento arrivano in fondo.
+    Ogni riga viene scritta subito al sistema operativo (sopravvive all'uccisione del processo),
+    mentre l'fsync (che la protegge anche da un'interruzione di corrente) è fatto a blocchi di
+    `righe_per_fsync` righe o ogni `secondi_per_fsync` secondi. Thread-safe.
     """
-    logger("\n--- Inizio Pianificazione Spostamento Duplicati ---")
-    azioni: List[SpostaFileAzione] = []
-    file_mantenuti: Set[MusicFile] = set()
+    def __init__(self, percorso: Path, righe_per_fsync: int = 256, secondi_per_fsync: float = 1.0):
+        self.percorso = Path(percorso)
+        self.righe_per_fsync = righe_per_fsync
+        self.secondi_per_fsync = secondi_per_fsync
+        self._scarta_riga_troncata()
+        self._file = open(self.percorso, 'a', encoding='utf-8')
+        self._righe_senza_fsync = 0
+        self._ultimo_fsync = time.monotonic()
+        self._lock = threading.Lock()
 
-    brani_identificati: Dict[Tuple[str, str], List[MusicFile]] = defaultdict(list)
-    for mf in file_musicali:
-        brani_identificati[(mf.artista_norm, mf.titolo_norm)].append(mf)
+    def _scarta_riga_troncata(self):
+        """Taglia un'eventuale ultima riga scritta a metà, così i record aggiunti restano leggibili."""
+        try:
+            with open(self.percorso, 'r+b') as f:
+                dimensione = f.seek(0, os.SEEK_END)
+                if dimensione == 0:
+                    return
+                f.seek(max(0, dimensione - 65536))
+                coda = f.read()
+                if coda.endswith(b"\n"):
+                    return
+                f.truncate(dimensione - len(coda) + coda.rfind(b"\n") + 1)
+        except FileNotFoundError:
+            pass
 
-    for (artista, titolo), files_in_gruppo in brani_identificati.items():
-        if len(files_in_gruppo) == 1:
-            file_mantenuti.add(files_in_gruppo[0])
-            continue
+    @classmethod
+    def crea(cls, percorso: Path, piano: Iterable[SpostaFileAzione], **kwargs) -> "GiornaleEsecuzione":
+        """
+        Crea (sovrascrivendolo) il giornale di un nuovo piano; il piano è su disco prima di ogni
+        spostamento. `piano` può essere un iteratore (es. `leggi_piano`): viene letto una volta sola.
+        Il giornale è scritto come "<nome>.parziale" e sostituisce il precedente solo quando il piano
+        è stato letto per intero: se `piano` solleva un errore (es. file di piano danneggiato) resta
+        il giornale precedente, senza un piano troncato che `riprendi_piano` potrebbe eseguire.
+        """
+        percorso = Path(percorso)
+        percorso.parent.mkdir(parents=True, exist_ok=True)
+        temporaneo = percorso.with_name(percorso.name + ".parziale")
+        try:
+            with open(temporaneo, 'w', encoding='utf-8') as f:
+                f.write(json.dumps({"tipo": "piano", "versione": VERSIONE_GIORNALE}) + "\n")
+                for azione in piano:
+                    f.write(json.dumps({"tipo": "azione", "sorgente": str(azione.sorgente), "destinazione": str(azione.destinazione),
+                                        "motivazione": azione.motivazione}) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+        except BaseException:
+            temporaneo.unlink(missing_ok=True)
+            raise
+        os.replace(temporaneo, percorso)
+        return cls(percorso, **kwargs)
 
-        logger(f"Brano: Artista='{artista}', Titolo='{titolo}' - Trovati {len(files_in_gruppo)} file (potenziali duplicati).")
-        
-        file_da_mantenere = max(files_in_gruppo, key=lambda mf: mf.dimensione, default=None)
-
-        if file_da_mantenere:
-            file_mantenuti.add(file_da_mantenere)
-            logger(f"    -> Da Mantenere: {file_da_mantenere.path.name} (Dimensione: {file_da_mantenere.dimensione} bytes)")
-
-            for mf_da_spostare in files_in_gruppo:
-                if mf_da_spostare != file_da_mantenere:
-                    # La gestione di nomi duplicati nella destinazione verrà fatta dall'esecutore del piano
-                    destinazione_proposta = cartella_duplicati_path / mf_da_spostare.path.name
-                    azione = SpostaFileAzione(
-                        sorgente=mf_da_spostare.path,
-                        destinazione=destinazione_proposta,
-                        motivazione="Duplicato"
-                    )
-                    azioni.append(azione)
-                    logger(f"    -> Da Spostare: {mf_da_spostare.path.name} -> {destinazione_proposta}")
-        else:
-            logger(f"    ATTENZIONE: Non è stato possibile determinare un file da mantenere per '{artista} - {titolo}'.")
-            file_mantenuti.update(files_in_gruppo)
+    @staticmethod
+    def leggi(percorso: Path) -> StatoGiornale:
+        """Rilegge il giornale. Un'ultima riga troncata (scrittura interrotta) viene ignorata."""
+        piano: List[SpostaFileAzione] = []
+        spostati: Dict[Path, Path] = {}
+        avviati: Dict[Path, Path] = {}
+        ripristinati: Set[Path] = set()
+        completato = annullato = False
+        with open(percorso, encoding='utf-8') as f:
+            righe = f.read().split("\n")
+        for numero, riga in enumerate(righe):
+            if not riga:
+                continue
+            try:
+                record = json.loads(riga)
+            except ValueError:
+                if numero >= len(righe) - 2: # Ultima riga, scritta a metà
+                    break
+                raise ValueError(f"Giornale '{percorso}' danneggiato alla riga {numero + 1}.")
+            tipo = record["tipo"]
+            if tipo == "piano" and record.get("versione") != VERSIONE_GIORNALE:
+                raise ValueError(f"Versione del giornale '{percorso}' non supportata: {record.get('versione')}.")
+            elif tipo == "azione":
+                piano.append(SpostaFileAzione(Path(record["sorgente"]), Path(record["destinazione"]), record["motivazione"]))
+            elif tipo == "avviato":
+                avviati[Path(record["sorgente"])] = Path(record["destinazione"])
+            elif tipo == "spostato":
+                spostati[Path(record["sorgente"])] = Path(record["destinazione"])
+            elif tipo == "ripristinato":
+                ripristinati.add(Path(record["sorgente"]))
+            elif tipo == "completato":
+                completato = True
+            elif tipo == "annullato":
+                annullato = True
+        return StatoGiornale(piano, spostati, avviati, ripristinati, completato, annullato)
 
-    logger(f"Pianificate {len(azioni)} azioni di spostamento per duplicati.")
-    return azioni, file_mantenuti
+    def _scrivi(self, record: dict, forza_fsync: bool = False):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            self._righe_senza_fsync += 1
+            adesso = time.monotonic()
+            if forza_fsync or self._righe_senza_fsync >= self.righe_per_fsync or adesso - self._ultimo_fsync >= self.secondi_per_fsync:
+                os.fsync(self._file.fileno())
+                self._righe_senza_fsync = 0
+                self._ultimo_fsync = adesso
+
+    def registra_avvio(self, sorgente: Path, destinazione: Path):
+        self._scrivi({"tipo": "avviato", "sorgente": str(sorgente), "destinazione": str(destinazione)})
+
+    def registra_spostamento(self, sorgente: Path, destinazione: Path):
+        self._scrivi({"tipo": "spostato", "sorgente": str(sorgente), "destinazione": str(destinazione)})
+
+    def registra_ripristino(self, sorgente: Path, destinazione: Path):
+        self._scrivi({"tipo": "ripristinato", "sorgente": str(sorgente), "destinazione": str(destinazione)})
 
-def pianifica_spostamento_da_verificare(file_da_considerare: Set[MusicFile], cartella_base_da_verificare_path: Path, logger=_default_logger) -> List[SpostaFileAzione]:
+    def registra_fine(self, tipo: str):
+        """`tipo` è "completato" o "annullato"."""
+        self._scrivi({"tipo": tipo}, forza_fsync=True)
+
+    def chiudi(self):
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+                self._file.close()
+
+
+def giornale_in_sospeso(percorso: Path) -> Optional[StatoGiornale]:
     """
-    Analizza un set di MusicFile e pianifica lo spostamento di gruppi di versioni
-    dello stesso brano per una revisione manuale.
+    Lo stato del giornale se contiene un piano interrotto (né completato né annullato) o un
+    annullamento non finito, altrimenti None.
     """
-    logger("\n--- Inizio Pianificazione File DA VERIFICARE ---")
-    azioni: List[SpostaFileAzione] = []
-    if not file_da_considerare:
-        logger("Nessun file candidato per l'analisi DA VERIFICARE.")
-        return azioni
+    try:
+        stato = GiornaleEsecuzione.leggi(percorso)
+    except FileNotFoundError:
+        return None
+    return None if stato.concluso else stato
 
-    brani_per_base: Dict[Tuple[str, str], List[MusicFile]] = defaultdict(list)
-    for mf in file_da_considerare:
-        brani_per_base[(mf.artista_norm, mf.titolo_base_norm)].append(mf)
 
-    for (artista_norm, titolo_base), lista_brani in brani_per_base.items():
-        if len(lista_brani) > 1:
-            logger(f"  Gruppo DA VERIFICARE per Artista='{artista_norm}', Titolo Base='{titolo_base}' ({len(lista_brani)} file):")
-            
-            nome_cartella_artista = "".join(c for c in artista_norm if c.isalnum() or c in (' ', '_')).strip() or "ArtistaSconosciuto"
-            nome_cartella_titolo = "".join(c for c in titolo_base if c.isalnum() or c in (' ', '_')).strip() or "TitoloSconosciuto"
-            cartella_destinazione_gruppo = cartella_base_da_verificare_path / nome_cartella_artista / nome_cartella_titolo
+def _registra_completamento(giornale: GiornaleEsecuzione, spostati: int, azioni: int, logger=_default_logger):
+    """Il piano è completato solo se tutte le azioni sono riuscite; altrimenti il giornale resta in sospeso."""
+    if spostati == azioni:
+        giornale.registra_fine("completato")
+    else:
+        logger(f"ATTENZIONE: {azioni - spostati} azioni non riuscite: il piano resta in sospeso nel giornale. "
+               "Riprendilo dopo aver risolto gli errori, oppure annullalo.")
 
-            for mf_da_spostare in lista_brani:
-                destinazione_proposta = cartella_destinazione_gruppo / mf_da_spostare.path.name
-                azione = SpostaFileAzione(
-                    sorgente=mf_da_spostare.path,
-                    destinazione=destinazione_proposta,
-                    motivazione="Versione da Verificare"
-                )
-                azioni.append(azione)
-                logger(f"    - Pianificato spostamento per '{mf_da_spostare.path.name}' in '{cartella_destinazione_gruppo}'")
 
-    logger(f"Pianificate {len(azioni)} azioni di spostamento per file DA VERIFICARE.")
-    return azioni
+def esegui_piano_con_giornale(piano: List[SpostaFileAzione], percorso_giornale: Path, logger=_default_logger, progress_callback=None, workers: int = 1, verifica_copie: bool = False) -> int:
+    """Registra il piano nel giornale e lo esegue, annotando ogni spostamento riuscito."""
+    giornale = GiornaleEsecuzione.crea(percorso_giornale, piano)
+    try:
+        spostati = esegui_piano_azioni(piano, logger, progress_callback, workers, verifica_copie, giornale)
+        _registra_completamento(giornale, spostati, len(piano), logger)
+    finally:
+        giornale.chiudi()
+    logger(f"Giornale dell'esecuzione: {percorso_giornale}")
+    return spostati
 
 
-def esegui_piano_azioni(piano: List[SpostaFileAzione], logger=_default_logger) -> int:
+def riprendi_piano(percorso_giornale: Path, logger=_default_logger, progress_callback=None, workers: int = 1, verifica_copie: bool = False) -> int:
     """
-    Esegue una lista di azioni di spostamento, gestendo la creazione di cartelle
-    e i conflitti di nomi.
+    Riprende un piano interrotto senza rifare l'analisi: esegue solo le azioni non registrate
+    come spostate. Uno spostamento annunciato ma non confermato (processo interrotto a metà) è
+    considerato eseguito se la sorgente non esiste più e la destinazione annunciata sì (vedi
+    `StatoGiornale.spostamenti_non_confermati`); la sola presenza di un file nella destinazione
+    pianificata non basta, perché potrebbe essere un altro file. Restituisce il numero di file spostati.
     """
-    logger("\n--- Inizio Esecuzione Piano di Spostamento ---")
-    contatore_spostati = 0
-    if not piano:
-        logger("Piano di azioni vuoto. Nessun file da spostare.")
+    logger(f"\n--- Ripresa del Piano dal Giornale: {percorso_giornale} ---")
+    stato = GiornaleEsecuzione.leggi(percorso_giornale)
+    if stato.concluso:
+        logger("Il piano del giornale è già stato " + ("annullato" if stato.annullato else "eseguito") + ": niente da riprendere.")
         return 0
+    if stato.annullamento_in_corso:
+        logger("L'annullamento del piano non è stato completato: ripeti l'annullamento invece di riprendere il piano.")
+        return 0
+    giornale = GiornaleEsecuzione(percorso_giornale)
+    try:
+        non_confermati = stato.spostamenti_non_confermati()
+        for sorgente, destinazione in non_confermati.items():
+            giornale.registra_spostamento(sorgente, destinazione)
+        da_eseguire = [azione for azione in stato.piano if azione.sorgente not in stato.spostati and azione.sorgente not in non_confermati]
+        logger(f"Azioni nel piano: {len(stato.piano)}, già eseguite: {len(stato.piano) - len(da_eseguire)}, da eseguire: {len(da_eseguire)}.")
+        spostati = esegui_piano_azioni(da_eseguire, logger, progress_callback, workers, verifica_copie, giornale) if da_eseguire else 0
+        _registra_completamento(giornale, spostati, len(da_eseguire), logger)
+    finally:
+        giornale.chiudi()
+    return spostati
 
-    for azione in piano:
+
+def annulla_piano(percorso_giornale: Path, logger=_default_logger, workers: int = 1, verifica_copie: bool = False) -> int:
+    """
+    Annulla gli spostamenti registrati nel giornale, dal più recente al più vecchio, riportando
+    ogni file nella posizione originale (senza mai sovrascrivere un file che nel frattempo la
+    occupa). L'annullamento è a sua volta registrato, quindi si può riprendere se interrotto.
+    Restituisce il numero di file ripristinati.
+    """
+    logger(f"\n--- Annullamento del Piano dal Giornale: {percorso_giornale} ---")
+    stato = GiornaleEsecuzione.leggi(percorso_giornale)
+    spostati = {**stato.spostati, **stato.spostamenti_non_confermati()}
+    da_ripristinare = [(sorgente, destinazione) for sorgente, destinazione in reversed(list(spostati.items()))
+                       if sorgente not in stato.ripristinati]
+    logger(f"Spostamenti da annullare: {len(da_ripristinare)}.")
+    giornale = GiornaleEsecuzione(percorso_giornale)
+    cartelle_create: Set[Path] = set()
+
+    def _ripristina(coppia: Tuple[Path, Path]) -> Optional[str]:
+        sorgente, destinazione = coppia
         try:
-            # Assicura che la cartella di destinazione esista
-            azione.destinazione.parent.mkdir(parents=True, exist_ok=True)
+            if os.path.lexists(sorgente):
+                return f"'{sorgente}' esiste già, lasciato in '{destinazione}'"
+            if sorgente.parent not in cartelle_create:
+                sorgente.parent.mkdir(parents=True, exist_ok=True)
+                cartelle_create.add(sorgente.parent)
+            sposta_file(destinazione, sorgente, verifica=verifica_copie)
+            giornale.registra_ripristino(sorgente, destinazione)
+            return None
+        except OSError as e:
+            return f"{destinazione.name}: {e}"
 
-            # Gestisci conflitti di nomi
-            nome_file_dest = azione.destinazione
-            counter = 1
-            while nome_file_dest.exists():
-                nome_file_dest = azione.destinazione.parent / f"{azione.destinazione.stem}_{counter}{azione.destinazione.suffix}"
-                counter += 1
+    try:
+        if workers > 1:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                errori = list(pool.map(_ripristina, da_ripristinare))
+        else:
+            errori = [_ripristina(coppia) for coppia in da_ripristinare]
+        errori = [errore for errore in errori if errore is not None]
+        if not errori:
+            giornale.registra_fine("annullato")
+    finally:
+        giornale.chiudi()
+    for errore in errori:
+        logger(f"    ATTENZIONE: Impossibile ripristinare {errore}")
+    ripristinati = len(da_ripristinare) - len(errori)
+    logger(f"Annullamento completato. Ripristinati {ripristinati} file.")
+    return ripristinati
 
-            shutil.move(str(azione.sorgente), str(nome_file_dest))
-            logger(f"  -> Spostato: '{azione.sorgente.name}' in '{nome_file_dest.parent}' ({azione.motivazione})")
-            contatore_spostati += 1
 
-        except FileNotFoundError:
-            logger(f"    ATTENZIONE: File sorgente non trovato, impossibile spostare: {azione.sorgente}")
-        except Exception as e:
-            logger(f"    ERRORE durante lo spostamento di {azione.sorgente.name}: {e}")
+# --- Piano su file: scrittura durante la pianificazione, filtri, suddivisione e applicazione ---
 
-    logger(f"Esecuzione completata. Spostati {contatore_spostati} file.")
-    return contatore_spostati
+VERSIONE_FILE_PIANO = 1
+AZIONI_PER_BLOCCO_PIANO = 100_000 # Azioni di un file di piano tenute in memoria durante l'applicazione
 
 
-def pianifica_gestione_completa(cartella_musicale_path_abs: Path, cartella_duplicati_path_abs: Path, cartella_non_conformi_path_abs: Path, cartella_da_verificare_path_abs: Path, logger=_default_logger, progress_callback=None) -> List[SpostaFileAzione]:
+class ScrittorePiano:
     """
-    Esegue tutta la logica di analisi e pianificazione, ma NON esegue gli spostamenti.
-    Restituisce il piano di azioni completo.
+    Scrive un piano su file JSON Lines man mano che viene prodotto: una riga di intestazione
+    {"piano": 1} e poi una riga [sorgente, destinazione, motivazione] per azione, leggibile e
+    filtrabile anche con gli strumenti di testo. Il file viene scritto come "<nome>.parziale" e
+    rinominato solo alla chiusura senza errori: un piano interrotto non può essere applicato
+    per sbaglio. Usabile come context manager.
+    """
+    def __init__(self, percorso: Path):
+        self.percorso = Path(percorso)
+        self.azioni = 0
+        self._temporaneo = self.percorso.with_name(self.percorso.name + ".parziale")
+        self._file = open(self._temporaneo, 'w', encoding='utf-8')
+        self._file.write(json.dumps({"piano": VERSIONE_FILE_PIANO}) + "\n")
+
+    def scrivi(self, azione: SpostaFileAzione):
+        self._file.write(json.dumps([str(azione.sorgente), str(azione.destinazione), azione.motivazione], ensure_ascii=False) + "\n")
+        self.azioni += 1
+
+    def chiudi(self):
+        self._file.close()
+        os.replace(self._temporaneo, self.percorso)
+
+    def scarta(self):
+        self._file.close()
+        self._temporaneo.unlink(missing_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo_eccezione, *_):
+        if tipo_eccezione is None:
+            self.chiudi()
+        else:
+            self.scarta()
+
+
+def salva_piano(azioni: Iterable[SpostaFileAzione], percorso: Path) -> int:
+    """Scrive le azioni (anche un iteratore, consumato una volta) in un file di piano. Restituisce quante sono."""
+    with ScrittorePiano(percorso) as scrittore:
+        for azione in azioni:
+            scrittore.scrivi(azione)
+    return scrittore.azioni
+
+
+def leggi_piano(percorso: Path) -> Iterator[SpostaFileAzione]:
+    """Legge un file di piano una riga alla volta, senza caricarlo in memoria."""
+    with open(percorso, encoding='utf-8') as f:
+        try:
+            versione = json.loads(f.readline()).get("piano")
+        except (ValueError, AttributeError):
+            versione = None
+        if versione != VERSIONE_FILE_PIANO:
+            raise ValueError(f"'{percorso}' non è un file di piano valido.")
+        for numero, riga in enumerate(f, 2):
+            if not riga.strip():
+                continue
+            try:
+                sorgente, destinazione, motivazione = json.loads(riga)
+            except (ValueError, TypeError):
+                raise ValueError(f"File di piano '{percorso}' danneggiato alla riga {numero}.")
+            yield SpostaFileAzione(Path(sorgente), Path(destinazione), motivazione)
+
+
+def filtra_piano(azioni: Iterable[SpostaFileAzione], motivazioni: Optional[Iterable[str]] = None, testo: Optional[str] = None) -> Iterator[SpostaFileAzione]:
+    """
+    Tiene le azioni con una delle `motivazioni` (tutte se None) e, con `testo`, quelle in cui
+    il testo compare (senza distinzione di maiuscole) nel percorso di origine o di destinazione.
+    """
+    motivazioni = set(motivazioni) if motivazioni else None
+    testo = testo.casefold() if testo else None
+    for azione in azioni:
+        if motivazioni is not None and azione.motivazione not in motivazioni:
+            continue
+        if testo is not None and testo not in str(azione.sorgente).casefold() and testo not in str(azione.destinazione).casefold():
+            continue
+        yield azione
+
+
+def _a_blocchi(azioni: Iterable[SpostaFileAzione], dimensione: int) -> Iterator[List[SpostaFileAzione]]:
+    blocco: List[SpostaFileAzione] = []
+    for azione in azioni:
+        blocco.append(azione)
+        if len(blocco) == dimensione:
+            yield blocco
+            blocco = []
+    if blocco:
+        yield blocco
+
+
+def dividi_piano(azioni: Iterable[SpostaFileAzione], percorso: Path, azioni_per_parte: int) -> List[Path]:
+    """
+    Suddivide le azioni in file di piano da `azioni_per_parte` azioni ciascuno, chiamati come
+    `percorso` con ".parte001", ".parte002", ... prima dell'estensione. Restituisce i file scritti.
+    """
+    if azioni_per_parte < 1:
+        raise ValueError("Il numero di azioni per parte deve essere almeno 1.")
+    percorso = Path(percorso)
+    parti = []
+    for numero, blocco in enumerate(_a_blocchi(azioni, azioni_per_parte), 1):
+        parte = percorso.with_name(f"{percorso.stem}.parte{numero:03d}{percorso.suffix}")
+        salva_piano(blocco, parte)
+        parti.append(parte)
+    return parti
+
+
+def applica_piano(percorso_piano: Path, percorso_giornale: Path, logger=_default_logger, progress_callback=None, workers: int = 1, verifica_copie: bool = False,
+                  motivazioni: Optional[Iterable[str]] = None, testo: Optional[str] = None, azioni_per_blocco: int = AZIONI_PER_BLOCCO_PIANO) -> int:
+    """
+    Applica un file di piano (filtrato con `motivazioni` e `testo`, vedi `filtra_piano`),
+    registrando l'esecuzione nel giornale come `avvia_gestione_duplicati`. Il file viene letto
+    due volte, senza mai tenerlo tutto in memoria: la prima per scrivere il giornale (e
+    verificarlo per intero prima di spostare qualsiasi file), la seconda per eseguirlo a blocchi
+    di `azioni_per_blocco` azioni. Restituisce il numero di file spostati.
     """
-    # 1. Scansiona la cartella, sposta i non conformi e ottieni una lista di file audio validi
+    logger(f"\n--- Applicazione del Piano: {percorso_piano} ---")
+    if giornale_in_sospeso(percorso_giornale) is not None:
+        logger(f"Errore: Il giornale '{percorso_giornale}' contiene un piano interrotto. Riprendilo o annullalo prima di avviarne uno nuovo.")
+        return 0
+    giornale = GiornaleEsecuzione.crea(percorso_giornale, filtra_piano(leggi_piano(percorso_piano), motivazioni, testo))
+    spostati = azioni = 0
+    try:
+        for numero, blocco in enumerate(_a_blocchi(filtra_piano(leggi_piano(percorso_piano), motivazioni, testo), azioni_per_blocco), 1):
+            if numero > 1 or len(blocco) == azioni_per_blocco:
+                logger(f"Blocco {numero} del piano: {len(blocco)} azioni.")
+            spostati += esegui_piano_azioni(blocco, logger, progress_callback, workers, verifica_copie, giornale)
+            azioni += len(blocco)
+        _registra_completamento(giornale, spostati, azioni, logger)
+    finally:
+        giornale.chiudi()
+    logger(f"Piano applicato. Spostati {spostati} file. Giornale dell'esecuzione: {percorso_giornale}")
+    return spostati
+
+
+def genera_piano_gestione(cartella_musicale_path_abs: Path, cartella_duplicati_path_abs: Path, cartella_non_conformi_path_abs: Path, cartella_da_verificare_path_abs: Path, logger=_default_logger, progress_callback=None, opzioni: Optional[OpzioniAnalisi] = None) -> Iterator[SpostaFileAzione]:
+    """
+    Come `pianifica_gestione_completa`, ma restituisce le azioni man mano che ogni fase della
+    pianificazione le produce (con i nomi di destinazione già risolti), così possono essere
+    scritte su file (vedi `ScrittorePiano`) senza attendere la fine dell'analisi.
+    """
+    monitor = MonitorAvanzamento.da_callback(progress_callback)
+    # 1. Scansiona la cartella (in sola lettura): file audio validi e spostamenti dei non conformi
     logger("\n--- Fase 1: Scansione e Analisi File ---")
-    file_musicali_validi, _ = scansiona_cartella(
+    libreria, azioni_non_conformi = scansiona_libreria(
         cartella_musicale_path_abs,
         cartella_non_conformi_path_abs,
         logger,
-        progress_callback
+        monitor,
+        opzioni,
+        cartelle_escluse=[cartella_duplicati_path_abs, cartella_da_verificare_path_abs]
     )
+    # I nomi finali sono scelti da un solo risolutore, nell'ordine del piano: il piano mostra le
+    # destinazioni esatte e l'esecuzione non deve cercarne di libere
+    risolutore = RisolutoreNomi()
+    yield from risolvi_destinazioni(azioni_non_conformi, risolutore)
 
-    if not file_musicali_validi:
+    if not len(libreria):
         logger("Nessun file audio valido trovato da processare.")
-        return []
+        return
+
+    opzioni = opzioni or OpzioniAnalisi()
+    ids_validi = libreria.ids()
+    if opzioni.duplicati_esatti or opzioni.impronta_audio:
+        # 1b. Le copie dello stesso audio (o identiche byte per byte) vengono tolte per prime, anche se i tag differiscono
+        azioni_duplicati_esatti, ids_validi = pianifica_spostamento_duplicati_esatti_libreria(
+            libreria,
+            ids_validi,
+            cartella_duplicati_path_abs,
+            logger,
+            workers=opzioni.workers,
+            confronta_contenuto=opzioni.duplicati_esatti,
+            monitor=monitor
+        )
+        yield from risolvi_destinazioni(azioni_duplicati_esatti, risolutore)
 
-    # 2. Pianifica lo spostamento dei duplicati e ottieni la lista dei file unici mantenuti
-    azioni_duplicati, file_mantenuti = pianifica_spostamento_duplicati(
-        file_musicali_validi,
+    monitor.inizia_fase("pianificazione", totale=len(ids_validi))
+    # 2. Pianifica lo spostamento dei duplicati e ottieni gli id dei file unici mantenuti
+    azioni_duplicati, ids_mantenuti = pianifica_spostamento_duplicati_libreria(
+        libreria,
+        ids_validi,
         cartella_duplicati_path_abs,
-        logger
+        logger,
+        criteri_conservazione=opzioni.criteri_conservazione,
+        ignora_accenti=opzioni.ignora_accenti
     )
+    yield from risolvi_destinazioni(azioni_duplicati, risolutore)
 
     # 3. Pianifica lo spostamento delle diverse versioni dai file rimasti
-    azioni_da_verificare = pianifica_spostamento_da_verificare(
-        file_mantenuti,
+    azioni_da_verificare = pianifica_spostamento_da_verificare_libreria(
+        libreria,
+        ids_mantenuti,
         cartella_da_verificare_path_abs,
-        logger
+        logger,
+        ignora_accenti=opzioni.ignora_accenti
     )
+    yield from risolvi_destinazioni(azioni_da_verificare, risolutore)
+
+    if opzioni.raggruppa_simili:
+        # 4. Tra i file rimasti, raccoglie per revisione quelli con artista e titolo simili
+        gia_pianificati = {azione.sorgente for azione in azioni_da_verificare}
+        azioni_simili = pianifica_spostamento_simili_libreria(
+            libreria,
+            [id_file for id_file in ids_mantenuti if libreria.percorso(id_file) not in gia_pianificati],
+            cartella_da_verificare_path_abs,
+            logger,
+            soglia=opzioni.soglia_somiglianza
+        )
+        yield from risolvi_destinazioni(azioni_simili, risolutore)
+    monitor.avanza("pianificazione", len(ids_validi))
+    monitor.termina_fase("pianificazione")
+
 
-    return azioni_duplicati + azioni_da_verificare
+def pianifica_gestione_completa(cartella_musicale_path_abs: Path, cartella_duplicati_path_abs: Path, cartella_non_conformi_path_abs: Path, cartella_da_verificare_path_abs: Path, logger=_default_logger, progress_callback=None, opzioni: Optional[OpzioniAnalisi] = None) -> List[SpostaFileAzione]:
+    """
+    Esegue tutta la logica di analisi e pianificazione, ma NON esegue gli spostamenti.
+    Restituisce il piano di azioni completo, con i nomi di destinazione già liberi (suffisso _N
+    dove il nome è occupato).
+    `progress_callback` può essere una funzione (corrente, totale), chiamata durante l'analisi
+    dei file, o un `MonitorAvanzamento`, che riceve tutte le fasi.
+    """
+    return list(genera_piano_gestione(cartella_musicale_path_abs, cartella_duplicati_path_abs, cartella_non_conformi_path_abs,
+                                      cartella_da_verificare_path_abs, logger, progress_callback, opzioni))
 
 
-def avvia_gestione_duplicati(cartella_musicale_path_abs: Path, cartella_duplicati_path_abs: Path, cartella_non_conformi_path_abs: Path, cartella_da_verificare_path_abs: Path, logger=_default_logger, progress_callback=None):
+def avvia_gestione_duplicati(cartella_musicale_path_abs: Path, cartella_duplicati_path_abs: Path, cartella_non_conformi_path_abs: Path, cartella_da_verificare_path_abs: Path, logger=_default_logger, progress_callback=None, opzioni: Optional[OpzioniAnalisi] = None, percorso_giornale: Optional[Path] = None):
     """
     Funzione principale per orchestrare la scansione e lo spostamento dei duplicati.
     Chiama la pianificazione e poi esegue immediatamente il piano.
+    Con un `MonitorAvanzamento` come `progress_callback` vengono riportate anche le fasi
+    successive all'analisi, spostamento compreso.
+    L'esecuzione è registrata in `percorso_giornale` (default: NOME_FILE_GIORNALE nella cartella
+    dei duplicati), da cui `riprendi_piano` e `annulla_piano` possono ripartire. Se il giornale
+    contiene un piano interrotto, non ne viene avviato uno nuovo.
     """
     logger(f"Avvio gestione completa per: {cartella_musicale_path_abs}")
 
@@ -451,6 +3885,11 @@ def avvia_gestione_duplicati(cartella_musicale_path_abs: Path, cartella_duplicat
         logger(f"Errore: La cartella musicale '{cartella_musicale_path_abs}' non esiste o non è una directory.")
         return
 
+    percorso_giornale = percorso_giornale or cartella_duplicati_path_abs / NOME_FILE_GIORNALE
+    if giornale_in_sospeso(percorso_giornale) is not None:
+        logger(f"Errore: Il giornale '{percorso_giornale}' contiene un piano interrotto. Riprendilo o annullalo prima di avviarne uno nuovo.")
+        return
+
     # Assicura che le cartelle di destinazione esistano prima di ogni operazione
     for p in [cartella_duplicati_path_abs, cartella_non_conformi_path_abs, cartella_da_verificare_path_abs]:
         try:
@@ -466,27 +3905,90 @@ def avvia_gestione_duplicati(cartella_musicale_path_abs: Path, cartella_duplicat
         cartella_non_conformi_path_abs,
         cartella_da_verificare_path_abs,
         logger,
-        progress_callback
+        progress_callback,
+        opzioni
     )
 
     # Esegui il piano
-    esegui_piano_azioni(piano_completo, logger)
+    opzioni = opzioni or OpzioniAnalisi()
+    esegui_piano_con_giornale(piano_completo, percorso_giornale, logger, progress_callback, workers=opzioni.workers, verifica_copie=opzioni.verifica_copie)
 
     logger("\n--- Operazione Completata ---")
 
 def main_cli():
     parser = argparse.ArgumentParser(description="Identifica e sposta i file musicali duplicati e non conformi.")
-    parser.add_argument("cartella_musicale", type=str, help="La cartella musicale da analizzare.")
+    parser.add_argument("cartella_musicale", type=str, nargs="?",
+                        help="La cartella musicale da analizzare (non serve con --applica-piano).")
     parser.add_argument("--cartella-duplicati", type=str, default="DOPPIONI",
                         help="La cartella dove spostare i file audio duplicati (default: DOPPIONI).")
     parser.add_argument("--cartella-non-conformi", type=str, default="NON CONFORMI",
                         help="La cartella dove spostare i file non conformi/video (default: NON CONFORMI).")
     parser.add_argument("--cartella-da-verificare", type=str, default="DA_VERIFICARE",
                         help="Sottocartella (relativa a --cartella-duplicati) per file che necessitano revisione (default: DA_VERIFICARE).")
+    parser.add_argument("--cache", action="store_true",
+                        help=f"Usa una cache persistente dei tag: le riscansioni rileggono solo i file nuovi o modificati (default: {NOME_FILE_CACHE} nella cartella musicale).")
+    parser.add_argument("--file-cache", type=str, default=None,
+                        help="Percorso alternativo del database della cache (implica --cache).")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Numero di thread per la lettura dei tag e per gli spostamenti; utile su dischi di rete (default: 1, seriale).")
+    parser.add_argument("--duplicati-esatti", action="store_true",
+                        help="Cerca anche le copie con contenuto identico byte per byte, anche se i tag sono diversi o mancanti.")
+    parser.add_argument("--impronta-audio", action="store_true",
+                        help="Confronta i soli frame audio degli MP3 (ignorando tag ID3/APE): trova le copie dello stesso brano con tag diversi.")
+    parser.add_argument("--simili", action="store_true",
+                        help="Raccoglie in DA_VERIFICARE anche i brani con artista/titolo simili ma non identici (refusi, 'The', 'feat.').")
+    parser.add_argument("--ignora-accenti", "--fold-accents", action="store_true",
+                        help="Confronta artista e titolo senza accenti: 'Beyoncé' e 'Beyonce' sono lo stesso artista.")
+    parser.add_argument("--soglia-simili", type=float, default=SOGLIA_SOMIGLIANZA_PREDEFINITA,
+                        help=f"Somiglianza minima (0-1) di artista e titolo per --simili (default: {SOGLIA_SOMIGLIANZA_PREDEFINITA}).")
+    parser.add_argument("--conserva", type=str, default="dimensione", metavar="CRITERI",
+                        help=f"Come scegliere il file da mantenere tra i duplicati: 'dimensione' (default), 'qualita' "
+                             f"(bitrate, poi frequenza, poi dimensione) o un elenco di criteri separati da virgole tra "
+                             f"{', '.join(CRITERI_CONSERVAZIONE)}; un '-' davanti inverte il criterio (es. 'bitrate,-durata').")
+    parser.add_argument("--verifica-copie", action="store_true",
+                        help="Quando DOPPIONI è su un altro disco, confronta l'hash di ogni copia con l'originale prima di eliminarlo.")
+    parser.add_argument("--processi", type=int, default=0,
+                        help="Numero di processi per l'analisi (lettura tag e normalizzazione) su librerie molto grandi; ha la precedenza su --workers (default: 0, disattivato).")
+    parser.add_argument("--giornale", type=str, default=None,
+                        help=f"File in cui registrare gli spostamenti eseguiti (default: {NOME_FILE_GIORNALE} nella cartella dei duplicati).")
+    azione_giornale = parser.add_mutually_exclusive_group()
+    azione_giornale.add_argument("--riprendi", action="store_true",
+                                 help="Riprende dal giornale un piano interrotto, senza rifare l'analisi.")
+    azione_giornale.add_argument("--annulla", action="store_true",
+                                 help="Riporta nella posizione originale i file spostati dall'ultimo piano registrato nel giornale.")
+    parser.add_argument("--profila", "--profile", action="store_true",
+                        help="Misura tempi e chiamate delle funzioni principali e conta stat, letture dei tag, regex e accessi alla cache; "
+                             "a fine esecuzione stampa il profilo e lo salva in JSON (vedi --profila-file).")
+    parser.add_argument("--profila-file", "--profile-file", type=str, default=None, metavar="FILE",
+                        help="File JSON del report di profilazione (default: tuneup_profilo.json); implica --profila.")
+    parser.add_argument("--profila-fase", type=str, default=None, choices=FASI_AVANZAMENTO,
+                        help="Registra anche un profilo cProfile della fase indicata, accanto al report (es. tuneup_profilo_analisi.pstats).")
+    parser.add_argument("--salva-piano", "--plan-out", type=str, default=None, metavar="FILE",
+                        help="Scrive il piano nel FILE man mano che viene costruito, senza spostare i duplicati; con --applica-piano "
+                             "scrive invece il piano filtrato.")
+    parser.add_argument("--applica-piano", "--apply-plan", type=str, default=None, metavar="FILE",
+                        help="Applica un piano salvato con --salva-piano, senza rifare l'analisi.")
+    parser.add_argument("--motivazione", action="append", default=None, metavar="MOTIVAZIONE",
+                        help="Con --applica-piano, solo le azioni con questa motivazione (es. 'Duplicato'); ripetibile.")
+    parser.add_argument("--filtra", type=str, default=None, metavar="TESTO",
+                        help="Con --applica-piano, solo le azioni con TESTO nel percorso di origine o di destinazione.")
+    parser.add_argument("--dividi", type=int, default=None, metavar="N",
+                        help="Con --applica-piano, invece di applicarlo divide il piano in file da N azioni (FILE.parte001, ...).")
     
     args = parser.parse_args()
+    try:
+        criteri_conservazione = criteri_da_testo(args.conserva)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.cartella_musicale is None and not args.applica_piano and not ((args.riprendi or args.annulla) and args.giornale):
+        parser.error("specificare la cartella musicale (non serve con --applica-piano, né con --riprendi/--annulla insieme a --giornale).")
+    if not args.applica_piano and (args.motivazione or args.filtra is not None or args.dividi is not None):
+        parser.error("--motivazione, --filtra e --dividi si usano con --applica-piano.")
+    if args.dividi is not None and args.dividi < 1:
+        parser.error("--dividi deve essere almeno 1.")
 
-    cartella_musicale_path = Path(args.cartella_musicale)
+    # Senza cartella musicale (piano o giornale già pronti) le cartelle relative partono da quella corrente
+    cartella_musicale_path = Path(args.cartella_musicale or ".")
     
     cartella_duplicati_path_arg = Path(args.cartella_duplicati)
     if not cartella_duplicati_path_arg.is_absolute():
@@ -504,46 +4006,126 @@ def main_cli():
     cartella_da_verificare_nome_sottocartella = Path(args.cartella_da_verificare)
     cartella_da_verificare_path_abs = (cartella_duplicati_path_abs / cartella_da_verificare_nome_sottocartella).resolve()
 
+    opzioni = OpzioniAnalisi(
+        usa_cache=args.cache or args.file_cache is not None,
+        percorso_cache=Path(args.file_cache).resolve() if args.file_cache else None,
+        workers=max(1, args.workers),
+        processi=max(0, args.processi),
+        duplicati_esatti=args.duplicati_esatti,
+        impronta_audio=args.impronta_audio,
+        raggruppa_simili=args.simili,
+        ignora_accenti=args.ignora_accenti,
+        soglia_somiglianza=min(1.0, max(0.0, args.soglia_simili)),
+        criteri_conservazione=criteri_conservazione,
+        verifica_copie=args.verifica_copie
+    )
+
     # Definisco un logger specifico per la CLI che usa print con flush=True
-    def cli_logger(messaggio):
+    def cli_logger(messaggio, flush=True): # flush è per compatibilità con _default_logger
         print(messaggio, flush=True)
 
-    # Definisco un callback per la progress bar per la CLI
-    ultimo_percentuale_stampata = -1
-    def cli_progress_callback(corrente, totale):
-        nonlocal ultimo_percentuale_stampata
-        if totale > 0:
-            percentuale = int((corrente / totale) * 100)
-            if percentuale > ultimo_percentuale_stampata:
-                 # Stampa sulla stessa riga sovrascrivendo
-                print(f"Progresso scansione: {corrente}/{totale} ({percentuale}%)          \r", end="", flush=True)
-                ultimo_percentuale_stampata = percentuale
-        if corrente == totale: # A fine scansione, vai a nuova riga
-            print() 
-
-    # Creazione iniziale delle cartelle qui, prima di chiamare la logica principale
-    # così avvia_gestione_duplicati può assumerle esistenti (o tentare di ricrearle).
-    if not cartella_musicale_path.is_dir():
-        cli_logger(f"Errore: La cartella musicale '{cartella_musicale_path}' non esiste o non è una directory.")
-        return
+    # Definisco un callback per l'avanzamento nella CLI: il monitor lo chiama al più
+    # 4 volte al secondo per fase, con velocità e tempo stimato
+    def cli_progress_callback(stato: StatoAvanzamento):
+        # Stampa sulla stessa riga sovrascrivendo
+        print(f"Progresso {stato.descrizione():<90}\r", end="", flush=True)
+        if stato.completata: # A fine fase, vai a nuova riga
+            print()
+    monitor = MonitorAvanzamento(cli_progress_callback)
 
-    for p in [cartella_duplicati_path_abs, cartella_non_conformi_path_abs, cartella_da_verificare_path_abs]:
-        if not p.exists():
-            cli_logger(f"Creo la cartella: {p}")
-            try:
-                p.mkdir(parents=True, exist_ok=True)
-            except OSError as e:
-                cli_logger(f"Errore durante la creazione della cartella '{p}': {e}")
+    def cli_riepilogo_fasi():
+        riepilogo = monitor.righe_riepilogo()
+        if riepilogo:
+            cli_logger("\nTempi per fase:")
+            for riga in riepilogo:
+                cli_logger(riga)
+
+    if args.giornale:
+        percorso_giornale = Path(args.giornale).resolve()
+    elif args.cartella_musicale is None and args.applica_piano:
+        percorso_giornale = Path(args.applica_piano).resolve().parent / NOME_FILE_GIORNALE
+    else:
+        percorso_giornale = cartella_duplicati_path_abs / NOME_FILE_GIORNALE
+    # Tutto il lavoro (anche ripresa, annullamento e piani su file) è profilabile con --profila
+    def cli_esegui():
+        if args.riprendi or args.annulla:
+            if not percorso_giornale.is_file():
+                cli_logger(f"Errore: Il giornale '{percorso_giornale}' non esiste.")
                 return
-    
-    avvia_gestione_duplicati(
-        cartella_musicale_path.resolve(), 
-        cartella_duplicati_path_abs, 
-        cartella_non_conformi_path_abs,
-        cartella_da_verificare_path_abs,
-        logger=cli_logger,
-        progress_callback=cli_progress_callback
-    )
+            if args.riprendi:
+                riprendi_piano(percorso_giornale, cli_logger, monitor, opzioni.workers, opzioni.verifica_copie)
+            else:
+                annulla_piano(percorso_giornale, cli_logger, opzioni.workers, opzioni.verifica_copie)
+            return
+
+        if args.applica_piano:
+            percorso_piano = Path(args.applica_piano)
+            azioni = filtra_piano(leggi_piano(percorso_piano), args.motivazione, args.filtra)
+            try:
+                if args.dividi:
+                    parti = dividi_piano(azioni, percorso_piano, args.dividi)
+                    cli_logger(f"Piano diviso in {len(parti)} file:")
+                    for parte in parti:
+                        cli_logger(f"  {parte}")
+                elif args.salva_piano:
+                    cli_logger(f"Scritte {salva_piano(azioni, Path(args.salva_piano))} azioni in '{args.salva_piano}'.")
+                else:
+                    applica_piano(percorso_piano, percorso_giornale, cli_logger, monitor, opzioni.workers, opzioni.verifica_copie,
+                                  args.motivazione, args.filtra)
+            except (OSError, ValueError) as e:
+                cli_logger(f"Errore: {e}")
+            return
+
+        # Creazione iniziale delle cartelle qui, prima di chiamare la logica principale
+        # così avvia_gestione_duplicati può assumerle esistenti (o tentare di ricrearle).
+        if not cartella_musicale_path.is_dir():
+            cli_logger(f"Errore: La cartella musicale '{cartella_musicale_path}' non esiste o non è una directory.")
+            return
+
+        # Con --salva-piano non si sposta nulla: le cartelle le crea poi applica_piano
+        for p in [] if args.salva_piano else [cartella_duplicati_path_abs, cartella_non_conformi_path_abs, cartella_da_verificare_path_abs]:
+            if not p.exists():
+                cli_logger(f"Creo la cartella: {p}")
+                try:
+                    p.mkdir(parents=True, exist_ok=True)
+                except OSError as e:
+                    cli_logger(f"Errore durante la creazione della cartella '{p}': {e}")
+                    return
+
+        if args.salva_piano:
+            # Solo la pianificazione: ogni fase scrive le sue azioni nel file appena le ha prodotte
+            azioni_salvate = salva_piano(genera_piano_gestione(cartella_musicale_path.resolve(), cartella_duplicati_path_abs,
+                                                               cartella_non_conformi_path_abs, cartella_da_verificare_path_abs,
+                                                               cli_logger, monitor, opzioni), Path(args.salva_piano))
+            cli_logger(f"\nPiano salvato in '{args.salva_piano}': {azioni_salvate} azioni. Applicalo con --applica-piano.")
+        else:
+            avvia_gestione_duplicati(
+                cartella_musicale_path.resolve(), 
+                cartella_duplicati_path_abs, 
+                cartella_non_conformi_path_abs,
+                cartella_da_verificare_path_abs,
+                logger=cli_logger,
+                progress_callback=monitor,
+                opzioni=opzioni,
+                percorso_giornale=percorso_giornale
+            )
+
+    profilatore = None
+    if args.profila or args.profila_file or args.profila_fase:
+        file_report = Path(args.profila_file or "tuneup_profilo.json")
+        file_cprofile = file_report.with_name(f"{file_report.stem}_{args.profila_fase}.pstats") if args.profila_fase else None
+        profilatore = Profilatore(args.profila_fase, file_cprofile)
+    with profilazione(profilatore):
+        cli_esegui()
+    cli_riepilogo_fasi()
+    if profilatore is not None:
+        report = profilatore.report(monitor)
+        cli_logger("\nProfilo dell'esecuzione:")
+        for riga in Profilatore.righe_report(report):
+            cli_logger(riga)
+        file_report.write_text(json.dumps(report, indent=1), encoding="utf-8")
+        cli_logger(f"Report del profilo (JSON): {file_report}")
 
 if __name__ == "__main__":
+    multiprocessing.freeze_support()
     main_cli() 
\ No newline at end of file
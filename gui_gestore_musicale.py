@@ -3,18 +3,45 @@ from tkinter import filedialog, scrolledtext, messagebox
 import ttkbootstrap as ttk
 from ttkbootstrap.constants import *
 import threading
+import json
+import multiprocessing
+import tempfile
+import time
 from pathlib import Path
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 # Importa le nuove funzioni di pianificazione ed esecuzione
 from gestore_duplicati_musicali import (
     pianifica_gestione_completa,
-    esegui_piano_azioni,
-    SpostaFileAzione
+    esegui_piano_con_giornale,
+    riprendi_piano,
+    annulla_piano,
+    giornale_in_sospeso,
+    NOME_FILE_GIORNALE,
+    SpostaFileAzione,
+    OpzioniAnalisi,
+    PercorsoCartella,
+    POLITICHE_CONSERVAZIONE,
+    criteri_da_testo,
+    CodaLog,
+    MonitorAvanzamento,
+    StatoAvanzamento,
+    IndicePiano,
+    Profilatore,
+    profilazione
 )
 
+MASSIMO_RIGHE_LOG = 5000 # Righe mantenute nell'area di log (il log completo è salvato su file)
+INTERVALLO_AGGIORNAMENTO_MS = 100 # Ogni quanto il main loop mostra i nuovi messaggi e il progresso
+DIMENSIONE_PAGINA_ANTEPRIMA = 500 # Righe inserite nell'anteprima a ogni caricamento di un gruppo
+
 class PreviewWindow(ttk.Toplevel):
-    """Finestra modale per visualizzare l'anteprima del piano di azioni."""
+    """
+    Finestra modale per visualizzare l'anteprima del piano di azioni.
+    Le azioni sono raggruppate per motivazione e inserite nel Treeview a pagine, solo quando
+    un gruppo viene aperto e si scorre fino in fondo: anche piani con centinaia di migliaia
+    di azioni si aprono subito. La ricerca usa l'indice di `IndicePiano`, preparato in background.
+    """
     def __init__(self, parent, piano: List[SpostaFileAzione], execute_callback, cartella_musicale_base: str):
         super().__init__(parent)
         self.transient(parent)
@@ -24,9 +51,13 @@ class PreviewWindow(ttk.Toplevel):
         self.piano = piano
         self.execute_callback = execute_callback
         self.cartella_musicale_base = cartella_musicale_base
+        self.indice = IndicePiano(piano, cartella_musicale_base)
+        self._gruppi_mostrati: Dict[str, List[int]] = {} # Indici delle azioni per motivazione (filtrati)
+        self._righe_caricate: Dict[str, int] = {} # Quante righe di ogni gruppo sono già nel Treeview
 
         self.create_widgets()
         self.populate_tree()
+        threading.Thread(target=self.indice.prepara_ricerca, daemon=True).start()
 
         self.protocol("WM_DELETE_WINDOW", self.cancel)
         self.grab_set()
@@ -36,46 +67,124 @@ class PreviewWindow(ttk.Toplevel):
         main_frame = ttk.Frame(self, padding="10")
         main_frame.pack(expand=True, fill=tk.BOTH)
 
-        # Treeview per mostrare il piano
+        # Ricerca per artista, titolo o cartella
+        search_frame = ttk.Frame(main_frame)
+        search_frame.grid(row=0, column=0, columnspan=2, sticky="ew", pady=(0, 5))
+        ttk.Label(search_frame, text="Cerca (artista, titolo, cartella):").pack(side=tk.LEFT)
+        self.ricerca_var = tk.StringVar()
+        ricerca_entry = ttk.Entry(search_frame, textvariable=self.ricerca_var, width=40)
+        ricerca_entry.pack(side=tk.LEFT, padx=5)
+        ricerca_entry.bind("<Return>", lambda _evento: self.avvia_ricerca())
+        ttk.Button(search_frame, text="Cerca", command=self.avvia_ricerca).pack(side=tk.LEFT)
+        ttk.Button(search_frame, text="Azzera", command=self.azzera_ricerca).pack(side=tk.LEFT, padx=5)
+
+        # Treeview per mostrare il piano: un nodo per motivazione, con le azioni come figli
         columns = ("sorgente", "destinazione", "motivazione")
-        self.tree = ttk.Treeview(main_frame, columns=columns, show="headings")
+        self.tree = ttk.Treeview(main_frame, columns=columns, show="tree headings")
 
+        self.tree.heading("#0", text="Gruppo")
         self.tree.heading("sorgente", text="File Originale")
         self.tree.heading("destinazione", text="Nuova Posizione")
         self.tree.heading("motivazione", text="Motivazione")
 
-        self.tree.column("sorgente", width=350)
-        self.tree.column("destinazione", width=350)
-        self.tree.column("motivazione", width=150, anchor=tk.CENTER)
+        self.tree.column("#0", width=220, stretch=False)
+        self.tree.column("sorgente", width=300)
+        self.tree.column("destinazione", width=300)
+        self.tree.column("motivazione", width=130, anchor=tk.CENTER)
 
-        # Scrollbar
+        # Scrollbar: a ogni scorrimento si caricano le pagine il cui segnaposto è diventato visibile
         scrollbar = ttk.Scrollbar(main_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscroll=scrollbar.set)
 
-        self.tree.grid(row=0, column=0, sticky="nsew")
-        scrollbar.grid(row=0, column=1, sticky="ns")
+        def _scorrimento(primo, ultimo):
+            scrollbar.set(primo, ultimo)
+            self.after_idle(self._carica_segnaposto_visibili)
+        self.tree.configure(yscrollcommand=_scorrimento)
+        self.tree.bind("<<TreeviewOpen>>", self._gruppo_aperto)
+        self.tree.bind("<Double-1>", self._doppio_clic)
+
+        self.tree.grid(row=1, column=0, sticky="nsew")
+        scrollbar.grid(row=1, column=1, sticky="ns")
 
-        main_frame.rowconfigure(0, weight=1)
+        main_frame.rowconfigure(1, weight=1)
         main_frame.columnconfigure(0, weight=1)
 
         # Frame per i pulsanti
         button_frame = ttk.Frame(main_frame, padding="10")
-        button_frame.grid(row=1, column=0, columnspan=2, sticky="ew")
+        button_frame.grid(row=2, column=0, columnspan=2, sticky="ew")
 
+        self.riepilogo_var = tk.StringVar()
+        ttk.Label(button_frame, textvariable=self.riepilogo_var).pack(side=tk.LEFT)
         ttk.Button(button_frame, text="Esegui Spostamenti", command=self.execute).pack(side=tk.RIGHT, padx=5)
         ttk.Button(button_frame, text="Annulla", command=self.cancel).pack(side=tk.RIGHT)
 
-    def populate_tree(self):
-        for azione in self.piano:
-            # Mostra percorsi relativi alla cartella musicale per leggibilità, se possibile
-            try:
-                sorgente_rel = azione.sorgente.relative_to(self.cartella_musicale_base)
-                dest_rel = azione.destinazione.relative_to(self.cartella_musicale_base)
-            except ValueError:
-                sorgente_rel = azione.sorgente
-                dest_rel = azione.destinazione
+    def populate_tree(self, gruppi: Optional[Dict[str, List[int]]] = None, filtro: str = ""):
+        """Mostra un nodo (chiuso) per ogni motivazione; le righe vengono caricate all'apertura."""
+        self.tree.delete(*self.tree.get_children())
+        self._gruppi_mostrati = self.indice.gruppi() if gruppi is None else gruppi
+        self._righe_caricate = {}
+        for motivazione, indici in self._gruppi_mostrati.items():
+            nodo = self.tree.insert("", tk.END, iid=f"gruppo:{motivazione}", text=f"{motivazione} ({len(indici):,})".replace(",", "."), open=False)
+            self._righe_caricate[motivazione] = 0
+            self._inserisci_segnaposto(nodo, motivazione)
+
+        mostrate = sum(len(indici) for indici in self._gruppi_mostrati.values())
+        if filtro:
+            testo = f"'{filtro}': {mostrate:,} azioni su {len(self.piano):,}. Il filtro riguarda solo l'anteprima: verranno eseguite tutte le azioni."
+        else:
+            testo = f"{len(self.piano):,} azioni in {len(self._gruppi_mostrati)} gruppi."
+        self.riepilogo_var.set(testo.replace(",", "."))
+
+    def _inserisci_segnaposto(self, nodo, motivazione):
+        rimanenti = len(self._gruppi_mostrati[motivazione]) - self._righe_caricate[motivazione]
+        if rimanenti > 0:
+            self.tree.insert(nodo, tk.END, iid=f"altri:{motivazione}",
+                             text=f"... altri {rimanenti:,}".replace(",", "."), values=("(scorri o fai doppio clic per caricarli)", "", ""))
+
+    def _carica_pagina(self, motivazione):
+        segnaposto = f"altri:{motivazione}"
+        if not self.tree.exists(segnaposto):
+            return
+        self.tree.delete(segnaposto)
+        nodo = f"gruppo:{motivazione}"
+        inizio = self._righe_caricate[motivazione]
+        fine = min(inizio + DIMENSIONE_PAGINA_ANTEPRIMA, len(self._gruppi_mostrati[motivazione]))
+        for indice in self._gruppi_mostrati[motivazione][inizio:fine]:
+            self.tree.insert(nodo, tk.END, iid=str(indice), values=self.indice.riga(indice))
+        self._righe_caricate[motivazione] = fine
+        self._inserisci_segnaposto(nodo, motivazione)
+
+    def _gruppo_aperto(self, _evento):
+        elemento = self.tree.focus()
+        if elemento.startswith("gruppo:") and self._righe_caricate.get(elemento[len("gruppo:"):]) == 0:
+            self._carica_pagina(elemento[len("gruppo:"):])
+
+    def _doppio_clic(self, evento):
+        elemento = self.tree.identify_row(evento.y)
+        if elemento.startswith("altri:"):
+            self._carica_pagina(elemento[len("altri:"):])
+
+    def _carica_segnaposto_visibili(self):
+        for motivazione in self._gruppi_mostrati:
+            segnaposto = f"altri:{motivazione}"
+            if self.tree.exists(segnaposto) and self.tree.item(f"gruppo:{motivazione}", "open") and self.tree.bbox(segnaposto):
+                self._carica_pagina(motivazione)
+
+    def avvia_ricerca(self):
+        filtro = self.ricerca_var.get().strip()
+        if not filtro:
+            self.azzera_ricerca()
+            return
+        self.riepilogo_var.set("Ricerca in corso...")
 
-            self.tree.insert("", tk.END, values=(str(sorgente_rel), str(dest_rel), azione.motivazione))
+        def _cerca():
+            # La prima ricerca può attendere l'indice, ancora in costruzione nel thread di background
+            gruppi = self.indice.gruppi(filtro)
+            self.after(0, self.populate_tree, gruppi, filtro)
+        threading.Thread(target=_cerca, daemon=True).start()
+
+    def azzera_ricerca(self):
+        self.ricerca_var.set("")
+        self.populate_tree()
 
     def execute(self):
         self.execute_callback(self.piano)
@@ -85,6 +194,69 @@ class PreviewWindow(ttk.Toplevel):
         self.destroy()
 
 
+class ProfiloWindow(ttk.Toplevel):
+    """
+    Pannello con il profilo dell'ultima operazione (vedi `Profilatore.report`): tempi per fase,
+    chiamate e tempo delle funzioni principali, contatori e statistiche del processo.
+    Il report può essere salvato in JSON.
+    """
+    def __init__(self, parent, report: dict):
+        super().__init__(parent)
+        self.transient(parent)
+        self.title("Profilo dell'Ultima Operazione")
+        self.geometry("760x480")
+        self.report = report
+        self.create_widgets()
+        self.populate_tree()
+
+    def create_widgets(self):
+        main_frame = ttk.Frame(self, padding="10")
+        main_frame.pack(expand=True, fill=tk.BOTH)
+
+        colonne = ("valore", "secondi", "per_unita")
+        self.tree = ttk.Treeview(main_frame, columns=colonne, show="tree headings")
+        self.tree.heading("#0", text="Voce")
+        self.tree.heading("valore", text="Elementi / Chiamate")
+        self.tree.heading("secondi", text="Secondi")
+        self.tree.heading("per_unita", text="Velocità / Tempo per Chiamata")
+        self.tree.column("#0", width=260)
+        for colonna in colonne:
+            self.tree.column(colonna, width=150, anchor=tk.E)
+        vsb = ttk.Scrollbar(main_frame, orient="vertical", command=self.tree.yview)
+        self.tree.configure(yscrollcommand=vsb.set)
+        self.tree.grid(row=0, column=0, sticky="nsew")
+        vsb.grid(row=0, column=1, sticky="ns")
+        main_frame.grid_rowconfigure(0, weight=1)
+        main_frame.grid_columnconfigure(0, weight=1)
+
+        button_frame = ttk.Frame(main_frame, padding=(0, 10, 0, 0))
+        button_frame.grid(row=1, column=0, columnspan=2, sticky="ew")
+        ttk.Button(button_frame, text="Salva JSON...", command=self.salva, bootstyle="info").pack(side=tk.LEFT)
+        ttk.Button(button_frame, text="Chiudi", command=self.destroy, bootstyle="secondary").pack(side=tk.RIGHT)
+
+    def populate_tree(self):
+        fasi = self.tree.insert("", tk.END, text="Fasi", open=True)
+        for fase in self.report["fasi"]:
+            velocita = f"{fase['elementi_al_secondo']:.0f}/s" if fase["elementi_al_secondo"] else "-"
+            self.tree.insert(fasi, tk.END, text=fase["fase"], values=(fase["elementi"], f"{fase['secondi']:.3f}", velocita))
+        funzioni = self.tree.insert("", tk.END, text="Funzioni", open=True)
+        for nome, voce in self.report["funzioni"].items():
+            per_chiamata = voce["secondi"] / voce["chiamate"] * 1e6 if voce["chiamate"] else 0
+            self.tree.insert(funzioni, tk.END, text=nome, values=(voce["chiamate"], f"{voce['secondi']:.3f}", f"{per_chiamata:.1f} µs"))
+        contatori = self.tree.insert("", tk.END, text="Contatori", open=True)
+        for nome, valore in self.report["contatori"].items():
+            self.tree.insert(contatori, tk.END, text=nome, values=(valore, "", ""))
+        processo = self.tree.insert("", tk.END, text="Processo", open=True)
+        for nome, valore in self.report["processo"].items():
+            self.tree.insert(processo, tk.END, text=nome, values=(valore, "", ""))
+
+    def salva(self):
+        percorso = filedialog.asksaveasfilename(parent=self, title="Salva il profilo", defaultextension=".json",
+                                                initialfile="tuneup_profilo.json", filetypes=[("JSON", "*.json")])
+        if percorso:
+            Path(percorso).write_text(json.dumps(self.report, indent=1), encoding="utf-8")
+
+
 class SplashScreen(ttk.Toplevel):
     """Schermata di avvio (splash screen)."""
     def __init__(self, parent):
@@ -125,12 +297,35 @@ class AppGestoreMusicaleV0_1:
         # Variabili di stato
         self.conteggio_file_iniziale = 0
 
+        # I thread di lavoro non toccano mai i widget: scrivono nella coda di log e in
+        # `_progresso`, che il main loop di Tk legge periodicamente (vedi `_aggiorna_da_coda`).
+        percorso_log = Path(tempfile.gettempdir()) / f"tuneup_log_{time.strftime('%Y%m%d_%H%M%S')}.txt"
+        self.coda_log = CodaLog(MASSIMO_RIGHE_LOG, percorso_log)
+        self._progresso = None # Ultimo StatoAvanzamento ricevuto, non ancora mostrato
+        self._fase_mostrata = None # Fase (diversa dalla visita) mostrata dalla barra
+        self.progresso_var = tk.StringVar()
+
         # Variabili per i percorsi delle cartelle
         self.cartella_musicale_var = tk.StringVar()
         self.cartella_duplicati_var = tk.StringVar()
         self.cartella_non_conformi_var = tk.StringVar()
         self.cartella_da_verificare_var = tk.StringVar() # Variabile per il percorso DA VERIFICARE
 
+        # Variabili per le opzioni di analisi
+        self.usa_cache_var = tk.BooleanVar(value=False)
+        self.workers_var = tk.IntVar(value=1)
+        self.processi_var = tk.IntVar(value=0)
+        self.duplicati_esatti_var = tk.BooleanVar(value=False)
+        self.impronta_audio_var = tk.BooleanVar(value=False)
+        self.raggruppa_simili_var = tk.BooleanVar(value=False)
+        self.ignora_accenti_var = tk.BooleanVar(value=False)
+        self.conserva_var = tk.StringVar(value="dimensione")
+        self.verifica_copie_var = tk.BooleanVar(value=False)
+        self.profila_var = tk.BooleanVar(value=False)
+        self._report_profilo = None # Report del Profilatore dell'ultima operazione profilata
+        self._spostamenti_in_corso = False # True mentre il thread degli spostamenti è attivo
+        self.widget_opzioni = [] # Widget da disabilitare durante l'analisi
+
         # Frame principale
         main_frame = ttk.Frame(self.root, padding="10")
         main_frame.grid(row=0, column=0, sticky=(tk.W, tk.E, tk.N, tk.S))
@@ -165,10 +360,57 @@ class AppGestoreMusicaleV0_1:
         file_count_label = ttk.Label(cartelle_frame, textvariable=self.file_count_var, bootstyle="info")
         file_count_label.grid(row=4, column=0, columnspan=3, sticky=tk.W, padx=5, pady=5)
 
+        # ---- Sezione Opzioni ----
+        opzioni_frame = ttk.LabelFrame(main_frame, text="Opzioni Analisi", padding="10")
+        opzioni_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+
+        cache_check = ttk.Checkbutton(opzioni_frame, text="Usa cache di scansione (rilegge solo i file nuovi o modificati)", variable=self.usa_cache_var)
+        cache_check.grid(row=0, column=0, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(cache_check)
+
+        ttk.Label(opzioni_frame, text="Thread (tag e spostamenti):").grid(row=0, column=1, sticky=tk.W, padx=(20, 5), pady=2)
+        workers_spin = ttk.Spinbox(opzioni_frame, from_=1, to=32, textvariable=self.workers_var, width=5)
+        workers_spin.grid(row=0, column=2, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(workers_spin)
+
+        ttk.Label(opzioni_frame, text="Processi di analisi (0 = off):").grid(row=0, column=3, sticky=tk.W, padx=(20, 5), pady=2)
+        processi_spin = ttk.Spinbox(opzioni_frame, from_=0, to=64, textvariable=self.processi_var, width=5)
+        processi_spin.grid(row=0, column=4, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(processi_spin)
+
+        esatti_check = ttk.Checkbutton(opzioni_frame, text="Cerca copie identiche (contenuto uguale, tag diversi)", variable=self.duplicati_esatti_var)
+        esatti_check.grid(row=1, column=0, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(esatti_check)
+
+        impronta_check = ttk.Checkbutton(opzioni_frame, text="Confronta solo l'audio MP3 (ignora i tag ID3/APE)", variable=self.impronta_audio_var)
+        impronta_check.grid(row=1, column=1, columnspan=4, sticky=tk.W, padx=(20, 5), pady=2)
+        self.widget_opzioni.append(impronta_check)
+
+        simili_check = ttk.Checkbutton(opzioni_frame, text="Raccogli in 'Da Verificare' i brani con artista/titolo simili", variable=self.raggruppa_simili_var)
+        simili_check.grid(row=2, column=0, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(simili_check)
+
+        ttk.Label(opzioni_frame, text="File da mantenere:").grid(row=2, column=1, sticky=tk.W, padx=(20, 5), pady=2)
+        conserva_combo = ttk.Combobox(opzioni_frame, textvariable=self.conserva_var, values=list(POLITICHE_CONSERVAZIONE), width=12)
+        conserva_combo.grid(row=2, column=2, columnspan=3, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(conserva_combo)
+
+        accenti_check = ttk.Checkbutton(opzioni_frame, text="Ignora gli accenti nel confronto di artista e titolo (\"Beyoncé\" = \"Beyonce\")", variable=self.ignora_accenti_var)
+        accenti_check.grid(row=3, column=0, columnspan=5, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(accenti_check)
+
+        verifica_check = ttk.Checkbutton(opzioni_frame, text="Verifica le copie tra dischi diversi (hash prima di eliminare l'originale)", variable=self.verifica_copie_var)
+        verifica_check.grid(row=4, column=0, columnspan=5, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(verifica_check)
+
+        profila_check = ttk.Checkbutton(opzioni_frame, text="Profila le operazioni (tempi delle funzioni, stat, tag, regex, cache)", variable=self.profila_var)
+        profila_check.grid(row=5, column=0, columnspan=5, sticky=tk.W, padx=5, pady=2)
+        self.widget_opzioni.append(profila_check)
+
         # ---- Area di Log ----
         log_frame = ttk.LabelFrame(main_frame, text="Log Operazioni", padding="10")
-        log_frame.grid(row=1, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
-        main_frame.rowconfigure(1, weight=1) # Permette al log frame di espandersi
+        log_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=5)
+        main_frame.rowconfigure(2, weight=1) # Permette al log frame di espandersi
         log_frame.columnconfigure(0, weight=1)
         log_frame.rowconfigure(0, weight=1)
 
@@ -177,24 +419,38 @@ class AppGestoreMusicaleV0_1:
 
         # ---- Pulsanti Azione ----
         action_frame = ttk.Frame(main_frame, padding="10")
-        action_frame.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
+        action_frame.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=5)
         action_frame.columnconfigure(0, weight=1) # Fa sì che il pulsante di avvio sia a sinistra
-        action_frame.columnconfigure(1, weight=0)
-        action_frame.columnconfigure(2, weight=0)
+        for colonna in range(1, 6):
+            action_frame.columnconfigure(colonna, weight=0)
 
 
         self.avvia_button = ttk.Button(action_frame, text="Avvia Analisi", command=self.avvia_analisi_thread)
         self.avvia_button.grid(row=0, column=0, sticky=tk.W, padx=5)
 
+        # Ripresa e annullamento dal giornale dell'ultima esecuzione (nella cartella dei duplicati)
+        self.riprendi_button = ttk.Button(action_frame, text="Riprendi Piano", command=lambda: self.avvia_giornale_thread(annulla=False))
+        self.riprendi_button.grid(row=0, column=1, sticky=tk.E, padx=5)
+        self.annulla_button = ttk.Button(action_frame, text="Annulla Ultimo Piano", command=lambda: self.avvia_giornale_thread(annulla=True))
+        self.annulla_button.grid(row=0, column=2, sticky=tk.E, padx=5)
+        self.widget_opzioni += [self.riprendi_button, self.annulla_button]
+
+        self.profilo_button = ttk.Button(action_frame, text="Profilo", command=self.mostra_profilo, state=tk.DISABLED)
+        self.profilo_button.grid(row=0, column=3, sticky=tk.E, padx=5)
+
         self.pulisci_log_button = ttk.Button(action_frame, text="Pulisci Log", command=self.pulisci_log)
-        self.pulisci_log_button.grid(row=0, column=1, sticky=tk.E, padx=5)
+        self.pulisci_log_button.grid(row=0, column=4, sticky=tk.E, padx=5)
 
         self.stop_button = ttk.Button(action_frame, text="Interrompi (Non Impl.)", state=tk.DISABLED)
-        self.stop_button.grid(row=0, column=2, sticky=tk.E, padx=5)
+        self.stop_button.grid(row=0, column=5, sticky=tk.E, padx=5)
         
         # ---- Barra di Progresso ----
         self.progress_bar = ttk.Progressbar(main_frame, orient=tk.HORIZONTAL, length=300, mode='determinate')
-        self.progress_bar.grid(row=3, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=10, padx=5)
+        self.progress_bar.grid(row=4, column=0, columnspan=3, sticky=(tk.W, tk.E), pady=(10, 0), padx=5)
+        ttk.Label(main_frame, textvariable=self.progresso_var).grid(row=5, column=0, columnspan=3, sticky=tk.W, pady=(2, 10), padx=5)
+
+        self._log_message(f"Log completo della sessione: {percorso_log}")
+        self.root.after(INTERVALLO_AGGIORNAMENTO_MS, self._aggiorna_da_coda)
 
     def seleziona_cartella(self, var_percorso, titolo_dialog, ask_save_dir=False):
         """ Apre una finestra di dialogo per selezionare una cartella. """
@@ -228,7 +484,12 @@ class AppGestoreMusicaleV0_1:
     def _esegui_conteggio_file(self, percorso):
         """Conta i file in modo ricorsivo e aggiorna la GUI."""
         try:
-            self.conteggio_file_iniziale = sum(1 for f in Path(percorso).rglob('*') if f.is_file())
+            visita = PercorsoCartella(Path(percorso))
+            for _ in visita:
+                if visita.file_trovati % 5000 == 0:
+                    testo_parziale = f"Conteggio file in corso... {visita.file_trovati:,}".replace(",", ".")
+                    self.root.after(0, self.file_count_var.set, testo_parziale)
+            self.conteggio_file_iniziale = visita.file_trovati
             testo_conteggio = f"Trovati {self.conteggio_file_iniziale:,} file nella cartella di origine.".replace(",", ".")
             self.root.after(0, self.file_count_var.set, testo_conteggio)
         except Exception as e:
@@ -236,29 +497,73 @@ class AppGestoreMusicaleV0_1:
             self.root.after(0, self.file_count_var.set, f"Errore nel conteggio file: {e}")
         
     def _log_message(self, message, flush=True): # flush è per compatibilità con _default_logger
-        """ Aggiunge un messaggio all'area di log della GUI. """
-        if self.log_area:
-            self.log_area.config(state=tk.NORMAL)
-            self.log_area.insert(tk.END, message + "\n")
-            self.log_area.see(tk.END) # Scroll automatico all'ultimo messaggio
-            self.log_area.config(state=tk.DISABLED)
-            self.root.update_idletasks() # Aggiorna la GUI
+        """ Accoda un messaggio per l'area di log; utilizzabile da qualsiasi thread. """
+        self.coda_log.scrivi(message)
+
+    def _aggiorna_da_coda(self):
+        """ Eseguito dal main loop di Tk: mostra in un colpo solo i messaggi e il progresso accumulati. """
+        try:
+            righe = self.coda_log.preleva()
+            if righe and self.log_area:
+                self.log_area.config(state=tk.NORMAL)
+                self.log_area.insert(tk.END, "\n".join(righe) + "\n")
+                # Mantiene solo le ultime MASSIMO_RIGHE_LOG righe nel widget
+                righe_nel_widget = int(self.log_area.index('end-1c').split('.')[0]) - 1
+                if righe_nel_widget > MASSIMO_RIGHE_LOG:
+                    self.log_area.delete('1.0', f"{righe_nel_widget - MASSIMO_RIGHE_LOG + 1}.0")
+                self.log_area.see(tk.END) # Scroll automatico all'ultimo messaggio
+                self.log_area.config(state=tk.DISABLED)
+
+            stato, self._progresso = self._progresso, None
+            if stato is not None and self.progress_bar:
+                # Fase senza totale (es. visita): la barra resta ferma, la riga di testo avanza
+                if stato.percentuale is not None:
+                    self.progress_bar['value'] = stato.percentuale
+                elif stato.fase != "visita":
+                    self.progress_bar['value'] = 0
+                self.progresso_var.set(stato.descrizione())
+        finally:
+            self.root.after(INTERVALLO_AGGIORNAMENTO_MS, self._aggiorna_da_coda)
 
     def pulisci_log(self):
+        self.coda_log.preleva() # Scarta (a video) i messaggi ancora in coda; restano nel file di log
+        self.coda_log.pulisci()
         self.log_area.config(state=tk.NORMAL)
         self.log_area.delete(1.0, tk.END)
         self.log_area.config(state=tk.DISABLED)
         self._log_message("Log pulito.")
 
-    def _update_progress_bar(self, corrente, totale):
-        """ Aggiorna la barra di progresso della GUI. """
-        if self.progress_bar:
-            if totale > 0:
-                percentuale = int((corrente / totale) * 100)
-                self.progress_bar['value'] = percentuale
-            else: # Se totale è 0, resetta la barra
-                self.progress_bar['value'] = 0
-            self.root.update_idletasks() # Necessario per aggiornare la GUI da un thread
+    def _update_progress_bar(self, stato: StatoAvanzamento):
+        """ Registra il progresso; barra ed etichetta vengono aggiornate dal main loop (vedi `_aggiorna_da_coda`). """
+        if stato.fase == "visita":
+            if self._fase_mostrata is not None:
+                return # La visita procede in parallelo all'analisi: una volta iniziata, si mostra l'analisi
+        else:
+            self._fase_mostrata = stato.fase
+        self._progresso = stato
+
+    def _nuovo_monitor(self) -> MonitorAvanzamento:
+        return MonitorAvanzamento(self._update_progress_bar, intervallo=INTERVALLO_AGGIORNAMENTO_MS / 1000)
+
+    def _log_riepilogo_fasi(self, monitor: MonitorAvanzamento):
+        riepilogo = monitor.righe_riepilogo()
+        if riepilogo:
+            self._log_message("Tempi per fase:\n" + "\n".join(riepilogo))
+
+    def _nuovo_profilatore(self) -> Optional[Profilatore]:
+        return Profilatore() if self.profila_var.get() else None
+
+    def _concludi_profilo(self, profilatore: Optional[Profilatore], monitor: MonitorAvanzamento):
+        """Registra nel log il profilo dell'operazione appena conclusa e lo rende visibile nel pannello."""
+        if profilatore is None:
+            return
+        self._report_profilo = profilatore.report(monitor)
+        self._log_message("Profilo dell'operazione:\n" + "\n".join(Profilatore.righe_report(self._report_profilo)))
+        self.root.after(0, self.profilo_button.config, {'state': tk.NORMAL})
+
+    def mostra_profilo(self):
+        if self._report_profilo is not None:
+            ProfiloWindow(self.root, self._report_profilo)
 
     def abilita_controlli(self, abilita=True):
         stato = tk.NORMAL if abilita else tk.DISABLED
@@ -283,15 +588,59 @@ class AppGestoreMusicaleV0_1:
                                 except tk.TclError: pass
         if self.avvia_button:
             self.avvia_button.config(state=stato)
+        for widget in self.widget_opzioni:
+            try: widget.config(state=stato)
+            except tk.TclError: pass
         # self.stop_button.config(state=tk.NORMAL if not abilita else tk.DISABLED) # Logica per il bottone stop
 
 
-    def _esegui_spostamenti(self, piano: List[SpostaFileAzione]):
-        """Esegue il piano di spostamento e logga il risultato."""
+    def _leggi_workers(self) -> int:
+        try:
+            return max(1, int(self.workers_var.get()))
+        except (tk.TclError, ValueError):
+            return 1
+
+    def _percorso_giornale(self) -> Path:
+        return Path(self.cartella_duplicati_var.get()).resolve() / NOME_FILE_GIORNALE
+
+    def avvia_spostamenti_thread(self, piano: List[SpostaFileAzione]):
+        """
+        Chiamata dall'anteprima quando l'utente approva il piano: gli spostamenti girano in un thread
+        separato, così il log e la barra di avanzamento restano aggiornati durante l'esecuzione.
+        """
         self._log_message("\n--- Esecuzione Spostamenti Approvata dall'Utente ---")
         try:
-            file_spostati = esegui_piano_azioni(piano, logger=self._log_message)
+            percorso_giornale = self._percorso_giornale()
+            in_sospeso = giornale_in_sospeso(percorso_giornale) is not None
+        except Exception as e:
+            self._log_message(f"ERRORE CRITICO DURANTE L'ESECUZIONE: {e}")
+            messagebox.showerror("Errore Critico", f"Impossibile leggere il giornale:\n\n{e}")
+            return
+        if in_sospeso:
+            self._log_message(f"ERRORE: Il giornale '{percorso_giornale}' contiene un piano interrotto.")
+            messagebox.showerror("Piano Interrotto", "L'ultimo piano non è stato completato.\nUsa 'Riprendi Piano' o 'Annulla Ultimo Piano' prima di eseguirne uno nuovo.")
+            return
+        # Le variabili Tk si leggono qui, nel thread principale
+        opzioni = dict(workers=self._leggi_workers(), verifica_copie=self.verifica_copie_var.get(), profilatore=self._nuovo_profilatore())
+        self._spostamenti_in_corso = True
+        self.abilita_controlli(False)
+        threading.Thread(target=self._esegui_spostamenti, args=(piano, percorso_giornale), kwargs=opzioni, daemon=True).start()
+
+    def _fine_spostamenti(self):
+        self._spostamenti_in_corso = False
+        self.abilita_controlli(True)
+
+    def _esegui_spostamenti(self, piano: List[SpostaFileAzione], percorso_giornale: Path, workers: int = 1,
+                            verifica_copie: bool = False, profilatore: Optional[Profilatore] = None):
+        """Esegue il piano di spostamento, registrandolo nel giornale, e logga il risultato. Da eseguire in un thread."""
+        try:
+            monitor = self._nuovo_monitor()
+            with profilazione(profilatore):
+                file_spostati = esegui_piano_con_giornale(piano, percorso_giornale, logger=self._log_message, progress_callback=monitor,
+                                                          workers=workers, verifica_copie=verifica_copie)
             self._log_message("--- Spostamenti Completati ---")
+            self._log_riepilogo_fasi(monitor)
+            self._concludi_profilo(profilatore, monitor)
 
             # Calcola e mostra il report finale
             file_rimanenti = self.conteggio_file_iniziale - file_spostati
@@ -304,41 +653,108 @@ class AppGestoreMusicaleV0_1:
             ).replace(",", ".")
             self._log_message(report)
 
-            messagebox.showinfo("Successo", f"Operazione completata. Spostati {file_spostati} file.\nControlla il log per i dettagli.")
+            self.root.after(0, messagebox.showinfo, "Successo", f"Operazione completata. Spostati {file_spostati} file.\nControlla il log per i dettagli.")
         except Exception as e:
             self._log_message(f"ERRORE CRITICO DURANTE L'ESECUZIONE: {e}")
             import traceback
             self._log_message(traceback.format_exc())
-            messagebox.showerror("Errore Critico", f"Si è verificato un errore irreversibile durante lo spostamento dei file:\n\n{e}")
+            self.root.after(0, messagebox.showerror, "Errore Critico", f"Si è verificato un errore irreversibile durante lo spostamento dei file:\n\n{e}")
+        finally:
+            self.root.after(0, self._fine_spostamenti)
 
-    def _esegui_analisi(self):
-        """Contiene la logica di pianificazione, da eseguire in un thread."""
+    def _esegui_giornale(self, percorso_giornale: Path, annulla: bool, workers: int = 1,
+                         verifica_copie: bool = False, profilatore: Optional[Profilatore] = None):
+        """Riprende o annulla il piano registrato nel giornale, da eseguire in un thread."""
+        try:
+            if annulla:
+                ripristinati = annulla_piano(percorso_giornale, logger=self._log_message, workers=workers,
+                                             verifica_copie=verifica_copie)
+                self.root.after(0, messagebox.showinfo, "Annullamento Completato", f"Ripristinati {ripristinati} file nella posizione originale.")
+            else:
+                monitor = self._nuovo_monitor()
+                with profilazione(profilatore):
+                    file_spostati = riprendi_piano(percorso_giornale, logger=self._log_message, progress_callback=monitor,
+                                                   workers=workers, verifica_copie=verifica_copie)
+                self._log_riepilogo_fasi(monitor)
+                self._concludi_profilo(profilatore, monitor)
+                self.root.after(0, messagebox.showinfo, "Ripresa Completata", f"Piano completato. Spostati {file_spostati} file.")
+        except Exception as e:
+            self._log_message(f"ERRORE CRITICO DURANTE L'USO DEL GIORNALE: {e}")
+            import traceback
+            self._log_message(traceback.format_exc())
+            self.root.after(0, messagebox.showerror, "Errore Critico", f"Impossibile usare il giornale '{percorso_giornale}':\n\n{e}")
+        finally:
+            self.root.after(0, self.abilita_controlli, True)
+
+    def avvia_giornale_thread(self, annulla: bool):
+        """ Chiede conferma e riprende (o annulla) l'ultimo piano in un thread separato. """
+        if not self.cartella_duplicati_var.get():
+            messagebox.showerror("Errore", "Specificare la cartella dei duplicati, che contiene il giornale.")
+            return
+        percorso_giornale = self._percorso_giornale()
+        if not percorso_giornale.is_file():
+            messagebox.showinfo("Nessun Giornale", f"Nessun piano registrato in:\n{percorso_giornale}")
+            return
+        domanda = ("Riportare nella posizione originale tutti i file spostati dall'ultimo piano?" if annulla
+                   else "Riprendere l'ultimo piano interrotto senza rifare l'analisi?")
+        if not messagebox.askyesno("Conferma", domanda):
+            return
+        # Le variabili Tk si leggono qui, nel thread principale
+        opzioni = dict(workers=self._leggi_workers(), verifica_copie=self.verifica_copie_var.get(),
+                       profilatore=None if annulla else self._nuovo_profilatore())
         self.abilita_controlli(False)
-        self.progress_bar['value'] = 0
+        threading.Thread(target=self._esegui_giornale, args=(percorso_giornale, annulla), kwargs=opzioni, daemon=True).start()
+
+    def _leggi_opzioni_analisi(self) -> OpzioniAnalisi:
+        """Costruisce le opzioni dell'analisi dalle variabili Tk: da chiamare nel thread principale."""
+        try:
+            processi = max(0, int(self.processi_var.get()))
+        except (tk.TclError, ValueError):
+            processi = 0
+        try:
+            criteri_conservazione = criteri_da_testo(self.conserva_var.get())
+        except ValueError as e:
+            self._log_message(f"ATTENZIONE: {e} Uso la politica 'dimensione'.")
+            criteri_conservazione = POLITICHE_CONSERVAZIONE["dimensione"]
+        return OpzioniAnalisi(
+            usa_cache=self.usa_cache_var.get(),
+            workers=self._leggi_workers(),
+            processi=processi,
+            duplicati_esatti=self.duplicati_esatti_var.get(),
+            impronta_audio=self.impronta_audio_var.get(),
+            raggruppa_simili=self.raggruppa_simili_var.get(),
+            ignora_accenti=self.ignora_accenti_var.get(),
+            criteri_conservazione=criteri_conservazione
+        )
+
+    def _esegui_analisi(self, cartelle: Tuple[str, str, str, str], opzioni: OpzioniAnalisi, profilatore: Optional[Profilatore] = None):
+        """
+        Contiene la logica di pianificazione, da eseguire in un thread. `cartelle` (musicale, duplicati,
+        non conformi, da verificare), `opzioni` e `profilatore` sono letti prima dal thread principale.
+        """
+        monitor = self._nuovo_monitor()
         self._log_message("--- Avvio Analisi e Pianificazione ---")
 
         try:
-            cartella_musicale = self.cartella_musicale_var.get()
-            path_musicale = Path(cartella_musicale).resolve()
-            path_duplicati = Path(self.cartella_duplicati_var.get()).resolve()
-            path_non_conformi = Path(self.cartella_non_conformi_var.get()).resolve()
-            path_da_verificare = Path(self.cartella_da_verificare_var.get()).resolve()
-
-            piano = pianifica_gestione_completa(
-                path_musicale,
-                path_duplicati,
-                path_non_conformi,
-                path_da_verificare,
-                logger=self._log_message,
-                progress_callback=self._update_progress_bar
-            )
-
-            self.progress_bar['value'] = 100
+            path_musicale, path_duplicati, path_non_conformi, path_da_verificare = (Path(c).resolve() for c in cartelle)
+            with profilazione(profilatore):
+                piano = pianifica_gestione_completa(
+                    path_musicale,
+                    path_duplicati,
+                    path_non_conformi,
+                    path_da_verificare,
+                    logger=self._log_message,
+                    progress_callback=monitor,
+                    opzioni=opzioni
+                )
+
             self._log_message("\n--- Pianificazione Completata ---")
+            self._log_riepilogo_fasi(monitor)
+            self._concludi_profilo(profilatore, monitor)
 
             if not piano:
                 self._log_message("Nessuna azione di spostamento necessaria.")
-                messagebox.showinfo("Analisi Completata", "Nessun file duplicato o da verificare è stato trovato.")
+                self.root.after(0, messagebox.showinfo, "Analisi Completata", "Nessun file duplicato o da verificare è stato trovato.")
             else:
                 self._log_message(f"Trovate {len(piano)} azioni da eseguire. In attesa di conferma dall'utente...")
                 # Apri la finestra di anteprima
@@ -351,17 +767,21 @@ class AppGestoreMusicaleV0_1:
             self.root.after(0, messagebox.showerror, "Errore Critico", f"Si è verificato un errore irreversibile durante l'analisi:\n\n{e}")
             self._log_message(traceback.format_exc())
         finally:
-            # Riabilita i controlli solo se non c'è una finestra di anteprima aperta
-            # La finestra di anteprima gestirà da sola la riabilitazione
-            if not any(isinstance(win, PreviewWindow) for win in self.root.winfo_children()):
-                 self.root.after(0, self.abilita_controlli, True)
+            self.root.after(0, self._fine_analisi)
+
+    def _fine_analisi(self):
+        # Riabilita i controlli solo se non c'è una finestra di anteprima aperta
+        # La finestra di anteprima gestirà da sola la riabilitazione
+        if not any(isinstance(win, PreviewWindow) for win in self.root.winfo_children()):
+            self.abilita_controlli(True)
 
     def mostra_finestra_anteprima(self, piano):
         cartella_base = self.cartella_musicale_var.get()
-        PreviewWindow(self.root, piano, self._esegui_spostamenti, cartella_base)
-        # Dopo che la finestra di anteprima è chiusa (sia per esecuzione che per annullamento),
-        # riabilitiamo i controlli.
-        self.abilita_controlli(True)
+        PreviewWindow(self.root, piano, self.avvia_spostamenti_thread, cartella_base)
+        # Finestra chiusa: se il piano è stato approvato, i controlli saranno riabilitati
+        # dal thread degli spostamenti al termine
+        if not self._spostamenti_in_corso:
+            self.abilita_controlli(True)
 
     def avvia_analisi_thread(self):
         """ Avvia l'analisi in un thread separato per non bloccare la GUI. """
@@ -371,8 +791,17 @@ class AppGestoreMusicaleV0_1:
             tk.messagebox.showerror("Errore", "Specificare la cartella musicale prima di avviare l'analisi.")
             return
         
+        # Le variabili Tk si leggono qui, nel thread principale
+        cartelle = (self.cartella_musicale_var.get(), self.cartella_duplicati_var.get(),
+                    self.cartella_non_conformi_var.get(), self.cartella_da_verificare_var.get())
+        argomenti = (cartelle, self._leggi_opzioni_analisi(), self._nuovo_profilatore())
+        self.abilita_controlli(False)
+        self._progresso = self._fase_mostrata = None
+        self.progresso_var.set("")
+        self.progress_bar.configure(value=0)
+
         # Crea e avvia il thread
-        analysis_thread = threading.Thread(target=self._esegui_analisi, daemon=True)
+        analysis_thread = threading.Thread(target=self._esegui_analisi, args=argomenti, daemon=True)
         analysis_thread.start()
 
 def show_splash_and_main_window():
@@ -393,4 +822,5 @@ def show_splash_and_main_window():
     root.mainloop()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support() # Necessario per i processi di analisi nell'eseguibile PyInstaller
     show_splash_and_main_window()
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+Costruzione di file MP3 sintetici (frame MPEG validi e tag ID3v2/ID3v1/APE) per i test
+e i benchmark. I frame contengono byte deterministici, non audio reale.
+"""
+import random
+import struct
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+# MPEG-1 Layer III, senza CRC; 128 kbps, 44100 Hz, senza padding, stereo: 417 byte per frame
+HEADER_MPEG1_128K = bytes([0xFF, 0xFB, 0x90, 0x00])
+LUNGHEZZA_FRAME_128K = 144 * 128000 // 44100
+
+
+def frame_audio(numero_frame: int, seme: int = 0, header: bytes = HEADER_MPEG1_128K, lunghezza_frame: int = LUNGHEZZA_FRAME_128K) -> bytes:
+    """Sequenza di `numero_frame` frame MPEG con payload pseudo-casuale ripetibile."""
+    rnd = random.Random(seme)
+    return b"".join(header + rnd.getrandbits((lunghezza_frame - 4) * 8).to_bytes(lunghezza_frame - 4, "little") for _ in range(numero_frame))
+
+
+def frame_xing(numero_frame: int, marcatore: bytes = b"Xing") -> bytes:
+    """Frame iniziale Xing/Info (MPEG-1 stereo: intestazione a 36 byte dall'inizio del frame) con tag LAME."""
+    corpo = bytearray(LUNGHEZZA_FRAME_128K - 4)
+    corpo[32:36] = marcatore
+    corpo[36:40] = struct.pack(">I", 0x0F) # Flag: frame, byte, TOC, qualità
+    corpo[40:44] = struct.pack(">I", numero_frame)
+    corpo[150:159] = b"LAME3.100"
+    return HEADER_MPEG1_128K + bytes(corpo)
+
+
+def _syncsafe(valore: int) -> bytes:
+    return bytes([(valore >> 21) & 0x7F, (valore >> 14) & 0x7F, (valore >> 7) & 0x7F, valore & 0x7F])
+
+
+def tag_id3v2(titolo: Optional[str] = None, artista: Optional[str] = None, versione: int = 3, padding: int = 0, frame_extra: bytes = b"") -> bytes:
+    """Tag ID3v2.3 (testo UTF-16) o ID3v2.4 (testo UTF-8) con i frame TIT2/TPE1 richiesti."""
+    frame = b""
+    for identificativo, testo in ((b"TIT2", titolo), (b"TPE1", artista)):
+        if testo is None:
+            continue
+        contenuto = b"\x03" + testo.encode("utf-8") if versione == 4 else b"\x01" + testo.encode("utf-16")
+        dimensione = _syncsafe(len(contenuto)) if versione == 4 else struct.pack(">I", len(contenuto))
+        frame += identificativo + dimensione + b"\x00\x00" + contenuto
+    corpo = frame + frame_extra + bytes(padding)
+    return b"ID3" + bytes([versione, 0, 0]) + _syncsafe(len(corpo)) + corpo
+
+
+def tag_id3v1(titolo: str = "", artista: str = "") -> bytes:
+    return (b"TAG" + titolo.encode("latin-1")[:30].ljust(30, b"\x00") + artista.encode("latin-1")[:30].ljust(30, b"\x00")
+            + bytes(30 + 4 + 30) + b"\xff")
+
+
+def tag_ape(campi: dict) -> bytes:
+    """Tag APEv2 con header e footer."""
+    elementi = b"".join(
+        struct.pack("<II", len(valore.encode("utf-8")), 0) + chiave.encode("ascii") + b"\x00" + valore.encode("utf-8")
+        for chiave, valore in campi.items()
+    )
+    dimensione = len(elementi) + 32 # Comprende il footer, non l'header
+
+    def _blocco(flag: int) -> bytes:
+        return b"APETAGEX" + struct.pack("<IIII", 2000, dimensione, len(campi), flag) + bytes(8)
+
+    return _blocco(0xA0000000) + elementi + _blocco(0x80000000)
+
+
+def crea_mp3(percorso: Path, audio: bytes, prefisso: List[bytes] = (), suffisso: List[bytes] = ()) -> Path:
+    """Scrive un file composto dai blocchi di `prefisso`, dall'audio e dai blocchi di `suffisso`."""
+    percorso.parent.mkdir(parents=True, exist_ok=True)
+    percorso.write_bytes(b"".join(prefisso) + audio + b"".join(suffisso))
+    return percorso
+
+
+# --- Libreria musicale sintetica (benchmark e test end-to-end) ---
+
+SUFFISSI_VERSIONE = (" (Live)", " (Radio Edit)", " [Remastered 2011]", " (Acoustic Version)", " (Extended Mix)", " (Remix)")
+# Convenzioni dei nomi file: quelle con "Artista - Titolo" sono leggibili anche senza tag
+CONVENZIONI_NOME = (
+    ("{artista} - {titolo}", True),
+    ("{traccia:02d} - {artista} - {titolo}", True),
+    ("{traccia:02d}. {artista} - {titolo}", True),
+    ("{traccia:02d} {titolo}", False),
+    ("{artista}_{titolo}", False),
+)
+_PAROLE = ("amore", "notte", "sole", "mare", "strada", "cuore", "vento", "fuoco", "luna", "città", "tempo", "sogno")
+
+
+class LibreriaSintetica(NamedTuple):
+    file: int
+    byte: int
+    cartelle: int
+    duplicati: int # Copie in più dello stesso brano (azioni "Duplicato" attese)
+    in_versioni: int # File dei brani con più versioni (azioni "Versione da Verificare" attese)
+
+
+def crea_libreria_sintetica(cartella: Path, numero_file: int, seme: int = 42, quota_duplicati: float = 0.15, quota_versioni: float = 0.1,
+                            quota_senza_tag: float = 0.05, profondita: int = 3, frame_per_file: int = 8) -> LibreriaSintetica:
+    """
+    Crea `numero_file` MP3 (frame MPEG validi e tag ID3v2.3/2.4) organizzati in cartelle
+    Artista/Album/... profonde da 1 a `profondita` livelli, con nomi in varie convenzioni.
+    Una quota dei brani ha copie (metà identiche byte per byte, metà con più frame), una quota
+    ha versioni alternative (suffissi di versione diversi tra loro) e una quota dei file è senza
+    tag, con "Artista - Titolo" nel nome. Il risultato atteso dell'analisi è nel valore restituito.
+    """
+    rnd = random.Random(seme)
+    blocchi_audio = [frame_audio(frame_per_file + extra, seme=extra) for extra in range(2)]
+    cartelle = set()
+    creati = byte = duplicati = in_versioni = 0
+    brano = 0
+    while creati < numero_file:
+        artista = f"Artista {brano % max(1, numero_file // 20):05d}"
+        titolo = f"{rnd.choice(_PAROLE).capitalize()} {rnd.choice(_PAROLE)} {brano}"
+        varianti = [(titolo, 0)]
+        if rnd.random() < quota_duplicati:
+            varianti.append((titolo, rnd.randrange(2))) # 0: stesso contenuto, 1: un frame in più
+        if rnd.random() < quota_versioni:
+            varianti += [(titolo + suffisso, 0) for suffisso in rnd.sample(SUFFISSI_VERSIONE, rnd.randint(1, 2))]
+        varianti = varianti[:numero_file - creati]
+        duplicati += sum(1 for t, _ in varianti if t == titolo) - 1
+        if len({t for t, _ in varianti}) > 1:
+            in_versioni += len({t for t, _ in varianti})
+
+        for numero_variante, (titolo_file, extra) in enumerate(varianti):
+            livelli = [artista, f"Album {brano % 7}", "CD 1", "Bonus"][:rnd.randint(1, max(1, profondita))]
+            destinazione = cartella.joinpath(*livelli)
+            senza_tag = rnd.random() < quota_senza_tag
+            formato = rnd.choice([c for c, leggibile in CONVENZIONI_NOME if leggibile or not senza_tag])
+            nome = formato.format(artista=artista, titolo=titolo_file, traccia=brano % 20 + 1)
+            if numero_variante:
+                destinazione = destinazione / f"copia {numero_variante}" # Stesso nome in un'altra cartella
+            # L'identificativo del brano nel primo frame rende l'audio di ogni brano unico
+            audio = bytearray(blocchi_audio[extra])
+            audio[4:12] = struct.pack(">Q", brano * 4 + (extra and numero_variante))
+            prefisso = [] if senza_tag else [tag_id3v2(titolo_file, artista, versione=3 + brano % 2)]
+            percorso = crea_mp3(destinazione / f"{nome}.mp3", bytes(audio), prefisso)
+            cartelle.add(destinazione)
+            byte += percorso.stat().st_size
+            creati += 1
+        brano += 1
+    return LibreriaSintetica(creati, byte, len(cartelle), duplicati, in_versioni)
@@ -0,0 +1,74 @@
+import pytest
+from gestore_duplicati_musicali import MonitorAvanzamento, StatoAvanzamento, scansiona_cartella, pianifica_gestione_completa, OpzioniAnalisi
+
+class Orologio:
+    def __init__(self):
+        self.adesso = 0.0
+    def __call__(self):
+        return self.adesso
+
+def test_monitor_limita_gli_aggiornamenti_e_stima_il_tempo():
+    orologio = Orologio()
+    stati = []
+    monitor = MonitorAvanzamento(stati.append, intervallo=1.0, smorzamento=0.5, orologio=orologio)
+    monitor.inizia_fase("hash", totale=1000)
+    for _ in range(48): # 16 file/s per 3 secondi, 1 MB per file (passi esatti in virgola mobile)
+        orologio.adesso += 0.0625
+        monitor.avanza("hash", byte=1_000_000)
+    assert [s.corrente for s in stati] == [16, 32, 48] # Un invio al secondo, non uno per file
+    assert stati[-1].elementi_al_secondo == pytest.approx(16)
+    assert stati[-1].byte_al_secondo == pytest.approx(16e6)
+    assert stati[-1].secondi_rimanenti == pytest.approx((1000 - 48) / 16)
+
+    for _ in range(16): # Rallenta a 8 file/s: la media mobile si adegua gradualmente
+        orologio.adesso += 0.125
+        monitor.avanza("hash")
+    assert [s.elementi_al_secondo for s in stati[3:]] == [12, 10]
+
+    monitor.termina_fase("hash")
+    finale = stati[-1]
+    assert finale.completata and finale.secondi_rimanenti == 0
+    assert (finale.corrente, finale.totale, finale.trascorsi) == (64, 1000, 5)
+    assert finale.elementi_al_secondo == pytest.approx(64 / 5) # Media sull'intera fase
+    assert finale.descrizione().startswith("hash: 64/1000 (6%) - 13 file/s - 9.6 MB/s - completata in 0:05")
+    assert monitor.riepilogo() == [("hash", 64, 48_000_000, 5)]
+
+def test_callback_compatibile_riceve_solo_l_analisi_con_l_ultimo_aggiornamento():
+    orologio = Orologio()
+    chiamate = []
+    monitor = MonitorAvanzamento.da_callback(lambda corrente, totale: chiamate.append((corrente, totale)))
+    monitor._orologio = orologio
+    monitor.inizia_fase("visita")
+    monitor.inizia_fase("analisi", approssimato=True)
+    for i in range(1, 11):
+        orologio.adesso += 0.1
+        monitor.avanza("visita")
+        monitor.avanza("analisi", totale=10 + i, approssimato=True)
+    monitor.termina_fase("visita")
+    monitor.termina_fase("analisi", totale=10)
+    assert chiamate[-1] == (10, 10)
+    assert len(chiamate) < 10
+    assert MonitorAvanzamento.da_callback(monitor) is monitor
+
+def test_scansione_e_pianificazione_riportano_le_fasi(tmp_path, mocker):
+    mocker.patch('gestore_duplicati_musicali.EasyID3', side_effect=Exception("nessun tag"))
+    musica = tmp_path / "musica"
+    musica.mkdir()
+    for i in range(5):
+        (musica / f"Artista - Brano {i}.mp3").write_text("stesso contenuto")
+    (musica / "note.txt").write_text("x")
+    logger = lambda msg, flush=True: None
+
+    chiamate = []
+    scansiona_cartella(musica, tmp_path / "NON CONFORMI", logger, lambda corrente, totale: chiamate.append((corrente, totale)))
+    assert chiamate[-1] == (5, 5)
+
+    stati = []
+    monitor = MonitorAvanzamento(stati.append)
+    pianifica_gestione_completa(musica, tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI", tmp_path / "DOPPIONI" / "DA_VERIFICARE",
+                                logger, monitor, OpzioniAnalisi(duplicati_esatti=True))
+    finali = {s.fase: s for s in stati if s.completata}
+    assert set(finali) == {"visita", "analisi", "hash", "pianificazione"}
+    assert (finali["analisi"].corrente, finali["analisi"].totale) == (5, 5)
+    assert (finali["hash"].corrente, finali["hash"].byte) == (5, 5 * len("stesso contenuto"))
+    assert [fase for fase, *_ in monitor.riepilogo()] == ["visita", "analisi", "hash", "pianificazione"]
@@ -0,0 +1,107 @@
+import os
+import pytest
+from pathlib import Path
+from mutagen import MutagenError
+import gestore_duplicati_musicali
+from gestore_duplicati_musicali import scansiona_cartella, OpzioniAnalisi, NOME_FILE_CACHE, ricompila_pattern
+
+TAG_PER_NOME = {
+    'Brano Uno.mp3': {'artist': ['Artista'], 'title': ['Brano Uno']},
+    'Brano Due.mp3': {'artist': ['Artista'], 'title': ['Brano Due (Live)']},
+    'senza_info.mp3': {},
+}
+
+class MockEasyID3Contatore:
+    """Mock di EasyID3 che conta quante volte viene aperto un file."""
+    aperture = 0
+
+    def __init__(self, file_path):
+        MockEasyID3Contatore.aperture += 1
+        self.file_tags = TAG_PER_NOME.get(Path(file_path).name, {})
+
+    def get(self, key, default):
+        return self.file_tags.get(key, default)
+
+@pytest.fixture
+def libreria(tmp_path, mocker):
+    mocker.patch('gestore_duplicati_musicali.EasyID3', MockEasyID3Contatore)
+    MockEasyID3Contatore.aperture = 0
+    cartella = tmp_path / "musica"
+    cartella.mkdir()
+    for nome in TAG_PER_NOME:
+        (cartella / nome).write_text("dati " + nome)
+    return cartella
+
+def _scansiona(cartella, tmp_path):
+    validi, _ = scansiona_cartella(
+        cartella, tmp_path / "NON CONFORMI",
+        logger=lambda msg, flush=True: None,
+        opzioni=OpzioniAnalisi(usa_cache=True)
+    )
+    return sorted(validi, key=lambda mf: mf.path.name)
+
+def test_cache_evita_rilettura_file_invariati(libreria, tmp_path):
+    primo = _scansiona(libreria, tmp_path)
+    assert MockEasyID3Contatore.aperture == 3
+    assert (libreria / NOME_FILE_CACHE).exists()
+
+    MockEasyID3Contatore.aperture = 0
+    secondo = _scansiona(libreria, tmp_path)
+
+    assert MockEasyID3Contatore.aperture == 0
+    assert secondo == primo
+    assert [mf.path.name for mf in secondo] == ['Brano Due.mp3', 'Brano Uno.mp3']
+    # Il database della cache non deve essere trattato come file non conforme
+    assert (libreria / NOME_FILE_CACHE).exists()
+
+def test_cache_rilegge_file_modificati(libreria, tmp_path):
+    _scansiona(libreria, tmp_path)
+
+    file_modificato = libreria / 'Brano Uno.mp3'
+    file_modificato.write_text("contenuto diverso e più lungo")
+    stat = file_modificato.stat()
+    os.utime(file_modificato, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    MockEasyID3Contatore.aperture = 0
+    risultato = _scansiona(libreria, tmp_path)
+
+    assert MockEasyID3Contatore.aperture == 1
+    brano_uno = next(mf for mf in risultato if mf.path.name == 'Brano Uno.mp3')
+    assert brano_uno.dimensione == file_modificato.stat().st_size
+
+def test_cache_non_memorizza_errori_di_lettura(libreria, tmp_path, mocker):
+    class MockEasyID3Irraggiungibile(MockEasyID3Contatore):
+        def __init__(self, file_path):
+            super().__init__(file_path)
+            if Path(file_path).name == 'Brano Uno.mp3':
+                try:
+                    raise TimeoutError("NAS non raggiungibile")
+                except OSError as e:
+                    raise MutagenError(e) from e
+
+    mocker.patch('gestore_duplicati_musicali.EasyID3', MockEasyID3Irraggiungibile)
+    assert [mf.path.name for mf in _scansiona(libreria, tmp_path)] == ['Brano Due.mp3']
+
+    # Solo il file letto con errore viene riletto; gli altri (anche quello senza info) restano in cache
+    mocker.patch('gestore_duplicati_musicali.EasyID3', MockEasyID3Contatore)
+    MockEasyID3Contatore.aperture = 0
+    assert [mf.path.name for mf in _scansiona(libreria, tmp_path)] == ['Brano Due.mp3', 'Brano Uno.mp3']
+    assert MockEasyID3Contatore.aperture == 1
+
+def test_nuovi_pattern_invalidano_la_cache(libreria, tmp_path, monkeypatch):
+    primo = _scansiona(libreria, tmp_path)
+    assert next(mf for mf in primo if mf.path.name == 'Brano Due.mp3').titolo_base_norm == 'brano due'
+
+    monkeypatch.setattr(gestore_duplicati_musicali, "VERSION_PATTERNS", [r"\s*\(demo\)"])
+    try:
+        ricompila_pattern()
+        MockEasyID3Contatore.aperture = 0
+        secondo = _scansiona(libreria, tmp_path)
+        assert MockEasyID3Contatore.aperture == 3
+        assert next(mf for mf in secondo if mf.path.name == 'Brano Due.mp3').titolo_base_norm == 'brano due (live)'
+    finally:
+        monkeypatch.undo()
+        ricompila_pattern()
+    MockEasyID3Contatore.aperture = 0
+    assert _scansiona(libreria, tmp_path) == primo
+    assert MockEasyID3Contatore.aperture == 3
@@ -0,0 +1,41 @@
+import threading
+from gestore_duplicati_musicali import CodaLog
+
+def test_coda_log_da_piu_thread_con_buffer_circolare_e_file(tmp_path):
+    percorso = tmp_path / "log.txt"
+    coda = CodaLog(massimo_righe=100, percorso_file=percorso)
+
+    def produttore(indice):
+        for i in range(1000):
+            coda.scrivi(f"thread {indice} riga {i}")
+
+    threads = [threading.Thread(target=produttore, args=(t,)) for t in range(4)]
+    for t in threads:
+        t.start()
+    mostrate = []
+    while any(t.is_alive() for t in threads):
+        mostrate += coda.preleva()
+    for t in threads:
+        t.join()
+    mostrate += coda.preleva()
+    coda.chiudi()
+
+    righe_file = percorso.read_text(encoding="utf-8").splitlines()
+    assert len(righe_file) == coda.totale_righe == 4000
+    # Ogni thread compare nel file con tutte le sue righe, in ordine
+    for t in range(4):
+        assert [r for r in righe_file if r.startswith(f"thread {t} ")] == [f"thread {t} riga {i}" for i in range(1000)]
+    assert len(coda.righe) == 100
+    assert list(coda.righe) == righe_file[-100:]
+    assert mostrate[-100:] == righe_file[-100:]
+
+def test_coda_log_messaggi_multiriga_e_limite_per_prelievo():
+    coda = CodaLog(massimo_righe=3)
+    assert coda.preleva() == []
+    coda.scrivi("\n--- Fase 1 ---")
+    coda.scrivi("a")
+    coda.scrivi("b")
+    assert coda.preleva() == ["--- Fase 1 ---", "a", "b"]
+    assert coda.totale_righe == 4
+    coda.pulisci()
+    assert len(coda.righe) == 0
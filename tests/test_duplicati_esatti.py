@@ -0,0 +1,43 @@
+import pytest
+from pathlib import Path
+from gestore_duplicati_musicali import (
+    MusicFile, trova_gruppi_contenuto_identico, pianifica_spostamento_duplicati_esatti, DIMENSIONE_BLOCCO_HASH
+)
+
+def crea_music_file(path: Path, contenuto: bytes, artista="artista", titolo="titolo") -> MusicFile:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(contenuto)
+    return MusicFile(path, artista, titolo, titolo, None, len(contenuto), "ID3")
+
+def test_raggruppa_solo_contenuti_identici(tmp_path):
+    grande = bytes(range(256)) * (3 * DIMENSIONE_BLOCCO_HASH // 256)
+    # Stesso inizio e stessa fine del file grande, ma un byte diverso in mezzo
+    meta = len(grande) // 2
+    grande_modificato = grande[:meta] + bytes([grande[meta] ^ 0xFF]) + grande[meta + 1:]
+
+    a = crea_music_file(tmp_path / "a.mp3", grande, "artista uno", "brano")
+    b = crea_music_file(tmp_path / "sub" / "b.mp3", grande, "altro artista", "altro titolo")
+    c = crea_music_file(tmp_path / "c.mp3", grande_modificato)
+    piccolo_1 = crea_music_file(tmp_path / "p1.mp3", b"dati piccoli")
+    piccolo_2 = crea_music_file(tmp_path / "p2.mp3", b"dati piccoli")
+    diverso = crea_music_file(tmp_path / "d.mp3", b"dati diversi")
+    vuoto_1 = crea_music_file(tmp_path / "v1.mp3", b"")
+    vuoto_2 = crea_music_file(tmp_path / "v2.mp3", b"")
+
+    gruppi = trova_gruppi_contenuto_identico([a, b, c, piccolo_1, piccolo_2, diverso, vuoto_1, vuoto_2])
+
+    assert sorted([mf.path.name for mf in g] for g in gruppi) == [["a.mp3", "b.mp3"], ["p1.mp3", "p2.mp3"]]
+
+def test_pianifica_duplicati_esatti_mantiene_il_primo(tmp_path):
+    a = crea_music_file(tmp_path / "a.mp3", b"stesso contenuto", "artista", "titolo")
+    b = crea_music_file(tmp_path / "b.mp3", b"stesso contenuto", "", "senza tag")
+    c = crea_music_file(tmp_path / "c.mp3", b"altro contenuto!")
+
+    azioni, rimasti = pianifica_spostamento_duplicati_esatti(
+        [a, b, c], tmp_path / "DOPPIONI", logger=lambda msg, flush=True: None, workers=2
+    )
+
+    assert [(az.sorgente, az.destinazione, az.motivazione) for az in azioni] == [
+        (b.path, tmp_path / "DOPPIONI" / "b.mp3", "Duplicato Esatto")
+    ]
+    assert rimasti == [a, c]
@@ -0,0 +1,73 @@
+import random
+import time
+from pathlib import Path
+from gestore_duplicati_musicali import esegui_piano_azioni, SpostaFileAzione, MonitorAvanzamento, RisolutoreNomi
+
+def crea_piano(base: Path):
+    """Piano con molte collisioni di nomi: stessi nomi, nomi già con suffisso _N, maiuscole diverse, file già presenti."""
+    rnd = random.Random(3)
+    musica, doppioni = base / "musica", base / "DOPPIONI"
+    (doppioni).mkdir(parents=True)
+    (doppioni / "01 - Intro.mp3").write_text("già presente")
+    (doppioni / "01 - Intro_2.mp3").write_text("già presente 2")
+    nomi = ["01 - Intro.mp3", "01 - Intro_1.mp3", "01 - INTRO.mp3", "Brano.mp3", "Brano_1_1.mp3", "Altro.mp3"]
+    piano = []
+    for i in range(200):
+        sorgente = musica / f"cd{i % 7}" / f"{i:03d}" / rnd.choice(nomi)
+        sorgente.parent.mkdir(parents=True)
+        sorgente.write_text(f"contenuto {i}")
+        cartella = doppioni if i % 3 else doppioni / "DA_VERIFICARE" / f"artista {i % 4}" / "titolo"
+        piano.append(SpostaFileAzione(sorgente, cartella / sorgente.name, "Duplicato" if i % 3 else "Versione da Verificare"))
+    piano.append(SpostaFileAzione(musica / "mancante.mp3", doppioni / "mancante.mp3", "Duplicato"))
+    return piano
+
+def disposizione(cartella: Path):
+    return {str(p.relative_to(cartella)): p.read_text() for p in cartella.rglob("*") if p.is_file()}
+
+def test_esecuzione_parallela_identica_alla_seriale(tmp_path, mocker):
+    logger = lambda msg, flush=True: None
+    seriale, parallela = tmp_path / "seriale", tmp_path / "parallela"
+    assert esegui_piano_azioni(crea_piano(seriale), logger) == 200
+
+    # Latenza (come su un NAS) solo per i nomi senza suffisso _N, e un thread per gruppo: senza
+    # l'ordinamento per gruppo le azioni successive con "Intro_1.mp3" li sorpasserebbero
+    risolvi = RisolutoreNomi.risolvi
+    def risolvi_lento(self, destinazione):
+        if "_" not in destinazione.stem:
+            time.sleep(0.002)
+        return risolvi(self, destinazione)
+    mocker.patch.object(RisolutoreNomi, "risolvi", risolvi_lento)
+
+    messaggi = []
+    monitor = MonitorAvanzamento()
+    assert esegui_piano_azioni(crea_piano(parallela), lambda msg, flush=True: messaggi.append(msg), monitor, workers=64) == 200
+
+    risultato = disposizione(parallela / "DOPPIONI")
+    assert risultato == disposizione(seriale / "DOPPIONI")
+    assert len(risultato) == 202
+    assert not any(p.is_file() for p in (parallela / "musica").rglob("*"))
+    # Riepilogo invece di una riga per file
+    assert not any("Spostato:" in m for m in messaggi)
+    assert "  Spostati 133 file (Duplicato)." in messaggi and "  Spostati 67 file (Versione da Verificare)." in messaggi
+    assert any("1 file sorgente non trovati" in m for m in messaggi)
+    assert monitor.riepilogo()[0][:2] == ("spostamento", 201)
+
+def test_errore_del_giornale_non_interrompe_l_esecuzione(tmp_path):
+    class GiornaleGuasto:
+        def registra_avvio(self, sorgente, destinazione):
+            pass
+
+        def registra_spostamento(self, sorgente, destinazione):
+            if sorgente.name == "Altro.mp3":
+                raise OSError("disco pieno")
+
+    piano = crea_piano(tmp_path)
+    altri = sum(1 for a in piano if a.sorgente.name == "Altro.mp3")
+    messaggi = []
+    monitor = MonitorAvanzamento()
+    spostati = esegui_piano_azioni(piano, lambda msg, flush=True: messaggi.append(msg), monitor, workers=8, giornale=GiornaleGuasto())
+
+    assert spostati == 200 - altri
+    assert any(f"ERRORE: {altri} spostamenti non riusciti:" in m for m in messaggi)
+    assert any("Altro.mp3: spostato in" in m and "disco pieno" in m for m in messaggi)
+    assert monitor.riepilogo()[0][:2] == ("spostamento", 201)
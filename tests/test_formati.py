@@ -0,0 +1,163 @@
+import random
+import struct
+import pytest
+from mutagen.ogg import OggPage
+from mp3_sintetici import crea_mp3, tag_id3v2, frame_audio
+from gestore_duplicati_musicali import (leggi_info_formato, leggi_info_formato_mutagen, pianifica_gestione_completa, criteri_da_testo,
+                                        OpzioniAnalisi, _guid_asf)
+
+logger = lambda msg, flush=True: None
+SECONDI = 180
+
+
+def audio_casuale(lunghezza: int, seme: int = 0) -> bytes:
+    return random.Random(seme).getrandbits(lunghezza * 8).to_bytes(lunghezza, "little")
+
+
+def commenti_vorbis(titolo: str, artista: str, riempimento: int = 0) -> bytes:
+    commenti = [b"DATE=1999", f"title={titolo}".encode(), f"ARTIST={artista}".encode(), b"ARTIST=Secondo", b"COMMENT=" + b"x" * riempimento]
+    return (struct.pack("<I", 4) + b"test" + struct.pack("<I", len(commenti))
+            + b"".join(struct.pack("<I", len(c)) + c for c in commenti))
+
+
+def crea_flac(percorso, titolo, artista, frequenza=44100):
+    streaminfo = struct.pack(">HH", 4096, 4096) + bytes(6) + ((frequenza << 44) | (1 << 41) | (15 << 36) | frequenza * SECONDI).to_bytes(8, "big") + bytes(16)
+    blocchi = [(0, streaminfo), (1, bytes(40_000)), (4, commenti_vorbis(titolo, artista))] # Padding oltre la prima lettura
+    dati = b"fLaC" + b"".join(bytes([(i == len(blocchi) - 1) << 7 | tipo]) + len(b).to_bytes(3, "big") + b for i, (tipo, b) in enumerate(blocchi))
+    percorso.write_bytes(dati + audio_casuale(200_000))
+    return percorso
+
+
+def crea_ogg(percorso, titolo, artista, opus=False):
+    if opus:
+        identificazione = b"OpusHead" + struct.pack("<BBHIhB", 1, 2, 312, 44100, 0, 0)
+        commenti = b"OpusTags" + commenti_vorbis(titolo, artista, 70_000) # Il pacchetto occupa più pagine
+        campioni = 48000 * SECONDI + 312
+    else:
+        identificazione = b"\x01vorbis" + struct.pack("<IBIiiiBB", 0, 2, 44100, 0, 128000, 0, 0xB8, 1)
+        commenti = b"\x03vorbis" + commenti_vorbis(titolo, artista, 70_000) + b"\x01"
+        campioni = 44100 * SECONDI
+    pagine = [OggPage(), *OggPage.from_packets([commenti], sequence=1)]
+    pagine[0].packets, pagine[0].first = [identificazione], True
+    finale = OggPage()
+    finale.packets, finale.position, finale.last, finale.sequence = [audio_casuale(30_000)], campioni, True, len(pagine)
+    for pagina in pagine + [finale]:
+        pagina.serial = 77
+    percorso.write_bytes(b"".join(p.write() for p in pagine) + audio_casuale(100_000) + finale.write())
+    return percorso
+
+
+def atomo(tipo: bytes, *contenuto: bytes) -> bytes:
+    dati = b"".join(contenuto)
+    return struct.pack(">I", 8 + len(dati)) + tipo + dati
+
+
+def crea_m4a(percorso, titolo, artista, codec=b"mp4a"):
+    valore = lambda testo: atomo(b"data", struct.pack(">II", 1, 0), testo.encode())
+    if codec == b"alac":
+        configurazione = atomo(b"alac", bytes(4), struct.pack(">IBBBBBBHIII", 4096, 0, 16, 40, 10, 14, 2, 255, 0, 0, 44100))
+    else: # Descrittori ES con AudioSpecificConfig: AAC LC, 44100 Hz, stereo
+        decoder = b"\x04\x11\x40\x15" + bytes(3) + struct.pack(">II", 128000, 128000) + b"\x05\x02\x12\x10"
+        configurazione = atomo(b"esds", bytes(4), b"\x03" + bytes([3 + len(decoder) + 3]) + bytes(3) + decoder + b"\x06\x01\x02")
+    voce = atomo(codec, bytes(6), struct.pack(">H", 1), bytes(8), struct.pack(">HHHHI", 2, 16, 0, 0, 44100 << 16), configurazione)
+    traccia = atomo(b"trak", atomo(b"mdia",
+                                   atomo(b"mdhd", bytes(12), struct.pack(">II", 44100, 44100 * SECONDI), bytes(4)),
+                                   atomo(b"hdlr", bytes(8), b"soun", bytes(12), b"SoundHandler\x00"),
+                                   atomo(b"minf", atomo(b"stbl", atomo(b"stsd", bytes(4), struct.pack(">I", 1), voce)))))
+    meta = atomo(b"meta", bytes(4), atomo(b"hdlr", bytes(8), b"mdirappl", bytes(9)),
+                 atomo(b"ilst", atomo(b"\xa9alb", valore("Album")), atomo(b"\xa9nam", valore(titolo)), atomo(b"\xa9ART", valore(artista))))
+    moov = atomo(b"moov", atomo(b"mvhd", bytes(12), struct.pack(">II", 1000, 1000 * SECONDI), bytes(80)), traccia, atomo(b"udta", meta))
+    # moov in coda, dopo i dati audio: il lettore salta mdat senza leggerlo
+    percorso.write_bytes(atomo(b"ftyp", b"M4A ", bytes(4), b"M4A mp42isom") + atomo(b"mdat", audio_casuale(300_000)) + moov)
+    return percorso
+
+
+def oggetto_asf(guid: str, *contenuto: bytes) -> bytes:
+    dati = b"".join(contenuto)
+    return _guid_asf(guid) + struct.pack("<Q", 24 + len(dati)) + dati
+
+
+def crea_wma(percorso, titolo, artista, secondi=SECONDI):
+    testi = [(t + "\x00").encode("utf-16-le") for t in (titolo, artista, "", "", "")]
+    descrizione = oggetto_asf("75B22633-668E-11CF-A6D9-00AA0062CE6C", struct.pack("<5H", *map(len, testi)), *testi)
+    proprieta = oggetto_asf("8CABDCA1-A947-11CF-8EE4-00C00C205365", bytes(16), struct.pack("<QQQQQQIIII", 0, 0, 0, (secondi + 3) * 10**7 if secondi else 0, 0, 3000, 2, 0, 0, 0))
+    formato = struct.pack("<HHIIHHH", 0x0161, 2, 44100, 16000, 2, 16, 0)
+    flusso = oggetto_asf("B7DC0791-A9B7-11CF-8EE6-00C00C205365", _guid_asf("F8699E40-5B4D-11CF-A8FD-00805F5C442B"), bytes(16),
+                         struct.pack("<QIIHI", 0, len(formato), 0, 1, 0), formato)
+    oggetti = descrizione + proprieta + flusso
+    intestazione = _guid_asf("75B22630-668E-11CF-A6D9-00AA0062CE6C") + struct.pack("<QIBB", 30 + len(oggetti), 3, 1, 2) + oggetti
+    percorso.write_bytes(intestazione + audio_casuale(100_000))
+    return percorso
+
+
+@pytest.mark.parametrize("crea, nome, codec", [
+    (crea_flac, "brano.flac", "flac"),
+    (crea_ogg, "brano.ogg", "vorbis"),
+    (lambda *a: crea_ogg(*a, opus=True), "brano.opus", "opus"),
+    (crea_m4a, "brano.m4a", "aac"),
+    (lambda *a: crea_m4a(*a, codec=b"alac"), "brano.m4a", "alac"),
+    (crea_wma, "brano.wma", "wma"),
+])
+def test_lettori_rapidi_come_mutagen(tmp_path, mocker, crea, nome, codec):
+    percorso = crea(tmp_path / nome, "Titolo è", "Artista")
+    riferimento = leggi_info_formato_mutagen(percorso, logger)
+
+    spia = mocker.spy(__import__("mutagen"), "File")
+    info = leggi_info_formato(percorso, logger)
+    assert spia.call_count == 0 # Solo le intestazioni, senza mutagen
+    assert (info.titolo, info.artista, info.codec) == ("Titolo è", "Artista", codec)
+    assert (riferimento.titolo, riferimento.artista) == (info.titolo, info.artista)
+    assert info.frequenza == riferimento.frequenza and info.durata == pytest.approx(riferimento.durata, abs=0.01) == SECONDI
+    assert info.bitrate_kbps > 0
+
+
+def test_firma_diversa_dall_estensione_e_ricorso_a_mutagen(tmp_path, mocker):
+    rinominato = crea_flac(tmp_path / "brano.ogg", "Titolo", "Artista")
+    assert leggi_info_formato(rinominato, logger).codec == "flac"
+
+    troncato = tmp_path / "troncato.flac"
+    troncato.write_bytes(crea_flac(tmp_path / "intero.flac", "Titolo", "Artista").read_bytes()[:5000])
+    spia = mocker.spy(__import__("mutagen"), "File")
+    assert leggi_info_formato(troncato, logger)[:2] == (None, None)
+    assert spia.call_count == 1
+
+    # Atomo mdhd vuoto in fondo alla traccia: il lettore non va oltre i suoi byte e si ricorre a mutagen
+    traccia = atomo(b"trak", atomo(b"mdia", atomo(b"hdlr", bytes(8), b"soun", bytes(12)), atomo(b"mdhd")))
+    (tmp_path / "malformato.m4a").write_bytes(atomo(b"ftyp", b"M4A ", bytes(4)) + atomo(b"moov", traccia))
+    assert leggi_info_formato(tmp_path / "malformato.m4a", logger)[:2] == (None, None)
+    assert spia.call_count == 2
+
+    messaggi = []
+    mocker.patch("mutagen.File", side_effect=RuntimeError("guasto"))
+    (tmp_path / "ignoto.wma").write_bytes(b"non e' un file ASF")
+    assert leggi_info_formato(tmp_path / "ignoto.wma", lambda msg, flush=True: messaggi.append(msg))[:3] == (None, None, None)
+    assert "Errore inatteso" in messaggi[0]
+
+
+def test_copie_in_formati_diversi_ordinate_per_codec(tmp_path):
+    musica = tmp_path / "musica"
+    for cartella in ("mp3", "flac", "m4a", "altro"):
+        (musica / cartella).mkdir(parents=True)
+    crea_mp3(musica / "mp3" / "brano.mp3", frame_audio(500), prefisso=[tag_id3v2("Titolo", "Artista")])
+    crea_flac(musica / "flac" / "brano.flac", "Titolo", "Artista")
+    crea_m4a(musica / "m4a" / "brano.m4a", "Titolo", "Artista")
+    (musica / "altro" / "Artista - Titolo.wav").write_bytes(b"RIFF")
+
+    opzioni = OpzioniAnalisi(criteri_conservazione=criteri_da_testo("qualita"), usa_cache=True)
+    for _ in range(2): # La seconda volta dalla cache, che conserva il codec
+        piano = pianifica_gestione_completa(musica, tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI",
+                                            tmp_path / "DOPPIONI" / "DA_VERIFICARE", logger, opzioni=opzioni)
+        assert {a.sorgente.name: a.motivazione for a in piano} == {"brano.mp3": "Duplicato", "brano.m4a": "Duplicato", "Artista - Titolo.wav": "Non Conforme"}
+
+
+def test_copie_senza_durata(tmp_path):
+    musica = tmp_path / "musica"
+    for cartella in ("a", "b"):
+        (musica / cartella).mkdir(parents=True)
+        crea_wma(musica / cartella / "brano.wma", "Titolo", "Artista", secondi=0) # Durata assente, bitrate e frequenza noti
+
+    messaggi = []
+    piano = pianifica_gestione_completa(musica, tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI", tmp_path / "DOPPIONI" / "DA_VERIFICARE",
+                                        lambda msg, flush=True: messaggi.append(msg), opzioni=OpzioniAnalisi(criteri_conservazione=criteri_da_testo("qualita")))
+    assert [a.motivazione for a in piano] == ["Duplicato"]
+    assert any("Da Mantenere" in m and m.endswith(", 128 kbps, 44100 Hz)") for m in messaggi)
@@ -0,0 +1,96 @@
+import pytest
+from pathlib import Path
+from gestore_duplicati_musicali import (GiornaleEsecuzione, SpostaFileAzione, esegui_piano_azioni, esegui_piano_con_giornale,
+                                        riprendi_piano, annulla_piano, giornale_in_sospeso, sposta_file,
+                                        avvia_gestione_duplicati)
+
+logger = lambda msg, flush=True: None
+
+def crea_piano(base: Path, quanti: int = 20):
+    piano = []
+    for i in range(quanti):
+        sorgente = base / "musica" / f"cd{i % 3}" / f"brano {i}.mp3"
+        sorgente.parent.mkdir(parents=True, exist_ok=True)
+        sorgente.write_text(f"contenuto {i}")
+        piano.append(SpostaFileAzione(sorgente, base / "DOPPIONI" / f"brano {i}.mp3", "Duplicato"))
+    return piano
+
+def test_ripresa_dopo_interruzione(tmp_path):
+    piano = crea_piano(tmp_path)
+    percorso = tmp_path / "giornale.jsonl"
+    giornale = GiornaleEsecuzione.crea(percorso, piano)
+    esegui_piano_azioni(piano[:8], logger, giornale=giornale) # Processo ucciso dopo 8 spostamenti...
+    giornale.chiudi()
+    giornale = GiornaleEsecuzione(percorso)
+    giornale.registra_avvio(piano[8].sorgente, piano[8].destinazione) # ...e durante il nono, prima di confermarlo
+    giornale.chiudi()
+    sposta_file(piano[8].sorgente, piano[8].destinazione)
+    stato = giornale_in_sospeso(percorso)
+    assert stato is not None and len(stato.piano) == 20 and len(stato.spostati) == 8
+
+    assert riprendi_piano(percorso, logger) == 11
+    assert all(not az.sorgente.exists() and az.destinazione.read_text() == f"contenuto {i}" for i, az in enumerate(piano))
+    stato = GiornaleEsecuzione.leggi(percorso)
+    assert stato.completato and len(stato.spostati) == 20
+    assert giornale_in_sospeso(percorso) is None
+    assert riprendi_piano(percorso, logger) == 0
+
+def test_annullamento_ripristina_le_posizioni_originali(tmp_path):
+    piano = crea_piano(tmp_path)
+    percorso = tmp_path / "giornale.jsonl"
+    assert esegui_piano_con_giornale(piano, percorso, logger, workers=4) == 20
+    piano[0].sorgente.write_text("ricomparso") # Mai sovrascritto dall'annullamento
+
+    assert annulla_piano(percorso, logger, workers=4) == 19
+    assert piano[0].sorgente.read_text() == "ricomparso" and piano[0].destinazione.exists()
+    assert all(az.sorgente.read_text() == f"contenuto {i}" and not az.destinazione.exists() for i, az in enumerate(piano) if i)
+    assert not GiornaleEsecuzione.leggi(percorso).annullato # Annullamento incompleto: si può ripetere
+    # ...e il giornale resta in sospeso: non si riprende il piano e non lo si sovrascrive con uno nuovo
+    assert giornale_in_sospeso(percorso) is not None
+    assert riprendi_piano(percorso, logger) == 0
+    messaggi = []
+    avvia_gestione_duplicati(tmp_path / "musica", tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI", tmp_path / "DOPPIONI" / "DA_VERIFICARE",
+                             lambda msg, flush=True: messaggi.append(msg), percorso_giornale=percorso)
+    assert any("piano interrotto" in m for m in messaggi) and len(GiornaleEsecuzione.leggi(percorso).ripristinati) == 19
+
+    piano[0].sorgente.unlink()
+    assert annulla_piano(percorso, logger) == 1
+    assert piano[0].sorgente.read_text() == "contenuto 0"
+    assert GiornaleEsecuzione.leggi(percorso).annullato
+
+def test_ultima_riga_troncata_ignorata(tmp_path):
+    piano = crea_piano(tmp_path, 3)
+    percorso = tmp_path / "giornale.jsonl"
+    giornale = GiornaleEsecuzione.crea(percorso, piano)
+    esegui_piano_azioni(piano[:1], logger, giornale=giornale)
+    giornale.chiudi()
+    with open(percorso, "a", encoding="utf-8") as f:
+        f.write('{"tipo": "spostato", "sorgente": "/mus')
+    assert list(GiornaleEsecuzione.leggi(percorso).spostati) == [piano[0].sorgente]
+    assert riprendi_piano(percorso, logger) == 2
+    assert GiornaleEsecuzione.leggi(percorso).completato # Riga troncata scartata prima di aggiungere i nuovi record
+
+    righe = percorso.read_text(encoding="utf-8").splitlines()
+    righe.insert(2, "non json")
+    percorso.write_text("\n".join(righe) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="danneggiato"):
+        GiornaleEsecuzione.leggi(percorso)
+
+def test_destinazione_occupata_da_un_altro_file(tmp_path):
+    piano = crea_piano(tmp_path, 3)
+    percorso = tmp_path / "giornale.jsonl"
+    GiornaleEsecuzione.crea(percorso, piano).chiudi() # Interrotto prima di ogni spostamento
+    piano[1].sorgente.unlink() # Sorgente sparita, e un file diverso dove sarebbe dovuta finire
+    piano[1].destinazione.parent.mkdir(parents=True)
+    piano[1].destinazione.write_text("altro file")
+
+    assert riprendi_piano(percorso, logger) == 2
+    stato = GiornaleEsecuzione.leggi(percorso)
+    assert piano[1].sorgente not in stato.spostati
+    # Un'azione non riuscita lascia il piano in sospeso
+    assert not stato.completato and giornale_in_sospeso(percorso) is not None
+
+    assert annulla_piano(percorso, logger) == 2
+    assert not piano[1].sorgente.exists() and piano[1].destinazione.read_text() == "altro file"
+    assert [az.sorgente.read_text() for az in (piano[0], piano[2])] == ["contenuto 0", "contenuto 2"]
+    assert giornale_in_sospeso(percorso) is None
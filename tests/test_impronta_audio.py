@@ -0,0 +1,81 @@
+import pytest
+from pathlib import Path
+from mp3_sintetici import (
+    frame_audio, frame_xing, tag_id3v2, tag_id3v1, tag_ape, crea_mp3, HEADER_MPEG1_128K, LUNGHEZZA_FRAME_128K
+)
+from gestore_duplicati_musicali import (
+    calcola_impronta_audio_mp3, analizza_header_mpeg, MusicFile, pianifica_spostamento_duplicati_esatti,
+    pianifica_gestione_completa, OpzioniAnalisi
+)
+
+AUDIO = frame_audio(40, seme=1)
+
+def test_header_mpeg1_layer3():
+    header = analizza_header_mpeg(HEADER_MPEG1_128K)
+    assert (header.versione, header.layer, header.bitrate_kbps, header.frequenza) == ("1", 3, 128, 44100)
+    assert header.lunghezza_frame == LUNGHEZZA_FRAME_128K
+    assert not header.mono
+    assert analizza_header_mpeg(b"\xff\xfb\xf0\x00") is None # Indice di bitrate non valido
+    assert analizza_header_mpeg(b"TAG\x00") is None
+
+def test_impronta_ignora_tag_e_frame_xing(tmp_path):
+    nudo = crea_mp3(tmp_path / "nudo.mp3", AUDIO)
+    con_tag = crea_mp3(
+        tmp_path / "con_tag.mp3", AUDIO,
+        prefisso=[tag_id3v2("Titolo", "Artista", versione=4, padding=300), b"\x00" * 7, frame_xing(40)],
+        suffisso=[tag_ape({"Title": "Titolo", "Comment": "rip 2"}), tag_id3v1("Titolo", "Artista")]
+    )
+    altri_tag = crea_mp3(
+        tmp_path / "altri_tag.mp3", AUDIO,
+        prefisso=[tag_id3v2("Another Title", "Someone", versione=3), frame_xing(40, b"Info")],
+        suffisso=[tag_id3v1("Another Title")]
+    )
+
+    impronta = calcola_impronta_audio_mp3(nudo)
+    assert impronta is not None
+    assert calcola_impronta_audio_mp3(con_tag) == impronta
+    assert calcola_impronta_audio_mp3(altri_tag) == impronta
+    assert con_tag.stat().st_size != altri_tag.stat().st_size
+
+def test_impronta_distingue_audio_diverso(tmp_path):
+    a = crea_mp3(tmp_path / "a.mp3", AUDIO)
+    b = crea_mp3(tmp_path / "b.mp3", frame_audio(40, seme=2))
+    troncato = crea_mp3(tmp_path / "troncato.mp3", AUDIO[:-LUNGHEZZA_FRAME_128K])
+    impronte = {calcola_impronta_audio_mp3(p) for p in (a, b, troncato)}
+    assert len(impronte) == 3
+
+@pytest.mark.parametrize("contenuto", [b"", b"non sono un mp3", tag_id3v2("Solo", "Tag")])
+def test_impronta_assente_senza_frame(tmp_path, contenuto):
+    assert calcola_impronta_audio_mp3(crea_mp3(tmp_path / "x.mp3", contenuto)) is None
+
+def test_pianifica_stesso_audio_mantiene_copia_con_tag(tmp_path):
+    def music_file(nome, dimensione, sorgente, impronta):
+        return MusicFile(tmp_path / nome, "artista", nome, nome, None, dimensione, sorgente, impronta)
+
+    senza_tag = music_file("senza_tag.mp3", 5000, "Nome File", "abc")
+    con_tag = music_file("con_tag.mp3", 4000, "ID3", "abc")
+    altro = music_file("altro.mp3", 4000, "ID3", "def")
+
+    azioni, rimasti = pianifica_spostamento_duplicati_esatti(
+        [senza_tag, con_tag, altro], tmp_path / "DOPPIONI", logger=lambda msg, flush=True: None, confronta_contenuto=False
+    )
+
+    assert [(az.sorgente.name, az.motivazione) for az in azioni] == [("senza_tag.mp3", "Duplicato Audio")]
+    assert rimasti == [con_tag, altro]
+
+@pytest.mark.parametrize("opzioni", [
+    OpzioniAnalisi(impronta_audio=True),
+    OpzioniAnalisi(impronta_audio=True, processi=2),
+    OpzioniAnalisi(impronta_audio=True, usa_cache=True),
+])
+def test_gestione_completa_con_impronta_audio(tmp_path, opzioni):
+    musica = tmp_path / "musica"
+    crea_mp3(musica / "Artista - Brano.mp3", AUDIO, prefisso=[tag_id3v2("Brano", "Artista")])
+    # Copia più grande ma senza titolo/artista nei tag ID3v2: le info vengono dal nome file
+    crea_mp3(musica / "Artista - Brano (vecchio rip).mp3", AUDIO, prefisso=[tag_id3v2(padding=2048)], suffisso=[tag_ape({"Comment": "rip"})])
+    crea_mp3(musica / "Artista - Altro Brano.mp3", frame_audio(40, seme=3), prefisso=[tag_id3v2("Altro Brano", "Artista")])
+
+    argomenti = (musica, tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI", tmp_path / "DOPPIONI" / "DA_VERIFICARE")
+    for _ in range(2 if opzioni.usa_cache else 1): # Con la cache, la seconda passata legge l'impronta memorizzata
+        piano = pianifica_gestione_completa(*argomenti, logger=lambda msg, flush=True: None, opzioni=opzioni)
+        assert [(az.sorgente.name, az.motivazione) for az in piano] == [("Artista - Brano (vecchio rip).mp3", "Duplicato Audio")]
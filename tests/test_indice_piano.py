@@ -0,0 +1,42 @@
+from pathlib import Path
+from gestore_duplicati_musicali import IndicePiano, SpostaFileAzione
+
+BASE = Path("/musica")
+
+def azione(sorgente, destinazione, motivazione):
+    return SpostaFileAzione(BASE / sorgente, BASE / destinazione, motivazione)
+
+PIANO = [
+    azione("Rock/Queen - Bohemian Rhapsody.mp3", "DOPPIONI/Queen - Bohemian Rhapsody.mp3", "Duplicato"),
+    azione("Pop/Beatles - Yesterday.mp3", "DOPPIONI/DA_VERIFICARE/beatles/yesterday/Beatles - Yesterday.mp3", "Versione da Verificare"),
+    azione("Rock/Queen - Radio Ga Ga.mp3", "DOPPIONI/Queen - Radio Ga Ga.mp3", "Duplicato"),
+    azione("Pop/Beatles - Yesterday (Live).mp3", "DOPPIONI/DA_VERIFICARE/beatles/yesterday/Beatles - Yesterday (Live).mp3", "Versione da Verificare"),
+]
+
+def test_gruppi_per_motivazione_e_percorsi_relativi():
+    indice = IndicePiano(PIANO, BASE)
+    assert indice.motivazioni == ["Duplicato", "Versione da Verificare"]
+    assert indice.gruppi() == {"Duplicato": [0, 2], "Versione da Verificare": [1, 3]}
+    assert indice.riga(1) == ("Pop/Beatles - Yesterday.mp3", "DOPPIONI/DA_VERIFICARE/beatles/yesterday/Beatles - Yesterday.mp3", "Versione da Verificare")
+    fuori_base = IndicePiano([SpostaFileAzione(Path("/altrove/a.mp3"), BASE / "DOPPIONI/a.mp3", "Duplicato")], BASE)
+    assert fuori_base.riga(0)[0] == str(Path("/altrove/a.mp3"))
+
+def test_ricerca_per_prefisso_su_artista_e_cartella():
+    indice = IndicePiano(PIANO, BASE)
+    assert indice.gruppi("queen") == {"Duplicato": [0, 2]}
+    assert indice.gruppi("QUE rad") == {"Duplicato": [2]} # Tutte le parole, anche come prefisso
+    assert indice.gruppi("rock") == {"Duplicato": [0, 2]} # Cartella di origine
+    assert indice.gruppi("verificare") == {"Versione da Verificare": [1, 3]} # Cartella di destinazione
+    assert indice.gruppi("live") == {"Versione da Verificare": [3]}
+    assert indice.gruppi("mozart") == {}
+    assert indice.gruppi(" - ") == indice.gruppi()
+
+def test_ricerca_su_piano_grande():
+    piano = [azione(f"{i % 50}/Artista {i % 997} - Brano B{i}.mp3", f"DOPPIONI/Artista {i % 997} - Brano B{i}.mp3",
+                    "Duplicato" if i % 3 else "Versione da Verificare") for i in range(30_000)]
+    indice = IndicePiano(piano, BASE)
+    indice.prepara_ricerca()
+    trovati = indice.gruppi("artista 996")
+    attesi = [i for i in range(30_000) if i % 997 == 996]
+    assert sorted(trovati["Duplicato"] + trovati["Versione da Verificare"]) == attesi
+    assert all(i % 3 for i in trovati["Duplicato"]) and not any(i % 3 for i in trovati["Versione da Verificare"])
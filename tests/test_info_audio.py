@@ -0,0 +1,69 @@
+import struct
+import pytest
+from pathlib import Path
+from mp3_sintetici import frame_audio, frame_xing, tag_id3v2, tag_id3v1, crea_mp3, HEADER_MPEG1_128K, LUNGHEZZA_FRAME_128K
+from gestore_duplicati_musicali import (
+    leggi_info_audio_mp3, analizza_header_mpeg, MusicFile, pianifica_spostamento_duplicati,
+    criteri_da_testo, POLITICHE_CONSERVAZIONE, DIMENSIONE_LETTURA_TAG
+)
+
+def test_info_audio_cbr_senza_intestazione(tmp_path):
+    percorso = crea_mp3(tmp_path / "cbr.mp3", frame_audio(40), prefisso=[tag_id3v2("Titolo", "Artista")], suffisso=[tag_id3v1("Titolo")])
+    info = leggi_info_audio_mp3(percorso)
+    assert (info.bitrate_kbps, info.frequenza, info.vbr) == (128, 44100, False)
+    assert info.durata == pytest.approx(40 * LUNGHEZZA_FRAME_128K * 8 / 128000, abs=0.001)
+
+@pytest.mark.parametrize("marcatore, vbr", [(b"Xing", True), (b"Info", False)])
+def test_info_audio_da_intestazione_xing(tmp_path, marcatore, vbr):
+    # Copertina più grande della prima lettura: il primo frame va cercato oltre
+    copertina = b"APIC" + struct.pack(">I", 2 * DIMENSIONE_LETTURA_TAG) + b"\x00\x00" + bytes(2 * DIMENSIONE_LETTURA_TAG)
+    percorso = crea_mp3(tmp_path / "xing.mp3", frame_audio(40), prefisso=[tag_id3v2("T", "A", frame_extra=copertina), frame_xing(1000, marcatore)])
+    info = leggi_info_audio_mp3(percorso)
+    assert info.vbr is vbr
+    assert info.durata == pytest.approx(1000 * 1152 / 44100, abs=0.001)
+    if vbr:
+        # Bitrate medio: i dati audio (41 frame) divisi per la durata dichiarata
+        assert info.bitrate_kbps == round(41 * LUNGHEZZA_FRAME_128K * 8 / (1000 * 1152 / 44100) / 1000)
+    else:
+        assert info.bitrate_kbps == 128
+
+def test_info_audio_vbri_mpeg2(tmp_path):
+    header = bytes([0xFF, 0xF3, 0x80, 0xC0]) # MPEG-2 Layer III, 64 kbps, 22050 Hz, mono
+    dati_header = analizza_header_mpeg(header)
+    assert (dati_header.versione, dati_header.campioni_per_frame, dati_header.mono) == ("2", 576, True)
+    corpo = bytearray(dati_header.lunghezza_frame - 4)
+    corpo[32:36] = b"VBRI"
+    corpo[42:46] = struct.pack(">I", 500_000)
+    corpo[46:50] = struct.pack(">I", 2000)
+    primo = header + bytes(corpo)
+    percorso = crea_mp3(tmp_path / "vbri.mp3", primo + frame_audio(10, header=header, lunghezza_frame=dati_header.lunghezza_frame))
+    info = leggi_info_audio_mp3(percorso)
+    assert (info.vbr, info.frequenza) == (True, 22050)
+    assert info.durata == pytest.approx(2000 * 576 / 22050, abs=0.001)
+    assert info.bitrate_kbps == round(500_000 * 8 / (2000 * 576 / 22050) / 1000)
+
+def test_info_audio_assente(tmp_path):
+    assert leggi_info_audio_mp3(crea_mp3(tmp_path / "testo.mp3", b"non sono un mp3")) is None
+
+def test_criteri_da_testo():
+    assert criteri_da_testo("qualita") == POLITICHE_CONSERVAZIONE["qualita"]
+    assert criteri_da_testo(" Bitrate, -durata ,dimensione") == ("bitrate", "-durata", "dimensione")
+    with pytest.raises(ValueError):
+        criteri_da_testo("bitrate,colore")
+
+def test_pianifica_duplicati_con_politica_qualita():
+    def music_file(nome, dimensione, bitrate, durata):
+        return MusicFile(Path(nome), "artista", "titolo", "titolo", None, dimensione, "ID3",
+                         bitrate_kbps=bitrate, frequenza=44100, vbr=False, durata=durata)
+
+    grande_128 = music_file("grande_128.mp3", 9_000_000, 128, 200.0) # Copertina enorme
+    piccolo_320 = music_file("piccolo_320.mp3", 8_000_000, 320, 200.0)
+    lungo_320 = music_file("lungo_320.mp3", 8_500_000, 320, 212.0) # Silenzio in coda
+    logger = lambda msg, flush=True: None
+
+    _, mantenuti = pianifica_spostamento_duplicati([grande_128, piccolo_320, lungo_320], Path("/DOPPIONI"), logger)
+    assert mantenuti == {grande_128}
+    _, mantenuti = pianifica_spostamento_duplicati([grande_128, piccolo_320, lungo_320], Path("/DOPPIONI"), logger, criteri_da_testo("qualita"))
+    assert mantenuti == {lungo_320}
+    _, mantenuti = pianifica_spostamento_duplicati([grande_128, piccolo_320, lungo_320], Path("/DOPPIONI"), logger, criteri_da_testo("bitrate,-durata"))
+    assert mantenuti == {piccolo_320}
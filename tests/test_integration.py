@@ -1,7 +1,7 @@
 import pytest
 from pathlib import Path
 import shutil
-from gestore_duplicati_musicali import avvia_gestione_duplicati
+from gestore_duplicati_musicali import avvia_gestione_duplicati, pianifica_gestione_completa
 
 # Helper per creare file fittizi
 def crea_file_fittizio(path: Path, contenuto: str = "data"):
@@ -83,3 +83,17 @@ def test_flusso_completo_integrazione(libreria_musicale_test, mocker):
     assert (cartella_gruppo_da_verificare / "Traccia Buona (Live).mp3").exists()
     assert not (cartella_musicale / "Traccia Buona.mp3").exists()
     assert not (cartella_musicale / "Traccia Buona (Live).mp3").exists()
+
+def test_pianificazione_in_sola_lettura(libreria_musicale_test, mocker):
+    """La pianificazione non sposta nulla: anche i non conformi sono azioni del piano, con i nomi già risolti."""
+    mocker.patch('gestore_duplicati_musicali.EasyID3', MockEasyID3Integration)
+    cartella_musicale = libreria_musicale_test
+    cartella_non_conformi = cartella_musicale / "NON CONFORMI"
+    crea_file_fittizio(cartella_non_conformi / "documento.txt", "già presente")
+    prima = sorted(p for p in cartella_musicale.rglob("*"))
+
+    piano = pianifica_gestione_completa(cartella_musicale, cartella_musicale / "DOPPIONI", cartella_non_conformi,
+                                        cartella_musicale / "DOPPIONI" / "DA_VERIFICARE", logger=lambda msg, flush=True: None)
+    assert sorted(p for p in cartella_musicale.rglob("*")) == prima
+    non_conformi = {a.sorgente.name: a.destinazione.name for a in piano if a.motivazione == "Non Conforme"}
+    assert non_conformi == {"File Video (official video).mp4": "File Video (official video).mp4", "documento.txt": "documento_1.txt"}
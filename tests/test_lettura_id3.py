@@ -0,0 +1,93 @@
+import pytest
+from pathlib import Path
+from mutagen.easyid3 import EasyID3
+from mutagen.id3 import ID3, TIT2, TPE1, TALB, APIC, COMM, Encoding
+from mp3_sintetici import frame_audio, tag_id3v2, tag_id3v1, tag_ape, crea_mp3
+from gestore_duplicati_musicali import leggi_titolo_artista_id3, estrai_info_id3, TagNonGestito, DIMENSIONE_LETTURA_TAG
+
+AUDIO = frame_audio(10)
+
+def riferimento_mutagen(percorso):
+    try:
+        audio = EasyID3(percorso)
+    except Exception:
+        return None, None
+    return audio.get('title', [None])[0], audio.get('artist', [None])[0]
+
+def salva_con_mutagen(percorso, titolo, artista, versione, codifica, copertina=0, v1=0, prima_la_copertina=False):
+    crea_mp3(percorso, AUDIO)
+    tag = ID3()
+    if prima_la_copertina and copertina:
+        tag.add(APIC(encoding=Encoding.LATIN1, mime="image/jpeg", type=3, desc="", data=b"\xff" * copertina))
+    tag.add(TALB(encoding=codifica, text=["Album"]))
+    tag.add(COMM(encoding=codifica, lang="ita", desc="", text=["commento"]))
+    if titolo is not None:
+        tag.add(TIT2(encoding=codifica, text=titolo))
+    if artista is not None:
+        tag.add(TPE1(encoding=codifica, text=artista))
+    if copertina and not prima_la_copertina:
+        tag.add(APIC(encoding=Encoding.LATIN1, mime="image/jpeg", type=3, desc="", data=b"\xff" * copertina))
+    tag.save(percorso, v2_version=versione, v1=v1)
+    return percorso
+
+CASI_MUTAGEN = [
+    dict(titolo=["Brano"], artista=["Artista"], versione=3, codifica=Encoding.LATIN1),
+    dict(titolo=["Città è già"], artista=["Beyoncé"], versione=3, codifica=Encoding.UTF16),
+    dict(titolo=["日本語のタイトル"], artista=["アーティスト"], versione=4, codifica=Encoding.UTF8),
+    dict(titolo=["Brano"], artista=["Primo", "Secondo"], versione=4, codifica=Encoding.UTF16BE),
+    dict(titolo=["Brano"], artista=["Artista"], versione=4, codifica=Encoding.UTF8, copertina=3 * DIMENSIONE_LETTURA_TAG, prima_la_copertina=True),
+    dict(titolo=["Brano"], artista=None, versione=3, codifica=Encoding.UTF16, copertina=1000),
+    dict(titolo=[""], artista=["Artista"], versione=3, codifica=Encoding.LATIN1),
+    dict(titolo=["Titolo v2"], artista=None, versione=4, codifica=Encoding.UTF8, v1=2),
+]
+
+@pytest.mark.parametrize("caso", CASI_MUTAGEN)
+def test_lettore_rapido_come_mutagen(tmp_path, caso):
+    percorso = salva_con_mutagen(tmp_path / "brano.mp3", **caso)
+    assert leggi_titolo_artista_id3(percorso) == riferimento_mutagen(percorso)
+
+def test_lettore_rapido_id3v22_e_id3v1(tmp_path):
+    frame = b"TT2" + (7).to_bytes(3, "big") + b"\x00Titolo" + b"TP1" + (8).to_bytes(3, "big") + b"\x00Artista"
+    id3v22 = b"ID3\x02\x00\x00" + len(frame).to_bytes(4, "big") + frame
+    assert leggi_titolo_artista_id3(crea_mp3(tmp_path / "v22.mp3", AUDIO, prefisso=[id3v22])) == ("Titolo", "Artista")
+
+    solo_v1 = crea_mp3(tmp_path / "v1.mp3", AUDIO, suffisso=[tag_id3v1("Titolo v1", "Artista v1")])
+    assert leggi_titolo_artista_id3(solo_v1) == ("Titolo v1", "Artista v1") == riferimento_mutagen(solo_v1)
+
+    # L'ID3v1 completa solo i valori mancanti nell'ID3v2
+    misto = crea_mp3(tmp_path / "misto.mp3", AUDIO, prefisso=[tag_id3v2("Titolo v2", None, versione=4)], suffisso=[tag_ape({"Title": "x"}), tag_id3v1("Titolo v1", "Artista v1")])
+    assert leggi_titolo_artista_id3(misto) == ("Titolo v2", "Artista v1")
+
+def test_lettore_rapido_senza_tag_o_non_gestito(tmp_path):
+    assert leggi_titolo_artista_id3(crea_mp3(tmp_path / "nudo.mp3", AUDIO)) is None
+    assert leggi_titolo_artista_id3(crea_mp3(tmp_path / "vuoto.mp3", b"")) is None
+
+    tag = bytearray(tag_id3v2("Titolo", "Artista", versione=3))
+    tag[5] |= 0x80 # Unsynchronisation
+    with pytest.raises(TagNonGestito):
+        leggi_titolo_artista_id3(crea_mp3(tmp_path / "unsync.mp3", AUDIO, prefisso=[bytes(tag)]))
+
+def test_estrai_info_id3_ricorre_a_mutagen_e_segnala_errori(tmp_path, mocker):
+    letti_da_mutagen = []
+
+    class MockEasyID3:
+        def __init__(self, percorso):
+            letti_da_mutagen.append(Path(percorso).name)
+            if Path(percorso).name == "errore.mp3":
+                raise RuntimeError("guasto")
+        def get(self, chiave, predefinito):
+            return {'title': ['Da Mutagen'], 'artist': ['Mutagen']}.get(chiave, predefinito)
+
+    mocker.patch('gestore_duplicati_musicali.EasyID3', MockEasyID3)
+    messaggi = []
+    logger = lambda msg, flush=True: messaggi.append(msg)
+
+    con_tag = crea_mp3(tmp_path / "con_tag.mp3", AUDIO, prefisso=[tag_id3v2("Titolo", "Artista")])
+    senza_tag = crea_mp3(tmp_path / "senza_tag.mp3", AUDIO)
+    errore = crea_mp3(tmp_path / "errore.mp3", AUDIO)
+
+    assert estrai_info_id3(con_tag, logger) == ("Titolo", "Artista")
+    assert estrai_info_id3(senza_tag, logger) == ("Da Mutagen", "Mutagen")
+    assert estrai_info_id3(errore, logger) == (None, None)
+    assert letti_da_mutagen == ["senza_tag.mp3", "errore.mp3"]
+    assert len(messaggi) == 1 and "errore.mp3" in messaggi[0] and "guasto" in messaggi[0]
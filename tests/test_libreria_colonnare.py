@@ -0,0 +1,42 @@
+import math
+from pathlib import Path
+from gestore_duplicati_musicali import (LibreriaColonnare, MusicFile, pianifica_spostamento_duplicati, pianifica_spostamento_duplicati_libreria,
+                                        pianifica_spostamento_da_verificare_libreria, scansiona_libreria, scansiona_cartella)
+from mp3_sintetici import crea_libreria_sintetica
+
+logger = lambda msg, flush=True: None
+
+def test_viste_e_music_file_ricostruiti():
+    file_musicali = [
+        MusicFile(Path("/musica/cd1/a.mp3"), "artista", "brano", "brano", None, 100, "ID3", "f00d", 320, 44100, True, 201.5),
+        MusicFile(Path("/musica/cd1/b.mp3"), "artista", "brano (live)", "brano", "live", 90, "NomeFile"),
+        MusicFile(Path("/musica/cd2/a.mp3"), "artista", "brano", "brano", None, 120, "ID3", bitrate_kbps=128, vbr=False, durata=0.0),
+    ]
+    libreria = LibreriaColonnare.da_music_file(file_musicali)
+    assert [libreria.music_file(i) for i in libreria.ids()] == file_musicali
+    assert len(libreria.testi) == 7 and len(libreria.cartelle) == 2 # Testi e cartelle ripetuti memorizzati una volta
+
+    vista = libreria.vista(2)
+    assert vista == libreria.vista(2) and vista != libreria.vista(0) and len({vista, libreria.vista(2)}) == 1
+    assert vista.path == Path("/musica/cd2/a.mp3") and vista.vbr is False and vista.durata == 0.0 and vista.frequenza is None
+    assert libreria.vista(1).durata is None and math.isclose(libreria.vista(0).durata, 201.5)
+    assert libreria.chiave_brano(0) == libreria.chiave_brano(2) != libreria.chiave_brano(1)
+    assert libreria.chiave_titolo_base(0) == libreria.chiave_titolo_base(1)
+
+    azioni, mantenuti = pianifica_spostamento_duplicati(file_musicali, Path("/doppioni"), logger)
+    assert [a.sorgente for a in azioni] == [Path("/musica/cd1/a.mp3")] and mantenuti == {file_musicali[1], file_musicali[2]}
+
+def test_pianificatori_per_id_sulla_libreria_scansionata(tmp_path):
+    sintetica = crea_libreria_sintetica(tmp_path / "musica", 200, seme=11, quota_duplicati=0.3, quota_versioni=0.2)
+    libreria, _ = scansiona_libreria(tmp_path / "musica", tmp_path / "NON CONFORMI", logger)
+    assert len(libreria) == sintetica.file
+
+    azioni, mantenuti = pianifica_spostamento_duplicati_libreria(libreria, libreria.ids(), tmp_path / "DOPPIONI", logger)
+    assert len(azioni) == sintetica.duplicati and mantenuti == sorted(mantenuti)
+    versioni = pianifica_spostamento_da_verificare_libreria(libreria, mantenuti, tmp_path / "DA_VERIFICARE", logger)
+    assert len(versioni) == sintetica.in_versioni
+
+    # Stesso piano dall'API con MusicFile
+    file_musicali, _ = scansiona_cartella(tmp_path / "musica", tmp_path / "NON CONFORMI", logger)
+    assert file_musicali == [libreria.music_file(i) for i in libreria.ids()]
+    assert pianifica_spostamento_duplicati(file_musicali, tmp_path / "DOPPIONI", logger)[0] == azioni
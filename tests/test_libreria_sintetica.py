@@ -0,0 +1,19 @@
+from collections import Counter
+from mp3_sintetici import crea_libreria_sintetica
+from gestore_duplicati_musicali import pianifica_gestione_completa, OpzioniAnalisi
+
+def test_libreria_sintetica_analizzata_senza_mock(tmp_path):
+    """File veri con tag ID3v2 (e alcuni senza tag): il piano trova esattamente le copie e le versioni create."""
+    libreria = crea_libreria_sintetica(tmp_path / "musica", 400, seme=7, quota_duplicati=0.3, quota_versioni=0.2, profondita=4)
+    assert libreria.file == 400 and libreria.duplicati > 0 and libreria.in_versioni > 0
+    assert len(list((tmp_path / "musica").rglob("*.mp3"))) == 400
+
+    piano = pianifica_gestione_completa(tmp_path / "musica", tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI",
+                                        tmp_path / "DOPPIONI" / "DA_VERIFICARE", lambda msg, flush=True: None)
+    assert Counter(azione.motivazione for azione in piano) == {"Duplicato": libreria.duplicati, "Versione da Verificare": libreria.in_versioni}
+
+    # Metà delle copie sono identiche byte per byte
+    esatti = pianifica_gestione_completa(tmp_path / "musica", tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI",
+                                         tmp_path / "DOPPIONI" / "DA_VERIFICARE", lambda msg, flush=True: None,
+                                         opzioni=OpzioniAnalisi(duplicati_esatti=True))
+    assert 0 < sum(azione.motivazione == "Duplicato Esatto" for azione in esatti) < libreria.duplicati
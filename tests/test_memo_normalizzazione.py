@@ -0,0 +1,41 @@
+import gestore_duplicati_musicali
+from gestore_duplicati_musicali import (MemoNormalizzazione, StatisticheMemo, MEMO_NORMALIZZAZIONE, normalizza_artista_titolo,
+                                        ricompila_pattern, scansiona_cartella, OpzioniAnalisi)
+
+def test_memo_limitato_con_statistiche():
+    memo = MemoNormalizzazione(dimensione_massima=2)
+    calcoli = []
+    calcola = lambda testo: lambda: calcoli.append(testo) or (testo.lower(),)
+    assert memo.ottieni("A", calcola("A")) == ("a",)
+    assert memo.ottieni("B", calcola("B")) == ("b",)
+    assert memo.ottieni("A", calcola("A")) == ("a",) # "A" diventa la voce più recente...
+    memo.ottieni("C", calcola("C")) # ...quindi viene scartata "B"
+    memo.ottieni("A", calcola("A"))
+    memo.ottieni("B", calcola("B"))
+    assert calcoli == ["A", "B", "C", "B"] and len(memo) == 2
+    assert memo.statistiche() == StatisticheMemo(trovati=2, calcolati=4, scartati=2)
+
+def test_nuovi_pattern_invalidano_il_memo(monkeypatch):
+    assert normalizza_artista_titolo("The Band", "Canzone (Demo)") == ("the band", "canzone (demo)", "canzone (demo)", None)
+    monkeypatch.setattr(gestore_duplicati_musicali, "VERSION_PATTERNS", gestore_duplicati_musicali.VERSION_PATTERNS + [r'\s*\(demo\)'])
+    try:
+        ricompila_pattern()
+        assert normalizza_artista_titolo("The Band", "Canzone (Demo)") == ("the band", "canzone (demo)", "canzone", "(demo)")
+    finally:
+        monkeypatch.undo()
+        ricompila_pattern()
+    assert normalizza_artista_titolo("The Band", "Canzone (Demo)")[3] is None
+
+def test_statistiche_sommate_dai_processi(tmp_path):
+    cartella = tmp_path / "musica"
+    cartella.mkdir()
+    for i in range(30):
+        (cartella / f"Artista {i % 3} - Brano {i}.mp3").write_text("x")
+    for opzioni in (OpzioniAnalisi(workers=4), OpzioniAnalisi(processi=2)):
+        MEMO_NORMALIZZAZIONE.svuota()
+        messaggi = []
+        scansiona_cartella(cartella, tmp_path / "NC", lambda msg, flush=True: messaggi.append(msg), opzioni=opzioni)
+        # Tre artisti e trenta titoli: ogni testo distinto è calcolato almeno una volta (per thread o processo)
+        riepilogo = next(m for m in messaggi if m.startswith("Memo della normalizzazione"))
+        trovati, calcolati = [int(parola) for parola in riepilogo.replace(",", "").split() if parola.isdigit()][:2]
+        assert trovati + calcolati == 60 and calcolati >= 33
@@ -0,0 +1,73 @@
+import re
+from pathlib import Path
+from collections import defaultdict
+from gestore_duplicati_musicali import (normalizza_testo, rimuovi_accenti, estrai_info_da_nome_file, estrai_titolo_base_e_versione,
+                                        pianifica_spostamento_duplicati, MusicFile)
+from test_pattern import carica_corpus
+
+# --- Implementazione di riferimento (catena di re.sub e str.replace, versione precedente alle tabelle) ---
+
+def riferimento_normalizza_testo(testo):
+    if testo is None:
+        return None
+    testo = testo.lower()
+    testo = testo.strip()
+    testo = re.sub(r'[\.,!?"\'\{\}#*:]', '', testo)
+    testo = testo.replace('&', 'and')
+    testo = re.sub(r'\s+', ' ', testo)
+    testo = testo.replace('( ', '(').replace(' )', ')')
+    testo = testo.replace('[ ', '[').replace(' ]', ']')
+    return testo.strip()
+
+def raggruppamenti(normalizza):
+    """Gruppi di righe del corpus ("Artista - Titolo") con stessi artista e titolo base secondo `normalizza`."""
+    gruppi = defaultdict(list)
+    for riga in carica_corpus():
+        artista, titolo = estrai_info_da_nome_file(riga)
+        if artista:
+            titolo_base, _ = estrai_titolo_base_e_versione(normalizza(titolo))
+            gruppi[(normalizza(artista), titolo_base)].append(riga)
+    return {tuple(gruppo) for gruppo in gruppi.values() if len(gruppo) > 1}
+
+# --- Test ---
+
+def test_corpus_uguale_al_riferimento_tranne_le_forme_unicode():
+    differenze = {riga: normalizza_testo(riga) for riga in carica_corpus() if normalizza_testo(riga) != riferimento_normalizza_testo(riga)}
+    assert differenze == {
+        "AC⁄DC - Highway to Hell": "ac/dc - highway to hell",
+        "Guns N’ Roses - November Rain": "guns n roses - november rain",
+        "The Beatles – Let It Be (Remastered 2009)": "the beatles - let it be (remastered 2009)",
+        "Rolling Stones — Angie": "rolling stones - angie",
+        "Ｓｈｉｎｅ - Ｆｕｌｌｗｉｄｔｈ Ｔｉｔｌｅ": "shine - fullwidth title",
+        "Non‐breaking hyphen‐title (Live)": "non-breaking hyphen-title (live)",
+        "ǅemal (Remix)": "džemal (remix)",
+        "Straße (Live)": "strasse (live)",
+        "ſtraight (Live)": "straight (live)",
+    }
+
+def test_raggruppamenti_del_corpus():
+    prima = raggruppamenti(riferimento_normalizza_testo)
+    assert raggruppamenti(normalizza_testo) - prima == {("Guns N' Roses - November Rain (Live in Tokyo)", "Guns N’ Roses - November Rain")}
+    senza_accenti = raggruppamenti(lambda testo: normalizza_testo(testo, senza_accenti=True))
+    assert senza_accenti - raggruppamenti(normalizza_testo) == {
+        ("Beyoncé - Halo (Live)", "Beyonce - Halo (Live)"),
+        ("Sigur Rós - Hoppípolla", "Sigur Ros - Hoppipolla (Live)"),
+        ("Mötley Crüe - Kickstart My Heart (Remastered)", "Motley Crue - Kickstart My Heart"),
+        ("Björk - Jóga (Live)", "Bjork - Joga"),
+        ("Édith Piaf - Non, je ne regrette rien (Remastered)", "Edith Piaf - Non, je ne regrette rien"),
+    }
+    assert not prima - senza_accenti # Nessun gruppo esistente viene diviso
+
+def test_rimuovi_accenti_solo_segni_diacritici():
+    assert rimuovi_accenti("ørsted - sønderborg") == "orsted - sonderborg"
+    assert rimuovi_accenti(normalizza_testo("İstanbul")) == "istanbul"
+    assert rimuovi_accenti("ελληνικά") == "ελληνικα"
+    assert rimuovi_accenti("が") == "が" # Il dakuten cambia la sillaba: resta
+    assert normalizza_testo("Ｈａｌｌ ＆ Ｏａｔｅｓ") == "hall and oates"
+
+def test_duplicati_senza_accenti():
+    file_musicali = [MusicFile(Path(f"/musica/{i}.mp3"), normalizza_testo(artista), "halo", "halo", None, 100 + i, "ID3")
+                     for i, artista in enumerate(["Beyoncé", "Beyonce", "BEYONCÉ"])]
+    assert len(pianifica_spostamento_duplicati(file_musicali, Path("/doppioni"), lambda msg, flush=True: None)[0]) == 1
+    azioni, mantenuti = pianifica_spostamento_duplicati(file_musicali, Path("/doppioni"), lambda msg, flush=True: None, ignora_accenti=True)
+    assert len(azioni) == 2 and mantenuti == {file_musicali[2]}
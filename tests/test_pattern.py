@@ -0,0 +1,88 @@
+import re
+import pytest
+from pathlib import Path
+from gestore_duplicati_musicali import (
+    estrai_titolo_base_e_versione, identifica_come_video, estrai_info_da_nome_file, normalizza_testo,
+    MatcherPattern, VERSION_PATTERNS, VIDEO_PATTERNS, PATTERN_NOME_FILE_DA_RIMUOVERE
+)
+
+PERCORSO_CORPUS = Path(__file__).parent / "dati" / "titoli.txt"
+
+def carica_corpus():
+    righe = PERCORSO_CORPUS.read_text(encoding="utf-8").splitlines()
+    return [r for r in righe if not r.startswith("#")]
+
+def varianti_corpus():
+    """Ogni titolo del corpus così com'è, in minuscolo, normalizzato e diviso su ' - '."""
+    varianti = []
+    for titolo in carica_corpus():
+        varianti += [titolo, titolo.lower(), normalizza_testo(titolo)]
+        varianti += titolo.split(" - ")
+    return varianti
+
+# --- Implementazioni di riferimento (ciclo di re.search, versione precedente al matcher) ---
+
+def riferimento_titolo_base(titolo_normalizzato):
+    titolo_da_lavorare = titolo_normalizzato
+    versione_trovata = None
+    for pattern in VERSION_PATTERNS:
+        match = re.search(pattern, titolo_da_lavorare, flags=re.IGNORECASE)
+        if match:
+            versione_trovata = match.group(0).strip()
+            titolo_da_lavorare = re.sub(re.escape(versione_trovata), '', titolo_da_lavorare, flags=re.IGNORECASE).strip()
+            titolo_da_lavorare = re.sub(r'\s+', ' ', titolo_da_lavorare).strip()
+            break
+    if versione_trovata:
+        titolo_da_lavorare = re.sub(r'\s*-\s*$', '', titolo_da_lavorare).strip()
+        return titolo_da_lavorare, versione_trovata
+    return titolo_normalizzato, None
+
+def riferimento_video(nome_file_stem):
+    nome_lower = nome_file_stem.lower()
+    return any(re.search(pattern, nome_lower) for pattern in VIDEO_PATTERNS)
+
+def riferimento_nome_file(nome_file_stem):
+    nome_pulito = nome_file_stem
+    for pattern in PATTERN_NOME_FILE_DA_RIMUOVERE:
+        nome_pulito = re.sub(pattern, '', nome_pulito, flags=re.IGNORECASE)
+    nome_pulito = nome_pulito.strip()
+    match = re.match(r'(.+?) - (.+)', nome_pulito)
+    if match:
+        artista, titolo = match.group(1).strip(), match.group(2).strip()
+        if artista and titolo:
+            return artista, titolo
+    return None, None
+
+# --- Test ---
+
+def test_corpus_non_banale():
+    corpus = carica_corpus()
+    assert len(corpus) > 300
+    assert sum(1 for t in corpus if riferimento_titolo_base(t.lower())[1]) > 100
+
+@pytest.mark.parametrize("funzione, riferimento", [
+    (estrai_titolo_base_e_versione, riferimento_titolo_base),
+    (identifica_come_video, riferimento_video),
+    (estrai_info_da_nome_file, riferimento_nome_file),
+])
+def test_equivalenza_con_ciclo_re_search(funzione, riferimento):
+    differenze = [(v, funzione(v), riferimento(v)) for v in varianti_corpus() if funzione(v) != riferimento(v)]
+    assert differenze == []
+
+def test_matcher_rispetta_ordine_della_lista():
+    # "radio edit" precede "live" nella lista, anche se compare più avanti nel testo
+    indice, inizio, fine = MatcherPattern(VERSION_PATTERNS, re.IGNORECASE).cerca("song (live) (radio edit)")
+    assert VERSION_PATTERNS[indice] == r'\s*\([^)]*radio edit[^)]*\)'
+    assert "song (live) (radio edit)"[inizio:fine] == " (radio edit)"
+
+def test_matcher_nessuna_corrispondenza():
+    matcher = MatcherPattern(VIDEO_PATTERNS)
+    assert matcher.cerca("artista - titolo") is None
+    assert not matcher.trova("artista - titolo")
+
+def test_matcher_caratteri_richiesti():
+    matcher = MatcherPattern([r'\s*\(live\)', r'\s*\[live\]'], re.IGNORECASE, caratteri_richiesti="([")
+    assert matcher.cerca("song live") is None
+    assert matcher.cerca("song (LIVE)") == (0, 4, 11)
+    with pytest.raises(ValueError):
+        MatcherPattern([r'\s*-\s*live$'], caratteri_richiesti="([")
@@ -0,0 +1,48 @@
+import os
+import pytest
+from pathlib import Path
+from gestore_duplicati_musicali import PercorsoCartella, _in_anticipo
+
+@pytest.fixture
+def albero(tmp_path):
+    radice = tmp_path / "musica"
+    for relativo in ["a.mp3", "b.txt", "cd1/c.mp3", "cd1/sub/d.MP3", "DOPPIONI/e.mp3", ".tuneup_cache.sqlite"]:
+        percorso = radice / relativo
+        percorso.parent.mkdir(parents=True, exist_ok=True)
+        percorso.write_text("x")
+    return radice
+
+def test_visita_trova_file_ed_esclude_cartelle_e_prefissi(albero):
+    visita = PercorsoCartella(
+        albero,
+        cartelle_escluse=[albero / "DOPPIONI"],
+        prefissi_esclusi=(".tuneup_cache",),
+        estensioni_contate=[".mp3"]
+    )
+    trovati = sorted(Path(voce.path).relative_to(albero).as_posix() for voce in visita)
+
+    assert trovati == ["a.mp3", "b.txt", "cd1/c.mp3", "cd1/sub/d.MP3"]
+    assert visita.completato
+    assert visita.file_trovati == 4
+    assert visita.file_contati == 3
+    assert visita.cartelle_visitate == 3
+
+@pytest.mark.skipif(not hasattr(os, "symlink"), reason="symlink non disponibili")
+def test_visita_non_segue_link_a_cartelle(albero, tmp_path):
+    esterna = tmp_path / "esterna"
+    esterna.mkdir()
+    (esterna / "fuori.mp3").write_text("x")
+    try:
+        (albero / "collegamento").symlink_to(esterna, target_is_directory=True)
+    except OSError:
+        pytest.skip("creazione symlink non permessa")
+
+    nomi = {voce.name for voce in PercorsoCartella(albero)}
+    assert "fuori.mp3" not in nomi
+
+def test_in_anticipo_mantiene_ordine_e_si_interrompe():
+    assert list(_in_anticipo(iter(range(1000)), massimo_in_attesa=10)) == list(range(1000))
+
+    generatore = _in_anticipo(iter(range(1000)), massimo_in_attesa=10)
+    assert next(generatore) == 0
+    generatore.close() # Non deve restare bloccato sul produttore
@@ -0,0 +1,93 @@
+import json
+import sys
+import pytest
+from gestore_duplicati_musicali import (genera_piano_gestione, pianifica_gestione_completa, pianifica_spostamento_da_verificare_libreria, salva_piano, leggi_piano, filtra_piano,
+                                        dividi_piano, applica_piano, ScrittorePiano, GiornaleEsecuzione, OpzioniAnalisi, main_cli,
+                                        giornale_in_sospeso, riprendi_piano)
+
+logger = lambda msg, flush=True: None
+
+@pytest.fixture
+def libreria(tmp_path, mocker):
+    mocker.patch('gestore_duplicati_musicali.EasyID3', side_effect=Exception("nessun tag"))
+    musica = tmp_path / "musica"
+    musica.mkdir()
+    (musica / "cd2").mkdir()
+    for i in range(4):
+        (musica / f"Artista {i} - Brano.mp3").write_text(f"audio {i}")
+        (musica / "cd2" / f"Artista {i} - Brano.mp3").write_text(f"audio {i}" * 2)
+    (musica / "Artista 9 - Accento.mp3").write_text("x" * 10)
+    (musica / "Artista 9 - Accento (live).mp3").write_text("y")
+    cartelle = (musica, tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI", tmp_path / "DOPPIONI" / "DA_VERIFICARE")
+    return cartelle
+
+def test_piano_scritto_durante_la_pianificazione_come_in_memoria(tmp_path, libreria, mocker):
+    in_memoria = pianifica_gestione_completa(*libreria, logger, opzioni=OpzioniAnalisi(duplicati_esatti=True))
+
+    file_piano = tmp_path / "piano.jsonl"
+    with ScrittorePiano(file_piano) as scrittore:
+        # I duplicati sono già scritti quando inizia la pianificazione delle versioni
+        scritte_prima = []
+        def da_verificare(*args, **kwargs):
+            scritte_prima.append(scrittore.azioni)
+            return pianifica_spostamento_da_verificare_libreria(*args, **kwargs)
+        mocker.patch('gestore_duplicati_musicali.pianifica_spostamento_da_verificare_libreria', da_verificare)
+        for azione in genera_piano_gestione(*libreria, logger, opzioni=OpzioniAnalisi(duplicati_esatti=True)):
+            scrittore.scrivi(azione)
+        assert not file_piano.exists()
+    assert scritte_prima == [4]
+    assert list(leggi_piano(file_piano)) == in_memoria
+    assert {a.motivazione for a in in_memoria} == {"Duplicato", "Versione da Verificare"}
+
+    with pytest.raises(RuntimeError):
+        with ScrittorePiano(tmp_path / "interrotto.jsonl") as scrittore:
+            raise RuntimeError("pianificazione interrotta")
+    assert list(tmp_path.glob("interrotto*")) == []
+
+def test_filtro_suddivisione_e_applicazione_a_blocchi(tmp_path, libreria):
+    file_piano = tmp_path / "piano.jsonl"
+    salva_piano(genera_piano_gestione(*libreria, logger), file_piano)
+    duplicati = list(filtra_piano(leggi_piano(file_piano), ["Duplicato"]))
+    assert len(duplicati) == 4
+    assert [a.sorgente.name for a in filtra_piano(leggi_piano(file_piano), testo="ARTISTA 2")] == ["Artista 2 - Brano.mp3"]
+
+    parti = dividi_piano(filtra_piano(leggi_piano(file_piano), ["Duplicato"]), file_piano, 3)
+    assert [p.name for p in parti] == ["piano.parte001.jsonl", "piano.parte002.jsonl"]
+    assert [a for p in parti for a in leggi_piano(p)] == duplicati
+
+    giornale = tmp_path / "giornale.jsonl"
+    assert applica_piano(parti[0], giornale, logger, workers=2, azioni_per_blocco=2) == 3
+    assert all(a.destinazione.exists() and not a.sorgente.exists() for a in duplicati[:3])
+    assert duplicati[3].sorgente.exists()
+    assert GiornaleEsecuzione.leggi(giornale).completato and len(GiornaleEsecuzione.leggi(giornale).spostati) == 3
+
+    (tmp_path / "rotto.jsonl").write_text('{"piano": 1}\n["a", "b"]\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="riga 2"):
+        applica_piano(tmp_path / "rotto.jsonl", tmp_path / "altro_giornale.jsonl", logger)
+    assert duplicati[3].sorgente.exists()
+
+    # Piano danneggiato dopo un'azione valida: il giornale precedente resta intatto e nulla viene ripreso
+    valida = json.dumps([str(duplicati[3].sorgente), str(duplicati[3].destinazione), "Duplicato"])
+    (tmp_path / "danneggiato.jsonl").write_text('{"piano": 1}\n' + valida + '\nnon json\n', encoding="utf-8")
+    with pytest.raises(ValueError, match="riga 3"):
+        applica_piano(tmp_path / "danneggiato.jsonl", giornale, logger)
+    assert giornale_in_sospeso(giornale) is None and len(GiornaleEsecuzione.leggi(giornale).piano) == 3
+    assert riprendi_piano(giornale, logger) == 0 and duplicati[3].sorgente.exists()
+    assert not list(tmp_path.glob("*.parziale"))
+
+def test_riga_di_comando_senza_cartella_musicale(tmp_path, libreria, monkeypatch):
+    musica = libreria[0]
+    file_piano = tmp_path / "piano.jsonl"
+    monkeypatch.setattr(sys, "argv", ["gestore", str(musica), "--cartella-duplicati", str(libreria[1]), "--plan-out", str(file_piano)])
+    main_cli()
+    assert len(list(leggi_piano(file_piano))) == 6 and (musica / "Artista 0 - Brano.mp3").exists()
+    assert not libreria[1].exists() # Solo il piano: nessuna cartella di destinazione creata
+
+    monkeypatch.setattr(sys, "argv", ["gestore", "--apply-plan", str(file_piano), "--motivazione", "Versione da Verificare"])
+    main_cli()
+    assert not (musica / "Artista 9 - Accento.mp3").exists() and (musica / "Artista 0 - Brano.mp3").exists()
+    assert GiornaleEsecuzione.leggi(tmp_path / ".tuneup_giornale.jsonl").completato
+
+    monkeypatch.setattr(sys, "argv", ["gestore", "--filtra", "x"])
+    with pytest.raises(SystemExit):
+        main_cli()
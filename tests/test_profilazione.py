@@ -0,0 +1,43 @@
+import json
+import pstats
+import sys
+import gestore_duplicati_musicali
+from mp3_sintetici import crea_libreria_sintetica
+from gestore_duplicati_musicali import (pianifica_gestione_completa, Profilatore, profilazione, MonitorAvanzamento, OpzioniAnalisi, main_cli)
+
+logger = lambda msg, flush=True: None
+
+def test_profilo_della_pianificazione(tmp_path):
+    libreria = crea_libreria_sintetica(tmp_path / "musica", 120, seme=3, quota_duplicati=0.3)
+    cartelle = (tmp_path / "musica", tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI", tmp_path / "DOPPIONI" / "DA_VERIFICARE")
+
+    profilatore, monitor = Profilatore(), MonitorAvanzamento()
+    with profilazione(profilatore):
+        assert gestore_duplicati_musicali._profilatore is profilatore
+        pianifica_gestione_completa(*cartelle, logger, monitor, opzioni=OpzioniAnalisi(duplicati_esatti=True))
+    assert gestore_duplicati_musicali._profilatore is None
+
+    report = json.loads(json.dumps(profilatore.report(monitor)))
+    assert report["funzioni"]["analisi file"]["chiamate"] == libreria.file
+    assert report["funzioni"]["hash parziale"]["chiamate"] > 0
+    assert report["contatori"]["regex eseguite"] > 0 and report["contatori"]["scandir"] > 0
+    assert report["contatori"]["tag dal lettore rapido"] + report["contatori"].get("tag con mutagen", 0) >= libreria.file
+    assert {"visita", "analisi"} <= {fase["fase"] for fase in report["fasi"]}
+    assert any("analisi file" in riga for riga in Profilatore.righe_report(report))
+
+    # Senza profilatore attivo non si registra nulla
+    pianifica_gestione_completa(*cartelle, logger)
+    assert profilatore.report()["funzioni"]["analisi file"]["chiamate"] == libreria.file
+
+def test_riga_di_comando_con_profilo_e_cprofile(tmp_path, monkeypatch):
+    crea_libreria_sintetica(tmp_path / "musica", 40, seme=5)
+    file_profilo = tmp_path / "profilo.json"
+    # --profile non consuma l'argomento che lo segue (qui la cartella musicale)
+    monkeypatch.setattr(sys, "argv", ["gestore", "--profile", str(tmp_path / "musica"), "--plan-out", str(tmp_path / "piano.jsonl"),
+                                      "--profile-file", str(file_profilo), "--profila-fase", "analisi"])
+    main_cli()
+    report = json.loads(file_profilo.read_text(encoding="utf-8"))
+    assert report["versione"] == 1 and report["funzioni"]["analisi file"]["chiamate"] == 40
+    assert report["cprofile"]["fase"] == "analisi"
+    statistiche = pstats.Stats(report["cprofile"]["file"])
+    assert any(funzione[2] == "_estrai_info_file" for funzione in statistiche.stats)
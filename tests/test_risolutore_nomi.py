@@ -0,0 +1,44 @@
+import os
+from pathlib import Path
+from gestore_duplicati_musicali import RisolutoreNomi, risolvi_destinazioni, esegui_piano_azioni, SpostaFileAzione
+
+def test_risolutore_come_la_ricerca_con_exists(tmp_path):
+    (tmp_path / "a.mp3").write_text("")
+    (tmp_path / "a_2.mp3").write_text("")
+    risolutore = RisolutoreNomi()
+    nomi = [risolutore.risolvi(tmp_path / nome).name for nome in ["a.mp3", "a.mp3", "a_1.mp3", "a.mp3", "b.mp3", "b.mp3", "a.mp3"]]
+    assert nomi == ["a_1.mp3", "a_3.mp3", "a_1_1.mp3", "a_4.mp3", "b.mp3", "b_1.mp3", "a_5.mp3"]
+    # Cartella non ancora creata: nessun nome occupato
+    assert risolutore.risolvi(tmp_path / "nuova" / "a.mp3") == tmp_path / "nuova" / "a.mp3"
+
+def test_trecento_copie_con_una_lettura_per_cartella_e_nessuna_ricerca_in_esecuzione(tmp_path, mocker):
+    doppioni = tmp_path / "DOPPIONI"
+    doppioni.mkdir()
+    (doppioni / "01 - Intro.mp3").write_text("già presente")
+    piano = []
+    for i in range(300):
+        sorgente = tmp_path / "musica" / f"cd{i:03d}" / "01 - Intro.mp3"
+        sorgente.parent.mkdir(parents=True)
+        sorgente.write_text(f"cd {i}")
+        piano.append(SpostaFileAzione(sorgente, doppioni / "01 - Intro.mp3", "Duplicato"))
+
+    scandir = mocker.patch('gestore_duplicati_musicali.os.scandir', side_effect=os.scandir)
+    piano = risolvi_destinazioni(piano)
+    assert scandir.call_count == 1
+    assert [az.destinazione.name for az in piano[:3]] == ["01 - Intro_1.mp3", "01 - Intro_2.mp3", "01 - Intro_3.mp3"]
+    assert len({az.destinazione for az in piano}) == 300
+
+    # L'esecuzione usa le destinazioni pianificate: nessun exists() per file
+    mocker.patch.object(Path, "exists", side_effect=AssertionError("ricerca del nome in esecuzione"))
+    assert esegui_piano_azioni(piano, lambda msg, flush=True: None, workers=4) == 300
+    assert all(az.destinazione.read_text() == f"cd {i}" for i, az in enumerate(piano))
+
+def test_esecuzione_non_sovrascrive_file_comparsi_dopo_la_pianificazione(tmp_path):
+    sorgente = tmp_path / "brano.mp3"
+    sorgente.write_text("nuovo")
+    piano = risolvi_destinazioni([SpostaFileAzione(sorgente, tmp_path / "DOPPIONI" / "brano.mp3", "Duplicato")])
+    (tmp_path / "DOPPIONI").mkdir()
+    (tmp_path / "DOPPIONI" / "brano.mp3").write_text("comparso dopo")
+    assert esegui_piano_azioni(piano, lambda msg, flush=True: None) == 1
+    assert (tmp_path / "DOPPIONI" / "brano.mp3").read_text() == "comparso dopo"
+    assert (tmp_path / "DOPPIONI" / "brano_1.mp3").read_text() == "nuovo"
@@ -0,0 +1,73 @@
+import re
+import pytest
+from pathlib import Path
+from gestore_duplicati_musicali import scansiona_cartella, pianifica_spostamento_duplicati, OpzioniAnalisi, MEMO_NORMALIZZAZIONE
+
+class MockEasyID3DaNome:
+    """Mock di EasyID3 che ricava i tag dal nome del file ('Artista - Titolo')."""
+    def __init__(self, file_path):
+        artista, _, titolo = Path(file_path).stem.partition(' - ')
+        titolo = titolo.split('_copia')[0]
+        self.file_tags = {'artist': [artista], 'title': [titolo]} if titolo else {}
+
+    def get(self, key, default):
+        return self.file_tags.get(key, default)
+
+@pytest.fixture
+def libreria(tmp_path, mocker):
+    mocker.patch('gestore_duplicati_musicali.EasyID3', MockEasyID3DaNome)
+    cartella = tmp_path / "musica"
+    for i in range(60):
+        sottocartella = cartella / f"cd{i % 5}"
+        sottocartella.mkdir(parents=True, exist_ok=True)
+        (sottocartella / f"Artista {i % 7} - Brano {i % 11}.mp3").write_text("x" * (i + 1))
+        if i % 3 == 0:
+            (sottocartella / f"Artista {i % 7} - Brano {i % 11}_copia{i}.mp3").write_text("y" * i)
+    (cartella / "senza trattino.mp3").write_text("z")
+    return cartella
+
+def _scansiona(cartella, tmp_path, workers):
+    MEMO_NORMALIZZAZIONE.svuota() # Stesse statistiche del memo nei log di ogni scansione
+    messaggi = []
+    # Il totale mostrato durante la visita in streaming è approssimato: lo ignoriamo nel confronto
+    registra = lambda msg, flush=True: messaggi.append(re.sub(r'/~?\d+ ', '/N ', msg))
+    validi, _ = scansiona_cartella(
+        cartella, tmp_path / "NON CONFORMI",
+        logger=registra,
+        opzioni=OpzioniAnalisi(workers=workers)
+    )
+    return validi, messaggi
+
+def test_scansione_parallela_stesso_ordine_e_stessi_log(libreria, tmp_path):
+    validi_seriale, log_seriale = _scansiona(libreria, tmp_path, workers=1)
+    validi_parallelo, log_parallelo = _scansiona(libreria, tmp_path, workers=8)
+
+    assert validi_parallelo == validi_seriale
+    assert [m for m in log_parallelo if 'thread paralleli' not in m] == log_seriale
+
+def test_scansione_parallela_stesso_piano(libreria, tmp_path):
+    validi_seriale, _ = _scansiona(libreria, tmp_path, workers=1)
+    validi_parallelo, _ = _scansiona(libreria, tmp_path, workers=4)
+
+    silenzioso = lambda msg, flush=True: None
+    piano_seriale, _ = pianifica_spostamento_duplicati(validi_seriale, tmp_path / "DOPPIONI", silenzioso)
+    piano_parallelo, _ = pianifica_spostamento_duplicati(validi_parallelo, tmp_path / "DOPPIONI", silenzioso)
+
+    assert piano_seriale
+    assert piano_parallelo == piano_seriale
+
+def test_scansione_multiprocesso_stesso_risultato(tmp_path):
+    # Nessun mock: i processi figli leggono file reali (senza tag) e usano il nome file
+    cartella = tmp_path / "musica"
+    for i in range(40):
+        sottocartella = cartella / f"cd{i % 3}"
+        sottocartella.mkdir(parents=True, exist_ok=True)
+        (sottocartella / f"{i:02d} - Artista {i % 4} - Brano {i % 9} (Live).mp3").write_text("x" * i)
+    (cartella / "illeggibile.mp3").write_text("z")
+
+    silenzioso = lambda msg, flush=True: None
+    seriale, _ = scansiona_cartella(cartella, tmp_path / "NC", silenzioso, opzioni=OpzioniAnalisi())
+    multiprocesso, _ = scansiona_cartella(cartella, tmp_path / "NC", silenzioso, opzioni=OpzioniAnalisi(processi=2))
+
+    assert len(seriale) == 40
+    assert multiprocesso == seriale
@@ -0,0 +1,93 @@
+import random
+import pytest
+from pathlib import Path
+from gestore_duplicati_musicali import (
+    MusicFile, chiave_somiglianza, trova_gruppi_simili, pianifica_spostamento_simili,
+    pianifica_gestione_completa, OpzioniAnalisi
+)
+
+def music_file(artista, titolo, nome=None):
+    nome = nome or f"{artista} - {titolo}.mp3"
+    return MusicFile(Path("/musica") / nome, artista, titolo, titolo, None, 1000, "ID3")
+
+def nomi_gruppi(gruppi):
+    return sorted(sorted(mf.path.name for mf in gruppo) for gruppo in gruppi)
+
+@pytest.mark.parametrize("testo, articolo, atteso", [
+    ("the beatles", True, "beatles"),
+    ("the end", False, "the end"),
+    ("let it be (feat billy preston)", False, "let it be"),
+    ("artista feat ospite", False, "artista"),
+    ("rock-n-roll [ft dj]", False, "rock n roll"),
+    ("left outside alone", False, "left outside alone"),
+])
+def test_chiave_somiglianza(testo, articolo, atteso):
+    assert chiave_somiglianza(testo, togli_articolo=articolo) == atteso
+
+def test_trova_gruppi_simili():
+    file_musicali = [
+        music_file("the beatles", "let it be"),
+        music_file("beatles", "let it be"),
+        music_file("beatles", "let it bee"),
+        music_file("artista", "canzone (feat ospite)"),
+        music_file("artista", "canzone"),
+        music_file("artista", "sinfonia no 5"),
+        music_file("artista", "sinfonia no 9"),
+        music_file("artista", "song a"),
+        music_file("artista", "song b"),
+        music_file("i want you", "x", "i want you.mp3"),
+        music_file("want you", "x", "want you.mp3"),
+    ]
+    assert nomi_gruppi(trova_gruppi_simili(file_musicali)) == [
+        ["artista - canzone (feat ospite).mp3", "artista - canzone.mp3"],
+        ["beatles - let it be.mp3", "beatles - let it bee.mp3", "the beatles - let it be.mp3"],
+        ["i want you.mp3", "want you.mp3"], # Articolo dell'artista ignorato
+    ]
+
+def test_vicinato_ordinato_trova_le_coppie_in_una_libreria_grande():
+    rnd = random.Random(7)
+    sillabe = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "qua"]
+    parola = lambda: "".join(rnd.choice(sillabe) for _ in range(rnd.randint(2, 4)))
+    file_musicali = [music_file(f"{parola()} {parola()}", f"{parola()} {parola()} {parola()}", f"{i}.mp3") for i in range(5000)]
+    # Quasi-duplicati: refuso nell'artista, nel titolo o articolo aggiunto
+    attesi = []
+    for i in rnd.sample(range(len(file_musicali)), 50):
+        originale = file_musicali[i]
+        artista, titolo = originale.artista_norm, originale.titolo_norm
+        variante = rnd.choice([("the " + artista, titolo), (artista[:-1], titolo), (artista, titolo + "e")])
+        file_musicali.append(music_file(*variante, f"variante {i}.mp3"))
+        attesi.append(sorted([originale.path.name, f"variante {i}.mp3"]))
+
+    gruppi = nomi_gruppi(trova_gruppi_simili(file_musicali))
+    assert all(coppia in gruppi for coppia in attesi)
+
+def test_pianifica_simili_raccoglie_il_gruppo_in_da_verificare():
+    file_musicali = [music_file("the beatles", "let it be"), music_file("beatles", "let it be"), music_file("altro", "brano")]
+    azioni = pianifica_spostamento_simili(file_musicali, Path("/DA_VERIFICARE"), logger=lambda msg, flush=True: None)
+    assert [(az.sorgente.name, az.destinazione, az.motivazione) for az in azioni] == [
+        ("beatles - let it be.mp3", Path("/DA_VERIFICARE/beatles/let it be/beatles - let it be.mp3"), "Simile da Verificare"),
+        ("the beatles - let it be.mp3", Path("/DA_VERIFICARE/beatles/let it be/the beatles - let it be.mp3"), "Simile da Verificare"),
+    ]
+
+def test_gestione_completa_con_simili(tmp_path, mocker):
+    mocker.patch('gestore_duplicati_musicali.EasyID3', side_effect=Exception("nessun tag"))
+    musica = tmp_path / "musica"
+    musica.mkdir()
+    for nome in ["The Beatles - Let It Be.mp3", "Beatles - Let It Be (Live).mp3", "Beatles - Yesterday.mp3", "Beatles - Yesterday (Live).mp3", "Queen - Bohemian Rhapsody.mp3"]:
+        (musica / nome).write_text(nome)
+    argomenti = (musica, tmp_path / "DOPPIONI", tmp_path / "NON CONFORMI", tmp_path / "DOPPIONI" / "DA_VERIFICARE")
+    logger = lambda msg, flush=True: None
+
+    senza = pianifica_gestione_completa(*argomenti, logger=logger)
+    assert sorted((az.sorgente.name, az.motivazione) for az in senza) == [
+        ("Beatles - Yesterday (Live).mp3", "Versione da Verificare"),
+        ("Beatles - Yesterday.mp3", "Versione da Verificare"),
+    ]
+
+    con = pianifica_gestione_completa(*argomenti, logger=logger, opzioni=OpzioniAnalisi(raggruppa_simili=True))
+    assert sorted((az.sorgente.name, az.motivazione) for az in con) == sorted([
+        ("Beatles - Yesterday (Live).mp3", "Versione da Verificare"),
+        ("Beatles - Yesterday.mp3", "Versione da Verificare"),
+        ("Beatles - Let It Be (Live).mp3", "Simile da Verificare"),
+        ("The Beatles - Let It Be.mp3", "Simile da Verificare"),
+    ])
@@ -0,0 +1,63 @@
+import errno
+import os
+import tempfile
+import pytest
+from pathlib import Path
+from gestore_duplicati_musicali import sposta_file, esegui_piano_azioni, SpostaFileAzione
+
+ALTRO_DISPOSITIVO = -1 # Nessun st_dev reale: forza la copia anche sullo stesso disco
+
+@pytest.fixture
+def sorgente(tmp_path):
+    percorso = tmp_path / "brano.mp3"
+    percorso.write_bytes(os.urandom(300_000))
+    os.utime(percorso, (1_000_000, 1_000_000))
+    return percorso
+
+def test_stesso_dispositivo_rinomina(tmp_path, sorgente, mocker):
+    copia = mocker.patch('gestore_duplicati_musicali._copia_file')
+    movimento = sposta_file(sorgente, tmp_path / "spostato.mp3")
+    assert movimento.metodo == "rename" and movimento.byte == 300_000
+    assert not copia.called and not sorgente.exists()
+
+@pytest.mark.parametrize("disponibili", [("copy_file_range", "sendfile"), ("sendfile",), (), ("macos",)])
+def test_copia_tra_dispositivi_con_ricaduta(tmp_path, sorgente, mocker, monkeypatch, disponibili):
+    contenuto = sorgente.read_bytes()
+    if disponibili == ("macos",):
+        # macOS: niente copy_file_range, e sendfile accetta solo un socket come destinazione
+        monkeypatch.delattr(os, "copy_file_range", raising=False)
+        mocker.patch('gestore_duplicati_musicali.os.sendfile', side_effect=OSError(errno.ENOTSOCK, "Socket operation on non-socket"), create=True)
+    elif "copy_file_range" not in disponibili:
+        # Kernel che non supporta copy_file_range tra questi file
+        mocker.patch('gestore_duplicati_musicali.os.copy_file_range', side_effect=OSError(errno.EXDEV, "cross-device"), create=True)
+    if "sendfile" not in disponibili:
+        mocker.patch('gestore_duplicati_musicali.os.sendfile', side_effect=OSError(errno.EINVAL, "non supportato"), create=True)
+    destinazione = tmp_path / "copia.mp3"
+    movimento = sposta_file(sorgente, destinazione, ALTRO_DISPOSITIVO, verifica=True)
+    attesi = [m for m in ("copy_file_range", "sendfile") if m in disponibili and hasattr(os, m)]
+    assert movimento.metodo == (attesi[0] if attesi else "read/write")
+    assert destinazione.read_bytes() == contenuto and not sorgente.exists()
+    assert os.stat(destinazione).st_mtime == 1_000_000
+
+def test_verifica_fallita_mantiene_l_originale(tmp_path, sorgente, mocker):
+    mocker.patch('gestore_duplicati_musicali._hash_completo', side_effect=[b"originale", b"copia"])
+    with pytest.raises(OSError, match="verifica"):
+        sposta_file(sorgente, tmp_path / "copia.mp3", ALTRO_DISPOSITIVO, verifica=True)
+    assert sorgente.exists() and not (tmp_path / "copia.mp3").exists()
+
+def test_copia_non_sovrascrive(tmp_path, sorgente):
+    (tmp_path / "esistente.mp3").write_text("da non perdere")
+    with pytest.raises(FileExistsError):
+        sposta_file(sorgente, tmp_path / "esistente.mp3", ALTRO_DISPOSITIVO)
+    assert (tmp_path / "esistente.mp3").read_text() == "da non perdere" and sorgente.exists()
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm") or not os.access("/dev/shm", os.W_OK), reason="serve un secondo filesystem")
+def test_piano_tra_dischi_diversi_riporta_la_velocita(tmp_path, sorgente):
+    if os.stat("/dev/shm").st_dev == os.stat(tmp_path).st_dev:
+        pytest.skip("/dev/shm è sullo stesso dispositivo")
+    messaggi = []
+    with tempfile.TemporaryDirectory(dir="/dev/shm") as altro_disco:
+        destinazione = Path(altro_disco) / "DOPPIONI" / "brano.mp3"
+        assert esegui_piano_azioni([SpostaFileAzione(sorgente, destinazione, "Duplicato")], lambda msg, flush=True: messaggi.append(msg), verifica_copie=True) == 1
+        assert destinazione.stat().st_size == 300_000 and not sorgente.exists()
+    assert any(m.startswith("  Dispositivo ") and "1 file" in m and "MB/s" in m for m in messaggi)